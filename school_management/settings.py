@@ -202,6 +202,9 @@ STATICFILES_DIRS = [
 # 生产环境下收集静态文件的目录
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# 上传文件目录（导入任务暂存的 Excel 等，不对外提供访问）
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -301,6 +304,56 @@ RQ_QUEUES = {
 # RQ管理界面配置
 RQ_SHOW_ADMIN_LINK = True  # 在Django admin中显示RQ链接
 
+# 缓存：default 为进程内 locmem；analysis 保存成绩分析接口的结果，access_scope 保存用户的成绩读权限范围
+# ANALYSIS_CACHE_BACKEND: redis（复用 RQ default 队列的 Redis，多进程共享）/ locmem（开发）/ dummy（不缓存）
+# 测试时默认不缓存：测试库回滚后主键会复用，跨用例命中旧结果；缓存相关用例自行覆盖为 locmem
+_rq_default = RQ_QUEUES['default']
+_ANALYSIS_CACHE_BACKEND = 'dummy' if _is_testing else os.getenv('ANALYSIS_CACHE_BACKEND', 'redis')
+
+
+def _shared_cache(name: str) -> dict:
+    if _ANALYSIS_CACHE_BACKEND == 'redis':
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv(
+                'ANALYSIS_CACHE_URL',
+                f"redis://{_rq_default['HOST']}:{_rq_default['PORT']}/{_rq_default['DB']}",
+            ),
+            'KEY_PREFIX': f'sms_{name}',
+        }
+    if _ANALYSIS_CACHE_BACKEND == 'locmem':
+        return {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'sms-{name}',
+        }
+    return {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'analysis': _shared_cache('analysis'),
+    'access_scope': _shared_cache('access_scope'),
+}
+
+# 排名计算后端：auto（数据库支持窗口函数时用 SQL，否则 Python）/ sql / python
+RANKING_BACKEND = os.getenv('RANKING_BACKEND', 'auto')
+
+# 排名任务调度：按 (考试, 届别) 合并请求，安静窗口结束后才投递一次排名任务
+# BACKEND: rq（Redis 保存状态 + enqueue_in 延迟投递，worker 需 --with-scheduler）/ inline（进程内，flush() 时同步执行）
+RANKING_SCHEDULER = {
+    'BACKEND': 'inline' if _is_testing else os.getenv('RANKING_SCHEDULER_BACKEND', 'rq'),
+    'QUIET_SECONDS': int(os.getenv('RANKING_QUIET_SECONDS', '5')),
+    'MAX_DELAY_SECONDS': int(os.getenv('RANKING_MAX_DELAY_SECONDS', '60')),
+    # 待处理的变动项超过该数量时直接改为全量重算
+    'MAX_CHANGED_PAIRS': 2000,
+    # 已投递的排名任务超过预计执行时间这么久仍未执行，视为丢失，下一次请求重新投递
+    'RESCHEDULE_GRACE_SECONDS': int(os.getenv('RANKING_RESCHEDULE_GRACE_SECONDS', '120')),
+    # Redis 中待处理状态的过期时间（秒）
+    'STATE_TTL_SECONDS': 6 * 60 * 60,
+}
+
 # 错误日志配置：记录所有 server error 到 logs/django.log
 LOGGING = {
     'version': 1,
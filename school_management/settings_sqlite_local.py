@@ -10,3 +10,12 @@ from .settings import *  # noqa: F401,F403
 
 DATABASES = deepcopy(DATABASES)
 DATABASES['default'] = deepcopy(DATABASES['sqlite'])
+
+# 本地开发未必启动 Redis：共享缓存默认改用进程内 locmem（显式设置 ANALYSIS_CACHE_BACKEND 时保持不变）
+if not os.getenv('ANALYSIS_CACHE_BACKEND'):
+    CACHES = deepcopy(CACHES)
+    for _alias in ('analysis', 'access_scope'):
+        CACHES[_alias] = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'sms-{_alias}',
+        }
@@ -5,6 +5,7 @@ from collections import defaultdict
 from django.db.models import Q
 
 from ...models.exam import Exam
+from ...models.exam_result import ExamResult
 from ...models.score import Score
 from ...models.student import Class, Student
 
@@ -69,15 +70,15 @@ def student_queryset_for_scope(scope):
 
 def scores_by_student(exam, students, subjects=None):
     student_ids = [student.id for student in students]
-    query = Score.objects.filter(exam=exam, student_id__in=student_ids).select_related(
-        "student", "student__current_class"
+    rows = ExamResult.objects.filter(exam=exam, student_id__in=student_ids).values_list(
+        "student_id", "subject_scores"
     )
-    if subjects:
-        query = query.filter(subject__in=subjects)
 
     grouped = defaultdict(dict)
-    for score in query:
-        grouped[score.student_id][score.subject] = float(score.score_value)
+    for student_id, subject_scores in rows:
+        for subject, value in subject_scores.items():
+            if not subjects or subject in subjects:
+                grouped[student_id][subject] = value
     return grouped
 
 
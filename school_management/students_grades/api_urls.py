@@ -6,6 +6,8 @@ from .api_views import (
     ClassViewSet,
     ExamViewSet,
     ScoreViewSet,
+    ImportJobViewSet,
+    ExportJobViewSet,
     advanced_filter,
     FilterRuleListView,
     FilterRuleDetailView,
@@ -20,6 +22,8 @@ router.register(r'students', StudentViewSet)
 router.register(r'classes', ClassViewSet)
 router.register(r'exams', ExamViewSet)
 router.register(r'scores', ScoreViewSet)
+router.register(r'import-jobs', ImportJobViewSet, basename='import-job')
+router.register(r'export-jobs', ExportJobViewSet, basename='export-job')
 
 urlpatterns = [
     # AI Agent V3 ReAct
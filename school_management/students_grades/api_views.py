@@ -10,12 +10,16 @@ from .views.score import ScoreViewSet
 from .views.student import StudentViewSet
 from .views.classroom import ClassViewSet
 from .views.exam import ExamViewSet
+from .views.import_job import ImportJobViewSet
+from .views.export_job import ExportJobViewSet
 
 __all__ = [
     "StudentViewSet",
     "ClassViewSet",
     "ExamViewSet",
     "ScoreViewSet",
+    "ImportJobViewSet",
+    "ExportJobViewSet",
     "advanced_filter",
     "FilterRuleListView",
     "FilterRuleDetailView",
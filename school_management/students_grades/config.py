@@ -16,5 +16,67 @@ TABLE_CONFIG = {
 IMPORT_CONFIG = {
     'MAX_FILE_SIZE': 10 * 1024 * 1024,  # 10MB
     'ALLOWED_EXTENSIONS': ['.xlsx', '.xls'],
-    'BATCH_SIZE': 1000
-}
\ No newline at end of file
+    'BATCH_SIZE': 1000,
+    # 超过该大小的上传文件转为后台导入任务（RQ），较小文件仍在请求内同步导入
+    'ASYNC_THRESHOLD': 512 * 1024,  # 512KB
+    # 导入任务每处理多少行上报一次进度
+    'PROGRESS_INTERVAL': 200,
+}
+# 导出任务配置
+EXPORT_CONFIG = {
+    # 已生成的导出文件保留时长，过期后由 evict_export_artifacts 命令（或新建任务时顺带）清理
+    'ARTIFACT_TTL_SECONDS': 24 * 60 * 60,
+}
+
+# 成绩分析结果缓存配置
+ANALYSIS_CACHE_CONFIG = {
+    # settings.CACHES 中的缓存别名
+    'ALIAS': 'analysis',
+    # 缓存键已包含考试数据版本与班级/学生名单版本，变化后自动失效；TTL 兜底未经信号的批量写入
+    'TTL_SECONDS': 10 * 60,
+}
+
+# 成绩读权限范围缓存配置
+ACCESS_SCOPE_CONFIG = {
+    # settings.CACHES 中的缓存别名
+    'ALIAS': 'access_scope',
+    # 班级、任课关系或考试成绩变化时版本号递增即失效；TTL 兜底未经信号的批量写入
+    'TTL_SECONDS': 10 * 60,
+}
+
+# 成绩选择集配置
+SELECTION_CONFIG = {
+    # 选择集有效期；每次修改后顺延
+    'TTL_SECONDS': 2 * 60 * 60,
+    # include/exclude 增量记录键合计的上限。选择集查询不分批，每条记录最多占两个绑定参数
+    # （记录各属不同考试时为 exam_id + student_id），400 条加上筛选条件仍在 SQLite 旧版 999 个参数的上限内
+    'MAX_DELTA_KEYS': 400,
+}
+
+# 高级筛选名次索引缓存配置
+RANK_INDEX_CONFIG = {
+    # settings.CACHES 中的缓存别名（与分析结果缓存共用）
+    'ALIAS': 'analysis',
+    # 缓存键含考试数据版本，成绩或排名变化后自动失效；TTL 只用于回收不再访问的考试
+    'TTL_SECONDS': 60 * 60,
+}
+
+# 目标生筛选 学生×考试 矩阵缓存配置
+TARGET_MATRIX_CONFIG = {
+    # settings.CACHES 中的缓存别名（与分析结果缓存共用）
+    'ALIAS': 'analysis',
+    # 缓存键含各场考试的数据版本，成绩或排名变化后自动失效；TTL 只用于回收不再访问的考试组合
+    'TTL_SECONDS': 60 * 60,
+}
+
+# 目标生筛选结果集缓存配置
+TARGET_RESULT_CONFIG = {
+    # settings.CACHES 中的缓存别名（与分析结果缓存共用）
+    'ALIAS': 'analysis',
+    # 翻页、排序、导出凭 result_id 读取结果集的有效期
+    'TTL_SECONDS': 30 * 60,
+    # 单个结果集（序列化后）超过该大小不缓存，每次重新计算
+    'MAX_ENTRY_BYTES': 4 * 1024 * 1024,
+    # 全部结果集的总大小上限，超出时按写入先后淘汰最早的结果集
+    'MEMORY_BUDGET_BYTES': 64 * 1024 * 1024,
+}
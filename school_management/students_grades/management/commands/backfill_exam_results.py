@@ -0,0 +1,59 @@
+"""
+回填/校正 (学生, 考试) 成绩汇总表 ExamResult
+
+用法:
+    python manage.py backfill_exam_results [--exam-id EXAM_ID]
+
+示例:
+    # 重算所有考试
+    python manage.py backfill_exam_results
+
+    # 只重算指定考试
+    python manage.py backfill_exam_results --exam-id 1
+
+命令可重复执行：缺失的汇总行会补齐，与成绩不一致的会被更新，已无成绩的会被删除。
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from school_management.students_grades.models.exam import Exam
+from school_management.students_grades.services.exam_result_service import ExamResultService
+
+
+class Command(BaseCommand):
+    help = '回填/校正考试成绩汇总表（ExamResult）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--exam-id',
+            type=int,
+            help='只重算指定 ID 的考试',
+        )
+
+    def handle(self, *args, **options):
+        exam_id = options.get('exam_id')
+
+        queryset = Exam.objects.all()
+        if exam_id:
+            queryset = queryset.filter(pk=exam_id)
+
+        exams = list(queryset.order_by('date'))
+        if not exams:
+            self.stdout.write(self.style.WARNING('没有找到考试'))
+            return
+
+        self.stdout.write(f'找到 {len(exams)} 个考试')
+
+        totals = {'created': 0, 'updated': 0, 'deleted': 0}
+        for exam in exams:
+            with transaction.atomic():
+                stats = ExamResultService.refresh_exam(exam.pk)
+            for key in totals:
+                totals[key] += stats[key]
+            self.stdout.write(
+                f'  {exam.name}（ID {exam.pk}）：新增 {stats["created"]}，更新 {stats["updated"]}，删除 {stats["deleted"]}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'完成：新增 {totals["created"]}，更新 {totals["updated"]}，删除 {totals["deleted"]}'
+        ))
@@ -0,0 +1,23 @@
+"""
+清理过期的导出任务及其导出文件
+
+用法:
+    python manage.py evict_export_artifacts
+
+示例:
+    # 建议每小时由 cron 执行一次
+    0 * * * * cd /path/to/SMS && python manage.py evict_export_artifacts
+
+文件保留时长见 config.EXPORT_CONFIG['ARTIFACT_TTL_SECONDS']；新建导出任务时也会顺带清理。
+"""
+from django.core.management.base import BaseCommand
+
+from school_management.students_grades.services.export_job_service import ExportJobService
+
+
+class Command(BaseCommand):
+    help = '清理过期的导出任务及导出文件'
+
+    def handle(self, *args, **options):
+        deleted = ExportJobService.evict_expired()
+        self.stdout.write(self.style.SUCCESS(f'完成：清理过期导出任务 {deleted} 个'))
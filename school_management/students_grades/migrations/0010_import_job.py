@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students_grades', '0009_exam_calendar_fk_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('score', '成绩导入'), ('student', '学生导入')], max_length=20, verbose_name='导入类型')),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '导入中'), ('success', '已完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('file', models.FileField(upload_to='import_jobs/%Y%m%d/', verbose_name='上传文件')),
+                ('original_filename', models.CharField(max_length=255, verbose_name='原始文件名')),
+                ('total_rows', models.IntegerField(default=0, help_text='按工作表尺寸估算，含空行', verbose_name='总行数')),
+                ('processed_rows', models.IntegerField(default=0, verbose_name='已处理行数')),
+                ('imported_rows', models.IntegerField(default=0, verbose_name='成功行数')),
+                ('failed_rows', models.IntegerField(default=0, verbose_name='失败行数')),
+                ('result', models.JSONField(blank=True, help_text='与同步导入接口返回格式一致', null=True, verbose_name='导入结果')),
+                ('message', models.TextField(blank=True, default='', verbose_name='说明')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='结束时间')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='import_jobs', to=settings.AUTH_USER_MODEL, verbose_name='创建人')),
+                ('exam', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='students_grades.exam', verbose_name='关联考试')),
+            ],
+            options={
+                'verbose_name': '导入任务',
+                'verbose_name_plural': '导入任务',
+                'db_table': 'import_jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_by', '-created_at'], name='import_jobs_created_f98329_idx')],
+            },
+        ),
+    ]
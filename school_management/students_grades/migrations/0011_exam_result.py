@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:52
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_exam_results(apps, schema_editor):
+    """按考试逐场从现有成绩生成汇总行；之后可随时用 backfill_exam_results 命令重算校正。"""
+    Exam = apps.get_model('students_grades', 'Exam')
+    Score = apps.get_model('students_grades', 'Score')
+    ExamResult = apps.get_model('students_grades', 'ExamResult')
+    Student = apps.get_model('students_grades', 'Student')
+
+    class_map = dict(Student.objects.values_list('id', 'current_class_id'))
+    created = 0
+    for exam_id in Exam.objects.values_list('id', flat=True):
+        summaries = {}
+        rows = Score.objects.filter(exam_id=exam_id).order_by().values_list(
+            'student_id', 'subject', 'score_value', 'total_score_rank_in_grade', 'total_score_rank_in_class',
+        )
+        for student_id, subject, score_value, grade_rank, class_rank in rows:
+            summary = summaries.setdefault(student_id, {
+                'total_score': Decimal('0'),
+                'subject_count': 0,
+                'total_score_rank_in_grade': None,
+                'total_score_rank_in_class': None,
+                'subject_scores': {},
+            })
+            summary['total_score'] += Decimal(score_value)
+            summary['subject_count'] += 1
+            summary['subject_scores'][subject] = float(score_value)
+            for field, rank in (('total_score_rank_in_grade', grade_rank), ('total_score_rank_in_class', class_rank)):
+                if rank is not None and (summary[field] is None or rank < summary[field]):
+                    summary[field] = rank
+
+        ExamResult.objects.bulk_create([
+            ExamResult(student_id=student_id, exam_id=exam_id, class_at_exam_id=class_map.get(student_id), **summary)
+            for student_id, summary in summaries.items()
+        ], batch_size=500)
+        created += len(summaries)
+
+    print(f"[Migration] 生成了 {created} 条考试成绩汇总")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students_grades', '0010_import_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_score', models.DecimalField(decimal_places=2, default=0, max_digits=8, verbose_name='总分')),
+                ('subject_count', models.PositiveSmallIntegerField(default=0, verbose_name='科目数')),
+                ('total_score_rank_in_grade', models.IntegerField(blank=True, null=True, verbose_name='总分年级排名')),
+                ('total_score_rank_in_class', models.IntegerField(blank=True, null=True, verbose_name='总分班级排名')),
+                ('subject_scores', models.JSONField(default=dict, help_text='{科目: 分数}', verbose_name='各科成绩')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('class_at_exam', models.ForeignKey(blank=True, help_text='首次生成汇总时学生所在班级，之后调班不影响历史考试', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='students_grades.class', verbose_name='考试时班级')),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='students_grades.exam', verbose_name='考试')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exam_results', to='students_grades.student', verbose_name='学生')),
+            ],
+            options={
+                'verbose_name': '考试成绩汇总',
+                'verbose_name_plural': '考试成绩汇总',
+                'db_table': 'exam_results',
+                'indexes': [models.Index(fields=['exam', 'total_score_rank_in_grade'], name='exam_result_exam_id_5cfcfa_idx')],
+                'unique_together': {('student', 'exam')},
+            },
+        ),
+        migrations.RunPython(backfill_exam_results, migrations.RunPython.noop),
+    ]
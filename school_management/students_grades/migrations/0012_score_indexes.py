@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:55
+
+from django.db import migrations, models
+
+
+class AddIndexOnline(migrations.AddIndex):
+    """
+    在 MySQL 上以 ALGORITHM=INPLACE, LOCK=NONE 在线建索引，建索引期间成绩表仍可读写；
+    其他数据库与普通 AddIndex 相同。迁移状态与 AddIndex 一致，不影响 makemigrations。
+    """
+
+    ONLINE_SUFFIX = ' ALGORITHM=INPLACE LOCK=NONE'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if schema_editor.connection.vendor != 'mysql' or not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        schema_editor.execute(str(self.index.create_sql(model, schema_editor)) + self.ONLINE_SUFFIX)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if schema_editor.connection.vendor != 'mysql' or not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        schema_editor.execute(str(self.index.remove_sql(model, schema_editor)) + self.ONLINE_SUFFIX)
+
+
+class Migration(migrations.Migration):
+
+    # 在线建索引耗时与表大小相关，不放在一个事务里
+    atomic = False
+
+    dependencies = [
+        ('students_grades', '0011_exam_result'),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name='score',
+            index=models.Index(fields=['exam', 'subject', 'student', 'grade_rank_in_subject', 'class_rank_in_subject'], name='score_exam_subject_rank_idx'),
+        ),
+        AddIndexOnline(
+            model_name='score',
+            index=models.Index(fields=['exam', 'student', 'total_score_rank_in_grade', 'total_score_rank_in_class'], name='score_exam_student_rank_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students_grades', '0012_score_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='数据版本'),
+        ),
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('score_query', '成绩查询导出'), ('score_batch', '筛选成绩导出'), ('student_analysis', '个人分析报告导出')], max_length=30, verbose_name='导出类型')),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('running', '生成中'), ('success', '已完成'), ('failed', '失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('cache_key', models.CharField(help_text='(导出类型, 规范化参数, 权限范围, 数据版本) 的 SHA-256', max_length=64, verbose_name='缓存键')),
+                ('params', models.JSONField(default=dict, verbose_name='导出参数')),
+                ('file', models.FileField(blank=True, upload_to='export_jobs/%Y%m%d/', verbose_name='导出文件')),
+                ('filename', models.CharField(blank=True, default='', max_length=255, verbose_name='下载文件名')),
+                ('cached', models.BooleanField(default=False, help_text='文件复用自相同缓存键的已完成任务', verbose_name='命中缓存')),
+                ('message', models.TextField(blank=True, default='', verbose_name='说明')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='结束时间')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='过期时间')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='创建人')),
+            ],
+            options={
+                'verbose_name': '导出任务',
+                'verbose_name_plural': '导出任务',
+                'db_table': 'export_jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['cache_key', 'status'], name='export_jobs_cache_k_0189cd_idx'), models.Index(fields=['expires_at'], name='export_jobs_expires_89b852_idx'), models.Index(fields=['created_by', '-created_at'], name='export_jobs_created_d156a2_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students_grades', '0013_export_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='processed_items',
+            field=models.PositiveIntegerField(default=0, verbose_name='已处理条目数'),
+        ),
+        migrations.AddField(
+            model_name='exportjob',
+            name='total_items',
+            field=models.PositiveIntegerField(default=0, help_text='批量导出时的学生人数', verbose_name='总条目数'),
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='kind',
+            field=models.CharField(choices=[('score_query', '成绩查询导出'), ('score_batch', '筛选成绩导出'), ('student_analysis', '个人分析报告导出'), ('student_analysis_batch', '个人分析报告批量导出')], max_length=30, verbose_name='导出类型'),
+        ),
+    ]
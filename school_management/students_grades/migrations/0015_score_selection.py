@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students_grades', '0014_export_job_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreSelection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True, verbose_name='选择令牌')),
+                ('params', models.JSONField(default=dict, help_text='规范化后的成绩列表查询参数', verbose_name='筛选参数')),
+                ('include_keys', models.JSONField(default=list, help_text='筛选结果之外额外选中的记录键', verbose_name='额外选中')),
+                ('exclude_keys', models.JSONField(default=list, help_text='从筛选结果中取消选中的记录键', verbose_name='取消选中')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('expires_at', models.DateTimeField(verbose_name='过期时间')),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_selections', to=settings.AUTH_USER_MODEL, verbose_name='创建人')),
+            ],
+            options={
+                'verbose_name': '成绩选择集',
+                'verbose_name_plural': '成绩选择集',
+                'db_table': 'score_selections',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['expires_at'], name='score_selec_expires_754fb3_idx')],
+            },
+        ),
+    ]
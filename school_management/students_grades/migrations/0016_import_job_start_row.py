@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students_grades', '0015_score_selection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='start_row',
+            field=models.PositiveIntegerField(default=2, help_text='成绩导入从第几行开始读取，用于中断后续传', verbose_name='起始行'),
+        ),
+    ]
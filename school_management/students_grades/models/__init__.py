@@ -6,6 +6,10 @@ from .exam import (
 from .score import Score
 from .filter import SavedFilterRule, FilterResultSnapshot
 from .calendar import CalendarEvent
+from .import_job import ImportJob
+from .exam_result import ExamResult
+from .export_job import ExportJob
+from .score_selection import ScoreSelection
 
 __all__ = [
     # 学生相关
@@ -18,5 +22,13 @@ __all__ = [
     # 筛选相关
     'SavedFilterRule', 'FilterResultSnapshot',
     # 日历相关
-    'CalendarEvent'
+    'CalendarEvent',
+    # 导入任务
+    'ImportJob',
+    # 成绩汇总
+    'ExamResult',
+    # 导出任务
+    'ExportJob',
+    # 成绩选择集
+    'ScoreSelection',
 ]
\ No newline at end of file
@@ -100,6 +100,8 @@ class Exam(models.Model):
         related_name='created_exams',
         verbose_name='创建者',
     )
+    # 成绩数据版本：该考试的成绩或排名每次写入后递增（ExamResultService 维护），导出缓存以此判断是否失效
+    data_version = models.PositiveIntegerField(default=0, editable=False, verbose_name="数据版本")
 
     class Meta:
         verbose_name = "考试"
@@ -0,0 +1,54 @@
+from django.db import models
+
+from .exam import Exam
+from .student import Class, Student
+
+
+class ExamResult(models.Model):
+    """
+    (学生, 考试) 汇总表，由 Score 派生，每个学生每场考试一行。
+
+    总分、科目数、总分排名、考试时所在班级和各科成绩向量都冗余存放在这里，
+    读取总分/总分排名的场景只需查这张窄表，不必再对 Score 分组聚合。
+    由 ExamResultService 在成绩写入、删除和排名任务后同步维护。
+    """
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        related_name="exam_results",
+        verbose_name="学生",
+    )
+    exam = models.ForeignKey(
+        Exam,
+        on_delete=models.CASCADE,
+        related_name="results",
+        verbose_name="考试",
+    )
+    class_at_exam = models.ForeignKey(
+        Class,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="考试时班级",
+        help_text="首次生成汇总时学生所在班级，之后调班不影响历史考试",
+    )
+    total_score = models.DecimalField(max_digits=8, decimal_places=2, default=0, verbose_name="总分")
+    subject_count = models.PositiveSmallIntegerField(default=0, verbose_name="科目数")
+    total_score_rank_in_grade = models.IntegerField(null=True, blank=True, verbose_name="总分年级排名")
+    total_score_rank_in_class = models.IntegerField(null=True, blank=True, verbose_name="总分班级排名")
+    subject_scores = models.JSONField(default=dict, verbose_name="各科成绩", help_text="{科目: 分数}")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+
+    class Meta:
+        db_table = "exam_results"
+        verbose_name = "考试成绩汇总"
+        verbose_name_plural = verbose_name
+        unique_together = ("student", "exam")
+        indexes = [
+            models.Index(fields=["exam", "total_score_rank_in_grade"]),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.exam_id}: {self.total_score}"
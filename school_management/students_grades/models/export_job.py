@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import models
+
+
+class ExportJob(models.Model):
+    """导出任务：由 RQ 任务生成导出文件并落盘，相同导出在有效期内直接复用已生成的文件。"""
+
+    KIND_CHOICES = [
+        ("score_query", "成绩查询导出"),
+        ("score_batch", "筛选成绩导出"),
+        ("student_analysis", "个人分析报告导出"),
+        ("student_analysis_batch", "个人分析报告批量导出"),
+    ]
+
+    STATUS_CHOICES = [
+        ("pending", "排队中"),
+        ("running", "生成中"),
+        ("success", "已完成"),
+        ("failed", "失败"),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, verbose_name="导出类型")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="状态")
+    cache_key = models.CharField(
+        max_length=64,
+        verbose_name="缓存键",
+        help_text="(导出类型, 规范化参数, 权限范围, 数据版本) 的 SHA-256",
+    )
+    params = models.JSONField(default=dict, verbose_name="导出参数")
+    file = models.FileField(upload_to="export_jobs/%Y%m%d/", blank=True, verbose_name="导出文件")
+    filename = models.CharField(max_length=255, blank=True, default="", verbose_name="下载文件名")
+    cached = models.BooleanField(default=False, verbose_name="命中缓存", help_text="文件复用自相同缓存键的已完成任务")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="export_jobs",
+        verbose_name="创建人",
+    )
+    total_items = models.PositiveIntegerField(default=0, verbose_name="总条目数", help_text="批量导出时的学生人数")
+    processed_items = models.PositiveIntegerField(default=0, verbose_name="已处理条目数")
+    message = models.TextField(blank=True, default="", verbose_name="说明")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="结束时间")
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="过期时间")
+
+    class Meta:
+        db_table = "export_jobs"
+        ordering = ["-created_at"]
+        verbose_name = "导出任务"
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=["cache_key", "status"]),
+            models.Index(fields=["expires_at"]),
+            models.Index(fields=["created_by", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
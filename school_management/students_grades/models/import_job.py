@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import models
+
+
+class ImportJob(models.Model):
+    """Excel 导入任务：上传文件先落盘，由 RQ 任务解析写库，前端轮询进度。"""
+
+    KIND_CHOICES = [
+        ("score", "成绩导入"),
+        ("student", "学生导入"),
+    ]
+
+    STATUS_CHOICES = [
+        ("pending", "排队中"),
+        ("running", "导入中"),
+        ("success", "已完成"),
+        ("failed", "失败"),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="导入类型")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="状态")
+    file = models.FileField(upload_to="import_jobs/%Y%m%d/", verbose_name="上传文件")
+    original_filename = models.CharField(max_length=255, verbose_name="原始文件名")
+    start_row = models.PositiveIntegerField(default=2, verbose_name="起始行", help_text="成绩导入从第几行开始读取，用于中断后续传")
+    exam = models.ForeignKey(
+        "Exam",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="import_jobs",
+        verbose_name="关联考试",
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="import_jobs",
+        verbose_name="创建人",
+    )
+    total_rows = models.IntegerField(default=0, verbose_name="总行数", help_text="按工作表尺寸估算，含空行")
+    processed_rows = models.IntegerField(default=0, verbose_name="已处理行数")
+    imported_rows = models.IntegerField(default=0, verbose_name="成功行数")
+    failed_rows = models.IntegerField(default=0, verbose_name="失败行数")
+    result = models.JSONField(null=True, blank=True, verbose_name="导入结果", help_text="与同步导入接口返回格式一致")
+    message = models.TextField(blank=True, default="", verbose_name="说明")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="结束时间")
+
+    class Meta:
+        db_table = "import_jobs"
+        ordering = ["-created_at"]
+        verbose_name = "导入任务"
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=["created_by", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
@@ -72,12 +72,20 @@ class Score(models.Model):
         unique_together = ('student', 'exam', 'subject')
         # 按考試日期、學生姓名、科目排序
         ordering = ['exam__date', 'student__name', 'subject']
-        # 暂时注释掉索引，避免迁移冲突
-        # indexes = [
-        #     models.Index(fields=['student', 'exam'], name='score_student_exam_idx'),
-        #     models.Index(fields=['exam', 'subject'], name='score_exam_subject_idx'),
-        #     models.Index(fields=['student', 'subject'], name='score_student_subject_idx'),
-        # ]
+        # (student, exam, subject) 已由 unique_together 建立唯一索引，覆盖按学生查询的路径；
+        # 以下两个按考试的复合索引：(exam, subject, student, 科目名次) 覆盖目标生科目名次矩阵的读取，无需回表；
+        # (exam, student, 总分名次) 供 (学生, 考试) 汇总按批刷新时按考试+学生定位。
+        # MySQL 上由迁移 0012 以 ALGORITHM=INPLACE, LOCK=NONE 在线创建。
+        indexes = [
+            models.Index(
+                fields=['exam', 'subject', 'student', 'grade_rank_in_subject', 'class_rank_in_subject'],
+                name='score_exam_subject_rank_idx',
+            ),
+            models.Index(
+                fields=['exam', 'student', 'total_score_rank_in_grade', 'total_score_rank_in_class'],
+                name='score_exam_student_rank_idx',
+            ),
+        ]
 
     def clean(self):
         """
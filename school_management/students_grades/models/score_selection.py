@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import models
+
+
+class ScoreSelection(models.Model):
+    """成绩选择集：保存筛选条件及手动勾选/取消的记录，批量操作凭 token 取回，过期自动失效。"""
+
+    token = models.CharField(max_length=64, unique=True, verbose_name="选择令牌")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="score_selections",
+        verbose_name="创建人",
+    )
+    params = models.JSONField(default=dict, verbose_name="筛选参数", help_text="规范化后的成绩列表查询参数")
+    include_keys = models.JSONField(default=list, verbose_name="额外选中", help_text="筛选结果之外额外选中的记录键")
+    exclude_keys = models.JSONField(default=list, verbose_name="取消选中", help_text="从筛选结果中取消选中的记录键")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    expires_at = models.DateTimeField(verbose_name="过期时间")
+
+    class Meta:
+        db_table = "score_selections"
+        ordering = ["-created_at"]
+        verbose_name = "成绩选择集"
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.token} ({self.created_by_id})"
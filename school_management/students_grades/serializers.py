@@ -5,6 +5,7 @@ from .models.exam import Exam, ExamSubject, SUBJECT_CHOICES as EXAM_SUBJECT_CHOI
 from .models.score import Score
 from .models.filter import SavedFilterRule, FilterResultSnapshot
 from .services.advanced_filter import AdvancedFilterService
+from .services.exam_result_service import ExamResultService
 
 
 class ClassSerializer(serializers.ModelSerializer):
@@ -147,6 +148,8 @@ class ExamSerializer(serializers.ModelSerializer):
                         'max_score': s['max_score'],
                     }
                 )
+        # 考试名称、满分等变化同样影响分析结果与导出内容
+        ExamResultService.bump_data_versions([instance.pk])
         return instance
 
 
@@ -187,6 +190,17 @@ class SavedFilterRuleSerializer(serializers.ModelSerializer):
         if not isinstance(value, dict):
             raise serializers.ValidationError('rule_config 必须是对象')
 
+        if value.get('expression') is not None:
+            # 嵌套表达式（AND/OR/NOT 分组），保存规范化后的树
+            try:
+                expression = AdvancedFilterService.normalize_expression(value)
+            except ValueError as exc:
+                raise serializers.ValidationError(f'rule_config.expression 非法：{exc}')
+            return {
+                **value,
+                'expression': expression,
+            }
+
         logic = (value.get('logic') or '').upper()
         if logic not in {'AND', 'OR'}:
             raise serializers.ValidationError('rule_config.logic 必须是 AND 或 OR')
@@ -1,27 +1,52 @@
 from .target_student_service import execute_target_student_rule
+from .target_result_service import TargetResultService, TargetResultServiceError
 from .advanced_filter import AdvancedFilterService
 from .filter_comparison import FilterComparisonService
 from .student_analysis_export import StudentAnalysisExportService
+from .student_analysis_batch_service import StudentAnalysisBatchService, StudentAnalysisBatchServiceError
 from .score_query_service import ScoreQueryService
 from .score_workbook_service import ScoreWorkbookService
 from .score_analysis_service import ScoreAnalysisService, ScoreAnalysisServiceError
+from .analysis_cache_service import AnalysisCacheService
 from .score_mutation_service import ScoreMutationService, ScoreMutationServiceError
+from .score_grid_service import ScoreGridService, ScoreGridServiceError
+from .score_selection_service import ScoreSelectionService, ScoreSelectionServiceError
 from .score_import_service import ScoreImportService, ScoreImportServiceError
+from .ranking_scheduler import RankingScheduler
+from .student_import_service import StudentImportService, StudentImportServiceError
+from .import_job_service import ImportJobService, ImportJobServiceError
+from .export_job_service import ExportJobService, ExportJobServiceError
 from .ai_minimax_client import call_minimax, call_minimax_safe
 
 __all__ = [
     "execute_target_student_rule",
+    "TargetResultService",
+    "TargetResultServiceError",
     "AdvancedFilterService",
     "FilterComparisonService",
     "StudentAnalysisExportService",
+    "StudentAnalysisBatchService",
+    "StudentAnalysisBatchServiceError",
     "ScoreQueryService",
     "ScoreWorkbookService",
     "ScoreAnalysisService",
     "ScoreAnalysisServiceError",
+    "AnalysisCacheService",
     "ScoreMutationService",
     "ScoreMutationServiceError",
+    "ScoreGridService",
+    "ScoreGridServiceError",
+    "ScoreSelectionService",
+    "ScoreSelectionServiceError",
     "ScoreImportService",
     "ScoreImportServiceError",
+    "RankingScheduler",
+    "StudentImportService",
+    "StudentImportServiceError",
+    "ImportJobService",
+    "ImportJobServiceError",
+    "ExportJobService",
+    "ExportJobServiceError",
     "call_minimax",
     "call_minimax_safe",
 ]
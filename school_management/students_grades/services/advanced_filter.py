@@ -1,10 +1,9 @@
-from django.db.models import Min
-
-from ..models import Exam, Score, Student
+from ..models import Student
+from .rank_index_service import RankIndex, RankIndexService
 
 
 class AdvancedFilterService:
-    """高级筛选服务。"""
+    """高级筛选服务：条件可组成 AND/OR/NOT 表达式树，在考试的名次索引上按代价顺序求值。"""
 
     SUBJECT_MAP = {
         "chinese": "语文",
@@ -18,76 +17,174 @@ class AdvancedFilterService:
         "politics": "政治",
     }
 
+    # 表达式树的最大嵌套层数与条件总数
+    MAX_EXPRESSION_DEPTH = 8
+    MAX_EXPRESSION_LEAVES = 50
+
+    @staticmethod
+    def subject_code(subject: str) -> str:
+        """条件中的科目键 → 索引列使用的科目代码（总分为 'total'）。"""
+        return subject if subject == "total" else AdvancedFilterService.SUBJECT_MAP[subject]
+
     @staticmethod
-    def apply_filter(exam_id: int, logic: str, conditions: list[dict], class_id: int = None) -> list[int]:
-        """应用多条件筛选，返回学生主键列表。"""
-        exam = Exam.objects.get(id=exam_id)
+    def apply_filter(
+        exam_id: int, logic: str, conditions: list[dict], class_id: int = None, index: RankIndex = None
+    ) -> list[int]:
+        """应用平铺的多条件筛选（logic 为 AND/OR），返回学生主键列表；等价于单层表达式树。"""
+        if index is None:
+            index = RankIndexService.get(exam_id)
 
         if not conditions:
             return []
 
-        condition_results = []
-        for condition in conditions:
-            student_ids = AdvancedFilterService._apply_single_condition(exam, condition)
-            condition_results.append(set(student_ids))
-
         normalized_logic = (logic or "").upper()
-        if normalized_logic == "AND":
-            final_result = set.intersection(*condition_results) if condition_results else set()
-        elif normalized_logic == "OR":
-            final_result = set.union(*condition_results) if condition_results else set()
-        else:
+        if normalized_logic not in {"AND", "OR"}:
             raise ValueError("logic 必须是 AND 或 OR")
+        for condition in conditions:
+            if not AdvancedFilterService.validate_condition(condition):
+                raise ValueError("筛选条件格式或取值无效")
 
-        if class_id:
-            class_student_ids = set(
-                Student.objects.filter(current_class_id=class_id).values_list("id", flat=True)
-            )
-            final_result &= class_student_ids
+        return AdvancedFilterService.apply_expression(
+            exam_id, {"op": normalized_logic, "children": conditions}, class_id=class_id, index=index
+        )
 
-        return sorted(final_result)
+    @staticmethod
+    def normalize_expression(config: dict) -> dict:
+        """
+        规则配置 → 表达式树。
+
+        嵌套格式：{"expression": 节点}，节点为条件（subject/dimension/operator/value）或
+        {"op": "AND"|"OR"|"NOT", "children": [节点, ...]}（NOT 只有一个子节点）；
+        平铺格式 {"logic", "conditions"} 视为单层 AND/OR。校验失败抛出 ValueError。
+        """
+        if not isinstance(config, dict):
+            raise ValueError("筛选规则必须是对象")
+
+        if config.get("expression") is not None:
+            expression = AdvancedFilterService._normalize_node(config["expression"], depth=1)
+        else:
+            logic = (config.get("logic") or "").upper()
+            if logic not in {"AND", "OR"}:
+                raise ValueError("logic 必须是 AND 或 OR")
+            conditions = config.get("conditions")
+            if not isinstance(conditions, list) or not conditions:
+                raise ValueError("conditions 必须是非空数组")
+            expression = AdvancedFilterService._normalize_node({"op": logic, "children": conditions}, depth=1)
+
+        if len(AdvancedFilterService.expression_leaves(expression)) > AdvancedFilterService.MAX_EXPRESSION_LEAVES:
+            raise ValueError(f"筛选条件不能超过 {AdvancedFilterService.MAX_EXPRESSION_LEAVES} 个")
+        return expression
 
     @staticmethod
-    def _apply_single_condition(exam: Exam, condition: dict) -> list[int]:
-        """应用单个筛选条件，返回匹配学生主键列表。"""
-        if not AdvancedFilterService.validate_condition(condition):
+    def _normalize_node(node, depth: int) -> dict:
+        if depth > AdvancedFilterService.MAX_EXPRESSION_DEPTH:
+            raise ValueError(f"筛选表达式嵌套不能超过 {AdvancedFilterService.MAX_EXPRESSION_DEPTH} 层")
+        if not isinstance(node, dict):
             raise ValueError("筛选条件格式或取值无效")
 
-        subject = condition["subject"]
-        dimension = condition["dimension"]
-        operator = condition["operator"]
-        value = condition["value"]
+        if "op" not in node:
+            if not AdvancedFilterService.validate_condition(node):
+                raise ValueError("筛选条件格式或取值无效")
+            return {field: node[field] for field in ("subject", "dimension", "operator", "value")}
+
+        op = str(node.get("op") or "").upper()
+        children = node.get("children")
+        if op not in {"AND", "OR", "NOT"}:
+            raise ValueError("op 必须是 AND、OR 或 NOT")
+        if not isinstance(children, list) or not children:
+            raise ValueError(f"{op} 分组的 children 必须是非空数组")
+        if op == "NOT" and len(children) != 1:
+            raise ValueError("NOT 分组只能有一个子节点")
+        return {
+            "op": op,
+            "children": [AdvancedFilterService._normalize_node(child, depth + 1) for child in children],
+        }
 
-        base_scores = Score.objects.filter(exam=exam)
+    @staticmethod
+    def expression_leaves(expression: dict) -> list[dict]:
+        """表达式树中的条件，按出现顺序（用于结果明细列）。"""
+        if "op" not in expression:
+            return [expression]
+        leaves = []
+        for child in expression["children"]:
+            leaves.extend(AdvancedFilterService.expression_leaves(child))
+        return leaves
 
-        if subject == "total":
-            rank_field = "total_score_rank_in_grade" if dimension == "grade" else "total_score_rank_in_class"
-            ranked = base_scores.values("student_id").annotate(rank_value=Min(rank_field))
-        else:
-            rank_field = "grade_rank_in_subject" if dimension == "grade" else "class_rank_in_subject"
-            ranked = (
-                base_scores.filter(subject=AdvancedFilterService.SUBJECT_MAP[subject])
-                .values("student_id")
-                .annotate(rank_value=Min(rank_field))
+    @staticmethod
+    def apply_expression(exam_id: int, expression: dict, class_id: int = None, index: RankIndex = None) -> list[int]:
+        """
+        在考试的名次索引上求值表达式树，返回学生主键列表。
+
+        expression 应已经过 normalize_expression。NOT 以本场考试有成绩的学生为全集取补集。
+        """
+        if index is None:
+            index = RankIndexService.get(exam_id)
+
+        candidates = None
+        if class_id:
+            class_student_ids = Student.objects.filter(current_class_id=class_id).values_list("id", flat=True)
+            candidates = index.mask_from_student_ids(class_student_ids)
+
+        return index.student_ids_from_mask(AdvancedFilterService._evaluate(index, expression, candidates))
+
+    @staticmethod
+    def _estimate(index: RankIndex, node: dict) -> int:
+        """节点命中人数的估计：条件为精确值（二分计数），分组按 AND 取最小、OR 取和、NOT 取补。"""
+        universe = len(index.student_ids)
+        if "op" not in node:
+            return index.count(
+                AdvancedFilterService.subject_code(node["subject"]), node["dimension"], node["operator"], node["value"]
             )
+        estimates = [AdvancedFilterService._estimate(index, child) for child in node["children"]]
+        if node["op"] == "AND":
+            return min(estimates)
+        if node["op"] == "OR":
+            return min(sum(estimates), universe)
+        return universe - estimates[0]
 
-        ranked = ranked.filter(rank_value__isnull=False)
-
-        if operator == "top_n":
-            ranked = ranked.filter(rank_value__lte=value)
-        elif operator == "bottom_n":
-            total_count = ranked.count()
-            if total_count <= 0:
-                return []
-            threshold = max(total_count - value + 1, 1)
-            ranked = ranked.filter(rank_value__gte=threshold)
-        elif operator == "range":
-            start, end = value
-            ranked = ranked.filter(rank_value__gte=start, rank_value__lte=end)
-        else:
-            raise ValueError("operator 无效")
+    @staticmethod
+    def _evaluate(index: RankIndex, node: dict, candidates):
+        """
+        求值节点，返回位图；candidates 为已知的候选位图（None 表示全体）。
+
+        AND 按估计命中数从小到大求值，后续子节点只在已命中的候选内判断，候选为空即停止；
+        OR 按估计从大到小求值，后续子节点只判断尚未命中的候选，全部命中即停止。
+        """
+        if "op" not in node:
+            return index.match(
+                AdvancedFilterService.subject_code(node["subject"]),
+                node["dimension"],
+                node["operator"],
+                node["value"],
+                candidates=candidates,
+            )
 
-        return list(ranked.values_list("student_id", flat=True))
+        op = node["op"]
+        if op == "NOT":
+            universe = index.full_mask if candidates is None else candidates
+            return universe & ~AdvancedFilterService._evaluate(index, node["children"][0], candidates)
+
+        ordered = sorted(
+            node["children"],
+            key=lambda child: AdvancedFilterService._estimate(index, child),
+            reverse=(op == "OR"),
+        )
+        if op == "AND":
+            result = candidates
+            for child in ordered:
+                result = AdvancedFilterService._evaluate(index, child, result)
+                if not result:
+                    return 0
+            return result
+
+        universe = index.full_mask if candidates is None else candidates
+        result = 0
+        for child in ordered:
+            remaining = universe & ~result
+            if not remaining:
+                break
+            result |= AdvancedFilterService._evaluate(index, child, remaining)
+        return result
 
     @staticmethod
     def validate_condition(condition: dict) -> bool:
@@ -0,0 +1,177 @@
+import hashlib
+import json
+
+from django.core.cache import caches
+
+from ..config import ANALYSIS_CACHE_CONFIG
+from ..models.exam import Exam
+from .score_access_service import ScoreAccessService
+
+
+def cache_get_or_build(cache, key, builder, timeout, store=None, record=None, label=None):
+    """
+    缓存结果的通用读取流程：命中时返回缓存值，否则调用 builder() 计算并写入。
+
+    缓存后端读取失败时直接计算、不再写入；写入失败不影响返回结果。builder 抛出的异常原样抛出，不缓存。
+    store(value) 替换默认的 cache.set(key, value, timeout)，用于有容量约束的写入；
+    record(outcome) 接收 'hits' / 'misses' / 'errors'，用于命中率统计；label 非空时打印后端异常。
+    """
+    def note(outcome):
+        if record is not None:
+            record(outcome)
+
+    try:
+        cached = cache.get(key)
+    except Exception as exc:
+        if label:
+            print(f"{label}读取失败，直接计算: {exc}")
+        note('errors')
+        return builder()
+
+    if cached is not None:
+        note('hits')
+        return cached
+
+    note('misses')
+    value = builder()
+    try:
+        if store is not None:
+            store(value)
+        else:
+            cache.set(key, value, timeout)
+    except Exception as exc:
+        if label:
+            print(f"{label}写入失败: {exc}")
+        note('errors')
+    return value
+
+
+class AnalysisCacheService:
+    """
+    成绩分析接口的结果缓存。
+
+    缓存键 = (接口, 查询参数, 用户权限范围, 所涉考试的数据版本, 名单版本)。成绩导入、增删改、批量删除和排名任务
+    都经 ExamResultService 刷新汇总并递增 Exam.data_version；班级增删改、学生调班/改状态等名单变化
+    经 invalidate_roster() 递增名单版本。旧结果不再命中，无需逐键删除。
+    命中/未命中次数记在同一缓存中（Redis 后端时各进程共享），由 metrics() 汇总。
+    """
+
+    ALIAS = ANALYSIS_CACHE_CONFIG['ALIAS']
+    TTL_SECONDS = ANALYSIS_CACHE_CONFIG['TTL_SECONDS']
+    ENDPOINTS = ('class_single', 'class_multi', 'class_grade', 'student')
+    OUTCOMES = ('hits', 'misses', 'errors')
+    ROSTER_VERSION_KEY = 'analysis:roster_version'
+
+    @classmethod
+    def _cache(cls):
+        return caches[cls.ALIAS]
+
+    @classmethod
+    def roster_version(cls):
+        try:
+            return cls._cache().get(cls.ROSTER_VERSION_KEY) or 0
+        except Exception:
+            return 0
+
+    @classmethod
+    def invalidate_roster(cls):
+        """班级或学生名单（班级、姓名、状态）变化后调用：所有分析结果失效。"""
+        cache = cls._cache()
+        try:
+            cache.add(cls.ROSTER_VERSION_KEY, 0, None)
+            cache.incr(cls.ROSTER_VERSION_KEY)
+        except Exception:
+            pass
+
+    @staticmethod
+    def exam_versions(exam_ids):
+        """[(考试ID, 数据版本), ...]；exam_ids 可以是列表或 exam_id 子查询。"""
+        return [
+            list(item)
+            for item in Exam.objects.filter(pk__in=exam_ids).order_by('pk').values_list('pk', 'data_version')
+        ]
+
+    @staticmethod
+    def _scope_key(user):
+        class_ids = ScoreAccessService.scoped_class_ids(user)
+        return 'all' if class_ids is None else sorted(class_ids)
+
+    @classmethod
+    def build_key(cls, endpoint, params, user, exam_ids):
+        raw = json.dumps(
+            {
+                'params': params,
+                'scope': cls._scope_key(user),
+                'versions': cls.exam_versions(exam_ids),
+                'roster': cls.roster_version(),
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return f"{endpoint}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    @classmethod
+    def get_or_build(cls, endpoint, params, user, exam_ids, builder):
+        """
+        命中时返回缓存结果，否则调用 builder() 计算并写入缓存。
+
+        builder 抛出的异常（参数错误、考试不存在等）原样抛出，不缓存；
+        缓存后端不可用时直接计算，记一次 errors。
+        """
+        try:
+            exam_ids = [int(item) for item in exam_ids] if isinstance(exam_ids, (list, tuple)) else exam_ids
+        except (TypeError, ValueError):
+            # 参数本身不合法，交给 builder 报错
+            return builder()
+
+        return cache_get_or_build(
+            cls._cache(),
+            cls.build_key(endpoint, params, user, exam_ids),
+            builder,
+            cls.TTL_SECONDS,
+            record=lambda outcome: cls._record(endpoint, outcome),
+            label=f"分析缓存[{endpoint}]",
+        )
+
+    @classmethod
+    def _metric_key(cls, endpoint, outcome):
+        return f"metrics:{endpoint}:{outcome}"
+
+    @classmethod
+    def _record(cls, endpoint, outcome):
+        cache = cls._cache()
+        key = cls._metric_key(endpoint, outcome)
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key)
+        except Exception:
+            pass
+
+    @classmethod
+    def metrics(cls):
+        """{接口: {'hits', 'misses', 'errors', 'hit_rate'}}，另含汇总项 'total'。"""
+        keys = [cls._metric_key(endpoint, outcome) for endpoint in cls.ENDPOINTS for outcome in cls.OUTCOMES]
+        try:
+            values = cls._cache().get_many(keys)
+        except Exception:
+            values = {}
+
+        result = {}
+        totals = dict.fromkeys(cls.OUTCOMES, 0)
+        for endpoint in cls.ENDPOINTS:
+            item = {outcome: int(values.get(cls._metric_key(endpoint, outcome)) or 0) for outcome in cls.OUTCOMES}
+            for outcome in cls.OUTCOMES:
+                totals[outcome] += item[outcome]
+            result[endpoint] = item
+        result['total'] = totals
+
+        for item in result.values():
+            lookups = item['hits'] + item['misses']
+            item['hit_rate'] = round(item['hits'] / lookups, 4) if lookups else None
+        return result
+
+    @classmethod
+    def reset_metrics(cls):
+        cls._cache().delete_many(
+            [cls._metric_key(endpoint, outcome) for endpoint in cls.ENDPOINTS for outcome in cls.OUTCOMES]
+        )
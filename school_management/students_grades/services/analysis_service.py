@@ -3,7 +3,7 @@ import re
 import statistics
 from decimal import Decimal
 
-from django.db.models import Avg, Count, Max, Min, Sum
+from django.db.models import Avg
 
 from ..models.exam import ExamSubject, SUBJECT_DEFAULT_MAX_SCORES
 from ..models.score import SUBJECT_CHOICES
@@ -26,8 +26,9 @@ def _build_exam_subject_max_score_map(exam):
     }
 
 
-def _compute_total_max_score(exam, extra_subject_codes=None):
-    subject_max_score_map = _build_exam_subject_max_score_map(exam)
+def _compute_total_max_score(exam, extra_subject_codes=None, subject_max_score_map=None):
+    if subject_max_score_map is None:
+        subject_max_score_map = _build_exam_subject_max_score_map(exam)
     total_max_score = sum(subject_max_score_map.values())
 
     if extra_subject_codes:
@@ -41,28 +42,117 @@ def _compute_total_max_score(exam, extra_subject_codes=None):
     return total_max_score
 
 
+class ScoreMatrix:
+    """
+    一次查询加载的成绩列式数据：每条成绩占一行，按列存放学生、姓名、班级、科目、分数和总分年级排名。
+
+    行顺序与传入查询集的排序一致，分析函数在这些列上分组汇总，
+    不再按班级、科目反复查询数据库。
+    """
+
+    COLUMNS = (
+        "student_id",
+        "student__name",
+        "student__current_class_id",
+        "subject",
+        "score_value",
+        "total_score_rank_in_grade",
+    )
+
+    def __init__(self, rows):
+        self.student_ids = [row[0] for row in rows]
+        self.student_names = [row[1] for row in rows]
+        self.class_ids = [row[2] for row in rows]
+        self.subjects = [row[3] for row in rows]
+        self.values = [row[4] for row in rows]
+        self.grade_ranks = [row[5] for row in rows]
+
+    @classmethod
+    def from_queryset(cls, scores):
+        # 无排序的查询集按主键取行，与 .first() 的默认口径一致
+        if not scores.ordered:
+            scores = scores.order_by("pk")
+        return cls(list(scores.values_list(*cls.COLUMNS)))
+
+    def __len__(self):
+        return len(self.values)
+
+    def _rows(self):
+        return zip(self.student_ids, self.student_names, self.class_ids, self.subjects, self.values, self.grade_ranks)
+
+    def by_class(self):
+        """按班级拆分为 {class_id: ScoreMatrix}，各班内保持原行顺序。"""
+        grouped = {}
+        for row in self._rows():
+            grouped.setdefault(row[2], []).append(row)
+        return {class_id: ScoreMatrix(rows) for class_id, rows in grouped.items()}
+
+    def subject_values(self):
+        """{科目: [分数, ...]}，科目按首次出现的顺序。"""
+        grouped = {}
+        for subject, value in zip(self.subjects, self.values):
+            grouped.setdefault(subject, []).append(value)
+        return grouped
+
+    def subject_codes(self):
+        """出现过的科目（去重），科目按首次出现的顺序。"""
+        return list(dict.fromkeys(self.subjects))
+
+    def student_count(self):
+        return len(set(self.student_ids))
+
+    def student_float_totals(self):
+        """{学生: 总分}，逐行按浮点累加，学生按首次出现的顺序。"""
+        totals = {}
+        for student_id, value in zip(self.student_ids, self.values):
+            if student_id not in totals:
+                totals[student_id] = 0
+            totals[student_id] += _decimal_to_float(value)
+        return totals
+
+    def student_summaries(self):
+        """按学生汇总 [学生, 姓名, 精确总分, 科目数, 首行的总分年级排名]，学生按首次出现的顺序。"""
+        summaries = {}
+        for student_id, name, _, _, value, grade_rank in self._rows():
+            summary = summaries.get(student_id)
+            if summary is None:
+                summaries[student_id] = [student_id, name, value, 1, grade_rank]
+            else:
+                summary[2] += value
+                summary[3] += 1
+        return list(summaries.values())
+
+
+def _subject_averages(scores, *group_fields):
+    """
+    各科平均分（数据库 AVG），一次分组查询：{(*group_fields, 科目): 平均分}。
+
+    与原先逐科目 aggregate(Avg) 的取值相同，只是不再按科目、班级分别查询。
+    """
+    fields = (*group_fields, "subject")
+    rows = scores.order_by().values(*fields).annotate(avg=Avg("score_value"))
+    return {tuple(row[field] for field in fields): row["avg"] for row in rows}
+
+
 def analyze_single_class(scores, target_class, exam):
-    total_students = scores.values("student").distinct().count()
+    matrix = ScoreMatrix.from_queryset(scores)
+    total_students = matrix.student_count()
 
     subject_stats = {}
     score_distribution = {}
     exam_subject_max_score_map = _build_exam_subject_max_score_map(exam)
+    values_by_subject = matrix.subject_values()
+    subject_averages = _subject_averages(scores)
 
     for subject_code, subject_name in SUBJECT_CHOICES:
-        subject_scores = scores.filter(subject=subject_code)
-        if subject_scores.exists():
-            stats = subject_scores.aggregate(
-                avg_score=Avg("score_value"),
-                max_score=Max("score_value"),
-                min_score=Min("score_value"),
-                count=Count("score_value"),
-            )
+        values = values_by_subject.get(subject_code)
+        if values:
             subject_stats[subject_code] = {
                 "name": subject_name,
-                "avg_score": round(float(stats["avg_score"] or 0), 2),
-                "actual_max_score": float(stats["max_score"] or 0),
-                "actual_min_score": float(stats["min_score"] or 0),
-                "count": stats["count"],
+                "avg_score": round(float(subject_averages[(subject_code,)] or 0), 2),
+                "actual_max_score": float(max(values)),
+                "actual_min_score": float(min(values)),
+                "count": len(values),
             }
 
             subject_max_score = exam_subject_max_score_map.get(subject_code)
@@ -73,46 +163,29 @@ def analyze_single_class(scores, target_class, exam):
 
             subject_stats[subject_code]["exam_max_score"] = subject_max_score
 
+            bounds = [subject_max_score * ratio for ratio in (0.95, 0.85, 0.70, 0.60)]
             score_distribution[subject_code] = {
-                "特优(95%+)": subject_scores.filter(score_value__gte=subject_max_score * 0.95).count(),
-                "优秀(85%-95%)": subject_scores.filter(
-                    score_value__gte=subject_max_score * 0.85,
-                    score_value__lt=subject_max_score * 0.95,
-                ).count(),
-                "良好(70%-85%)": subject_scores.filter(
-                    score_value__gte=subject_max_score * 0.70,
-                    score_value__lt=subject_max_score * 0.85,
-                ).count(),
-                "及格(60%-70%)": subject_scores.filter(
-                    score_value__gte=subject_max_score * 0.60,
-                    score_value__lt=subject_max_score * 0.70,
-                ).count(),
-                "不及格(<60%)": subject_scores.filter(score_value__lt=subject_max_score * 0.60).count(),
+                "特优(95%+)": sum(1 for value in values if value >= bounds[0]),
+                "优秀(85%-95%)": sum(1 for value in values if bounds[1] <= value < bounds[0]),
+                "良好(70%-85%)": sum(1 for value in values if bounds[2] <= value < bounds[1]),
+                "及格(60%-70%)": sum(1 for value in values if bounds[3] <= value < bounds[2]),
+                "不及格(<60%)": sum(1 for value in values if value < bounds[3]),
             }
 
-    student_total_scores = []
-    student_scores = scores.values("student__id", "student__name").annotate(
-        total_score=Sum("score_value"),
-        subject_count=Count("subject"),
-    ).order_by("-total_score")
-
-    for index, student_data in enumerate(student_scores):
-        student_id = student_data["student__id"]
-        grade_rank = None
-        sample_score = scores.filter(student_id=student_id).first()
-        if sample_score:
-            grade_rank = sample_score.total_score_rank_in_grade
+    # 总分降序；同分保持成绩行的原顺序（与查询集排序一致）
+    student_summaries = sorted(matrix.student_summaries(), key=lambda item: -item[2])
 
-        student_total_scores.append(
-            {
-                "student_id": student_id,
-                "student_name": student_data["student__name"],
-                "total_score": float(student_data["total_score"]),
-                "subject_count": student_data["subject_count"],
-                "rank": index + 1,
-                "grade_rank": grade_rank,
-            }
-        )
+    student_total_scores = [
+        {
+            "student_id": student_id,
+            "student_name": student_name,
+            "total_score": float(total_score),
+            "subject_count": subject_count,
+            "rank": index + 1,
+            "grade_rank": grade_rank,
+        }
+        for index, (student_id, student_name, total_score, subject_count, grade_rank) in enumerate(student_summaries)
+    ]
 
     if student_total_scores:
         class_avg_total = sum(item["total_score"] for item in student_total_scores) / len(student_total_scores)
@@ -121,8 +194,7 @@ def analyze_single_class(scores, target_class, exam):
     else:
         class_avg_total = class_max_total = class_min_total = 0
 
-    observed_subject_codes = list(scores.values_list("subject", flat=True).distinct())
-    total_max_score = _compute_total_max_score(exam, observed_subject_codes)
+    total_max_score = _compute_total_max_score(exam, matrix.subject_codes(), exam_subject_max_score_map)
 
     grade_distribution = {
         "特优(95%+)": 0,
@@ -185,10 +257,12 @@ def analyze_multiple_classes(selected_classes, exam):
     all_scores = Score.objects.filter(
         exam=exam,
         student__current_class__in=selected_classes,
-    ).exclude(student__status='毕业').select_related("student", "student__current_class")
+    ).exclude(student__status='毕业')
+    class_matrices = ScoreMatrix.from_queryset(all_scores).by_class()
 
     exam_subjects = list(ExamSubject.objects.filter(exam=exam))
     exam_subject_map = {item.subject_code: item for item in exam_subjects}
+    exam_subject_max_score_map = {item.subject_code: item.max_score for item in exam_subjects}
     subject_name_map = dict(SUBJECT_CHOICES)
 
     # 按 SUBJECT_CHOICES 固定顺序输出，避免多班级图表与表格科目顺序漂移
@@ -210,18 +284,18 @@ def analyze_multiple_classes(selected_classes, exam):
     sorted_classes = sorted(selected_classes, key=extract_class_number)
 
     for class_obj in sorted_classes:
-        class_scores = all_scores.filter(student__current_class=class_obj)
+        class_matrix = class_matrices.get(class_obj.id, ScoreMatrix([]))
 
-        student_count = class_scores.values("student").distinct().count()
+        student_count = class_matrix.student_count()
         total_students += student_count
 
         subject_averages = []
         class_name = class_obj.class_name
         class_subject_averages[class_name] = []
 
+        values_by_subject = class_matrix.subject_values()
         for subject in subjects:
-            subject_scores = class_scores.filter(subject=subject)
-            scores_list = [_decimal_to_float(item.score_value) for item in subject_scores if item.score_value is not None]
+            scores_list = [_decimal_to_float(value) for value in values_by_subject.get(subject, [])]
             if scores_list:
                 avg_score = statistics.mean(scores_list)
                 subject_averages.append(round(avg_score, 2))
@@ -230,12 +304,7 @@ def analyze_multiple_classes(selected_classes, exam):
                 subject_averages.append(0)
                 class_subject_averages[class_name].append(0)
 
-        student_totals = {}
-        for score in class_scores:
-            if score.student.id not in student_totals:
-                student_totals[score.student.id] = 0
-            if score.score_value is not None:
-                student_totals[score.student.id] += _decimal_to_float(score.score_value)
+        student_totals = class_matrix.student_float_totals()
 
         total_scores_list = list(student_totals.values()) if student_totals else [0]
         avg_total = statistics.mean(total_scores_list) if total_scores_list else 0
@@ -250,8 +319,7 @@ def analyze_multiple_classes(selected_classes, exam):
             highest_avg = avg_total
 
         score_dist = [0, 0, 0, 0, 0]
-        observed_subject_codes = list(class_scores.values_list("subject", flat=True).distinct())
-        total_max_score = _compute_total_max_score(exam, observed_subject_codes)
+        total_max_score = _compute_total_max_score(exam, class_matrix.subject_codes(), exam_subject_max_score_map)
 
         for total in total_scores_list:
             if total_max_score > 0:
@@ -317,10 +385,16 @@ def analyze_grade(exam, grade_level):
     all_scores = Score.objects.filter(
         exam=exam,
         student__current_class__cohort=grade_level,
-    ).exclude(student__status='毕业').select_related("student", "student__current_class")
+    ).exclude(student__status='毕业')
+    matrix = ScoreMatrix.from_queryset(all_scores)
+    class_matrices = matrix.by_class()
+    values_by_subject = matrix.subject_values()
+    grade_subject_averages = _subject_averages(all_scores)
+    class_subject_average_map = _subject_averages(all_scores, "student__current_class_id")
 
     exam_subjects = list(ExamSubject.objects.filter(exam=exam))
     exam_subject_map = {item.subject_code: item for item in exam_subjects}
+    exam_subject_max_score_map = {item.subject_code: item.max_score for item in exam_subjects}
     subject_name_map = dict(SUBJECT_CHOICES)
 
     # 按 SUBJECT_CHOICES 的固定顺序输出科目，避免数据库返回顺序导致前后端图表/表格列顺序漂移
@@ -337,7 +411,7 @@ def analyze_grade(exam, grade_level):
         for code in ordered_subject_codes
     ]
 
-    total_students = all_scores.values("student").distinct().count()
+    total_students = matrix.student_count()
     total_classes = len(classes)
 
     class_statistics = []
@@ -348,27 +422,20 @@ def analyze_grade(exam, grade_level):
     subject_stats = {}
     for subject in subjects:
         subject_code = subject["code"]
-        subject_scores = all_scores.filter(subject=subject_code)
-        if subject_scores.exists():
-            avg_score = subject_scores.aggregate(avg=Avg("score_value"))["avg"]
+        values = values_by_subject.get(subject_code)
+        if values:
             subject_stats[subject_code] = {
                 "name": subject["name"],
-                "avg_score": _decimal_to_float(avg_score),
+                "avg_score": _decimal_to_float(grade_subject_averages[(subject_code,)]),
                 "max_score": subject["max_score"],
             }
 
-    student_totals = {}
-    for score in all_scores:
-        if score.student.id not in student_totals:
-            student_totals[score.student.id] = 0
-        if score.score_value is not None:
-            student_totals[score.student.id] += _decimal_to_float(score.score_value)
+    student_totals = matrix.student_float_totals()
 
     total_scores_list = list(student_totals.values()) if student_totals else [0]
     grade_avg_score = statistics.mean(total_scores_list) if total_scores_list else 0
 
-    observed_subject_codes = list(all_scores.values_list("subject", flat=True).distinct())
-    total_max_score = _compute_total_max_score(exam, observed_subject_codes)
+    total_max_score = _compute_total_max_score(exam, matrix.subject_codes(), exam_subject_max_score_map)
 
     if total_max_score > 0:
         excellent_count = sum(1 for score in total_scores_list if score >= total_max_score * 0.95)
@@ -378,19 +445,14 @@ def analyze_grade(exam, grade_level):
         excellent_rate = 0
 
     for class_obj in classes:
-        class_scores = all_scores.filter(student__current_class=class_obj)
-        if not class_scores.exists():
+        class_matrix = class_matrices.get(class_obj.id)
+        if class_matrix is None:
             continue
 
         class_name = class_obj.class_name
         class_names.append(class_name)
 
-        class_student_totals = {}
-        for score in class_scores:
-            if score.student.id not in class_student_totals:
-                class_student_totals[score.student.id] = 0
-            if score.score_value is not None:
-                class_student_totals[score.student.id] += _decimal_to_float(score.score_value)
+        class_student_totals = class_matrix.student_float_totals()
 
         class_total_scores = list(class_student_totals.values()) if class_student_totals else [0]
         avg_total = statistics.mean(class_total_scores) if class_total_scores else 0
@@ -416,13 +478,8 @@ def analyze_grade(exam, grade_level):
 
         subject_averages = []
         for subject in subjects:
-            subject_code = subject["code"]
-            class_subject_scores = class_scores.filter(subject=subject_code)
-            if class_subject_scores.exists():
-                avg = class_subject_scores.aggregate(avg=Avg("score_value"))["avg"]
-                subject_averages.append(_decimal_to_float(avg))
-            else:
-                subject_averages.append(0)
+            avg = class_subject_average_map.get((class_obj.id, subject["code"]))
+            subject_averages.append(_decimal_to_float(avg) if avg is not None else 0)
 
         class_statistics.append(
             {
@@ -0,0 +1,205 @@
+"""
+(学生, 考试) 汇总表维护
+
+ExamResult 完全由 Score 派生。维护入口：
+- 单条成绩的保存/删除：signals.py 中的 Score 信号调用 mark_changed；
+- 批量写入（bulk_create / bulk_update / 查询集删除）：调用方在 deferred() 块内执行，
+  或直接调用 refresh_pairs，块结束时合并刷新一次；
+- 排名任务写回排名后调用 refresh_exam 同步总分排名；
+- 历史数据用 manage.py backfill_exam_results 回填。
+
+每次刷新同时递增所涉考试的 Exam.data_version，导出缓存以此判断文件是否过时。
+"""
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db.models import F
+
+from ..models.exam import Exam
+from ..models.exam_result import ExamResult
+from ..models.score import Score
+from ..models.student import Student
+from .score_access_service import ScoreAccessService
+
+# 汇总字段（不含 class_at_exam：考试时班级只在首次生成时记录）
+SUMMARY_FIELDS = [
+    'total_score',
+    'subject_count',
+    'total_score_rank_in_grade',
+    'total_score_rank_in_class',
+    'subject_scores',
+]
+
+# 按学生ID分批查询，避免 IN 参数过多
+STUDENT_BATCH_SIZE = 1000
+
+_local = threading.local()
+
+
+class ExamResultService:
+    """(学生, 考试) 汇总表维护服务。"""
+
+    @staticmethod
+    def _summarize(score_rows):
+        """把成绩行 (student_id, exam_id, subject, score_value, 年级总分排名, 班级总分排名) 汇总为 {(学生, 考试): 字段}。"""
+        summaries = {}
+        for student_id, exam_id, subject, score_value, grade_rank, class_rank in score_rows:
+            summary = summaries.get((student_id, exam_id))
+            if summary is None:
+                summary = {
+                    'total_score': Decimal('0'),
+                    'subject_count': 0,
+                    'total_score_rank_in_grade': None,
+                    'total_score_rank_in_class': None,
+                    'subject_scores': {},
+                }
+                summaries[(student_id, exam_id)] = summary
+
+            summary['total_score'] += Decimal(score_value)
+            summary['subject_count'] += 1
+            summary['subject_scores'][subject] = float(score_value)
+            # 总分排名在每个科目行上重复存放，取最小值，与原先 Min() 的读取口径一致
+            for field, rank in (('total_score_rank_in_grade', grade_rank), ('total_score_rank_in_class', class_rank)):
+                if rank is not None and (summary[field] is None or rank < summary[field]):
+                    summary[field] = rank
+        return summaries
+
+    @staticmethod
+    def _score_rows(queryset):
+        return queryset.order_by().values_list(
+            'student_id', 'exam_id', 'subject', 'score_value',
+            'total_score_rank_in_grade', 'total_score_rank_in_class',
+        )
+
+    @classmethod
+    def _apply(cls, summaries, existing, stats):
+        """
+        把汇总结果写入 ExamResult：新增缺失行、只更新有变化的行、删除已无成绩的行。
+
+        existing: 本次刷新范围内已有的 {(学生, 考试): ExamResult}。
+        """
+        new_pairs = [pair for pair in summaries if pair not in existing]
+        class_map = {}
+        if new_pairs:
+            class_map = dict(
+                Student.objects.filter(pk__in={student_id for student_id, _ in new_pairs})
+                .values_list('id', 'current_class_id')
+            )
+
+        to_create = [
+            ExamResult(
+                student_id=student_id,
+                exam_id=exam_id,
+                class_at_exam_id=class_map.get(student_id),
+                **summaries[(student_id, exam_id)],
+            )
+            for student_id, exam_id in new_pairs
+        ]
+
+        to_update = []
+        for pair, result in existing.items():
+            summary = summaries.get(pair)
+            if summary is None:
+                continue
+            if any(getattr(result, field) != summary[field] for field in SUMMARY_FIELDS):
+                for field in SUMMARY_FIELDS:
+                    setattr(result, field, summary[field])
+                to_update.append(result)
+
+        stale_ids = [result.pk for pair, result in existing.items() if pair not in summaries]
+
+        if to_create:
+            ExamResult.objects.bulk_create(to_create, batch_size=500)
+        if to_update:
+            ExamResult.objects.bulk_update(to_update, SUMMARY_FIELDS, batch_size=500)
+        if stale_ids:
+            ExamResult.objects.filter(pk__in=stale_ids).delete()
+        if to_create or stale_ids:
+            # 新增/删除 (学生, 考试) 会改变班级可见的考试范围
+            ScoreAccessService.invalidate_class_exams()
+
+        stats['created'] += len(to_create)
+        stats['updated'] += len(to_update)
+        stats['deleted'] += len(stale_ids)
+
+    @staticmethod
+    def _new_stats():
+        return {'created': 0, 'updated': 0, 'deleted': 0}
+
+    @staticmethod
+    def bump_data_versions(exam_ids):
+        """成绩或排名写入后递增考试的数据版本（单条 UPDATE）。"""
+        exam_ids = {int(exam_id) for exam_id in exam_ids}
+        if exam_ids:
+            Exam.objects.filter(pk__in=exam_ids).update(data_version=F('data_version') + 1)
+
+    @classmethod
+    def refresh_pairs(cls, pairs):
+        """按 (student_id, exam_id) 重算汇总行；返回新增/更新/删除计数。"""
+        stats = cls._new_stats()
+        students_by_exam = {}
+        for student_id, exam_id in pairs or []:
+            students_by_exam.setdefault(int(exam_id), set()).add(int(student_id))
+
+        for exam_id, student_ids in students_by_exam.items():
+            student_ids = sorted(student_ids)
+            for start in range(0, len(student_ids), STUDENT_BATCH_SIZE):
+                batch = student_ids[start:start + STUDENT_BATCH_SIZE]
+                summaries = cls._summarize(
+                    cls._score_rows(Score.objects.filter(exam_id=exam_id, student_id__in=batch))
+                )
+                existing = {
+                    (result.student_id, result.exam_id): result
+                    for result in ExamResult.objects.filter(exam_id=exam_id, student_id__in=batch)
+                }
+                cls._apply(summaries, existing, stats)
+        cls.bump_data_versions(students_by_exam)
+        return stats
+
+    @classmethod
+    def refresh_exam(cls, exam_id, grade_level=None):
+        """重算一场考试（可限定届别）的全部汇总行，排名任务结束后调用。"""
+        scores = Score.objects.filter(exam_id=exam_id)
+        results = ExamResult.objects.filter(exam_id=exam_id)
+        if grade_level is not None:
+            scores = scores.filter(student__cohort=grade_level)
+            results = results.filter(student__cohort=grade_level)
+
+        stats = cls._new_stats()
+        existing = {(result.student_id, result.exam_id): result for result in results}
+        cls._apply(cls._summarize(cls._score_rows(scores)), existing, stats)
+        cls.bump_data_versions([exam_id])
+        return stats
+
+    @staticmethod
+    @contextmanager
+    def deferred():
+        """
+        块内由 Score 信号登记的 (学生, 考试) 暂存起来，正常退出时合并刷新一次。
+
+        用于一次写入多条成绩的场景（批量删除、整行编辑）；嵌套时由最外层负责刷新，
+        块内抛出异常时放弃刷新（事务通常也已回滚）。
+        """
+        if getattr(_local, 'pending', None) is not None:
+            yield
+            return
+
+        _local.pending = set()
+        try:
+            yield
+        except BaseException:
+            _local.pending = None
+            raise
+        pending, _local.pending = _local.pending, None
+        if pending:
+            ExamResultService.refresh_pairs(pending)
+
+    @classmethod
+    def mark_changed(cls, pairs):
+        """登记发生变化的 (学生, 考试)：在 deferred() 块内暂存，否则立即刷新。"""
+        pending = getattr(_local, 'pending', None)
+        if pending is not None:
+            pending.update(pairs)
+            return
+        cls.refresh_pairs(pairs)
@@ -0,0 +1,371 @@
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+from io import BytesIO
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from ..config import EXPORT_CONFIG
+from ..models.exam import Exam
+from ..models.export_job import ExportJob
+from ..models.score import Score, SUBJECT_CHOICES as SCORE_SUBJECT_CHOICES
+from .score_access_service import ScoreAccessService
+from .score_analysis_service import ScoreAnalysisService, ScoreAnalysisServiceError
+from .score_query_service import ScoreQueryService
+from .score_workbook_service import ScoreWorkbookService
+from .student_analysis_batch_service import StudentAnalysisBatchService, StudentAnalysisBatchServiceError
+from .student_analysis_export import StudentAnalysisExportService
+
+
+class ExportJobServiceError(Exception):
+    """导出任务服务异常。"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class ExportJobService:
+    """
+    导出任务：导出请求转为 RQ 任务，生成的文件落盘并按缓存键复用。
+
+    缓存键 = (导出类型, 规范化后的查询参数, 用户权限范围, 所涉考试的数据版本)。
+    考试的成绩或排名变化后 Exam.data_version 递增，旧文件自然不再命中；
+    文件保留 ARTIFACT_TTL_SECONDS，过期后清理。
+    """
+
+    TTL_SECONDS = EXPORT_CONFIG['ARTIFACT_TTL_SECONDS']
+    # 不影响导出内容的参数
+    IGNORED_PARAMS = {'async', 'page', 'page_size', 'cursor'}
+    SCORE_KINDS = ('score_query', 'score_batch')
+    # 内容随用户权限范围变化的导出类型
+    SCOPED_KINDS = SCORE_KINDS + ('student_analysis_batch',)
+    # 批量导出每处理多少个学生回写一次进度
+    PROGRESS_STEP = 10
+
+    @staticmethod
+    def should_run_async(requested):
+        return str(requested or '').lower() in ('1', 'true', 'yes')
+
+    @classmethod
+    def normalize_params(cls, query_params):
+        """查询参数 → {参数名: [取值, ...]}：去掉空值与无关参数，键与多值均排序。"""
+        params = {}
+        for key in sorted(query_params.keys()):
+            if key in cls.IGNORED_PARAMS:
+                continue
+            values = sorted(str(value) for value in query_params.getlist(key) if value not in (None, ''))
+            if values:
+                params[key] = values
+        return params
+
+    @classmethod
+    def _scope_key(cls, kind, user):
+        # 个人分析报告的访问权限在请求时校验，内容与用户无关
+        if kind not in cls.SCOPED_KINDS:
+            return 'all'
+        class_ids = ScoreAccessService.scoped_class_ids(user)
+        return 'all' if class_ids is None else sorted(class_ids)
+
+    @staticmethod
+    def _first(params, key):
+        return (params.get(key) or [None])[0]
+
+    @classmethod
+    def _batch_students(cls, params, user):
+        return StudentAnalysisBatchService.resolve_students(
+            user, cls._first(params, 'class_id'), cls._first(params, 'cohort')
+        )
+
+    @classmethod
+    def _exam_ids(cls, kind, params, user):
+        if kind in cls.SCORE_KINDS:
+            scores = ScoreQueryService.filter_scores(ScoreQueryService.replay_request(params, user))
+        elif kind == 'student_analysis_batch':
+            try:
+                students = cls._batch_students(params, user)
+                exam_ids = StudentAnalysisBatchService.parse_exam_ids(cls._first(params, 'exam_ids'))
+            except StudentAnalysisBatchServiceError:
+                return []
+            scores = Score.objects.filter(student__in=students.order_by().values('pk'))
+            if exam_ids is not None:
+                scores = scores.filter(exam_id__in=exam_ids)
+        else:
+            try:
+                scores = Score.objects.filter(student_id=int(params.get('student_id', [''])[0]))
+            except ValueError:
+                return []
+        return scores.order_by().values_list('exam_id', flat=True).distinct()
+
+    @classmethod
+    def build_cache_key(cls, kind, params, user):
+        versions = list(
+            Exam.objects.filter(pk__in=cls._exam_ids(kind, params, user))
+            .order_by('pk')
+            .values_list('pk', 'data_version')
+        )
+        raw = json.dumps(
+            {
+                'kind': kind,
+                'params': params,
+                'scope': cls._scope_key(kind, user),
+                'versions': versions,
+            },
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _reusable_artifact(cache_key, now):
+        job = (
+            ExportJob.objects.filter(cache_key=cache_key, status='success', expires_at__gt=now)
+            .exclude(file='')
+            .order_by('-finished_at')
+            .first()
+        )
+        if job and default_storage.exists(job.file.name):
+            return job
+        return None
+
+    @classmethod
+    def request_job(cls, kind, query_params, user):
+        """
+        申请导出：有效期内已有相同缓存键的文件时立即返回已完成的任务，
+        同一用户已有相同的排队/生成中任务时返回该任务，否则新建任务并入队。
+        """
+        if kind not in dict(ExportJob.KIND_CHOICES):
+            raise ExportJobServiceError('不支持的导出类型', 400)
+
+        now = timezone.now()
+        cls.evict_expired(now)
+
+        params = cls.normalize_params(query_params)
+        cache_key = cls.build_cache_key(kind, params, user)
+
+        artifact = cls._reusable_artifact(cache_key, now)
+        if artifact is not None:
+            if artifact.created_by_id == user.pk:
+                return artifact
+            return ExportJob.objects.create(
+                kind=kind,
+                status='success',
+                cache_key=cache_key,
+                params=params,
+                file=artifact.file.name,
+                filename=artifact.filename,
+                cached=True,
+                created_by=user,
+                message='复用已生成的导出文件',
+                started_at=now,
+                finished_at=now,
+                expires_at=artifact.expires_at,
+            )
+
+        in_flight = ExportJob.objects.filter(
+            cache_key=cache_key,
+            status__in=('pending', 'running'),
+            created_by=user,
+        ).first()
+        if in_flight is not None:
+            return in_flight
+
+        job = ExportJob.objects.create(kind=kind, cache_key=cache_key, params=params, created_by=user)
+
+        from ..tasks import run_export_job
+
+        # 事务提交后再入队，避免 worker 读到尚未提交的任务记录
+        transaction.on_commit(lambda: cls._enqueue(run_export_job, job.pk))
+        job.refresh_from_db()
+        return job
+
+    @classmethod
+    def _enqueue(cls, task, job_id):
+        try:
+            task.delay(job_id)
+        except Exception as exc:
+            print(f"导出任务入队失败，改为同步执行，任务ID: {job_id}: {exc}")
+            cls.run(job_id)
+
+    @classmethod
+    def _build(cls, job):
+        """生成导出文件，返回 (下载文件名, 字节块迭代器)。"""
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        if job.kind in cls.SCORE_KINDS:
+            if job.created_by is None:
+                raise ExportJobServiceError('创建人已不存在，无法确定导出范围', 400)
+            request = ScoreQueryService.replay_request(job.params, job.created_by)
+            scores = ScoreQueryService.filter_scores(request)
+            if job.kind == 'score_batch':
+                rows = ScoreQueryService.iter_export_rows(scores)
+                return f'筛选成绩导出_{timestamp}.xlsx', ScoreWorkbookService.export_workbook_chunks(rows)
+
+            all_subjects = ScoreQueryService.display_subjects(
+                ScoreQueryService.present_subjects(scores),
+                request.query_params.get('dynamic_subjects'),
+            )
+            rows = ScoreQueryService.iter_export_rows(scores, request)
+            return (
+                f'成绩查询导出_{timestamp}.xlsx',
+                ScoreWorkbookService.query_export_workbook_chunks(rows, all_subjects),
+            )
+
+        if job.kind == 'student_analysis_batch':
+            return cls._build_batch(job, timestamp)
+
+        def first(key):
+            return cls._first(job.params, key)
+
+        try:
+            analysis_data = ScoreAnalysisService.build_student_analysis_data(
+                first('student_id'), first('exam_ids') or '', first('exam_id')
+            )
+            payload = StudentAnalysisExportService.build_payload(analysis_data, SCORE_SUBJECT_CHOICES)
+        except ScoreAnalysisServiceError as exc:
+            raise ExportJobServiceError(exc.message, exc.status_code) from exc
+        except ValueError as exc:
+            raise ExportJobServiceError(str(exc), 400) from exc
+
+        buffer = BytesIO()
+        StudentAnalysisExportService.build_workbook(payload).save(buffer)
+        filename = StudentAnalysisExportService.build_filename(
+            payload.get('student_info') or {},
+            datetime.datetime.now().strftime('%Y%m%d_%H%M'),
+        )
+        return filename, [buffer.getvalue()]
+
+    @classmethod
+    def _build_batch(cls, job, timestamp):
+        if job.created_by is None:
+            raise ExportJobServiceError('创建人已不存在，无法确定导出范围', 400)
+        try:
+            students = list(cls._batch_students(job.params, job.created_by))
+            exam_ids = StudentAnalysisBatchService.parse_exam_ids(cls._first(job.params, 'exam_ids'))
+        except StudentAnalysisBatchServiceError as exc:
+            raise ExportJobServiceError(exc.message, exc.status_code) from exc
+        if not students:
+            raise ExportJobServiceError('没有可导出的学生', 400)
+
+        ExportJob.objects.filter(pk=job.pk).update(total_items=len(students), processed_items=0)
+
+        def report_progress(processed, total):
+            if processed % cls.PROGRESS_STEP == 0 or processed == total:
+                ExportJob.objects.filter(pk=job.pk).update(processed_items=processed)
+
+        # 进度按已处理的学生数计，与 total_items 一致（数据不足而跳过的学生也计入）
+        chunks = StudentAnalysisBatchService.stream_zip(
+            students,
+            exam_ids,
+            progress_callback=report_progress,
+            max_workers=StudentAnalysisBatchService.MAX_WORKERS,
+        )
+        return f'个人成绩分析报告_{timestamp}.zip', chunks
+
+    @classmethod
+    def run(cls, job_id):
+        """执行导出任务（RQ worker 中调用），结果写回 ExportJob。"""
+        job = ExportJob.objects.select_related('created_by').get(pk=job_id)
+        if job.status not in ('pending', 'running'):
+            return cls.serialize(job)
+
+        now = timezone.now()
+        ExportJob.objects.filter(pk=job.pk).update(status='running', started_at=now)
+
+        # 排队期间其他用户可能已生成了相同缓存键的文件
+        artifact = cls._reusable_artifact(job.cache_key, now)
+        if artifact is not None:
+            ExportJob.objects.filter(pk=job.pk).update(
+                status='success',
+                file=artifact.file.name,
+                filename=artifact.filename,
+                cached=True,
+                message='复用已生成的导出文件',
+                finished_at=now,
+                expires_at=artifact.expires_at,
+            )
+            job.refresh_from_db()
+            return cls.serialize(job)
+
+        try:
+            filename, chunks = cls._build(job)
+            with tempfile.TemporaryFile() as buffer:
+                for chunk in chunks:
+                    buffer.write(chunk)
+                buffer.seek(0)
+                extension = os.path.splitext(filename)[1] or '.xlsx'
+                job.file.save(f'{job.kind}_{job.pk}{extension}', File(buffer), save=False)
+        except ExportJobServiceError as exc:
+            cls._mark_failed(job, exc.message)
+        except Exception as exc:
+            cls._mark_failed(job, f'导出失败：{str(exc)}')
+        else:
+            finished_at = timezone.now()
+            ExportJob.objects.filter(pk=job.pk).update(
+                status='success',
+                file=job.file.name,
+                filename=filename,
+                message='导出完成',
+                finished_at=finished_at,
+                expires_at=finished_at + datetime.timedelta(seconds=cls.TTL_SECONDS),
+            )
+
+        job.refresh_from_db()
+        return cls.serialize(job)
+
+    @classmethod
+    def _mark_failed(cls, job, message):
+        finished_at = timezone.now()
+        ExportJob.objects.filter(pk=job.pk).update(
+            status='failed',
+            message=message,
+            finished_at=finished_at,
+            expires_at=finished_at + datetime.timedelta(seconds=cls.TTL_SECONDS),
+        )
+
+    @staticmethod
+    def evict_expired(now=None):
+        """删除过期任务；文件在没有未过期任务引用时一并删除。返回删除的任务数。"""
+        now = now or timezone.now()
+        expired = ExportJob.objects.filter(expires_at__lte=now)
+        names = set(expired.exclude(file='').values_list('file', flat=True))
+        if names:
+            names -= set(
+                ExportJob.objects.filter(file__in=names, expires_at__gt=now).values_list('file', flat=True)
+            )
+        for name in names:
+            default_storage.delete(name)
+        deleted, _ = expired.delete()
+        return deleted
+
+    @staticmethod
+    def scope_jobs(user):
+        """管理员可查看全部任务，其他用户只能查看自己创建的任务。"""
+        queryset = ExportJob.objects.all()
+        if getattr(user, 'role', None) != 'admin' and not user.is_superuser:
+            queryset = queryset.filter(created_by=user)
+        return queryset
+
+    @staticmethod
+    def serialize(job):
+        return {
+            'id': job.pk,
+            'kind': job.kind,
+            'status': job.status,
+            'filename': job.filename,
+            'cached': job.cached,
+            'message': job.message,
+            'total_items': job.total_items,
+            'processed_items': job.processed_items,
+            'download_url': f'/api/export-jobs/{job.pk}/download' if job.status == 'success' else None,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+            'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+        }
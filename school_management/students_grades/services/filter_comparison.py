@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from django.db.models import Min
+from django.db.models import F
 
-from ..models import FilterResultSnapshot, Score, Student
+from ..models import ExamResult, FilterResultSnapshot, Student
 
 
 class FilterComparisonService:
@@ -76,9 +76,8 @@ class FilterComparisonService:
         }
 
         rank_rows = (
-            Score.objects.filter(student_id__in=student_ids, exam_id__in=[baseline_exam_id, comparison_exam_id])
-            .values("student_id", "exam_id")
-            .annotate(rank=Min("total_score_rank_in_grade"))
+            ExamResult.objects.filter(student_id__in=student_ids, exam_id__in=[baseline_exam_id, comparison_exam_id])
+            .values("student_id", "exam_id", rank=F("total_score_rank_in_grade"))
         )
 
         rank_map = {
@@ -0,0 +1,217 @@
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from ..config import IMPORT_CONFIG
+from ..models.exam import Exam
+from ..models.import_job import ImportJob
+from .score_import_service import ScoreImportService, ScoreImportServiceError
+from .student_import_service import StudentImportService, StudentImportServiceError
+
+
+class ImportJobServiceError(Exception):
+    """导入任务服务异常。"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class ImportJobService:
+    """
+    Excel 导入任务：上传文件落盘后由 RQ 任务执行导入，并提供进度查询。
+
+    小文件仍在请求内同步导入（返回原有结果格式），大文件或显式要求时走后台任务。
+    """
+
+    ASYNC_THRESHOLD = IMPORT_CONFIG['ASYNC_THRESHOLD']
+
+    @classmethod
+    def should_run_async(cls, uploaded_file, requested=None):
+        """requested 为前端传入的 async 参数（'true'/'false'），未传时按文件大小决定。"""
+        if requested not in (None, ''):
+            return str(requested).lower() in ('1', 'true', 'yes')
+        return (uploaded_file.size or 0) > cls.ASYNC_THRESHOLD
+
+    @classmethod
+    def create_job(cls, kind, uploaded_file, user=None, exam_id=None, start_row=2):
+        """
+        保存上传文件并投递导入任务；任务队列不可用时在当前请求内直接执行。
+
+        start_row 与同步成绩导入相同：从第几行开始读取，用于中断后续传。
+        """
+        if not uploaded_file:
+            raise ImportJobServiceError('请选择Excel文件', 400)
+        if not uploaded_file.name.endswith(('.xlsx', '.xls')):
+            raise ImportJobServiceError('文件格式不正确，请上传 .xlsx 或 .xls 文件', 400)
+
+        exam = None
+        if kind == 'score':
+            if not exam_id:
+                raise ImportJobServiceError('请选择考试', 400)
+            try:
+                exam = Exam.objects.get(pk=exam_id)
+            except (Exam.DoesNotExist, ValueError, TypeError) as exc:
+                raise ImportJobServiceError('考试不存在', 400) from exc
+
+        try:
+            start_row = max(int(start_row or 2), 2)
+        except (TypeError, ValueError) as exc:
+            raise ImportJobServiceError('起始行必须为整数', 400) from exc
+
+        job = ImportJob.objects.create(
+            kind=kind,
+            file=uploaded_file,
+            original_filename=uploaded_file.name,
+            start_row=start_row,
+            exam=exam,
+            created_by=user if user and user.is_authenticated else None,
+        )
+
+        from ..tasks import run_import_job
+
+        # 事务提交后再入队，避免 worker 读到尚未提交的任务记录
+        transaction.on_commit(lambda: cls._enqueue(run_import_job, job.pk))
+        return job
+
+    @classmethod
+    def _enqueue(cls, task, job_id):
+        try:
+            task.delay(job_id)
+        except Exception as exc:
+            print(f"导入任务入队失败，改为同步执行，任务ID: {job_id}: {exc}")
+            cls.run(job_id)
+
+    @staticmethod
+    def _count_rows(path, start_row=2):
+        """按工作表尺寸估算 start_row 起的数据行数（只读模式不逐行扫描）。"""
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return max((workbook.active.max_row or 1) - start_row + 1, 0)
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _discard_source(job):
+        """任务结束后删除上传的源文件；需要续传时由前端按 resume_from_row 重新上传。"""
+        if not job.file:
+            return
+        try:
+            job.file.delete(save=False)
+        except Exception as exc:
+            print(f"删除导入源文件失败，任务ID: {job.pk}: {exc}")
+            return
+        ImportJob.objects.filter(pk=job.pk).update(file='')
+
+    @classmethod
+    def run(cls, job_id):
+        """执行导入任务（RQ worker 中调用），进度与结果写回 ImportJob。"""
+        job = ImportJob.objects.select_related('exam').get(pk=job_id)
+        if job.status not in ('pending', 'running'):
+            return cls.serialize(job)
+
+        try:
+            total_rows = cls._count_rows(job.file.path, job.start_row)
+        except Exception:
+            total_rows = 0
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='running',
+            started_at=timezone.now(),
+            total_rows=total_rows,
+        )
+
+        def report_progress(progress):
+            ImportJob.objects.filter(pk=job.pk).update(
+                processed_rows=progress['processed_rows'],
+                imported_rows=progress['imported_count'],
+                failed_rows=progress['failed_count'],
+            )
+
+        try:
+            with open(job.file.path, 'rb') as file_handle:
+                excel_file = File(file_handle, name=job.original_filename)
+                if job.kind == 'score':
+                    result = ScoreImportService.batch_import(
+                        excel_file, job.exam_id, start_row=job.start_row, progress_callback=report_progress
+                    )
+                else:
+                    result = StudentImportService.batch_import(excel_file, progress_callback=report_progress)
+        except (ScoreImportServiceError, StudentImportServiceError) as exc:
+            result = getattr(exc, 'payload', None) or {'success': False, 'message': exc.message}
+            ImportJob.objects.filter(pk=job.pk).update(
+                status='failed',
+                result=result,
+                message=exc.message,
+                finished_at=timezone.now(),
+            )
+        except Exception as exc:
+            ImportJob.objects.filter(pk=job.pk).update(
+                status='failed',
+                result={'success': False, 'message': f'文件处理失败：{str(exc)}'},
+                message=str(exc),
+                finished_at=timezone.now(),
+            )
+        else:
+            ImportJob.objects.filter(pk=job.pk).update(
+                status='success',
+                result=result,
+                message=result.get('message', '导入完成'),
+                imported_rows=result.get('imported_count', 0),
+                failed_rows=result.get('failed_count', 0),
+                finished_at=timezone.now(),
+            )
+
+        cls._discard_source(job)
+        job.refresh_from_db()
+        return cls.serialize(job)
+
+    @staticmethod
+    def scope_jobs(user):
+        """管理员可查看全部任务，其他用户只能查看自己创建的任务。"""
+        queryset = ImportJob.objects.all()
+        if getattr(user, 'role', None) != 'admin' and not user.is_superuser:
+            queryset = queryset.filter(created_by=user)
+        return queryset
+
+    @staticmethod
+    def serialize(job):
+        """任务状态：进度、预计剩余时间（秒），结束后附带完整导入结果。"""
+        eta_seconds = None
+        if job.status == 'running' and job.started_at and job.processed_rows and job.total_rows:
+            elapsed = (timezone.now() - job.started_at).total_seconds()
+            remaining_rows = max(job.total_rows - job.processed_rows, 0)
+            eta_seconds = round(elapsed / job.processed_rows * remaining_rows, 1)
+
+        progress = None
+        if job.total_rows:
+            progress = round(min(job.processed_rows / job.total_rows, 1) * 100, 1)
+        if job.status == 'success':
+            progress = 100.0
+
+        data = {
+            'id': job.pk,
+            'kind': job.kind,
+            'status': job.status,
+            'original_filename': job.original_filename,
+            'exam_id': job.exam_id,
+            'start_row': job.start_row,
+            'total_rows': job.total_rows,
+            'processed_rows': job.processed_rows,
+            'imported_rows': job.imported_rows,
+            'failed_rows': job.failed_rows,
+            'progress': progress,
+            'eta_seconds': eta_seconds,
+            'message': job.message,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
+        if job.status in ('success', 'failed'):
+            result = job.result or {}
+            data['result'] = result
+            # 成绩导入为 error_details，学生导入为 failed_rows
+            data['error_details'] = result.get('error_details', result.get('failed_rows', []))
+        return data
@@ -0,0 +1,255 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+
+from django.core.cache import caches
+
+from ..config import RANK_INDEX_CONFIG
+from ..models.exam import Exam
+from ..models.score import Score
+from .analysis_cache_service import cache_get_or_build
+
+
+class RankColumn:
+    """
+    一个 (科目, 维度) 的名次列。
+
+    ranks 与 RankIndex.student_ids 按位置对齐（0 表示无名次）；sorted_ranks/positions 为按名次升序排列的
+    (名次, 位置)，区间查询用二分定位后直接取出位置。
+    """
+
+    __slots__ = ('ranks', 'sorted_ranks', 'positions')
+
+    def __init__(self, ranks):
+        self.ranks = ranks
+        order = sorted((rank, position) for position, rank in enumerate(ranks) if rank)
+        self.sorted_ranks = array('l', (rank for rank, _ in order))
+        self.positions = array('l', (position for _, position in order))
+
+    @property
+    def ranked_count(self):
+        return len(self.sorted_ranks)
+
+    def positions_between(self, start, end=None):
+        """名次在 [start, end] 内的位置；end 为 None 表示不设上限。"""
+        low = bisect_left(self.sorted_ranks, start)
+        high = len(self.sorted_ranks) if end is None else bisect_right(self.sorted_ranks, end)
+        return self.positions[low:high]
+
+
+class RankIndex:
+    """
+    一场考试的名次索引：学生按主键排序编号，每个 (科目, 维度) 一列名次，另存科目成绩与总分。
+
+    条件求值结果是以位置为位的整数位图，AND/OR 直接按位运算。
+    """
+
+    def __init__(self, exam_id, version, student_ids, rank_columns, score_columns):
+        self.exam_id = exam_id
+        self.version = version
+        self.student_ids = array('l', student_ids)
+        self.rank_columns = {key: RankColumn(array('l', ranks)) for key, ranks in rank_columns.items()}
+        self.score_columns = {key: array('d', values) for key, values in score_columns.items()}
+        self._positions = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_positions'] = None
+        return state
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = {student_id: position for position, student_id in enumerate(self.student_ids)}
+        return self._positions
+
+    @property
+    def full_mask(self):
+        """本场考试全部学生的位图。"""
+        return (1 << len(self.student_ids)) - 1
+
+    def mask_from_positions(self, positions):
+        buffer = bytearray((len(self.student_ids) + 7) // 8)
+        for position in positions:
+            buffer[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(buffer, 'little')
+
+    def mask_from_student_ids(self, student_ids):
+        positions = self.positions
+        return self.mask_from_positions(positions[sid] for sid in student_ids if sid in positions)
+
+    def positions_from_mask(self, mask):
+        """位图 → 位置列表（升序）。"""
+        result = []
+        data = mask.to_bytes((len(self.student_ids) + 7) // 8, 'little')
+        for byte_index, byte in enumerate(data):
+            if not byte:
+                continue
+            base = byte_index << 3
+            for bit in range(8):
+                if byte >> bit & 1:
+                    result.append(base + bit)
+        return result
+
+    def student_ids_from_mask(self, mask):
+        """位图 → 学生主键（升序）。"""
+        student_ids = self.student_ids
+        return [student_ids[position] for position in self.positions_from_mask(mask)]
+
+    def column(self, subject, dimension):
+        """subject 为科目代码或 'total'；无该列（本场没有此科目）时返回 None。"""
+        return self.rank_columns.get((subject, dimension))
+
+    @staticmethod
+    def _bounds(column, operator, value):
+        """条件 → 名次区间 (start, end)，end 为 None 表示不设上限；口径与原先逐条件的数据库查询一致。"""
+        if operator == 'top_n':
+            return 1, value
+        if operator == 'bottom_n':
+            return max(column.ranked_count - value + 1, 1), None
+        if operator == 'range':
+            start, end = value
+            return start, end
+        raise ValueError('operator 无效')
+
+    def count(self, subject, dimension, operator, value):
+        """条件命中人数（两次二分，不生成位图），供求值顺序的代价估计。"""
+        column = self.column(subject, dimension)
+        if column is None or column.ranked_count <= 0:
+            return 0
+        return len(column.positions_between(*self._bounds(column, operator, value)))
+
+    def match(self, subject, dimension, operator, value, candidates=None):
+        """
+        单个名次条件的位图。
+
+        传入 candidates（候选位图）时结果限定在候选之内：候选少于区间命中数时逐个检查候选的名次，
+        否则取出区间命中的位置再与候选相与。
+        """
+        column = self.column(subject, dimension)
+        if column is None or column.ranked_count <= 0 or candidates == 0:
+            return 0
+
+        start, end = self._bounds(column, operator, value)
+        positions = column.positions_between(start, end)
+        if candidates is None:
+            return self.mask_from_positions(positions)
+
+        candidate_positions = self.positions_from_mask(candidates)
+        if len(candidate_positions) < len(positions):
+            ranks = column.ranks
+            return self.mask_from_positions(
+                position for position in candidate_positions
+                if ranks[position] and ranks[position] >= start and (end is None or ranks[position] <= end)
+            )
+        return self.mask_from_positions(positions) & candidates
+
+    def rank(self, subject, dimension, student_id):
+        column = self.column(subject, dimension)
+        position = self.positions.get(student_id)
+        if column is None or position is None:
+            return None
+        return column.ranks[position] or None
+
+    def score(self, subject, student_id):
+        values = self.score_columns.get(subject)
+        position = self.positions.get(student_id)
+        if values is None or position is None or math.isnan(values[position]):
+            return None
+        return values[position]
+
+
+class RankIndexService:
+    """
+    按考试缓存名次索引，高级筛选的条件求值与明细列都从索引读取。
+
+    缓存键含 Exam.data_version：排名任务写回后 refresh_exam 递增版本，旧索引自然失效；
+    排名任务结束时调用 warm() 预先构建，之后的筛选请求只需一次版本查询。
+    """
+
+    ALIAS = RANK_INDEX_CONFIG['ALIAS']
+    TTL_SECONDS = RANK_INDEX_CONFIG['TTL_SECONDS']
+
+    @classmethod
+    def _cache(cls):
+        return caches[cls.ALIAS]
+
+    @staticmethod
+    def cache_key(exam_id, version):
+        return f'rank_index:{exam_id}:{version}'
+
+    @staticmethod
+    def build(exam_id, version):
+        """
+        一条查询构建索引。
+
+        科目名次取该科目行，总分名次取各科目行上重复存放的总分名次的最小值（与原先 Min() 口径一致）；
+        总分为各科成绩之和，与 (学生, 考试) 汇总表的口径相同。
+        """
+        rows = list(
+            Score.objects.filter(exam_id=exam_id)
+            .order_by()
+            .values_list(
+                'student_id', 'subject', 'score_value',
+                'grade_rank_in_subject', 'class_rank_in_subject',
+                'total_score_rank_in_grade', 'total_score_rank_in_class',
+            )
+        )
+
+        student_ids = sorted({row[0] for row in rows})
+        positions = {student_id: position for position, student_id in enumerate(student_ids)}
+        size = len(student_ids)
+        rank_columns = {}
+        score_columns = {}
+        # 总分按 Decimal 累加，避免浮点误差
+        totals = {}
+
+        def set_min_rank(key, position, rank):
+            ranks = rank_columns.get(key)
+            if ranks is None:
+                ranks = rank_columns[key] = [0] * size
+            if rank is not None and (not ranks[position] or rank < ranks[position]):
+                ranks[position] = rank
+
+        def score_column(key):
+            if key not in score_columns:
+                score_columns[key] = [math.nan] * size
+            return score_columns[key]
+
+        for student_id, subject, score_value, grade_rank, class_rank, total_grade_rank, total_class_rank in rows:
+            position = positions[student_id]
+            set_min_rank((subject, 'grade'), position, grade_rank)
+            set_min_rank((subject, 'class'), position, class_rank)
+            set_min_rank(('total', 'grade'), position, total_grade_rank)
+            set_min_rank(('total', 'class'), position, total_class_rank)
+            if score_value is None:
+                continue
+            value = float(score_value)
+            scores = score_column(subject)
+            if math.isnan(scores[position]) or value > scores[position]:
+                scores[position] = value
+            totals[position] = totals.get(position, Decimal('0')) + Decimal(score_value)
+
+        if totals:
+            total_scores = score_column('total')
+            for position, total in totals.items():
+                total_scores[position] = float(total)
+
+        return RankIndex(exam_id, version, student_ids, rank_columns, score_columns)
+
+    @classmethod
+    def get(cls, exam_id):
+        """返回考试的名次索引；考试不存在时抛出 Exam.DoesNotExist。"""
+        version = Exam.objects.filter(pk=exam_id).values_list('data_version', flat=True).get()
+        return cache_get_or_build(
+            cls._cache(), cls.cache_key(exam_id, version), lambda: cls.build(exam_id, version), cls.TTL_SECONDS
+        )
+
+    @classmethod
+    def warm(cls, exam_id):
+        """排名任务结束后调用：构建并缓存最新版本的索引。"""
+        try:
+            cls.get(exam_id)
+        except Exam.DoesNotExist:
+            pass
@@ -0,0 +1,423 @@
+"""
+排名任务调度器
+
+成绩的每次写操作都会触发排名重算。连续多次编辑同一场考试时，如果每次都直接
+往 RQ 投递一个整届排名任务，队列里会堆积大量重复任务。这里在 RQ 前面加一层：
+
+- 按 (考试, 届别) 合并待处理请求，多次请求只产生一个排名任务；
+- 每次新请求都会把执行时间推迟到"安静窗口"之后（去抖），但不超过最长等待时间；
+- 待处理状态可查询，前端据此提示"排名更新中"，而不是展示过期名次；
+- 记录已投递任务的预计执行时间与任务ID：投递失败时清除记录，任务丢失（worker 未带
+  --with-scheduler、崩溃、队列被清空）超过宽限时间后，下一次请求会重新投递，不会永久卡在"待处理"。
+
+后端：
+- rq：状态保存在 Redis，任务通过 queue.enqueue_in 延迟投递（worker 需带 --with-scheduler）；
+- inline：进程内字典，不自动执行，调用 flush() 时同步运行，供测试与无 Redis 的开发环境使用。
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+
+from ..models.student import Student
+from ..tasks import run_pending_rankings, update_all_rankings_async
+
+# 不区分届别（整场考试重算）时使用的键
+ALL_COHORTS = '__all__'
+
+DEFAULT_SCHEDULER_CONFIG = {
+    'BACKEND': 'rq',
+    'QUIET_SECONDS': 5,
+    'MAX_DELAY_SECONDS': 60,
+    'MAX_CHANGED_PAIRS': 2000,
+    # 已投递任务超过预计执行时间这么久仍未执行，视为丢失并重新投递
+    'RESCHEDULE_GRACE_SECONDS': 120,
+    # Redis 中待处理状态的过期时间，兜底清理无人处理的状态
+    'STATE_TTL_SECONDS': 6 * 60 * 60,
+}
+
+
+def get_scheduler_config():
+    config = dict(DEFAULT_SCHEDULER_CONFIG)
+    config.update(getattr(settings, 'RANKING_SCHEDULER', {}))
+    return config
+
+
+class InMemoryRankingStore:
+    """进程内的待处理状态存储，行为与 Redis 存储一致。"""
+
+    _pending = {}
+
+    def add(self, exam_id, cohort_key, pairs, full, now, quiet_seconds, max_delay_seconds, max_pairs,
+            grace_seconds=0, ttl_seconds=None):
+        """登记请求；返回是否需要（重新）投递任务，需要时已先占位，避免并发请求重复投递。"""
+        entry = self._pending.get((exam_id, cohort_key))
+        if entry is None:
+            entry = {
+                'first_requested_at': now,
+                'request_count': 0,
+                'full': False,
+                'pairs': set(),
+                'scheduled_for': None,
+                'job_id': None,
+            }
+            self._pending[(exam_id, cohort_key)] = entry
+
+        entry['request_count'] += 1
+        entry['due_at'] = min(now + quiet_seconds, entry['first_requested_at'] + max_delay_seconds)
+        if full:
+            entry['full'] = True
+        if not entry['full']:
+            entry['pairs'].update(pairs)
+            if len(entry['pairs']) > max_pairs:
+                entry['full'] = True
+        if entry['full']:
+            entry['pairs'] = set()
+
+        scheduled_for = entry['scheduled_for']
+        needs_schedule = scheduled_for is None or now > scheduled_for + grace_seconds
+        if needs_schedule:
+            entry['scheduled_for'] = now + quiet_seconds
+            entry['job_id'] = None
+        return needs_schedule
+
+    def mark_scheduled(self, exam_id, cohort_key, scheduled_for, job_id):
+        entry = self._pending.get((exam_id, cohort_key))
+        if entry is not None:
+            entry['scheduled_for'] = scheduled_for
+            entry['job_id'] = job_id
+
+    def clear_schedule(self, exam_id, cohort_key):
+        entry = self._pending.get((exam_id, cohort_key))
+        if entry is not None:
+            entry['scheduled_for'] = None
+            entry['job_id'] = None
+
+    def get(self, exam_id, cohort_key):
+        entry = self._pending.get((exam_id, cohort_key))
+        if entry is None:
+            return None
+        return {key: value for key, value in entry.items() if key != 'pairs'}
+
+    def pop(self, exam_id, cohort_key):
+        return self._pending.pop((exam_id, cohort_key), None)
+
+    def cohort_keys(self, exam_id):
+        return [cohort_key for pending_exam_id, cohort_key in self._pending if pending_exam_id == exam_id]
+
+    def exam_ids(self):
+        return sorted({exam_id for exam_id, _ in self._pending})
+
+    def schedule(self, exam_id, cohort_key, delay_seconds):
+        # 进程内后端不自动执行，等待 flush()
+        return None
+
+    @classmethod
+    def clear(cls):
+        cls._pending.clear()
+
+
+class RedisRankingStore:
+    """基于 django-rq Redis 连接的待处理状态存储。"""
+
+    KEY_PREFIX = 'sms:ranking:pending'
+
+    def __init__(self, queue_name='default'):
+        import django_rq
+
+        self.queue = django_rq.get_queue(queue_name)
+        self.redis = self.queue.connection
+
+    def _state_key(self, exam_id, cohort_key):
+        return f'{self.KEY_PREFIX}:{exam_id}:{cohort_key}'
+
+    def _pairs_key(self, exam_id, cohort_key):
+        return f'{self._state_key(exam_id, cohort_key)}:pairs'
+
+    def _index_key(self, exam_id):
+        return f'{self.KEY_PREFIX}:{exam_id}'
+
+    @staticmethod
+    def _decode(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    # 登记请求的读-改-写在一个脚本内原子完成（包括读取 first_requested_at 与占位投递）
+    # KEYS: 状态哈希、变动项集合、考试索引集合
+    # ARGV: now, quiet, max_delay, max_pairs, full, ttl, grace, cohort_key, 变动项...
+    ADD_SCRIPT = """
+local now = tonumber(ARGV[1])
+local first = tonumber(redis.call('HGET', KEYS[1], 'first_requested_at') or ARGV[1])
+redis.call('HSET', KEYS[1], 'first_requested_at', first)
+redis.call('HSET', KEYS[1], 'due_at', math.min(now + tonumber(ARGV[2]), first + tonumber(ARGV[3])))
+redis.call('HINCRBY', KEYS[1], 'request_count', 1)
+if ARGV[5] == '1' then
+    redis.call('HSET', KEYS[1], 'full', 1)
+end
+if redis.call('HGET', KEYS[1], 'full') ~= '1' then
+    for i = 9, #ARGV do
+        redis.call('SADD', KEYS[2], ARGV[i])
+    end
+    if redis.call('SCARD', KEYS[2]) > tonumber(ARGV[4]) then
+        redis.call('HSET', KEYS[1], 'full', 1)
+    end
+end
+if redis.call('HGET', KEYS[1], 'full') == '1' then
+    redis.call('DEL', KEYS[2])
+end
+redis.call('SADD', KEYS[3], ARGV[8])
+
+local needs_schedule = 0
+local scheduled_for = tonumber(redis.call('HGET', KEYS[1], 'scheduled_for') or '0')
+if scheduled_for == 0 or now > scheduled_for + tonumber(ARGV[7]) then
+    needs_schedule = 1
+    redis.call('HSET', KEYS[1], 'scheduled_for', now + tonumber(ARGV[2]))
+    redis.call('HDEL', KEYS[1], 'job_id')
+end
+
+local ttl = tonumber(ARGV[6])
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('EXPIRE', KEYS[3], ttl)
+return {needs_schedule, redis.call('HGET', KEYS[1], 'job_id') or ''}
+"""
+
+    MARK_SCHEDULED_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], 'scheduled_for', ARGV[1], 'job_id', ARGV[2])
+end
+return 0
+"""
+
+    def add(self, exam_id, cohort_key, pairs, full, now, quiet_seconds, max_delay_seconds, max_pairs,
+            grace_seconds=0, ttl_seconds=None):
+        """登记请求；返回是否需要（重新）投递任务。已投递的任务在 Redis 中不存在时也重新投递。"""
+        needs_schedule, job_id = self.redis.register_script(self.ADD_SCRIPT)(
+            keys=[self._state_key(exam_id, cohort_key), self._pairs_key(exam_id, cohort_key), self._index_key(exam_id)],
+            args=[
+                now, quiet_seconds, max_delay_seconds, max_pairs, 1 if full else 0,
+                int(ttl_seconds or DEFAULT_SCHEDULER_CONFIG['STATE_TTL_SECONDS']), grace_seconds, cohort_key,
+                *[f'{student_id}|{subject}' for student_id, subject in pairs],
+            ],
+        )
+        if needs_schedule:
+            return True
+
+        job_id = self._decode(job_id)
+        if job_id and not self._job_exists(job_id):
+            # 任务已丢失（队列清空等）：清除记录后由本次请求重新投递
+            self.clear_schedule(exam_id, cohort_key)
+            return True
+        return False
+
+    def _job_exists(self, job_id):
+        from rq.job import Job
+
+        return Job.exists(job_id, connection=self.redis)
+
+    def mark_scheduled(self, exam_id, cohort_key, scheduled_for, job_id):
+        self.redis.register_script(self.MARK_SCHEDULED_SCRIPT)(
+            keys=[self._state_key(exam_id, cohort_key)],
+            args=[scheduled_for, job_id or ''],
+        )
+
+    def clear_schedule(self, exam_id, cohort_key):
+        self.redis.hdel(self._state_key(exam_id, cohort_key), 'scheduled_for', 'job_id')
+
+    def get(self, exam_id, cohort_key):
+        state = self.redis.hgetall(self._state_key(exam_id, cohort_key))
+        if not state:
+            return None
+        state = {self._decode(key): self._decode(value) for key, value in state.items()}
+        return {
+            'first_requested_at': float(state.get('first_requested_at', 0)),
+            'due_at': float(state.get('due_at', 0)),
+            'request_count': int(state.get('request_count', 0)),
+            'full': state.get('full') == '1',
+            'scheduled_for': float(state['scheduled_for']) if state.get('scheduled_for') else None,
+            'job_id': state.get('job_id') or None,
+        }
+
+    def pop(self, exam_id, cohort_key):
+        state_key = self._state_key(exam_id, cohort_key)
+        pairs_key = self._pairs_key(exam_id, cohort_key)
+
+        pipe = self.redis.pipeline()
+        pipe.hgetall(state_key)
+        pipe.smembers(pairs_key)
+        pipe.delete(state_key, pairs_key)
+        pipe.srem(self._index_key(exam_id), cohort_key)
+        state, members, _, _ = pipe.execute()
+        if not state:
+            return None
+
+        state = {self._decode(key): self._decode(value) for key, value in state.items()}
+        pairs = set()
+        for member in members:
+            student_id, subject = self._decode(member).split('|', 1)
+            pairs.add((int(student_id), subject))
+        return {
+            'first_requested_at': float(state.get('first_requested_at', 0)),
+            'due_at': float(state.get('due_at', 0)),
+            'request_count': int(state.get('request_count', 0)),
+            'full': state.get('full') == '1',
+            'pairs': pairs,
+        }
+
+    def cohort_keys(self, exam_id):
+        return [self._decode(member) for member in self.redis.smembers(self._index_key(exam_id))]
+
+    def exam_ids(self):
+        exam_ids = set()
+        for key in self.redis.scan_iter(match=f'{self.KEY_PREFIX}:*'):
+            parts = self._decode(key).split(':')
+            if len(parts) == 4:
+                exam_ids.add(int(parts[3]))
+        return sorted(exam_ids)
+
+    def schedule(self, exam_id, cohort_key, delay_seconds):
+        return self.queue.enqueue_in(
+            timedelta(seconds=max(delay_seconds, 0)),
+            run_pending_rankings,
+            exam_id,
+            cohort_key,
+            job_timeout=600,
+        )
+
+
+class RankingScheduler:
+    """合并、去抖后再投递排名任务。"""
+
+    @staticmethod
+    def get_store():
+        if get_scheduler_config()['BACKEND'] == 'inline':
+            return InMemoryRankingStore()
+        return RedisRankingStore()
+
+    @staticmethod
+    def _group_by_cohort(grade_level, changed_pairs):
+        """把变动项按届别分组；无法确定届别时归入整场考试。"""
+        pairs = {(int(student_id), subject) for student_id, subject in changed_pairs or []}
+        if grade_level is not None:
+            return {grade_level: pairs}
+        if not pairs:
+            return {ALL_COHORTS: set()}
+
+        student_cohorts = dict(
+            Student.objects.filter(pk__in={student_id for student_id, _ in pairs}).values_list('id', 'cohort')
+        )
+        grouped = {}
+        for student_id, subject in pairs:
+            cohort = student_cohorts.get(student_id) or ALL_COHORTS
+            grouped.setdefault(cohort, set()).add((student_id, subject))
+        return grouped
+
+    @staticmethod
+    def _schedule(store, exam_id, cohort_key, delay_seconds):
+        """投递延迟任务并记录预计执行时间与任务ID；投递失败时清除记录，下一次请求会重新投递。"""
+        try:
+            job = store.schedule(exam_id, cohort_key, delay_seconds)
+        except Exception:
+            store.clear_schedule(exam_id, cohort_key)
+            raise
+        store.mark_scheduled(exam_id, cohort_key, time.time() + max(delay_seconds, 0), getattr(job, 'id', None))
+        return job
+
+    @classmethod
+    def request(cls, exam_id, grade_level=None, changed_pairs=None):
+        """
+        登记一次排名更新请求。
+
+        grade_level: 届别；不传时根据 changed_pairs 中的学生推断，仍无法确定则整场考试重算。
+        changed_pairs: 变动的 (student_id, subject)；不传表示该届别需全量重算。
+        返回 True 表示请求已登记；存储不可用（如 Redis 未启动）时返回 False。
+        """
+        config = get_scheduler_config()
+        try:
+            store = cls.get_store()
+            now = time.time()
+            for cohort_key, pairs in cls._group_by_cohort(grade_level, changed_pairs).items():
+                needs_schedule = store.add(
+                    exam_id,
+                    cohort_key,
+                    pairs,
+                    full=not pairs,
+                    now=now,
+                    quiet_seconds=config['QUIET_SECONDS'],
+                    max_delay_seconds=config['MAX_DELAY_SECONDS'],
+                    max_pairs=config['MAX_CHANGED_PAIRS'],
+                    grace_seconds=config['RESCHEDULE_GRACE_SECONDS'],
+                    ttl_seconds=config['STATE_TTL_SECONDS'],
+                )
+                if needs_schedule:
+                    cls._schedule(store, exam_id, cohort_key, config['QUIET_SECONDS'])
+        except Exception as exc:
+            print(f"登记排名更新失败，考试ID: {exam_id}: {exc}")
+            return False
+        return True
+
+    @classmethod
+    def run_pending(cls, exam_id, cohort_key, force=False):
+        """
+        执行某 (考试, 届别) 的待处理排名请求。
+
+        安静窗口未结束时重新延迟投递自身；force=True 时立即执行。
+        返回排名任务结果，没有待处理请求或已重新延迟时返回 None。
+        """
+        store = cls.get_store()
+        state = store.get(exam_id, cohort_key)
+        if state is None:
+            return None
+
+        remaining = state['due_at'] - time.time()
+        if remaining > 0 and not force:
+            cls._schedule(store, exam_id, cohort_key, remaining)
+            return None
+
+        entry = store.pop(exam_id, cohort_key)
+        if entry is None:
+            return None
+
+        grade_level = None if cohort_key == ALL_COHORTS else cohort_key
+        changed_pairs = None if entry['full'] else [list(pair) for pair in sorted(entry['pairs'])]
+        print(
+            f"执行合并后的排名任务，考试ID: {exam_id}, 届别: {grade_level or '全部'}, "
+            f"合并请求 {entry['request_count']} 次"
+        )
+        # 直接调用任务函数，在当前进程（worker 或测试）中同步执行
+        return update_all_rankings_async(exam_id, grade_level, changed_pairs=changed_pairs)
+
+    @classmethod
+    def flush(cls, exam_id=None):
+        """立即执行待处理的排名请求（忽略安静窗口），返回各任务结果列表。"""
+        store = cls.get_store()
+        exam_ids = [exam_id] if exam_id is not None else store.exam_ids()
+        results = []
+        for pending_exam_id in exam_ids:
+            for cohort_key in store.cohort_keys(pending_exam_id):
+                result = cls.run_pending(pending_exam_id, cohort_key, force=True)
+                if result is not None:
+                    results.append(result)
+        return results
+
+    @classmethod
+    def pending(cls, exam_id):
+        """查询某场考试的待处理排名请求，供前端提示排名尚未更新。"""
+        store = cls.get_store()
+        cohorts = []
+        for cohort_key in store.cohort_keys(exam_id):
+            state = store.get(exam_id, cohort_key)
+            if state is None:
+                continue
+            cohorts.append({
+                'grade_level': None if cohort_key == ALL_COHORTS else cohort_key,
+                'request_count': state['request_count'],
+                'full': state['full'],
+                'first_requested_at': state['first_requested_at'],
+                'due_at': state['due_at'],
+            })
+        cohorts.sort(key=lambda item: item['grade_level'] or '')
+        return {
+            'exam_id': exam_id,
+            'pending': bool(cohorts),
+            'cohorts': cohorts,
+        }
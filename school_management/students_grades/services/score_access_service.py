@@ -1,19 +1,89 @@
-from ..models.score import Score
+import itertools
+
+from django.core.cache import caches
+
+from ..config import ACCESS_SCOPE_CONFIG
+from ..models.exam_result import ExamResult
 from ..models.student import Class
 
+# 进程内失效计数：本进程内的写入立即让已记忆的范围失效（跨进程依赖共享缓存中的版本号）
+_generation = itertools.count(1)
+_state = {'scope': next(_generation), 'class_exams': next(_generation)}
+
+
+class AccessScope:
+    """
+    用户的成绩读权限范围。
+
+    class_ids 为 None 表示不受限（admin/staff）；cohorts 为这些班级所属届别，用于录入考试的范围。
+    """
+
+    __slots__ = ('class_ids', 'cohorts')
+
+    def __init__(self, class_ids, cohorts):
+        self.class_ids = class_ids
+        self.cohorts = cohorts
+
+    @property
+    def unrestricted(self):
+        return self.class_ids is None
+
+
+UNRESTRICTED_SCOPE = AccessScope(None, None)
+
 
 class ScoreAccessService:
-    """成绩相关读权限作用域服务。"""
+    """
+    成绩相关读权限作用域服务。
+
+    权限范围按 (用户, 角色, 负责年级) 记忆：同一请求内只计算一次（挂在 request.user 上），
+    跨请求存入 access_scope 缓存。班级增删改、任课关系变化时 invalidate_scopes() 递增版本号；
+    (班级 → 有成绩的考试) 映射由 ExamResult 汇总表生成并同样缓存，考试范围不再扫描 Score 表。
+    """
+
+    ALIAS = ACCESS_SCOPE_CONFIG['ALIAS']
+    TTL_SECONDS = ACCESS_SCOPE_CONFIG['TTL_SECONDS']
+    SCOPE_VERSION_KEY = 'scope_version'
+    CLASS_EXAMS_VERSION_KEY = 'class_exams_version'
 
     @staticmethod
     def _is_unrestricted(user):
         return getattr(user, "role", None) in {"admin", "staff"}
 
     @classmethod
-    def scoped_class_ids(cls, user):
-        if cls._is_unrestricted(user):
-            return None
+    def _cache(cls):
+        return caches[cls.ALIAS]
+
+    @classmethod
+    def _shared_version(cls, key):
+        try:
+            return cls._cache().get(key) or 0
+        except Exception:
+            return 0
 
+    @classmethod
+    def _bump_shared_version(cls, key):
+        cache = cls._cache()
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key)
+        except Exception:
+            pass
+
+    @classmethod
+    def invalidate_scopes(cls):
+        """班级或任课关系变化后调用：所有用户的权限范围失效。"""
+        _state['scope'] = next(_generation)
+        cls._bump_shared_version(cls.SCOPE_VERSION_KEY)
+
+    @classmethod
+    def invalidate_class_exams(cls):
+        """(学生, 考试) 汇总行增删或学生调班后调用：(班级 → 考试) 映射失效。"""
+        _state['class_exams'] = next(_generation)
+        cls._bump_shared_version(cls.CLASS_EXAMS_VERSION_KEY)
+
+    @staticmethod
+    def _compute_class_ids(user):
         role = getattr(user, "role", None)
         if role == "grade_manager":
             managed_grade = getattr(user, "managed_grade", None)
@@ -26,6 +96,100 @@ class ScoreAccessService:
 
         return []
 
+    @classmethod
+    def _compute_scope(cls, user):
+        class_ids = sorted(cls._compute_class_ids(user))
+        cohorts = []
+        if class_ids:
+            cohorts = sorted(
+                Class.objects.filter(id__in=class_ids)
+                .exclude(cohort__isnull=True)
+                .values_list("cohort", flat=True)
+                .distinct()
+            )
+        return AccessScope(tuple(class_ids), tuple(cohorts))
+
+    @classmethod
+    def get_scope(cls, user):
+        """返回用户的 AccessScope：先取请求内记忆，再取共享缓存，都未命中时查询数据库。"""
+        if cls._is_unrestricted(user):
+            return UNRESTRICTED_SCOPE
+
+        role = getattr(user, "role", None)
+        managed_grade = getattr(user, "managed_grade", None)
+        memo = getattr(user, "_score_access_scope", None)
+        if memo is not None and memo[:3] == (_state['scope'], role, managed_grade):
+            return memo[3]
+
+        key = f"scope:{cls._shared_version(cls.SCOPE_VERSION_KEY)}:{user.pk}:{role}:{managed_grade}"
+        try:
+            scope = cls._cache().get(key)
+        except Exception:
+            scope = None
+        if scope is None:
+            scope = cls._compute_scope(user)
+            try:
+                cls._cache().set(key, scope, cls.TTL_SECONDS)
+            except Exception:
+                pass
+
+        try:
+            user._score_access_scope = (_state['scope'], role, managed_grade, scope)
+        except AttributeError:
+            pass
+        return scope
+
+    @classmethod
+    def class_exam_map(cls):
+        """{班级ID: (考试ID, ...)}：学生当前所在班级 → 这些学生有成绩的考试。"""
+        key = f"class_exams:{cls._shared_version(cls.CLASS_EXAMS_VERSION_KEY)}"
+        try:
+            mapping = cls._cache().get(key)
+        except Exception:
+            mapping = None
+        if mapping is not None:
+            return mapping
+
+        grouped = {}
+        pairs = (
+            ExamResult.objects.filter(student__current_class__isnull=False)
+            .order_by()
+            .values_list("student__current_class_id", "exam_id")
+            .distinct()
+        )
+        for class_id, exam_id in pairs:
+            grouped.setdefault(class_id, set()).add(exam_id)
+        mapping = {class_id: tuple(sorted(exam_ids)) for class_id, exam_ids in grouped.items()}
+        try:
+            cls._cache().set(key, mapping, cls.TTL_SECONDS)
+        except Exception:
+            pass
+        return mapping
+
+    @classmethod
+    def scoped_exam_ids(cls, user):
+        """用户可见成绩所在的考试ID集合；不受限时返回 None。"""
+        scope = cls.get_scope(user)
+        if scope.unrestricted:
+            return None
+
+        memo = getattr(user, "_score_access_exam_ids", None)
+        if memo is not None and memo[0] == (_state['class_exams'], scope.class_ids):
+            return memo[1]
+
+        mapping = cls.class_exam_map()
+        exam_ids = frozenset(exam_id for class_id in scope.class_ids for exam_id in mapping.get(class_id, ()))
+        try:
+            user._score_access_exam_ids = ((_state['class_exams'], scope.class_ids), exam_ids)
+        except AttributeError:
+            pass
+        return exam_ids
+
+    @classmethod
+    def scoped_class_ids(cls, user):
+        class_ids = cls.get_scope(user).class_ids
+        return None if class_ids is None else list(class_ids)
+
     @classmethod
     def scope_scores(cls, user, queryset):
         class_ids = cls.scoped_class_ids(user)
@@ -56,25 +220,19 @@ class ScoreAccessService:
     @classmethod
     def scope_exams_from_scores(cls, user, queryset):
         """Return exams that HAVE scores the user can see."""
-        if cls._is_unrestricted(user):
+        exam_ids = cls.scoped_exam_ids(user)
+        if exam_ids is None:
             return queryset
-
-        accessible_exam_ids = cls.scope_scores(
-            user,
-            Score.objects.all(),
-        ).values_list("exam_id", flat=True).distinct()
-        return queryset.filter(id__in=accessible_exam_ids)
+        if not exam_ids:
+            return queryset.none()
+        return queryset.filter(id__in=sorted(exam_ids))
 
     @classmethod
     def scope_exams_for_entry(cls, user, queryset):
         """Return exams the user can ENTER scores for (including exams with no scores yet)."""
-        if cls._is_unrestricted(user):
+        scope = cls.get_scope(user)
+        if scope.unrestricted:
             return queryset
-
-        # Find cohorts associated with user's accessible classes
-        class_ids = cls.scoped_class_ids(user)
-        if not class_ids:
+        if not scope.class_ids:
             return queryset.none()
-
-        cohorts = Class.objects.filter(id__in=class_ids).values_list("cohort", flat=True).distinct()
-        return queryset.filter(grade_level__in=cohorts)
+        return queryset.filter(grade_level__in=scope.cohorts)
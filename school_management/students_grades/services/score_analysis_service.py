@@ -6,6 +6,13 @@ from ..models.student import Class, Student
 from .analysis_service import analyze_single_class, analyze_multiple_classes, analyze_grade
 
 
+# 科目代码/名称 → 在 SUBJECT_CHOICES 中的位置（重复时取首个），排序时查表而非逐项扫描
+SUBJECT_ORDER = {}
+for _index, (_code, _name) in enumerate(SCORE_SUBJECT_CHOICES):
+    SUBJECT_ORDER.setdefault(_code, _index)
+    SUBJECT_ORDER.setdefault(_name, _index)
+
+
 class ScoreAnalysisServiceError(Exception):
     """成绩分析服务异常，包含前端可消费的错误信息与状态码。"""
 
@@ -20,10 +27,53 @@ class ScoreAnalysisService:
 
     @staticmethod
     def _get_subject_order(subject):
-        for index, (subject_code, subject_name) in enumerate(SCORE_SUBJECT_CHOICES):
-            if subject_code == subject or subject_name == subject:
-                return index
-        return 999
+        return SUBJECT_ORDER.get(subject, 999)
+
+    @classmethod
+    def load_students_analysis_data(cls, students, exam_ids=None):
+        """
+        批量组装个人分析数据：{学生主键: analysis_data}，与 assemble_student_analysis_data 输出一致。
+
+        students 应已 select_related('current_class')；exam_ids 为 None 时每个学生取其全部考试，
+        没有任何考试的学生不出现在结果中。
+        查询数：成绩 1 条 + 考试 1 条 + 考试科目 1 条，与学生、考试数量无关。
+        """
+        students = list(students)
+        # 与 Score 默认排序在单个 (学生, 考试) 内的相对顺序一致，省去默认排序的连表
+        scores = (
+            Score.objects.filter(student_id__in=[student.pk for student in students])
+            .select_related('exam_subject')
+            .order_by('subject')
+        )
+        if exam_ids is not None:
+            scores = scores.filter(exam_id__in=exam_ids)
+
+        scores_by_student = {}
+        for score in scores:
+            scores_by_student.setdefault(score.student_id, {}).setdefault(score.exam_id, []).append(score)
+
+        if exam_ids is None:
+            needed_exam_ids = {exam_id for by_exam in scores_by_student.values() for exam_id in by_exam}
+        else:
+            needed_exam_ids = exam_ids
+        exams = list(
+            Exam.objects.filter(id__in=needed_exam_ids).order_by('date', 'id').prefetch_related('exam_subjects')
+        ) if needed_exam_ids else []
+        exam_map = {exam.id: exam for exam in exams}
+        for by_exam in scores_by_student.values():
+            for exam_id, exam_scores in by_exam.items():
+                for score in exam_scores:
+                    # 满分兜底（Score.get_max_score）会读取 score.exam，直接挂上已加载的考试
+                    score.exam = exam_map[exam_id]
+
+        results = {}
+        for student in students:
+            by_exam = scores_by_student.get(student.pk, {})
+            student_exams = exams if exam_ids is not None else [exam for exam in exams if exam.id in by_exam]
+            if not student_exams:
+                continue
+            results[student.pk] = cls.assemble_student_analysis_data(student, student_exams, by_exam)
+        return results
 
     @classmethod
     def build_student_analysis_data(cls, student_id, exam_ids, exam_id):
@@ -35,18 +85,26 @@ class ScoreAnalysisService:
         elif exam_id:
             exam_id_list = [exam_id]
         else:
-            student_exam_ids = Score.objects.filter(student_id=student_id).values_list('exam_id', flat=True).distinct()
-            exam_id_list = [str(item) for item in student_exam_ids]
+            exam_id_list = None
 
         try:
             student = Student.objects.select_related('current_class').get(id=student_id)
         except Student.DoesNotExist as exc:
             raise ScoreAnalysisServiceError('学生不存在', 404) from exc
 
-        exams = Exam.objects.filter(id__in=exam_id_list).order_by('date', 'id')
-        if not exams.exists():
+        analysis_data = cls.load_students_analysis_data([student], exam_id_list).get(student.pk)
+        if analysis_data is None:
             raise ScoreAnalysisServiceError('未找到指定的考试', 404)
+        return analysis_data
+
+    @classmethod
+    def assemble_student_analysis_data(cls, student, exams, scores_by_exam):
+        """
+        由已加载的数据组装个人分析数据，本身不查询数据库（批量导出复用）。
 
+        exams: 按 (日期, ID) 排序的考试列表；scores_by_exam: {考试ID: [Score, ...]}。
+        Score.exam_subject 与 Exam.exam_subjects 应已预取，否则会逐条查询。
+        """
         analysis_data = {
             'student_info': {
                 'id': student.id,
@@ -60,7 +118,7 @@ class ScoreAnalysisService:
             'subjects': [],
             'trend_data': {},
             'summary': {
-                'total_exams': exams.count(),
+                'total_exams': len(exams),
                 'subjects_count': 0,
             }
         }
@@ -68,8 +126,7 @@ class ScoreAnalysisService:
         all_subjects = set()
 
         for exam in exams:
-            scores = Score.objects.filter(student=student, exam=exam).select_related('exam_subject')
-            scores_list = list(scores)
+            scores_list = list(scores_by_exam.get(exam.id, []))
             scores_list.sort(key=lambda score: cls._get_subject_order(score.subject))
             exam_subject_max_scores = {
                 item.subject_code: float(item.max_score)
@@ -0,0 +1,252 @@
+from django.db import transaction
+from django.db.models import Count, Max
+
+from ..models.exam import Exam
+from ..models.score import Score, SUBJECT_CHOICES as SCORE_SUBJECT_CHOICES
+from ..models.student import Class, Student
+from .ranking_scheduler import RankingScheduler
+from .score_access_service import ScoreAccessService
+from .score_mutation_service import ScoreMutationService
+
+
+class ScoreGridServiceError(Exception):
+    """班级成绩表格录入异常。"""
+
+    def __init__(self, message, status_code=400, payload=None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.payload = payload
+
+
+class ScoreGridService:
+    """
+    按 (班级, 考试, 科目) 表格录入成绩。
+
+    每行（学生）带版本号：该学生本场考试成绩的最近更新时间与条数，保存时与当前值比对，
+    被他人改动过的行整体拒绝（乐观并发）。整张表先逐格校验，全部通过后在一个事务内
+    批量删除/upsert，并只登记一次排名更新。
+    """
+
+    CONFLICT_MESSAGE = '该学生的成绩已被他人修改，请刷新后重试'
+
+    @staticmethod
+    def parse_subjects(subjects):
+        """'语文,数学' 或列表 → 按 SUBJECT_CHOICES 顺序的科目代码；未传时为全部科目。"""
+        valid_codes = [code for code, _ in SCORE_SUBJECT_CHOICES]
+        if not subjects:
+            return valid_codes
+        if isinstance(subjects, str):
+            subjects = subjects.split(',')
+        requested = {str(item).strip() for item in subjects if str(item).strip()}
+        unknown = requested.difference(valid_codes)
+        if unknown:
+            raise ScoreGridServiceError(f"未知科目：{', '.join(sorted(unknown))}", 400)
+        return [code for code in valid_codes if code in requested]
+
+    @staticmethod
+    def _resolve(user, class_id, exam_id):
+        if not class_id or not exam_id:
+            raise ScoreGridServiceError('缺少必要参数：班级ID或考试ID', 400)
+
+        try:
+            cls_obj = ScoreAccessService.scope_classes(user, Class.objects.all()).get(pk=class_id)
+        except (Class.DoesNotExist, ValueError, TypeError) as exc:
+            raise ScoreGridServiceError('班级不存在或无权访问', 404) from exc
+
+        try:
+            exam = Exam.objects.get(pk=exam_id)
+        except (Exam.DoesNotExist, ValueError, TypeError) as exc:
+            raise ScoreGridServiceError('考试不存在', 404) from exc
+        return cls_obj, exam
+
+    @staticmethod
+    def _class_students(cls_obj):
+        return Student.objects.filter(current_class=cls_obj).exclude(status='毕业').order_by('student_id')
+
+    @staticmethod
+    def format_version(last_updated, score_count):
+        """行版本号：最近更新时间 + 成绩条数（删除较早更新的科目也会改变版本）；无成绩时为 None。"""
+        if not score_count:
+            return None
+        return f'{last_updated.isoformat()}#{score_count}'
+
+    @classmethod
+    def row_versions(cls, exam, student_ids):
+        """{学生ID: 版本号}，一条聚合查询。"""
+        rows = (
+            Score.objects.filter(exam=exam, student_id__in=list(student_ids))
+            .order_by()
+            .values('student_id')
+            .annotate(last_updated=Max('updated_at'), score_count=Count('id'))
+        )
+        versions = {student_id: None for student_id in student_ids}
+        for row in rows:
+            versions[row['student_id']] = cls.format_version(row['last_updated'], row['score_count'])
+        return versions
+
+    @classmethod
+    def load(cls, user, class_id, exam_id, subjects=None):
+        cls_obj, exam = cls._resolve(user, class_id, exam_id)
+        subject_codes = cls.parse_subjects(subjects)
+        subject_name_map = dict(SCORE_SUBJECT_CHOICES)
+        subject_max_scores = ScoreMutationService.get_subject_max_scores(exam)
+
+        students = list(cls._class_students(cls_obj))
+        student_ids = [student.pk for student in students]
+        scores = {}
+        for student_id, subject, score_value in (
+            Score.objects.filter(exam=exam, student_id__in=student_ids, subject__in=subject_codes)
+            .order_by()
+            .values_list('student_id', 'subject', 'score_value')
+        ):
+            scores[(student_id, subject)] = float(score_value)
+        versions = cls.row_versions(exam, student_ids)
+
+        return {
+            'success': True,
+            'class': {'id': cls_obj.pk, 'name': str(cls_obj), 'cohort': cls_obj.cohort},
+            'exam': {
+                'id': exam.pk,
+                'name': exam.name,
+                'academic_year': exam.academic_year,
+                'date': exam.date.strftime('%Y-%m-%d') if exam.date else '',
+            },
+            'subjects': [
+                {'value': code, 'label': subject_name_map[code], 'max_score': subject_max_scores[code]}
+                for code in subject_codes
+            ],
+            'rows': [
+                {
+                    'student_id': student.pk,
+                    'student_number': student.student_id,
+                    'name': student.name,
+                    'version': versions[student.pk],
+                    'scores': {code: scores.get((student.pk, code)) for code in subject_codes},
+                }
+                for student in students
+            ],
+        }
+
+    @classmethod
+    def _validate_cells(cls, rows, class_student_ids, subject_max_scores):
+        """逐格校验，返回 (有效单元格 {(学生ID, 科目): 分数或 None}, 错误列表)。"""
+        subject_name_map = dict(SCORE_SUBJECT_CHOICES)
+        cells = {}
+        errors = []
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                errors.append({'row': index, 'student_id': None, 'subject': None, 'message': '行数据格式不正确'})
+                continue
+            try:
+                student_id = int(row.get('student_id'))
+            except (TypeError, ValueError):
+                errors.append({'row': index, 'student_id': row.get('student_id'), 'subject': None, 'message': '学生ID无效'})
+                continue
+            if student_id not in class_student_ids:
+                errors.append({'row': index, 'student_id': student_id, 'subject': None, 'message': '学生不属于该班级'})
+                continue
+
+            row_scores = row.get('scores') or {}
+            if not isinstance(row_scores, dict):
+                errors.append({'row': index, 'student_id': student_id, 'subject': None, 'message': '行数据格式不正确'})
+                continue
+            for subject_code, raw_value in row_scores.items():
+                if subject_code not in subject_name_map:
+                    errors.append({'row': index, 'student_id': student_id, 'subject': subject_code, 'message': '未知科目'})
+                    continue
+                if raw_value in [None, '']:
+                    cells[(student_id, subject_code)] = None
+                    continue
+                try:
+                    score_value = float(raw_value)
+                except (TypeError, ValueError):
+                    errors.append({
+                        'row': index, 'student_id': student_id, 'subject': subject_code,
+                        'message': f"{subject_name_map[subject_code]} 的分数格式不正确",
+                    })
+                    continue
+                max_score = float(subject_max_scores.get(subject_code, 100))
+                if score_value < 0 or score_value > max_score:
+                    errors.append({
+                        'row': index, 'student_id': student_id, 'subject': subject_code,
+                        'message': f"{subject_name_map[subject_code]} 的分数必须在0-{max_score:g}分之间",
+                    })
+                    continue
+                cells[(student_id, subject_code)] = score_value
+        return cells, errors
+
+    @classmethod
+    def save(cls, user, class_id, exam_id, rows):
+        """
+        保存表格中提交的行（可只提交改动的行/单元格）；空值表示删除该科目成绩。
+
+        校验失败返回 400、版本冲突返回 409，两种情况都不写入任何数据。
+        """
+        if not isinstance(rows, list) or not rows:
+            raise ScoreGridServiceError('请至少提交一行成绩', 400)
+
+        cls_obj, exam = cls._resolve(user, class_id, exam_id)
+        subject_max_scores = ScoreMutationService.get_subject_max_scores(exam)
+        exam_subject_map = {subject.subject_code: subject for subject in exam.exam_subjects.all()}
+
+        with transaction.atomic():
+            # 锁住本次提交涉及的学生行，保证“比对版本 → 写入”之间不被并发保存插入
+            class_student_ids = set(cls._class_students(cls_obj).values_list('pk', flat=True))
+            cells, errors = cls._validate_cells(rows, class_student_ids, subject_max_scores)
+            submitted_ids = sorted({student_id for student_id, _ in cells})
+            list(Student.objects.select_for_update().filter(pk__in=submitted_ids).order_by('pk').values_list('pk'))
+
+            current_versions = cls.row_versions(exam, submitted_ids)
+            conflicts = []
+            for row in rows:
+                if not isinstance(row, dict):
+                    continue
+                try:
+                    student_id = int(row.get('student_id'))
+                except (TypeError, ValueError):
+                    continue
+                if student_id in current_versions and row.get('version') != current_versions[student_id]:
+                    conflicts.append({
+                        'student_id': student_id,
+                        'current_version': current_versions[student_id],
+                        'message': cls.CONFLICT_MESSAGE,
+                    })
+
+            if errors:
+                raise ScoreGridServiceError('成绩校验未通过', 400, payload={
+                    'success': False,
+                    'code': 'validation_failed',
+                    'message': '成绩校验未通过',
+                    'errors': errors,
+                    'conflicts': conflicts,
+                })
+            if conflicts:
+                raise ScoreGridServiceError(cls.CONFLICT_MESSAGE, 409, payload={
+                    'success': False,
+                    'code': 'version_conflict',
+                    'message': cls.CONFLICT_MESSAGE,
+                    'errors': [],
+                    'conflicts': conflicts,
+                })
+
+            existing = {
+                (score.student_id, score.subject): score
+                for score in Score.objects.filter(exam=exam, student_id__in=submitted_ids).order_by()
+            }
+            stats = ScoreMutationService.save_score_cells(exam, cells, existing, exam_subject_map)
+            changed_pairs = stats['changed_pairs']
+
+        if changed_pairs:
+            # 整张表只登记一次排名更新
+            RankingScheduler.request(exam.pk, cls_obj.cohort, changed_pairs=changed_pairs)
+
+        versions = cls.row_versions(exam, submitted_ids)
+        return {
+            'success': True,
+            'message': f'成功保存 {len(changed_pairs)} 个成绩',
+            'created_count': stats['created_count'],
+            'updated_count': stats['updated_count'],
+            'deleted_count': stats['deleted_count'],
+            'rows': [{'student_id': student_id, 'version': versions[student_id]} for student_id in submitted_ids],
+        }
@@ -4,33 +4,196 @@ import openpyxl
 from django.db import transaction
 from django.utils import timezone
 
+from ..config import IMPORT_CONFIG
 from ..models.exam import Exam, SUBJECT_DEFAULT_MAX_SCORES
 from ..models.score import Score, SUBJECT_CHOICES as SCORE_SUBJECT_CHOICES
 from ..models.student import Student
-from ..tasks import update_all_rankings_async
+from .exam_result_service import ExamResultService
+from .ranking_scheduler import RankingScheduler
 
 
 class ScoreImportServiceError(Exception):
     """成绩导入服务异常。"""
 
-    def __init__(self, message, status_code):
+    def __init__(self, message, status_code, payload=None):
         super().__init__(message)
         self.message = message
         self.status_code = status_code
+        self.payload = payload
 
 
 class ScoreImportService:
-    """成绩批量导入服务。"""
+    """
+    成绩批量导入服务。
+
+    以只读模式流式读取 Excel，按块（IMPORT_CONFIG['BATCH_SIZE'] 行）校验并写库，
+    每块一个事务；内存占用只与块大小有关，与文件大小无关。
+    中途失败时已提交的块保留，可通过 start_row 从失败块的首行继续导入。
+    """
+
+    CHUNK_SIZE = IMPORT_CONFIG['BATCH_SIZE']
 
     @staticmethod
-    def _trigger_ranking_update(exam_id):
-        try:
-            update_all_rankings_async.delay(exam_id)
-        except Exception:
-            pass
+    def _trigger_ranking_update(exam_id, changed_pairs=None):
+        """登记排名更新（由调度器合并去抖）；传入 changed_pairs 时排名任务走增量模式。"""
+        RankingScheduler.request(exam_id, changed_pairs=changed_pairs)
+
+    @staticmethod
+    def _iter_row_chunks(sheet, headers, start_row, chunk_size):
+        """逐行读取数据区，跳过空行，每 chunk_size 行产出一块 [(row_idx, row_data), ...]。"""
+        chunk = []
+        for row_idx, row in enumerate(sheet.iter_rows(min_row=start_row, values_only=True), start=start_row):
+            if not any(row):
+                continue
+            chunk.append((row_idx, dict(zip(headers, row))))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _import_chunk(exam, rows, subject_codes, exam_subject_map, max_score_map):
+        """
+        校验并写入一块数据（单个事务）。
+
+        返回 (imported_count, failed_count, error_details, changed_pairs)。
+        """
+        student_ids = {
+            str(row_data.get('学号')).strip()
+            for _, row_data in rows
+            if row_data.get('学号')
+        }
+        students = Student.objects.filter(student_id__in=student_ids).select_related('current_class')
+        students_map = {student.student_id: student for student in students}
+
+        existing_scores = Score.objects.filter(
+            exam=exam,
+            student_id__in=[student.id for student in students_map.values()],
+            subject__in=subject_codes,
+        )
+        existing_scores_map = {
+            (score.student_id, score.subject): score
+            for score in existing_scores
+        }
+
+        imported_count = 0
+        failed_count = 0
+        error_details = []
+        pending_create_map = {}
+        pending_update_map = {}
+        now_ts = timezone.now()
+
+        with transaction.atomic():
+            for row_idx, row_data in rows:
+                student_id = str(row_data.get('学号') or '').strip()
+                student_name = str(row_data.get('学生姓名') or '').strip()
+
+                row_errors = []
+                if not student_id:
+                    row_errors.append('缺少学号')
+                student = students_map.get(student_id)
+                if not student:
+                    row_errors.append(f'学号 {student_id} 对应的学生不存在')
+
+                changed_any = False
+                if not row_errors:
+                    for subject_code in subject_codes:
+                        raw_score = row_data.get(subject_code)
+                        if raw_score in [None, '']:
+                            continue
+                        try:
+                            score_value = Decimal(str(raw_score))
+                        except (TypeError, ValueError, InvalidOperation):
+                            row_errors.append(f'{subject_code} 分数 "{raw_score}" 格式错误（须为数字）')
+                            continue
+
+                        if score_value < 0:
+                            row_errors.append(f'{subject_code} 分数 {score_value} 不能为负数')
+                            continue
+
+                        max_score = max_score_map.get(subject_code)
+                        if max_score is not None and score_value > max_score:
+                            row_errors.append(f'{subject_code} 分数 {score_value} 超过满分 {max_score}')
+                            continue
+
+                        exam_subject_obj = exam_subject_map.get(subject_code)
+                        key = (student.id, subject_code)
+                        existing_score = existing_scores_map.get(key)
+
+                        if existing_score:
+                            if (
+                                existing_score.score_value != score_value
+                                or existing_score.exam_subject_id != (exam_subject_obj.id if exam_subject_obj else None)
+                            ):
+                                existing_score.score_value = score_value
+                                existing_score.exam_subject = exam_subject_obj
+                                existing_score.updated_at = now_ts
+                                pending_update_map[existing_score.id] = existing_score
+                                changed_any = True
+                        else:
+                            pending_score = pending_create_map.get(key)
+                            if pending_score:
+                                if (
+                                    pending_score.score_value != score_value
+                                    or pending_score.exam_subject_id != (exam_subject_obj.id if exam_subject_obj else None)
+                                ):
+                                    pending_score.score_value = score_value
+                                    pending_score.exam_subject = exam_subject_obj
+                                    pending_score.updated_at = now_ts
+                                    changed_any = True
+                            else:
+                                pending_create_map[key] = Score(
+                                    student=student,
+                                    exam=exam,
+                                    subject=subject_code,
+                                    score_value=score_value,
+                                    exam_subject=exam_subject_obj,
+                                    created_at=now_ts,
+                                    updated_at=now_ts,
+                                )
+                                changed_any = True
+
+                if row_errors:
+                    failed_count += 1
+                    error_details.append({
+                        'row': row_idx,
+                        'student_id': student_id,
+                        'student_name': student_name,
+                        'errors': row_errors,
+                    })
+                elif changed_any:
+                    imported_count += 1
+
+            if pending_create_map:
+                Score.objects.bulk_create(list(pending_create_map.values()), batch_size=1000)
+
+            if pending_update_map:
+                Score.objects.bulk_update(
+                    list(pending_update_map.values()),
+                    ['score_value', 'exam_subject', 'updated_at'],
+                    batch_size=1000,
+                )
+
+            # bulk 写入不触发 Score 的 post_save 信号，同块事务内直接刷新汇总表
+            changed_students = {student_id for student_id, _ in pending_create_map}
+            changed_students.update(score.student_id for score in pending_update_map.values())
+            if changed_students:
+                ExamResultService.refresh_pairs((student_id, exam.pk) for student_id in changed_students)
+
+        changed_pairs = set(pending_create_map.keys())
+        changed_pairs.update((score.student_id, score.subject) for score in pending_update_map.values())
+        return imported_count, failed_count, error_details, changed_pairs
 
     @classmethod
-    def batch_import(cls, excel_file, exam_id):
+    def batch_import(cls, excel_file, exam_id, start_row=2, progress_callback=None, chunk_size=None):
+        """
+        导入成绩 Excel。
+
+        start_row: 从第几行开始读取数据（默认 2，即标题行之后），用于中断后续传。
+        progress_callback: 每提交一块后回调一次，参数为进度字典
+            （processed_rows / imported_count / failed_count / last_committed_row）。
+        """
         start_time = timezone.now()
 
         if not exam_id:
@@ -46,17 +209,25 @@ class ScoreImportService:
             raise ScoreImportServiceError('考试不存在', 400) from exc
 
         try:
-            workbook = openpyxl.load_workbook(excel_file)
+            start_row = max(int(start_row or 2), 2)
+        except (TypeError, ValueError) as exc:
+            raise ScoreImportServiceError('起始行必须为整数', 400) from exc
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+
+        workbook = None
+        try:
+            workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
             sheet = workbook.active
-            headers = [cell.value for cell in sheet[1]]
+            headers = list(next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ()))
 
+            exam_subjects = list(exam.exam_subjects.all())
             exam_subject_map = {
                 subject.subject_code: subject
-                for subject in exam.exam_subjects.all()
+                for subject in exam_subjects
             }
             max_score_map = {
                 subject.subject_code: Decimal(str(subject.max_score))
-                for subject in exam.exam_subjects.all()
+                for subject in exam_subjects
             }
 
             if not max_score_map:
@@ -93,130 +264,49 @@ class ScoreImportService:
                     400,
                 )
 
-            student_ids = set()
-            excel_rows = []
-            for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-                if not any(row):
-                    continue
-                row_data = dict(zip(headers, row))
-                sid = row_data.get('学号')
-                if sid:
-                    sid = str(sid).strip()
-                    student_ids.add(sid)
-                excel_rows.append((row_idx, row_data))
-
-            students = Student.objects.filter(student_id__in=student_ids).select_related('current_class')
-            students_map = {student.student_id: student for student in students}
-
-            existing_scores = Score.objects.filter(
-                exam=exam,
-                student_id__in=[student.id for student in students],
-                subject__in=subject_codes,
-            )
-            existing_scores_map = {
-                (score.student_id, score.subject): score
-                for score in existing_scores
-            }
-
             imported_count = 0
             failed_count = 0
+            processed_rows = 0
             error_details = []
-            pending_create_map = {}
-            pending_update_map = {}
-            now_ts = timezone.now()
-
-            with transaction.atomic():
-                for row_idx, row_data in excel_rows:
-                    student_id = str(row_data.get('学号') or '').strip()
-                    student_name = str(row_data.get('学生姓名') or '').strip()
-
-                    row_errors = []
-                    if not student_id:
-                        row_errors.append('缺少学号')
-                    student = students_map.get(student_id)
-                    if not student:
-                        row_errors.append(f'学号 {student_id} 对应的学生不存在')
-
-                    changed_any = False
-                    if not row_errors:
-                        for subject_code in subject_codes:
-                            raw_score = row_data.get(subject_code)
-                            if raw_score in [None, '']:
-                                continue
-                            try:
-                                score_value = Decimal(str(raw_score))
-                            except (TypeError, ValueError, InvalidOperation):
-                                row_errors.append(f'{subject_code} 分数 "{raw_score}" 格式错误（须为数字）')
-                                continue
-
-                            if score_value < 0:
-                                row_errors.append(f'{subject_code} 分数 {score_value} 不能为负数')
-                                continue
-
-                            max_score = max_score_map.get(subject_code)
-                            if max_score is not None and score_value > max_score:
-                                row_errors.append(f'{subject_code} 分数 {score_value} 超过满分 {max_score}')
-                                continue
-
-                            exam_subject_obj = exam_subject_map.get(subject_code)
-                            key = (student.id, subject_code)
-                            existing_score = existing_scores_map.get(key)
-
-                            if existing_score:
-                                if (
-                                    existing_score.score_value != score_value
-                                    or existing_score.exam_subject_id != (exam_subject_obj.id if exam_subject_obj else None)
-                                ):
-                                    existing_score.score_value = score_value
-                                    existing_score.exam_subject = exam_subject_obj
-                                    existing_score.updated_at = now_ts
-                                    pending_update_map[existing_score.id] = existing_score
-                                    changed_any = True
-                            else:
-                                pending_score = pending_create_map.get(key)
-                                if pending_score:
-                                    if (
-                                        pending_score.score_value != score_value
-                                        or pending_score.exam_subject_id != (exam_subject_obj.id if exam_subject_obj else None)
-                                    ):
-                                        pending_score.score_value = score_value
-                                        pending_score.exam_subject = exam_subject_obj
-                                        pending_score.updated_at = now_ts
-                                        changed_any = True
-                                else:
-                                    pending_create_map[key] = Score(
-                                        student=student,
-                                        exam=exam,
-                                        subject=subject_code,
-                                        score_value=score_value,
-                                        exam_subject=exam_subject_obj,
-                                        created_at=now_ts,
-                                        updated_at=now_ts,
-                                    )
-                                    changed_any = True
+            last_committed_row = start_row - 1
 
-                    if row_errors:
-                        failed_count += 1
-                        error_details.append({
-                            'row': row_idx,
-                            'student_id': student_id,
-                            'student_name': student_name,
-                            'errors': row_errors,
-                        })
-                    elif changed_any:
-                        imported_count += 1
-
-                if pending_create_map:
-                    Score.objects.bulk_create(list(pending_create_map.values()), batch_size=1000)
-
-                if pending_update_map:
-                    Score.objects.bulk_update(
-                        list(pending_update_map.values()),
-                        ['score_value', 'exam_subject', 'updated_at'],
-                        batch_size=1000,
+            for chunk in cls._iter_row_chunks(sheet, headers, start_row, chunk_size):
+                try:
+                    chunk_imported, chunk_failed, chunk_errors, changed_pairs = cls._import_chunk(
+                        exam, chunk, subject_codes, exam_subject_map, max_score_map
                     )
-
-            cls._trigger_ranking_update(exam.pk)
+                except Exception as exc:
+                    first_row = chunk[0][0]
+                    raise ScoreImportServiceError(
+                        f'第 {first_row}-{chunk[-1][0]} 行导入失败：{str(exc)}',
+                        500,
+                        payload={
+                            'success': False,
+                            'message': f'第 {first_row}-{chunk[-1][0]} 行导入失败：{str(exc)}，'
+                                       f'之前的数据已保存，可从第 {first_row} 行继续导入',
+                            'imported_count': imported_count,
+                            'failed_count': failed_count,
+                            'error_details': error_details,
+                            'last_committed_row': last_committed_row,
+                            'resume_from_row': first_row,
+                        },
+                    ) from exc
+
+                imported_count += chunk_imported
+                failed_count += chunk_failed
+                processed_rows += len(chunk)
+                error_details.extend(chunk_errors)
+                last_committed_row = chunk[-1][0]
+
+                if changed_pairs:
+                    cls._trigger_ranking_update(exam.pk, changed_pairs)
+                if progress_callback:
+                    progress_callback({
+                        'processed_rows': processed_rows,
+                        'imported_count': imported_count,
+                        'failed_count': failed_count,
+                        'last_committed_row': last_committed_row,
+                    })
 
             execution_time = (timezone.now() - start_time).total_seconds()
             return {
@@ -225,9 +315,13 @@ class ScoreImportService:
                 'imported_count': imported_count,
                 'failed_count': failed_count,
                 'error_details': error_details,
+                'last_committed_row': last_committed_row,
                 'execution_time': round(execution_time, 2),
             }
         except ScoreImportServiceError:
             raise
         except Exception as exc:
             raise ScoreImportServiceError(f'文件处理失败：{str(exc)}', 500) from exc
+        finally:
+            if workbook is not None:
+                workbook.close()
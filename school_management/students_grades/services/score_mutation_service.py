@@ -1,9 +1,14 @@
-from django.db import transaction
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
 
 from ..models.exam import Exam, ExamSubject, SUBJECT_DEFAULT_MAX_SCORES
 from ..models.score import Score, SUBJECT_CHOICES as SCORE_SUBJECT_CHOICES
 from ..models.student import Student
-from ..tasks import update_all_rankings_async
+from .exam_result_service import ExamResultService
+from .score_query_service import SELECTION_CHUNK_SIZE, ScoreQueryService
+from .ranking_scheduler import RankingScheduler
 
 
 class ScoreMutationServiceError(Exception):
@@ -32,14 +37,34 @@ class ScoreMutationService:
         return max_scores
 
     @staticmethod
-    def _trigger_ranking_update(exam_id, grade_level=None):
-        try:
-            if grade_level is None:
-                update_all_rankings_async.delay(exam_id)
-            else:
-                update_all_rankings_async.delay(exam_id, grade_level)
-        except Exception:
-            pass
+    def _trigger_ranking_update(exam_id, grade_level=None, changed_pairs=None):
+        """登记排名更新（由调度器合并去抖）；传入 changed_pairs 时排名任务走增量模式。"""
+        RankingScheduler.request(exam_id, grade_level, changed_pairs=changed_pairs)
+
+    @staticmethod
+    def _validate_score(subject_code, score_value, exam_subject):
+        """与 Score.clean 相同的校验与提示，在内存中对照预取的考试科目完成，不逐条查询。"""
+        if score_value < 0:
+            raise ValidationError("分数不能为负数")
+        if exam_subject and Decimal(str(score_value)) > exam_subject.max_score:
+            raise ValidationError(
+                f"分数 {score_value} 超过了 {exam_subject.subject_name} 的满分 {exam_subject.max_score}"
+            )
+
+    @staticmethod
+    def upsert_scores(scores):
+        """
+        一条语句写入整张 (学生, 考试) 成绩：已存在的 (学生, 考试, 科目) 更新分数，其余插入。
+
+        MySQL 为 INSERT ... ON DUPLICATE KEY UPDATE，SQLite/PostgreSQL 为 ON CONFLICT DO UPDATE。
+        """
+        options = {
+            'update_conflicts': True,
+            'update_fields': ['score_value', 'exam_subject', 'updated_at'],
+        }
+        if connection.features.supports_update_conflicts_with_target:
+            options['unique_fields'] = ['student', 'exam', 'subject']
+        Score.objects.bulk_create(scores, **options)
 
     @classmethod
     def manual_add(cls, student_id, exam_id, scores):
@@ -69,11 +94,16 @@ class ScoreMutationService:
         if not valid_scores:
             raise ScoreMutationServiceError('请至少输入一个科目的成绩', 400)
 
-        existing_subjects = []
         subject_name_map = {code: name for code, name in SCORE_SUBJECT_CHOICES}
-        for subject_code in valid_scores.keys():
-            if Score.objects.filter(student=student, exam=exam, subject=subject_code).exists():
-                existing_subjects.append(subject_name_map.get(subject_code, subject_code))
+        present_subjects = set(
+            Score.objects.filter(student=student, exam=exam, subject__in=list(valid_scores))
+            .values_list('subject', flat=True)
+        )
+        existing_subjects = [
+            subject_name_map.get(subject_code, subject_code)
+            for subject_code in valid_scores
+            if subject_code in present_subjects
+        ]
 
         if existing_subjects:
             raise ScoreMutationServiceError(
@@ -91,20 +121,29 @@ class ScoreMutationService:
 
         exam_subject_map = {s.subject_code: s for s in exam.exam_subjects.all()}
 
-        created_count = 0
+        new_scores = []
+        for subject_code, score_value in valid_scores.items():
+            exam_subject = exam_subject_map.get(subject_code)
+            cls._validate_score(subject_code, score_value, exam_subject)
+            new_scores.append(Score(
+                student=student,
+                exam=exam,
+                subject=subject_code,
+                score_value=score_value,
+                exam_subject=exam_subject,
+            ))
+
         with transaction.atomic():
-            for subject_code, score_value in valid_scores.items():
-                score = Score(
-                    student=student,
-                    exam=exam,
-                    subject=subject_code,
-                    score_value=score_value,
-                    exam_subject=exam_subject_map.get(subject_code)
-                )
-                score.save()
-                created_count += 1
+            Score.objects.bulk_create(new_scores)
+            # bulk_create 不触发 Score 的 post_save 信号，直接刷新汇总表
+            ExamResultService.refresh_pairs([(student.pk, exam.pk)])
+        created_count = len(new_scores)
 
-        cls._trigger_ranking_update(exam.pk, student.grade_level)
+        cls._trigger_ranking_update(
+            exam.pk,
+            student.cohort,
+            changed_pairs=[(student.pk, subject_code) for subject_code in valid_scores],
+        )
 
         return {
             'success': True,
@@ -172,67 +211,160 @@ class ScoreMutationService:
         subject_name_map = {code: name for code, name in SCORE_SUBJECT_CHOICES}
         exam_subject_map = {subject.subject_code: subject for subject in exam.exam_subjects.all()}
 
-        updated_count = 0
-        created_count = 0
-        deleted_count = 0
+        existing_scores = {
+            (student.pk, score.subject): score for score in Score.objects.filter(student=student, exam=exam)
+        }
 
+        # 先在内存中校验整张成绩单，全部通过后再写入
+        cells = {}
         try:
-            with transaction.atomic():
-                for subject_code, _ in SCORE_SUBJECT_CHOICES:
-                    raw_value = (scores or {}).get(subject_code)
-
-                    if raw_value in [None, '']:
-                        deleted_count += Score.objects.filter(
-                            student=student,
-                            exam=exam,
-                            subject=subject_code
-                        ).delete()[0]
-                        continue
-
-                    try:
-                        score_value = float(raw_value)
-                    except (TypeError, ValueError) as exc:
-                        raise ScoreMutationServiceError(
-                            f"{subject_name_map.get(subject_code, subject_code)} 的分数格式不正确",
-                            400,
-                        ) from exc
-
-                    max_score = float(subject_max_scores.get(subject_code, 100))
-                    if score_value < 0 or score_value > max_score:
-                        raise ScoreMutationServiceError(
-                            f"{subject_name_map.get(subject_code, subject_code)} 的分数必须在0-{max_score:g}分之间",
-                            400,
-                        )
-
-                    score_obj, created = Score.objects.update_or_create(
-                        student=student,
-                        exam=exam,
-                        subject=subject_code,
-                        defaults={
-                            'score_value': score_value,
-                            'exam_subject': exam_subject_map.get(subject_code)
-                        }
+            for subject_code, _ in SCORE_SUBJECT_CHOICES:
+                raw_value = (scores or {}).get(subject_code)
+
+                if raw_value in [None, '']:
+                    cells[(student.pk, subject_code)] = None
+                    continue
+
+                try:
+                    score_value = float(raw_value)
+                except (TypeError, ValueError) as exc:
+                    raise ScoreMutationServiceError(
+                        f"{subject_name_map.get(subject_code, subject_code)} 的分数格式不正确",
+                        400,
+                    ) from exc
+
+                max_score = float(subject_max_scores.get(subject_code, 100))
+                if score_value < 0 or score_value > max_score:
+                    raise ScoreMutationServiceError(
+                        f"{subject_name_map.get(subject_code, subject_code)} 的分数必须在0-{max_score:g}分之间",
+                        400,
                     )
 
-                    score_obj.clean()
-                    score_obj.save()
+                cls._validate_score(subject_code, score_value, exam_subject_map.get(subject_code))
+                cells[(student.pk, subject_code)] = score_value
 
-                    if created:
-                        created_count += 1
-                    else:
-                        updated_count += 1
+            stats = cls.save_score_cells(exam, cells, existing_scores, exam_subject_map)
 
         except ScoreMutationServiceError:
             raise
         except Exception as exc:
             raise ScoreMutationServiceError(str(exc), 400) from exc
 
-        cls._trigger_ranking_update(exam.pk, student.grade_level)
+        # 值未变化的科目不写库也不触发排名，但仍计入修改数
+        if stats['changed_pairs']:
+            cls._trigger_ranking_update(exam.pk, student.cohort, changed_pairs=stats['changed_pairs'])
 
         return {
             'success': True,
             'message': '成功修改成绩！',
+            'created_count': stats['created_count'],
+            'updated_count': stats['updated_count'] + stats['unchanged_count'],
+            'deleted_count': stats['deleted_count'],
+        }
+
+    @classmethod
+    def save_score_cells(cls, exam, cells, existing, exam_subject_map):
+        """
+        按单元格写入一场考试的成绩：cells 为 {(学生主键, 科目): 分数}，分数为 None 表示删除该科目成绩。
+
+        existing 为 {(学生主键, 科目): Score}；分数与考试科目都未变化的单元格不写库。删除与写入在一个事务、
+        一个 ExamResultService.deferred() 内完成，汇总表按 (学生, 考试) 只刷新一次；排名更新由调用方登记。
+        返回 created_count / updated_count / unchanged_count / deleted_count 与变动的 changed_pairs。
+        """
+        to_write = []
+        to_delete = []
+        changed_pairs = []
+        created_count = updated_count = unchanged_count = 0
+        for (student_id, subject_code), score_value in cells.items():
+            current = existing.get((student_id, subject_code))
+            if score_value is None:
+                if current is not None:
+                    to_delete.append(current.pk)
+                    changed_pairs.append((student_id, subject_code))
+                continue
+            exam_subject = exam_subject_map.get(subject_code)
+            if current is None:
+                created_count += 1
+            elif (
+                current.score_value == Decimal(str(score_value))
+                and current.exam_subject_id == (exam_subject.pk if exam_subject else None)
+            ):
+                unchanged_count += 1
+                continue
+            else:
+                updated_count += 1
+            to_write.append(Score(
+                student_id=student_id,
+                exam=exam,
+                subject=subject_code,
+                score_value=score_value,
+                exam_subject=exam_subject,
+            ))
+            changed_pairs.append((student_id, subject_code))
+
+        if changed_pairs:
+            with transaction.atomic(), ExamResultService.deferred():
+                if to_delete:
+                    Score.objects.filter(pk__in=to_delete).delete()
+                if to_write:
+                    cls.upsert_scores(to_write)
+                ExamResultService.mark_changed({(student_id, exam.pk) for student_id, _ in changed_pairs})
+
+        return {
             'created_count': created_count,
             'updated_count': updated_count,
+            'unchanged_count': unchanged_count,
+            'deleted_count': len(to_delete),
+            'changed_pairs': changed_pairs,
+        }
+
+    @classmethod
+    def _delete_rows(cls, rows):
+        """
+        删除 rows（(主键, 考试ID, 届别, 学生ID, 科目)），按批删除后只对受影响的 (考试, 届别) 各登记一次排名。
+
+        返回删除总数与按考试统计的删除数。
+        """
+        deleted_count = 0
+        exam_counts = {}
+        changed = {}
+        with transaction.atomic(), ExamResultService.deferred():
+            for start in range(0, len(rows), SELECTION_CHUNK_SIZE):
+                batch = rows[start:start + SELECTION_CHUNK_SIZE]
+                deleted_count += Score.objects.filter(pk__in=[row[0] for row in batch]).delete()[0]
+        for _, exam_id, cohort, student_id, subject in rows:
+            exam_counts[exam_id] = exam_counts.get(exam_id, 0) + 1
+            changed.setdefault((exam_id, cohort), []).append((student_id, subject))
+
+        for (exam_id, cohort), changed_pairs in changed.items():
+            cls._trigger_ranking_update(exam_id, cohort, changed_pairs=changed_pairs)
+
+        return {
             'deleted_count': deleted_count,
+            'affected_exams': [
+                {'exam_id': exam_id, 'deleted_count': count} for exam_id, count in sorted(exam_counts.items())
+            ],
         }
+
+    @staticmethod
+    def _rows_to_delete(scores):
+        return list(
+            scores.order_by().values_list('pk', 'exam_id', 'student__cohort', 'student_id', 'subject')
+        )
+
+    @classmethod
+    def delete_selected(cls, scores, record_keys):
+        """
+        删除选中的 (学生, 考试) 记录（"学生主键_考试主键"）；scores 应已按用户权限限定范围。
+
+        记录按批转为集合条件，每批一次查询取出待删成绩，查询数与选中数量无关。
+        """
+        rows = []
+        for _, condition in ScoreQueryService.iter_selection_chunks(ScoreQueryService.parse_record_keys(record_keys)):
+            rows.extend(cls._rows_to_delete(scores.filter(condition)))
+        return cls._delete_rows(rows)
+
+    @classmethod
+    def delete_scores(cls, scores):
+        """删除 queryset 中的全部成绩（如服务端选择集），排名登记与 delete_selected 相同。"""
+        return cls._delete_rows(cls._rows_to_delete(scores))
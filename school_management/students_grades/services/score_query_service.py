@@ -1,13 +1,42 @@
+import base64
+import binascii
+import datetime
+import json
 from collections import defaultdict
+from types import SimpleNamespace
 
+from django.db.models import FloatField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.http import QueryDict
+
+from ..models.exam import Exam
 from ..models.score import Score, SUBJECT_CHOICES as SCORE_SUBJECT_CHOICES
-from ..models.student import GRADE_LEVEL_CHOICES
+from ..models.student import GRADE_LEVEL_CHOICES, Student
 from .score_access_service import ScoreAccessService
 
+# 默认顺序（也是所有排序的并列兜底）：学号、考试日期、考试ID，三者唯一确定一行
+BASE_ORDER_KEYS = [('student__student_id', False), ('exam__date', False), ('exam_id', False)]
+# 缺失名次/科目成绩在排序中的替代值，与 sort_rows 保持一致
+MISSING_RANK_SORT_VALUE = 999999
+MISSING_SCORE_SORT_VALUE = -1
+# 流式导出每批取出的 (学生, 考试) 行数
+EXPORT_CHUNK_SIZE = 1000
+# 按选中记录（"学生主键_考试主键"）处理时每批的记录数：每批按考试分组为 exam_id = ? AND student_id IN (...)，
+# 绑定参数约为记录数 + 考试数，留在 SQLite 旧版 999 个参数的上限内
+SELECTION_CHUNK_SIZE = 900
+
 
 class ScoreQueryService:
     """成绩查询聚合服务。"""
 
+    @staticmethod
+    def replay_request(params, user):
+        """用保存的参数（{参数名: [取值, ...]}）构造 filter_scores 所需的 request（query_params + user）。"""
+        query_params = QueryDict(mutable=True)
+        for key, values in params.items():
+            query_params.setlist(key, values)
+        return SimpleNamespace(query_params=query_params, user=user)
+
     @staticmethod
     def filter_scores(request):
         scores = Score.objects.select_related('student', 'student__current_class', 'exam').exclude(
@@ -151,3 +180,325 @@ class ScoreQueryService:
                 subject_set.update(row.get('scores', {}).keys())
             return [subject for subject in subject_order if subject in subject_set]
         return subject_order
+
+    @staticmethod
+    def present_subjects(scores):
+        """筛选结果中出现过的科目（DISTINCT 查询，只返回几行）。"""
+        return set(scores.order_by().values_list('subject', flat=True).distinct())
+
+    @staticmethod
+    def _pivot_subjects(present):
+        """透视列的科目顺序：先按 SUBJECT_CHOICES，再追加其他出现过的科目。"""
+        subject_order = [value for value, _ in SCORE_SUBJECT_CHOICES]
+        subjects = [subject for subject in subject_order if subject in present]
+        return subjects + sorted(present - set(subjects))
+
+    @staticmethod
+    def display_subjects(present, dynamic_subjects):
+        """与 resolve_subjects 相同的口径，但基于 present_subjects 的结果，无需先取出全部行。"""
+        subject_order = [value for value, _ in SCORE_SUBJECT_CHOICES]
+        if dynamic_subjects in ['1', 'true', 'True']:
+            return [subject for subject in subject_order if subject in present]
+        return subject_order
+
+    @staticmethod
+    def _subject_columns(subjects):
+        return {
+            subject: Max('score_value', filter=Q(subject=subject))
+            for subject in subjects
+        }
+
+    @staticmethod
+    def _sort_keys(request, subject_columns):
+        """
+        把排序参数翻译为 [(注解名, 是否降序)]，语义与 sort_rows 一致。
+
+        返回 (主排序注解表达式 dict, 排序键列表)；排序键末尾总是追加 BASE_ORDER_KEYS。
+        """
+        sort_by = request.query_params.get('sort_by')
+        subject_sort = request.query_params.get('subject_sort')
+        descending = request.query_params.get('sort_order', 'desc') == 'desc'
+        rank_key = Coalesce(Min('total_score_rank_in_grade'), Value(MISSING_RANK_SORT_VALUE))
+
+        annotations = {}
+        keys = []
+        if subject_sort:
+            if subject_sort == 'total_score':
+                keys.append(('total_score', descending))
+            elif subject_sort == 'grade_rank':
+                annotations['sort_rank'] = rank_key
+                keys.append(('sort_rank', descending))
+            elif subject_sort in subject_columns:
+                annotations['sort_subject'] = Coalesce(
+                    subject_columns[subject_sort],
+                    Value(MISSING_SCORE_SORT_VALUE),
+                    output_field=FloatField(),
+                )
+                keys.append(('sort_subject', descending))
+        elif sort_by in ('total_score_desc', 'total_score_asc'):
+            keys.append(('total_score', sort_by == 'total_score_desc'))
+        elif sort_by == 'student_name':
+            keys.append(('student__name', False))
+        elif sort_by == 'exam_date':
+            keys.append(('exam__date', True))
+        elif sort_by == 'grade_rank':
+            annotations['sort_rank'] = rank_key
+            keys.append(('sort_rank', False))
+
+        return annotations, keys + BASE_ORDER_KEYS
+
+    @staticmethod
+    def grouped_queryset(scores, subject_columns, sort_annotations):
+        """
+        在数据库中按 (学生, 考试) 分组：条件聚合透视各科成绩，并计算总分与总分年级排名。
+
+        subject_columns: {科目: 透视表达式}，按顺序输出为 subject_0、subject_1 ... 列。
+        """
+        pivot = {
+            f'subject_{index}': expression
+            for index, expression in enumerate(subject_columns.values())
+        }
+        return scores.order_by().values(
+            'student_id', 'exam_id', 'student__student_id', 'student__name', 'exam__date',
+        ).annotate(
+            total_score=Round(Sum('score_value'), 2, output_field=FloatField()),
+            grade_rank=Min('total_score_rank_in_grade'),
+            **pivot,
+            **sort_annotations,
+        )
+
+    @staticmethod
+    def _order_by(keys, reverse=False):
+        return [
+            f"{'-' if descending != reverse else ''}{name}"
+            for name, descending in keys
+        ]
+
+    @staticmethod
+    def _keyset_filter(keys, values, reverse=False):
+        """构造 "排在游标之后" 的条件：(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..."""
+        condition = Q()
+        equal_prefix = Q()
+        for (name, descending), value in zip(keys, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+            equal_prefix &= Q(**{name: value})
+        return condition
+
+    @staticmethod
+    def _encode_cursor(keys, row, page, direction):
+        values = []
+        for name, _ in keys:
+            value = row[name]
+            if isinstance(value, datetime.date):
+                value = value.isoformat()
+            elif value is not None and not isinstance(value, (int, str)):
+                value = float(value)
+            values.append(value)
+        payload = json.dumps({'v': values, 'p': page, 'd': direction}, ensure_ascii=False, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor, keys):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+            page = int(payload['p'])
+            direction = payload.get('d', 'next')
+            if len(values) != len(keys) or direction not in ('next', 'previous'):
+                raise ValueError
+            values = [
+                datetime.date.fromisoformat(value) if name == 'exam__date' else value
+                for (name, _), value in zip(keys, values)
+            ]
+        except (ValueError, KeyError, TypeError, binascii.Error, UnicodeError):
+            raise ValueError('cursor 无效，请从第一页重新查询')
+        return values, max(page, 1), direction
+
+    @staticmethod
+    def build_page_rows(grouped_rows, subjects):
+        """把分组查询结果补全学生、班级、考试信息，输出与 aggregate_rows 相同的行结构。"""
+        grade_label_map = {value: label for value, label in GRADE_LEVEL_CHOICES}
+        students = Student.objects.select_related('current_class').in_bulk(
+            {row['student_id'] for row in grouped_rows}
+        )
+        exams = Exam.objects.in_bulk({row['exam_id'] for row in grouped_rows})
+
+        rows = []
+        for row in grouped_rows:
+            student = students[row['student_id']]
+            class_obj = student.current_class
+            exam = exams[row['exam_id']]
+            scores = {}
+            for index, subject in enumerate(subjects):
+                value = row[f'subject_{index}']
+                if value is not None:
+                    scores[subject] = float(value)
+            rows.append({
+                'record_key': f"{student.pk}_{exam.pk}",
+                'student_id': student.pk,
+                'exam_id': exam.pk,
+                'student': {
+                    'student_id': student.student_id,
+                    'name': student.name,
+                    'cohort': student.cohort or '',
+                    'grade_level': student.grade_level,
+                    'grade_level_display': grade_label_map.get(student.grade_level, student.grade_level),
+                },
+                'class': {
+                    'class_name': class_obj.class_name if class_obj else None,
+                },
+                'exam': {
+                    'id': exam.pk,
+                    'name': exam.name,
+                    'academic_year': exam.academic_year,
+                    'date': exam.date.strftime('%Y-%m-%d') if exam.date else '',
+                },
+                'scores': scores,
+                'total_score': round(float(row['total_score'] or 0), 2),
+                'grade_rank': row['grade_rank'],
+            })
+        return rows
+
+    @classmethod
+    def paginate(cls, scores, request, page_size):
+        """
+        成绩列表分页：分组、透视、总分、排序都在数据库完成，每页只取 page_size 行。
+
+        - 传 cursor（上一次响应中的 next_cursor / previous_cursor）时按键集分页，
+          开销与页码无关；
+        - 否则按 page 页码取（LIMIT/OFFSET），兼容原有前端。
+        count / num_pages 来自单独的 COUNT(DISTINCT 学生, 考试) 查询。
+        cursor 无效时抛出 ValueError。
+        """
+        present = cls.present_subjects(scores)
+        subjects = cls._pivot_subjects(present)
+        all_subjects = cls.display_subjects(present, request.query_params.get('dynamic_subjects'))
+
+        subject_columns = cls._subject_columns(subjects)
+        sort_annotations, keys = cls._sort_keys(request, subject_columns)
+        grouped = cls.grouped_queryset(scores, subject_columns, sort_annotations)
+
+        count = scores.order_by().values('student_id', 'exam_id').distinct().count()
+        num_pages = max((count - 1) // page_size + 1, 1)
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            values, page, direction = cls._decode_cursor(cursor, keys)
+            reverse = direction == 'previous'
+            queryset = grouped.filter(cls._keyset_filter(keys, values, reverse=reverse))
+            page_rows = list(queryset.order_by(*cls._order_by(keys, reverse=reverse))[:page_size])
+            if reverse:
+                page_rows.reverse()
+        else:
+            try:
+                page = int(request.query_params.get('page', '1'))
+            except (TypeError, ValueError):
+                page = 1
+            # 与 Paginator.get_page 一致：越界页码回落到首页/末页
+            page = min(max(page, 1), num_pages)
+            offset = (page - 1) * page_size
+            page_rows = list(grouped.order_by(*cls._order_by(keys))[offset:offset + page_size])
+
+        page = min(page, num_pages)
+        has_previous = page > 1
+        has_next = page < num_pages
+        start_index = (page - 1) * page_size + 1 if page_rows else 0
+
+        return {
+            'count': count,
+            'num_pages': num_pages,
+            'current_page': page,
+            'has_previous': has_previous,
+            'has_next': has_next,
+            'previous_page': page - 1 if has_previous else None,
+            'next_page': page + 1 if has_next else None,
+            'start_index': start_index,
+            'end_index': start_index + len(page_rows) - 1 if page_rows else 0,
+            'page_size': page_size,
+            'next_cursor': (
+                cls._encode_cursor(keys, page_rows[-1], page + 1, 'next') if has_next and page_rows else None
+            ),
+            'previous_cursor': (
+                cls._encode_cursor(keys, page_rows[0], page - 1, 'previous') if has_previous and page_rows else None
+            ),
+            'results': cls.build_page_rows(page_rows, subjects),
+            'all_subjects': all_subjects,
+        }
+
+    @classmethod
+    def iter_export_rows(cls, scores, request=None, chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        逐批产出导出行（行结构同 aggregate_rows），内存占用只与 chunk_size 有关。
+
+        每批在数据库中分组透视 chunk_size 个 (学生, 考试)，批与批之间按键集续取；
+        传 request 时按其排序参数排序（语义同 sort_rows），否则按学号、考试日期排序。
+        """
+        subjects = cls._pivot_subjects(cls.present_subjects(scores))
+        subject_columns = cls._subject_columns(subjects)
+        if request is not None:
+            sort_annotations, keys = cls._sort_keys(request, subject_columns)
+        else:
+            sort_annotations, keys = {}, list(BASE_ORDER_KEYS)
+        grouped = cls.grouped_queryset(scores, subject_columns, sort_annotations).order_by(*cls._order_by(keys))
+
+        last_values = None
+        while True:
+            queryset = grouped if last_values is None else grouped.filter(cls._keyset_filter(keys, last_values))
+            chunk = list(queryset[:chunk_size])
+            if not chunk:
+                return
+            yield from cls.build_page_rows(chunk, subjects)
+            if len(chunk) < chunk_size:
+                return
+            last_values = [chunk[-1][name] for name, _ in keys]
+
+    @staticmethod
+    def parse_record_keys(record_keys):
+        """记录键列表 → 去重后的 (学生主键, 考试主键)，保持原顺序；格式不正确的跳过。"""
+        pairs = {}
+        for record in record_keys or []:
+            try:
+                student_id, exam_id = (int(part) for part in str(record).split('_'))
+            except ValueError:
+                continue
+            pairs.setdefault((student_id, exam_id), None)
+        return list(pairs)
+
+    @staticmethod
+    def selection_condition(pairs):
+        """一批 (学生, 考试) → 按考试分组的集合条件（每场考试一个 student_id IN），而不是逐对 OR。"""
+        students_by_exam = defaultdict(list)
+        for student_id, exam_id in pairs:
+            students_by_exam[exam_id].append(student_id)
+        condition = Q()
+        for exam_id, student_ids in students_by_exam.items():
+            condition |= Q(exam_id=exam_id, student_id__in=student_ids)
+        return condition
+
+    @classmethod
+    def iter_selection_chunks(cls, pairs, chunk_size=SELECTION_CHUNK_SIZE):
+        """按参数上限分批，产出 (该批记录, 集合条件)。"""
+        for start in range(0, len(pairs), chunk_size):
+            batch = pairs[start:start + chunk_size]
+            yield batch, cls.selection_condition(batch)
+
+    @classmethod
+    def iter_selected_export_rows(cls, scores, record_keys, chunk_size=SELECTION_CHUNK_SIZE):
+        """
+        按前端选中的记录键（"学生主键_考试主键"）逐批产出导出行，顺序与 record_keys 一致。
+
+        格式不正确的记录键跳过；scores 应已按用户权限限定范围。
+        """
+        for batch, condition in cls.iter_selection_chunks(cls.parse_record_keys(record_keys), chunk_size):
+            batch_scores = scores.filter(condition)
+
+            subjects = cls._pivot_subjects(cls.present_subjects(batch_scores))
+            grouped_rows = list(cls.grouped_queryset(batch_scores, cls._subject_columns(subjects), {}))
+            rows_by_pair = {
+                (row['student_id'], row['exam_id']): row
+                for row in cls.build_page_rows(grouped_rows, subjects)
+            }
+            for pair in batch:
+                if pair in rows_by_pair:
+                    yield rows_by_pair[pair]
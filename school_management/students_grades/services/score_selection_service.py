@@ -0,0 +1,144 @@
+import datetime
+import secrets
+
+from django.utils import timezone
+
+from ..config import SELECTION_CONFIG
+from ..models.score import Score
+from ..models.score_selection import ScoreSelection
+from .export_job_service import ExportJobService
+from .score_access_service import ScoreAccessService
+from .score_query_service import ScoreQueryService
+
+
+class ScoreSelectionServiceError(Exception):
+    """成绩选择集服务异常。"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class ScoreSelectionService:
+    """
+    服务端成绩选择集：前端不再取回并回传全部记录键，而是持有一个 token。
+
+    选择集 = 保存的筛选条件 - exclude_keys + include_keys。每次使用时按创建人当前的
+    ScoreAccessService 权限范围重新计算，只有创建人可以使用；过期后自动失效并在新建时顺带清理。
+    """
+
+    TTL_SECONDS = SELECTION_CONFIG['TTL_SECONDS']
+    MAX_DELTA_KEYS = SELECTION_CONFIG['MAX_DELTA_KEYS']
+
+    @staticmethod
+    def _clean_keys(keys):
+        """记录键 → 规范化的 "学生主键_考试主键" 列表（去重、去掉格式不正确的）。"""
+        if keys in (None, ''):
+            return []
+        if not isinstance(keys, (list, tuple)):
+            raise ScoreSelectionServiceError('记录键格式不正确', 400)
+        return [f'{student_id}_{exam_id}' for student_id, exam_id in ScoreQueryService.parse_record_keys(keys)]
+
+    @staticmethod
+    def _merge_keys(current, added, removed):
+        removed = set(removed)
+        merged = [key for key in current if key not in removed]
+        seen = set(merged)
+        for key in added:
+            if key not in seen:
+                merged.append(key)
+                seen.add(key)
+        return merged
+
+    @classmethod
+    def _apply_deltas(cls, selection, include, exclude):
+        include = cls._clean_keys(include)
+        exclude = cls._clean_keys(exclude)
+        # 同一记录后一次操作生效：勾选时从 exclude 移除，取消勾选时从 include 移除
+        selection.include_keys = cls._merge_keys(selection.include_keys, include, exclude)
+        selection.exclude_keys = cls._merge_keys(selection.exclude_keys, exclude, include)
+        if len(selection.include_keys) + len(selection.exclude_keys) > cls.MAX_DELTA_KEYS:
+            raise ScoreSelectionServiceError(
+                f'手动勾选/取消的记录过多（超过 {cls.MAX_DELTA_KEYS} 条），请调整筛选条件', 400
+            )
+
+    @staticmethod
+    def evict_expired(now=None):
+        """删除过期的选择集，返回删除数量。"""
+        return ScoreSelection.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
+
+    @classmethod
+    def create(cls, user, query_params, include=None, exclude=None):
+        now = timezone.now()
+        cls.evict_expired(now)
+
+        selection = ScoreSelection(
+            token=secrets.token_urlsafe(24),
+            created_by=user,
+            params=ExportJobService.normalize_params(query_params),
+            include_keys=[],
+            exclude_keys=[],
+            expires_at=now + datetime.timedelta(seconds=cls.TTL_SECONDS),
+        )
+        cls._apply_deltas(selection, include, exclude)
+        selection.save()
+        return selection
+
+    @staticmethod
+    def get(user, token):
+        selection = ScoreSelection.objects.filter(
+            token=str(token or ''),
+            created_by=user,
+            expires_at__gt=timezone.now(),
+        ).first()
+        if selection is None:
+            raise ScoreSelectionServiceError('选择已过期或不存在，请重新选择', 404)
+        return selection
+
+    @classmethod
+    def update(cls, user, token, include=None, exclude=None):
+        """追加勾选/取消的记录，并顺延有效期。"""
+        selection = cls.get(user, token)
+        cls._apply_deltas(selection, include, exclude)
+        selection.expires_at = timezone.now() + datetime.timedelta(seconds=cls.TTL_SECONDS)
+        selection.save(update_fields=['include_keys', 'exclude_keys', 'expires_at', 'updated_at'])
+        return selection
+
+    @classmethod
+    def discard(cls, user, token):
+        cls.get(user, token).delete()
+
+    @classmethod
+    def scores(cls, selection, user):
+        """选择集对应的成绩 queryset（已按 user 当前权限范围限定）。"""
+        scores = ScoreQueryService.filter_scores(ScoreQueryService.replay_request(selection.params, user))
+
+        exclude_pairs = ScoreQueryService.parse_record_keys(selection.exclude_keys)
+        if exclude_pairs:
+            scores = scores.exclude(ScoreQueryService.selection_condition(exclude_pairs))
+
+        include_pairs = ScoreQueryService.parse_record_keys(selection.include_keys)
+        if include_pairs:
+            included = ScoreAccessService.scope_scores(
+                user,
+                Score.objects.filter(ScoreQueryService.selection_condition(include_pairs)),
+            )
+            scores = scores | included
+        return scores
+
+    @classmethod
+    def resolve(cls, user, token):
+        """token → 成绩 queryset；供批量删除/导出使用。"""
+        return cls.scores(cls.get(user, token), user)
+
+    @classmethod
+    def serialize(cls, selection, user):
+        count = cls.scores(selection, user).values('student_id', 'exam_id').distinct().count()
+        return {
+            'token': selection.token,
+            'count': count,
+            'include_count': len(selection.include_keys),
+            'exclude_count': len(selection.exclude_keys),
+            'expires_at': selection.expires_at.isoformat(),
+        }
@@ -1,66 +1,127 @@
+import tempfile
+
 import openpyxl
 
 from ..models.score import SUBJECT_CHOICES as SCORE_SUBJECT_CHOICES
 
+EXPORT_BASE_HEADERS = ["学号", "学生姓名", "届别", "年级", "班级", "考试名称", "学年", "考试日期"]
+QUERY_EXPORT_BASE_HEADERS = ["学号", "学生姓名", "入学级别", "年级", "班级", "考试名称", "学年", "考试日期"]
+TARGET_STUDENT_HEADERS = ["学号", "学生姓名", "届别", "年级", "班级", "命中次数", "应达标次数", "参考次数", "缺考次数", "平均名次", "平均值"]
+
+# 导出文件分块写出时每块的字节数
+STREAM_CHUNK_BYTES = 64 * 1024
+
 
 class ScoreWorkbookService:
     """成绩导出工作簿构建服务。"""
 
     @staticmethod
-    def build_export_workbook(rows):
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "成绩导出"
+    def _base_cells(row):
+        return [
+            row['student']['student_id'],
+            row['student']['name'],
+            row['student']['cohort'],
+            row['student']['grade_level_display'],
+            row['class']['class_name'] or "N/A",
+            row['exam']['name'],
+            row['exam']['academic_year'] or "N/A",
+            row['exam']['date'] or "",
+        ]
 
+    @staticmethod
+    def _subject_cells(row, all_subjects):
+        cells = []
+        for subject in all_subjects:
+            value = row['scores'].get(subject)
+            cells.append(value if value is not None else "-")
+        return cells
+
+    @classmethod
+    def _export_sheet_rows(cls, rows):
         all_subjects = [subject_code for subject_code, _ in SCORE_SUBJECT_CHOICES]
-        headers = ["学号", "学生姓名", "届别", "年级", "班级", "考试名称", "学年", "考试日期"] + all_subjects
-        sheet.append(headers)
+        yield EXPORT_BASE_HEADERS + all_subjects
+        for row in rows:
+            yield cls._base_cells(row) + cls._subject_cells(row, all_subjects)
 
+    @classmethod
+    def _query_export_sheet_rows(cls, rows, all_subjects):
+        yield QUERY_EXPORT_BASE_HEADERS + all_subjects + ["总分", "年级排名"]
         for row in rows:
-            output_row = [
-                row['student']['student_id'],
-                row['student']['name'],
-                row['student']['cohort'],
-                row['student']['grade_level_display'],
-                row['class']['class_name'] or "N/A",
-                row['exam']['name'],
-                row['exam']['academic_year'] or "N/A",
-                row['exam']['date'] or "",
+            yield cls._base_cells(row) + cls._subject_cells(row, all_subjects) + [
+                row.get('total_score', 0),
+                row.get('grade_rank') if row.get('grade_rank') is not None else "-",
             ]
-            for subject in all_subjects:
-                value = row['scores'].get(subject)
-                output_row.append(value if value is not None else "-")
-            sheet.append(output_row)
 
-        return workbook
+    @staticmethod
+    def _target_student_sheet_rows(students):
+        yield TARGET_STUDENT_HEADERS
+        for item in students:
+            yield [
+                item["student_id"],
+                item["name"],
+                item["cohort"],
+                item["grade_level_display"] or "",
+                item["class_name"] or "N/A",
+                item["hit_count"],
+                item["required_count"] if item["required_count"] is not None else "-",
+                item["participated_count"] if item["participated_count"] is not None else "-",
+                item["missed_exam_count"] if item["missed_exam_count"] is not None else "-",
+                item["avg_rank"] if item["avg_rank"] is not None else "-",
+                item["avg_value"] if item.get("avg_value") is not None else "-",
+            ]
 
     @staticmethod
-    def build_query_export_workbook(rows, all_subjects):
+    def _build_workbook(title, sheet_rows):
         workbook = openpyxl.Workbook()
         sheet = workbook.active
-        sheet.title = "成绩查询导出"
+        sheet.title = title
+        for cells in sheet_rows:
+            sheet.append(cells)
+        return workbook
 
-        headers = ["学号", "学生姓名", "入学级别", "年级", "班级", "考试名称", "学年", "考试日期"] + all_subjects + ["总分", "年级排名"]
-        sheet.append(headers)
+    @staticmethod
+    def _workbook_chunks(title, sheet_rows):
+        """
+        以 write_only 模式逐行写入工作表，保存到临时文件后分块产出字节。
 
-        for row in rows:
-            output_row = [
-                row['student']['student_id'],
-                row['student']['name'],
-                row['student']['cohort'],
-                row['student']['grade_level_display'],
-                row['class']['class_name'] or "N/A",
-                row['exam']['name'],
-                row['exam']['academic_year'] or "N/A",
-                row['exam']['date'] or "",
-            ]
+        write_only 工作表把已追加的行写到磁盘，不在内存中保留单元格对象，
+        因此内存占用只与上游每批取出的行数有关。
+        注意这不是流式生成：xlsx 的工作表要在全部行写完后才能打包，第一个字节
+        仍要等整个工作簿生成完毕才产出，首字节时间与一次性生成相同。
+        """
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(title)
+        for cells in sheet_rows:
+            sheet.append(cells)
 
-            for subject in all_subjects:
-                value = row['scores'].get(subject)
-                output_row.append(value if value is not None else "-")
+        with tempfile.TemporaryFile() as buffer:
+            workbook.save(buffer)
+            buffer.seek(0)
+            while True:
+                chunk = buffer.read(STREAM_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
 
-            output_row.append(row.get('total_score', 0))
-            output_row.append(row.get('grade_rank') if row.get('grade_rank') is not None else "-")
-            sheet.append(output_row)
+    @classmethod
+    def build_export_workbook(cls, rows):
+        return cls._build_workbook("成绩导出", cls._export_sheet_rows(rows))
 
-        return workbook
+    @classmethod
+    def build_query_export_workbook(cls, rows, all_subjects):
+        return cls._build_workbook("成绩查询导出", cls._query_export_sheet_rows(rows, all_subjects))
+
+    @classmethod
+    def export_workbook_chunks(cls, rows):
+        """build_export_workbook 的低内存版本：rows 可以是逐批产出的迭代器，返回 xlsx 字节块迭代器。"""
+        return cls._workbook_chunks("成绩导出", cls._export_sheet_rows(rows))
+
+    @classmethod
+    def query_export_workbook_chunks(cls, rows, all_subjects):
+        """build_query_export_workbook 的低内存版本，列布局相同。"""
+        return cls._workbook_chunks("成绩查询导出", cls._query_export_sheet_rows(rows, all_subjects))
+
+    @classmethod
+    def target_students_workbook_chunks(cls, students):
+        """目标生筛选结果导出，students 为结果集中的学生行，返回 xlsx 字节块迭代器。"""
+        return cls._workbook_chunks("目标生筛选结果", cls._target_student_sheet_rows(students))
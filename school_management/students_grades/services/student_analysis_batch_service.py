@@ -0,0 +1,180 @@
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from ..models.score import SUBJECT_CHOICES as SCORE_SUBJECT_CHOICES
+from ..models.student import Student
+from .score_access_service import ScoreAccessService
+from .score_analysis_service import ScoreAnalysisService
+from .student_analysis_export import StudentAnalysisExportService
+
+
+class StudentAnalysisBatchServiceError(Exception):
+    """批量个人分析报告导出异常。"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _init_report_worker():
+    # spawn 方式启动的子进程需要先初始化 Django（fork 方式下为空操作）
+    import django
+
+    django.setup()
+
+
+def _render_report(item):
+    """
+    生成单个学生的工作簿（可在子进程中执行）：item 为 (zip 内文件名, payload)，返回 (文件名, 字节)。
+
+    item 为 None（该学生被跳过）时返回 None。
+    """
+    if item is None:
+        return None
+    arcname, payload = item
+    buffer = BytesIO()
+    StudentAnalysisExportService.build_workbook(payload).save(buffer)
+    return arcname, buffer.getvalue()
+
+
+class _ChunkSink:
+    """zip 的写入目标：暂存已写出的字节，由 stream_zip 每写完一个文件取走一次。"""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+class StudentAnalysisBatchService:
+    """
+    班级/届别批量导出个人成绩分析报告（zip）。
+
+    学生、成绩、考试及考试科目按批集合查询加载，每批学生只需固定几条查询。
+    后台导出任务中各学生的工作簿在进程池中并行生成；同步请求在当前进程生成，
+    人数超过 SYNC_MAX_STUDENTS 时转为后台导出任务，不在 Web 进程里启动进程池。
+    """
+
+    # 每批加载的学生数
+    STUDENT_CHUNK_SIZE = 200
+    # 后台任务的进程池大小；人数少于 POOL_THRESHOLD 时直接在当前进程生成
+    MAX_WORKERS = min(4, os.cpu_count() or 1)
+    POOL_THRESHOLD = 8
+    # 同步请求最多导出的人数，超过时转为后台导出任务
+    SYNC_MAX_STUDENTS = 100
+
+    @staticmethod
+    def parse_exam_ids(exam_ids):
+        """'1,2,3' → [1, 2, 3]；未传时返回 None（每个学生取其全部考试）。"""
+        if not exam_ids:
+            return None
+        try:
+            return [int(item) for item in str(exam_ids).split(',') if item.strip()]
+        except ValueError as exc:
+            raise StudentAnalysisBatchServiceError('考试参数格式错误', 400) from exc
+
+    @staticmethod
+    def resolve_students(user, class_id=None, cohort=None):
+        """按班级或届别取在读学生（受用户权限范围限制），按学号排序。"""
+        if not class_id and not cohort:
+            raise StudentAnalysisBatchServiceError('请指定班级或届别', 400)
+
+        students = Student.objects.select_related('current_class').exclude(status='毕业')
+        if class_id:
+            students = students.filter(current_class_id=class_id)
+        if cohort:
+            students = students.filter(current_class__cohort=cohort)
+        return ScoreAccessService.scope_students(user, students).order_by('student_id')
+
+    @classmethod
+    def iter_report_items(cls, students, exam_ids=None):
+        """
+        逐批为每个学生产出 (zip 内文件名, 导出 payload)。
+
+        没有考试或数据不足以导出的学生产出 None，保证产出项与学生一一对应，便于按学生计进度。
+        """
+        students = list(students)
+        for start in range(0, len(students), cls.STUDENT_CHUNK_SIZE):
+            chunk = students[start:start + cls.STUDENT_CHUNK_SIZE]
+            analysis_by_student = ScoreAnalysisService.load_students_analysis_data(chunk, exam_ids)
+            for student in chunk:
+                analysis_data = analysis_by_student.get(student.pk)
+                if analysis_data is None:
+                    yield None
+                    continue
+                try:
+                    payload = StudentAnalysisExportService.build_payload(analysis_data, SCORE_SUBJECT_CHOICES)
+                except ValueError:
+                    yield None
+                    continue
+                filename = StudentAnalysisExportService.build_filename(payload.get('student_info') or {}, None)
+                # 学号前缀避免同名学生的文件互相覆盖
+                yield f'{student.student_id}_{filename}', payload
+
+    @classmethod
+    def _write_reports(cls, archive, students, exam_ids, progress_callback, max_workers):
+        """
+        逐个学生生成工作簿并写入 archive，每处理一个学生产出一次（被跳过的学生产出 None）。
+
+        progress_callback(processed, total) 按已处理的学生数调用，被跳过的学生同样计入。
+        """
+        total = len(students)
+        items = cls.iter_report_items(students, exam_ids)
+        if max_workers > 1 and total >= cls.POOL_THRESHOLD:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_report_worker) as executor:
+                reports = executor.map(_render_report, items, chunksize=4)
+                yield from cls._write_rendered(archive, reports, total, progress_callback)
+        else:
+            yield from cls._write_rendered(archive, map(_render_report, items), total, progress_callback)
+
+    @staticmethod
+    def _write_rendered(archive, reports, total, progress_callback):
+        for processed, report in enumerate(reports, start=1):
+            if report is not None:
+                archive.writestr(*report)
+            if progress_callback:
+                progress_callback(processed, total)
+            yield report
+
+    @classmethod
+    def write_zip(cls, fileobj, students, exam_ids=None, progress_callback=None, max_workers=1):
+        """
+        把每个学生的工作簿写入 zip；返回写入的报告数。
+
+        max_workers > 1 时使用进程池，只应在后台导出任务中传入（见 MAX_WORKERS）。
+        """
+        students = list(students)
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as archive:
+            reports = cls._write_reports(archive, students, exam_ids, progress_callback, max_workers)
+            return sum(1 for report in reports if report is not None)
+
+    @classmethod
+    def stream_zip(cls, students, exam_ids=None, progress_callback=None, max_workers=1):
+        """
+        边生成边产出 zip 字节，供 StreamingHttpResponse 与后台导出任务使用。
+
+        zip 写入不可 seek 的目标时使用数据描述符记录各文件长度，因此每写完一个学生的
+        工作簿就能把这部分字节发出去：首字节只需等第一批数据加载和第一份工作簿，不需要临时文件。
+        """
+        students = list(students)
+        sink = _ChunkSink()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for _ in cls._write_reports(archive, students, exam_ids, progress_callback, max_workers):
+                chunk = sink.take()
+                if chunk:
+                    yield chunk
+        # 关闭时写出的中央目录
+        yield sink.take()
@@ -1,3 +1,4 @@
+import openpyxl
 from django.utils import timezone
 from openpyxl.chart import BarChart, LineChart, Reference
 from openpyxl.chart.label import DataLabelList
@@ -723,6 +724,16 @@ class StudentAnalysisExportService:
         except Exception:
             cls._write_chart_notice(sheet, f"A{sheet.max_row + 3}", "图表生成失败，请联系管理员", is_error=True)
 
+    @classmethod
+    def build_workbook(cls, payload):
+        """按 payload 生成完整的个人分析报告工作簿（总览、总分趋势、科目明细、科目趋势）。"""
+        workbook = openpyxl.Workbook()
+        cls.build_overview_sheet(workbook, payload)
+        cls.build_total_trend_sheet(workbook, payload)
+        cls.build_subject_detail_sheet(workbook, payload)
+        cls.build_subject_trend_sheet(workbook, payload)
+        return workbook
+
     @staticmethod
     def build_filename(student_info, timestamp):
         del timestamp  # 当前命名规则不包含时间戳
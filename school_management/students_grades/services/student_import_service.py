@@ -0,0 +1,436 @@
+import datetime
+import re
+
+import openpyxl
+from django.db import transaction
+
+from ..config import IMPORT_CONFIG
+from ..models.student import Class, Student
+from .analysis_cache_service import AnalysisCacheService
+from .score_access_service import ScoreAccessService
+
+# Excel 标题 → 模型字段（以下划线开头的为中间字段，不直接写入模型）
+HEADER_MAPPING = {
+    "学号 (必填)": "student_id",
+    "姓名 (必填)": "name",
+    "性别 (男/女)": "gender",
+    "出生日期 (YYYY-MM-DD)": "date_of_birth",
+    "年级 (初一/初二/初三/高一/高二/高三)": "grade_level",
+    "学段 (初中/高中)": "_section",
+    "届别年份 (纯数字，如2026)": "_cohort_year",
+    "班级名称 (1班-20班)": "class_name",
+    "在校状态 (在读/转学/休学/复学/毕业)": "status",
+    "身份证号码": "id_card_number",
+    "学籍号": "student_enrollment_number",
+    "家庭地址": "home_address",
+    "监护人姓名": "guardian_name",
+    "监护人联系电话": "guardian_contact_phone",
+    "入学日期 (YYYY-MM-DD)": "entry_date",
+    "毕业日期 (YYYY-MM-DD)": "graduation_date",
+}
+
+GENDER_MAPPING = {
+    '男': '男', 'M': '男', 'Male': '男', 'male': '男', '1': '男',
+    '女': '女', 'F': '女', 'Female': '女', 'female': '女', '0': '女'
+}
+
+DATE_FIELDS = ['date_of_birth', 'entry_date', 'graduation_date']
+
+# 支持 YYYY-MM-DD / YYYY/MM/DD / YYYY.MM.DD，月日可不补零
+_DATE_PATTERN = re.compile(r'^(\d{4})([-/.])(\d{1,2})\2(\d{1,2})$')
+
+
+class StudentImportServiceError(Exception):
+    """学生导入服务异常。"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class StudentImportService:
+    """
+    学生批量导入服务（同步请求与异步导入任务共用）。
+
+    按块处理：先一次性解析并预加载本块涉及的班级（缺失的批量创建），
+    再按学号批量 bulk_create / bulk_update 学生。某块批量写入触发唯一约束等
+    数据库错误时，该块退回逐行写入，以便准确定位出错行，报告格式不变。
+    """
+
+    CHUNK_SIZE = IMPORT_CONFIG['BATCH_SIZE']
+    PROGRESS_INTERVAL = IMPORT_CONFIG['PROGRESS_INTERVAL']
+    # 关闭后每块都逐行写入（旧实现的行为），用于排查问题与基准对比
+    BULK_WRITE = True
+    # bulk_update 生成 CASE WHEN 语句，单条语句行数过多时数据库逐行匹配开销明显
+    UPDATE_BATCH_SIZE = 100
+
+    @staticmethod
+    def _parse_date(date_value, date_cache):
+        """解析日期单元格，返回 (date 或 None, 是否有效)；相同的日期字符串只解析一次。"""
+        if isinstance(date_value, datetime.datetime):
+            return date_value.date(), True
+        if isinstance(date_value, datetime.date):
+            return date_value, True
+
+        date_str = str(date_value).strip()
+        if date_str not in date_cache:
+            parsed = None
+            match = _DATE_PATTERN.match(date_str)
+            if match:
+                try:
+                    parsed = datetime.date(int(match.group(1)), int(match.group(3)), int(match.group(4)))
+                except ValueError:
+                    parsed = None
+            date_cache[date_str] = parsed
+        parsed = date_cache[date_str]
+        return parsed, parsed is not None
+
+    @classmethod
+    def _parse_row(cls, row_idx, row_data, warning_messages, date_cache):
+        """把一行 Excel 数据转换为学生字段字典（含 _class_name），必填缺失时抛 ValueError。"""
+        student_data = {}
+        for excel_header, model_field in HEADER_MAPPING.items():
+            if excel_header in row_data:
+                student_data[model_field] = row_data[excel_header]
+
+        if not student_data.get('student_id') or not student_data.get('name'):
+            raise ValueError("学号和姓名为必填字段")
+
+        student_data['student_id'] = str(student_data['student_id']).strip()
+
+        if student_data.get('id_card_number'):
+            student_data['id_card_number'] = str(student_data['id_card_number']).strip()
+        # 学籍号：空字符串也设为None，避免唯一约束冲突
+        enrollment = student_data.get('student_enrollment_number')
+        if enrollment and str(enrollment).strip():
+            student_data['student_enrollment_number'] = str(enrollment).strip()
+        else:
+            student_data['student_enrollment_number'] = None
+
+        for date_field in DATE_FIELDS:
+            date_value = student_data.get(date_field)
+            if date_value is None or str(date_value).strip() == '':
+                student_data[date_field] = None
+                continue
+            parsed, valid = cls._parse_date(date_value, date_cache)
+            student_data[date_field] = parsed
+            if not valid:
+                warning_messages.append(f"第 {row_idx} 行的 '{date_field}' 日期格式不正确 (值: '{date_value}')")
+
+        if 'gender' in student_data and student_data['gender']:
+            gender_value = str(student_data['gender']).strip()
+            student_data['gender'] = GENDER_MAPPING.get(gender_value, gender_value)
+            if student_data['gender'] not in ['男', '女']:
+                warning_messages.append(f"第 {row_idx} 行的性别值 '{gender_value}' 无效，已设置为空")
+                student_data['gender'] = None
+
+        # 处理学段 + 届别年份 → cohort
+        # grade_level 直接从 Excel 读取（传统格式如"初一"）
+        # cohort = section + cohort_year + "级"（如"初中2024级"）
+        section = student_data.pop('_section', None)
+        cohort_year = student_data.pop('_cohort_year', None)
+        if section and cohort_year:
+            student_data['cohort'] = f"{section}{str(cohort_year).strip()}级"
+
+        student_data['_class_name'] = student_data.pop('class_name', None)
+        return student_data
+
+    @staticmethod
+    def _class_key(student_data):
+        # 使用 grade_level + class_name 作为查找键，确保正确匹配
+        return (student_data.get('grade_level', ''), student_data['_class_name'])
+
+    @classmethod
+    def _resolve_classes(cls, parsed_rows, class_cache, report):
+        """
+        预加载本块所需班级：一次查询已有班级，缺失的批量创建，空 cohort 批量补全。
+
+        class_cache: {(grade_level, class_name): Class 或 错误信息字符串}，跨块复用。
+        """
+        rows_with_class = [
+            (row_idx, student_data)
+            for row_idx, student_data in parsed_rows
+            if student_data['_class_name']
+        ]
+        missing_keys = {cls._class_key(data) for _, data in rows_with_class} - set(class_cache)
+
+        if missing_keys:
+            candidates = {}
+            for class_obj in Class.objects.filter(class_name__in={class_name for _, class_name in missing_keys}):
+                key = (class_obj.grade_level, class_obj.class_name)
+                if key in missing_keys:
+                    candidates.setdefault(key, []).append(class_obj)
+
+            to_create = {}
+            for key in missing_keys:
+                matched = candidates.get(key, [])
+                if len(matched) == 1:
+                    class_cache[key] = matched[0]
+                elif len(matched) > 1:
+                    class_cache[key] = f"班级创建/查找失败: 匹配到 {len(matched)} 个 {key[0]}{key[1]} 班级"
+
+            # 新班级的 cohort 取文件中第一行出现该班级的学生的 cohort
+            for _, student_data in rows_with_class:
+                key = cls._class_key(student_data)
+                if key not in class_cache and key not in to_create:
+                    to_create[key] = Class(
+                        grade_level=key[0],
+                        class_name=key[1],
+                        cohort=student_data.get('cohort', ''),
+                    )
+
+            if to_create:
+                cls._create_classes(to_create, class_cache, report)
+
+        # 如果已存在但 cohort 为空，自动补全 cohort
+        classes_to_fill = {}
+        for row_idx, student_data in rows_with_class:
+            class_obj = class_cache.get(cls._class_key(student_data))
+            if isinstance(class_obj, Class) and not class_obj.cohort and student_data.get('cohort'):
+                class_obj.cohort = student_data['cohort']
+                classes_to_fill[class_obj.pk] = class_obj
+                report['warning_messages'].append(
+                    f"第 {row_idx} 行：班级 {student_data.get('grade_level', '')}{class_obj.class_name} 的 cohort 已自动补全为 {class_obj.cohort}"
+                )
+        if classes_to_fill:
+            Class.objects.bulk_update(list(classes_to_fill.values()), ['cohort'])
+
+    @staticmethod
+    def _create_classes(to_create, class_cache, report):
+        """批量创建班级；批量失败（如届别+班名冲突）时逐个创建以定位失败的班级。"""
+        try:
+            with transaction.atomic():
+                Class.objects.bulk_create(list(to_create.values()))
+        except Exception:
+            for key, class_obj in to_create.items():
+                try:
+                    with transaction.atomic():
+                        class_obj.pk = None
+                        class_obj.save()
+                except Exception as e:
+                    class_cache[key] = f"班级创建/查找失败: {e}"
+                    to_create[key] = None
+
+        created = {key: class_obj for key, class_obj in to_create.items() if class_obj is not None}
+        # MySQL 的 bulk_create 不回填主键，统一重新查询一次
+        if created and any(class_obj.pk is None for class_obj in created.values()):
+            refreshed = {
+                (class_obj.grade_level, class_obj.class_name): class_obj
+                for class_obj in Class.objects.filter(class_name__in={key[1] for key in created})
+            }
+            created = {key: refreshed[key] for key in created if key in refreshed}
+
+        for key, class_obj in created.items():
+            class_cache[key] = class_obj
+            report['success_messages'].append(f"自动创建班级：{key[0]}{key[1]}")
+
+    @staticmethod
+    def _student_fields(student_data, class_obj):
+        fields = {key: value for key, value in student_data.items() if not key.startswith('_')}
+        fields['current_class'] = class_obj
+        return fields
+
+    @staticmethod
+    def _changed_fields(student_obj, fields):
+        changed = []
+        for field_name, value in fields.items():
+            if field_name == 'current_class':
+                if student_obj.current_class_id != (value.pk if value else None):
+                    changed.append(field_name)
+            elif getattr(student_obj, field_name) != value:
+                changed.append(field_name)
+        return changed
+
+    @classmethod
+    def _save_chunk_bulk(cls, rows):
+        """
+        批量写入一块学生：已存在的学号 bulk_update，其余 bulk_create（块内重复学号以最后一行为准）。
+
+        rows: [(row_idx, fields)]，返回每行对应的 created 标记列表。
+        """
+        existing = {
+            student.student_id: student
+            for student in Student.objects.filter(student_id__in={fields['student_id'] for _, fields in rows})
+        }
+        to_create = {}
+        to_update = {}
+        update_fields = set()
+        created_flags = []
+
+        for _, fields in rows:
+            student_id = fields['student_id']
+            student_obj = to_create.get(student_id) or existing.get(student_id)
+            if student_obj is None:
+                student_obj = Student(**fields)
+                to_create[student_id] = student_obj
+                created_flags.append(True)
+                continue
+
+            # 只回写值有变化的字段，重复导入同一份名册时几乎不产生 UPDATE
+            changed_fields = cls._changed_fields(student_obj, fields)
+            for field_name in changed_fields:
+                setattr(student_obj, field_name, fields[field_name])
+            if changed_fields and student_id in existing:
+                to_update[student_id] = student_obj
+                update_fields.update(changed_fields)
+            created_flags.append(False)
+
+        with transaction.atomic():
+            if to_create:
+                Student.objects.bulk_create(list(to_create.values()))
+            if to_update:
+                Student.objects.bulk_update(
+                    list(to_update.values()),
+                    sorted(update_fields),
+                    batch_size=cls.UPDATE_BATCH_SIZE,
+                )
+        return created_flags
+
+    @classmethod
+    def _save_row(cls, fields):
+        with transaction.atomic():
+            _, created = Student.objects.update_or_create(
+                student_id=fields['student_id'],
+                defaults=fields,
+            )
+        return created
+
+    @classmethod
+    def _import_chunk(cls, chunk, class_cache, date_cache, report):
+        """解析、校验并写入一块数据，结果累加到 report。"""
+        parsed_rows = []
+        for row_idx, row_data in chunk:
+            try:
+                parsed_rows.append((row_idx, cls._parse_row(row_idx, row_data, report['warning_messages'], date_cache)))
+            except Exception as e:
+                report['failed_rows'].append({'row': row_idx, 'error': str(e)})
+                report['error_messages'].append(f"第 {row_idx} 行学生导入失败: {e}")
+
+        cls._resolve_classes(parsed_rows, class_cache, report)
+
+        writable_rows = []
+        for row_idx, student_data in parsed_rows:
+            class_obj = None
+            if student_data['_class_name']:
+                class_obj = class_cache.get(cls._class_key(student_data))
+                if not isinstance(class_obj, Class):
+                    report['failed_rows'].append({'row': row_idx, 'error': class_obj})
+                    report['error_messages'].append(f"第 {row_idx} 行学生导入失败: {class_obj}")
+                    continue
+            writable_rows.append((row_idx, cls._student_fields(student_data, class_obj)))
+
+        created_flags = None
+        if cls.BULK_WRITE and writable_rows:
+            try:
+                created_flags = cls._save_chunk_bulk(writable_rows)
+            except Exception:
+                created_flags = None
+
+        for index, (row_idx, fields) in enumerate(writable_rows):
+            if created_flags is not None:
+                created = created_flags[index]
+            else:
+                try:
+                    created = cls._save_row(fields)
+                except Exception as e:
+                    report['failed_rows'].append({'row': row_idx, 'error': str(e)})
+                    report['error_messages'].append(f"第 {row_idx} 行学生导入失败: {e}")
+                    continue
+
+            action_text = '新增' if created else '更新'
+            report['success_messages'].append(f"成功{action_text}学生：{fields['name']} ({fields['student_id']})")
+            report['imported_count'] += 1
+
+        # 批量写入不触发信号：新建班级、补全届别和调班都会改变权限范围
+        ScoreAccessService.invalidate_scopes()
+        ScoreAccessService.invalidate_class_exams()
+        AnalysisCacheService.invalidate_roster()
+
+    @classmethod
+    def batch_import(cls, excel_file, progress_callback=None, chunk_size=None):
+        """
+        导入学生 Excel，返回与原同步接口一致的结果字典。
+
+        progress_callback: 每处理完一块及结束时回调一次，
+            参数为进度字典（processed_rows / imported_count / failed_count）。
+        """
+        if not excel_file:
+            raise StudentImportServiceError("请选择正确的 Excel 文件。", 400)
+        if not excel_file.name.endswith(('.xlsx', '.xls')):
+            raise StudentImportServiceError("文件格式不正确，请上传 .xlsx 或 .xls 文件。", 400)
+
+        chunk_size = chunk_size or cls.CHUNK_SIZE
+        workbook = None
+        try:
+            workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+            sheet = workbook.active
+            header = list(next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+
+            report = {
+                'imported_count': 0,
+                'failed_rows': [],
+                'success_messages': [],
+                'error_messages': [],
+                'warning_messages': [],
+            }
+            class_cache = {}
+            date_cache = {}
+
+            # 检测Excel中是否有重复学号
+            seen_student_ids = set()
+            duplicate_student_ids = []
+
+            processed_rows = 0
+            chunk = []
+            for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+                if not any(row):
+                    continue
+                row_data = dict(zip(header, row))
+                sid = row_data.get('学号 (必填)') or row_data.get('学号')
+                if sid:
+                    sid = str(sid).strip()
+                    if sid in seen_student_ids:
+                        duplicate_student_ids.append(sid)
+                    seen_student_ids.add(sid)
+
+                chunk.append((row_idx, row_data))
+                if len(chunk) >= chunk_size:
+                    cls._import_chunk(chunk, class_cache, date_cache, report)
+                    processed_rows += len(chunk)
+                    chunk = []
+                    if progress_callback:
+                        progress_callback({
+                            'processed_rows': processed_rows,
+                            'imported_count': report['imported_count'],
+                            'failed_count': len(report['failed_rows']),
+                        })
+
+            if chunk:
+                cls._import_chunk(chunk, class_cache, date_cache, report)
+                processed_rows += len(chunk)
+
+            if duplicate_student_ids:
+                report['warning_messages'].insert(0, f"检测到Excel中有重复学号：{', '.join(duplicate_student_ids)}")
+
+            if progress_callback:
+                progress_callback({
+                    'processed_rows': processed_rows,
+                    'imported_count': report['imported_count'],
+                    'failed_count': len(report['failed_rows']),
+                })
+
+            return {
+                'success': True,
+                'imported_count': report['imported_count'],
+                'failed_count': len(report['failed_rows']),
+                'success_messages': report['success_messages'],
+                'error_messages': report['error_messages'],
+                'warning_messages': report['warning_messages'],
+                'failed_rows': sorted(report['failed_rows'], key=lambda item: item['row']),
+            }
+        except Exception as e:
+            raise StudentImportServiceError(f"解析文件时出现严重错误: {str(e)}", 500) from e
+        finally:
+            if workbook is not None:
+                workbook.close()
@@ -0,0 +1,144 @@
+import hashlib
+import math
+from array import array
+
+from django.core.cache import caches
+
+from ..config import TARGET_MATRIX_CONFIG
+from ..models.exam_result import ExamResult
+from ..models.score import Score
+from .analysis_cache_service import cache_get_or_build
+
+# 指标 → (数据来源, 字段, 指标类型)；名次类指标越小越好，分数类指标越大越好
+METRIC_SOURCES = {
+    "total_score_rank_in_grade": ("exam_result", "total_score_rank_in_grade", "rank"),
+    "total_score_rank_in_class": ("exam_result", "total_score_rank_in_class", "rank"),
+    "total_score": ("exam_result", "total_score", "score"),
+    "subject_rank_in_grade": ("score", "grade_rank_in_subject", "rank"),
+    "subject_rank_in_class": ("score", "class_rank_in_subject", "rank"),
+    "subject_score": ("score", "score_value", "score"),
+}
+
+
+class TargetMatrix:
+    """
+    一个 (届别, 指标, 考试组合) 的稠密 学生×考试 矩阵。
+
+    按考试分列存放，每列与 student_ids 按位置对齐，缺考（无数据或尚未排名）为 nan。
+    参考人数与指标合计在构建时按列累加好，与阈值无关；每次规则求值只需逐列比较一次阈值。
+    """
+
+    def __init__(self, student_ids, exam_ids, columns):
+        self.student_ids = array("l", student_ids)
+        self.exam_ids = list(exam_ids)
+        self.columns = [array("d", column) for column in columns]
+
+        size = len(self.student_ids)
+        participated = [0] * size
+        sums = [0.0] * size
+        for column in self.columns:
+            participated = [count + (value == value) for count, value in zip(participated, column)]
+            sums = [total + value if value == value else total for total, value in zip(sums, column)]
+        self.participated = array("l", participated)
+        self.sums = array("d", sums)
+        self._positions = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_positions"] = None
+        return state
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = {student_id: position for position, student_id in enumerate(self.student_ids)}
+        return self._positions
+
+    @property
+    def exam_count(self):
+        return len(self.exam_ids)
+
+    def view(self, exam_ids):
+        """取部分考试列组成的子矩阵（复合规则中各条件共用同一份矩阵），学生位置不变。"""
+        if list(exam_ids) == self.exam_ids:
+            return self
+        exam_positions = {exam_id: index for index, exam_id in enumerate(self.exam_ids)}
+        sub = TargetMatrix(self.student_ids, exam_ids, [self.columns[exam_positions[exam_id]] for exam_id in exam_ids])
+        sub._positions = self.positions
+        return sub
+
+    def hit_counts(self, operator, threshold):
+        """每个学生命中阈值的考试场次；nan 与任何数比较都为 False，缺考自然不计入。"""
+        counts = [0] * len(self.student_ids)
+        threshold = float(threshold)
+        for column in self.columns:
+            if operator == "lte":
+                counts = [count + (value <= threshold) for count, value in zip(counts, column)]
+            else:
+                counts = [count + (value >= threshold) for count, value in zip(counts, column)]
+        return counts
+
+    def averages(self):
+        """每个学生参考场次的指标平均值；全部缺考为 None。"""
+        return [
+            round(total / count, 1) if count else None
+            for total, count in zip(self.sums, self.participated)
+        ]
+
+
+class TargetMatrixService:
+    """按 (届别, 指标, 科目, 考试及其数据版本) 缓存目标生矩阵，翻页与重复执行规则时不再重建。"""
+
+    ALIAS = TARGET_MATRIX_CONFIG["ALIAS"]
+    TTL_SECONDS = TARGET_MATRIX_CONFIG["TTL_SECONDS"]
+
+    @classmethod
+    def _cache(cls):
+        return caches[cls.ALIAS]
+
+    @staticmethod
+    def cache_key(grade_level, metric, subject, exams):
+        versions = ",".join(f"{exam.pk}:{exam.data_version}" for exam in exams)
+        digest = hashlib.md5(f"{grade_level}|{metric}|{subject or ''}|{versions}".encode("utf-8")).hexdigest()
+        return f"target_matrix:{digest}"
+
+    @staticmethod
+    def source_rows(grade_level, metric, subject, exam_ids):
+        """
+        矩阵的数据来源 (学生, 考试, 取值)：总分类指标读 (学生, 考试) 汇总表；科目类指标读该科目的成绩行。
+
+        科目名次只读取 exam/subject/student/名次列，由成绩表的复合索引 score_exam_subject_rank_idx 覆盖。
+        """
+        source, field, _ = METRIC_SOURCES[metric]
+        if source == "exam_result":
+            queryset = ExamResult.objects.filter(exam_id__in=exam_ids, student__cohort=grade_level)
+        else:
+            queryset = Score.objects.filter(exam_id__in=exam_ids, subject=subject, student__cohort=grade_level)
+        return queryset.order_by().values_list("student_id", "exam_id", field)
+
+    @staticmethod
+    def build(grade_level, metric, subject, exams):
+        """
+        一条查询（source_rows）构建矩阵，覆盖该届别在这些考试中有数据的全部学生。
+        """
+        exam_ids = [exam.pk for exam in exams]
+        rows = list(TargetMatrixService.source_rows(grade_level, metric, subject, exam_ids))
+
+        student_ids = sorted({row[0] for row in rows})
+        positions = {student_id: position for position, student_id in enumerate(student_ids)}
+        exam_positions = {exam_id: index for index, exam_id in enumerate(exam_ids)}
+        columns = [[math.nan] * len(student_ids) for _ in exam_ids]
+        for student_id, exam_id, value in rows:
+            if value is not None:
+                columns[exam_positions[exam_id]][positions[student_id]] = float(value)
+        return TargetMatrix(student_ids, exam_ids, columns)
+
+    @classmethod
+    def get(cls, grade_level, metric, subject, exams):
+        """exams 需带 data_version（build_exam_scope 的结果即可），不额外查询版本。"""
+        return cache_get_or_build(
+            cls._cache(),
+            cls.cache_key(grade_level, metric, subject, exams),
+            lambda: cls.build(grade_level, metric, subject, exams),
+            cls.TTL_SECONDS,
+        )
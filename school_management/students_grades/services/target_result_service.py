@@ -0,0 +1,144 @@
+import hashlib
+import json
+import pickle
+import time
+
+from django.core.cache import caches
+
+from ..config import TARGET_RESULT_CONFIG
+from ..models.exam import Exam
+from .analysis_cache_service import cache_get_or_build
+from .target_student_service import evaluate_target_student_rule, prepare_target_student_rule
+
+
+class TargetResultServiceError(Exception):
+    """目标生结果集异常。"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class TargetResultService:
+    """
+    目标生筛选结果集缓存。
+
+    result_id 由规范化后的规则与所涉考试的数据版本计算：同一规则在数据未变时得到同一个 result_id，
+    翻页、换排序、导出都凭它读取缓存的结果集，不再重新求值。读取时核对考试数据版本，成绩或排名
+    变化后结果集失效；缓存总量按 MEMORY_BUDGET_BYTES 约束，超出时淘汰最早写入的结果集。
+    """
+
+    ALIAS = TARGET_RESULT_CONFIG['ALIAS']
+    TTL_SECONDS = TARGET_RESULT_CONFIG['TTL_SECONDS']
+    MAX_ENTRY_BYTES = TARGET_RESULT_CONFIG['MAX_ENTRY_BYTES']
+    MEMORY_BUDGET_BYTES = TARGET_RESULT_CONFIG['MEMORY_BUDGET_BYTES']
+
+    INDEX_KEY = 'target_result:index'
+    EXPIRED_MESSAGE = '筛选结果已过期，请重新查询'
+    SORT_FIELDS = {
+        'hit_count', 'participated_count', 'missed_exam_count',
+        'avg_rank', 'avg_value', 'student_id', 'class_name',
+    }
+
+    @classmethod
+    def _cache(cls):
+        return caches[cls.ALIAS]
+
+    @staticmethod
+    def cache_key(result_id):
+        return f'target_result:{result_id}'
+
+    @staticmethod
+    def result_id(rule, exams):
+        normalized = json.dumps(
+            {'rule': rule, 'exams': [[exam.pk, exam.data_version] for exam in exams]},
+            sort_keys=True,
+            default=str,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+    @classmethod
+    def _get(cls, result_id):
+        try:
+            return cls._cache().get(cls.cache_key(result_id))
+        except Exception:
+            return None
+
+    @classmethod
+    def _store(cls, result_id, entry):
+        """写入结果集并登记到索引；超过单条上限的结果集不缓存。"""
+        size = len(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        if size > cls.MAX_ENTRY_BYTES:
+            return False
+
+        cache = cls._cache()
+        now = time.time()
+        try:
+            index = [
+                item for item in (cache.get(cls.INDEX_KEY) or [])
+                if item[0] != result_id and item[2] > now
+            ]
+            index.append([result_id, size, now + cls.TTL_SECONDS])
+            evicted = []
+            while index and sum(item[1] for item in index) > cls.MEMORY_BUDGET_BYTES:
+                evicted.append(cls.cache_key(index.pop(0)[0]))
+            if evicted:
+                cache.delete_many(evicted)
+            if index:
+                cache.set(cls.cache_key(result_id), entry, cls.TTL_SECONDS)
+            cache.set(cls.INDEX_KEY, index, cls.TTL_SECONDS)
+        except Exception:
+            return False
+        return bool(index)
+
+    @classmethod
+    def run(cls, payload):
+        """校验并执行规则（单条件或复合规则），返回 (result_id, 结果)；命中缓存时不重新求值。"""
+        rule, exams = prepare_target_student_rule(payload)
+        result_id = cls.result_id(rule, exams)
+
+        entry = cache_get_or_build(
+            cls._cache(),
+            cls.cache_key(result_id),
+            lambda: {
+                'result': evaluate_target_student_rule(rule, exams),
+                'exam_versions': {exam.pk: exam.data_version for exam in exams},
+            },
+            cls.TTL_SECONDS,
+            store=lambda value: cls._store(result_id, value),
+        )
+        return result_id, entry['result']
+
+    @classmethod
+    def load(cls, result_id):
+        """按 result_id 读取结果集；不存在、已过期或考试数据已变化时抛出 404。"""
+        entry = cls._get(str(result_id or ''))
+        if entry is None:
+            raise TargetResultServiceError(cls.EXPIRED_MESSAGE, 404)
+
+        exam_versions = entry['exam_versions']
+        current = dict(Exam.objects.filter(pk__in=list(exam_versions)).values_list('pk', 'data_version'))
+        if current != exam_versions:
+            try:
+                cls._cache().delete(cls.cache_key(result_id))
+            except Exception:
+                pass
+            raise TargetResultServiceError(cls.EXPIRED_MESSAGE, 404)
+        return entry['result']
+
+    @classmethod
+    def sort_students(cls, students, sort_by=None, sort_order='desc'):
+        """按指定字段重排结果集（稳定排序，原顺序作为次序）；空值始终排在最后。"""
+        if not sort_by:
+            return list(students)
+        if sort_by not in cls.SORT_FIELDS:
+            raise TargetResultServiceError(f"sort_by 非法，可选值：{', '.join(sorted(cls.SORT_FIELDS))}", 400)
+        if sort_order not in ('asc', 'desc'):
+            raise TargetResultServiceError('sort_order 仅支持 asc/desc', 400)
+
+        present = [item for item in students if item.get(sort_by) is not None]
+        missing = [item for item in students if item.get(sort_by) is None]
+        present.sort(key=lambda item: item[sort_by], reverse=sort_order == 'desc')
+        return present + missing
@@ -1,18 +1,19 @@
 import datetime
 
-from django.db.models import Min
-
 from ..models.exam import Exam
-from ..models.score import Score
+from ..models.score import SUBJECT_CHOICES
 from ..models.student import COHORT_CHOICES, Student
+from .target_matrix_service import METRIC_SOURCES, TargetMatrixService
 
 
-ALLOWED_METRICS = {"total_score_rank_in_grade"}
-ALLOWED_OPERATORS = {"lte"}
+ALLOWED_METRICS = set(METRIC_SOURCES)
+ALLOWED_OPERATORS = {"lte", "gte"}
 ALLOWED_QUANTIFIERS = {"all", "at_least"}
 ALLOWED_ABSENT_POLICIES = {"strict_fail", "ignore_absent"}
-ALLOWED_EXAM_SCOPE_TYPES = {"all_in_grade", "selected_exam_ids", "date_range"}
+ALLOWED_EXAM_SCOPE_TYPES = {"all_in_grade", "selected_exam_ids", "date_range", "latest_n"}
+ALLOWED_LOGICS = {"AND", "OR"}
 MAX_EXAM_SCOPE_SIZE = 50
+MAX_RULE_CONDITIONS = 10
 
 
 def validate_rule_payload(payload):
@@ -38,20 +39,35 @@ def validate_rule_payload(payload):
 
     metric = payload.get("metric")
     if metric not in ALLOWED_METRICS:
-        raise ValueError("metric 非法，第一期仅支持 total_score_rank_in_grade")
+        raise ValueError(f"metric 非法，可选值：{', '.join(sorted(ALLOWED_METRICS))}")
+
+    subject = None
+    if METRIC_SOURCES[metric][0] == "score":
+        subject = payload.get("subject")
+        if subject not in {code for code, _ in SUBJECT_CHOICES}:
+            raise ValueError("科目类指标必须指定合法的 subject（如 语文）")
 
     operator = payload.get("operator")
     if operator not in ALLOWED_OPERATORS:
-        raise ValueError("operator 非法，第一期仅支持 lte")
+        raise ValueError("operator 非法，仅支持 lte/gte")
 
     threshold = payload.get("threshold")
-    try:
-        threshold = int(threshold)
-    except (TypeError, ValueError):
-        raise ValueError("threshold 必须为正整数")
+    if METRIC_SOURCES[metric][2] == "rank":
+        try:
+            threshold = int(threshold)
+        except (TypeError, ValueError):
+            raise ValueError("threshold 必须为正整数")
+
+        if threshold <= 0:
+            raise ValueError("threshold 必须为正整数")
+    else:
+        try:
+            threshold = float(threshold)
+        except (TypeError, ValueError):
+            raise ValueError("分数类指标的 threshold 必须为数字")
 
-    if threshold <= 0:
-        raise ValueError("threshold 必须为正整数")
+        if threshold < 0 or threshold != threshold:
+            raise ValueError("分数类指标的 threshold 不能为负数")
 
     quantifier = payload.get("quantifier")
     if quantifier not in ALLOWED_QUANTIFIERS:
@@ -78,6 +94,7 @@ def validate_rule_payload(payload):
         "grade_level": grade_level,
         "exam_scope": normalized_exam_scope,
         "metric": metric,
+        "subject": subject,
         "operator": operator,
         "threshold": threshold,
         "quantifier": quantifier,
@@ -86,6 +103,74 @@ def validate_rule_payload(payload):
     }
 
 
+def validate_compound_rule_payload(payload):
+    """
+    校验复合规则：多个条件（各自的考试范围、指标与时序量词）按 AND/OR 组合。
+
+    条件中的 grade_level 以外层为准；每个条件按单条件规则的口径校验。
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("请求参数格式错误")
+
+    logic = str(payload.get("logic") or "AND").upper()
+    if logic not in ALLOWED_LOGICS:
+        raise ValueError("logic 非法，仅支持 AND/OR")
+
+    conditions = payload.get("conditions")
+    if not isinstance(conditions, list) or not conditions:
+        raise ValueError("conditions 必须为非空数组")
+    if len(conditions) > MAX_RULE_CONDITIONS:
+        raise ValueError(f"条件过多，最多允许 {MAX_RULE_CONDITIONS} 个")
+
+    normalized_conditions = []
+    for index, condition in enumerate(conditions, start=1):
+        if not isinstance(condition, dict):
+            raise ValueError(f"第 {index} 个条件格式错误")
+        try:
+            normalized = validate_rule_payload({**condition, "grade_level": payload.get("grade_level")})
+        except ValueError as exc:
+            if "grade_level" in str(exc):
+                raise
+            raise ValueError(f"第 {index} 个条件：{exc}")
+        normalized_conditions.append(normalized)
+
+    return {
+        "grade_level": normalized_conditions[0]["grade_level"],
+        "logic": logic,
+        "conditions": [
+            {key: value for key, value in condition.items() if key != "grade_level"}
+            for condition in normalized_conditions
+        ],
+    }
+
+
+def prepare_target_student_rule(payload):
+    """
+    校验规则并解析考试范围，返回 (规则, 考试列表)。
+
+    带 conditions 的是复合规则：届别考试只查询一次，各条件的考试范围从中选取并记入 exam_ids，
+    返回的考试列表是各条件范围的并集（按日期升序）。
+    """
+    if not isinstance(payload, dict) or "conditions" not in payload:
+        rule = validate_rule_payload(payload)
+        return rule, build_exam_scope(rule["grade_level"], rule["exam_scope"])
+
+    rule = validate_compound_rule_payload(payload)
+    cohort_exams = load_cohort_exams(rule["grade_level"])
+    used_exam_ids = set()
+    for index, condition in enumerate(rule["conditions"], start=1):
+        try:
+            exams = build_exam_scope(rule["grade_level"], condition["exam_scope"], cohort_exams)
+        except ValueError as exc:
+            raise ValueError(f"第 {index} 个条件：{exc}")
+        if condition["quantifier"] == "at_least" and condition["absent_policy"] == "strict_fail" and condition["k"] > len(exams):
+            raise ValueError(f"第 {index} 个条件：strict_fail 场景下，k 不能大于目标考试场次")
+        condition["exam_ids"] = [exam.id for exam in exams]
+        used_exam_ids.update(condition["exam_ids"])
+
+    return rule, [exam for exam in cohort_exams if exam.id in used_exam_ids]
+
+
 def _normalize_exam_scope(exam_scope):
     scope_type = exam_scope.get("type")
 
@@ -105,6 +190,15 @@ def _normalize_exam_scope(exam_scope):
 
         normalized["exam_ids"] = list(dict.fromkeys(normalized_ids))
 
+    if scope_type == "latest_n":
+        try:
+            n = int(exam_scope.get("n"))
+        except (TypeError, ValueError):
+            raise ValueError("exam_scope.type=latest_n 时，n 必须为正整数")
+        if n <= 0 or n > MAX_EXAM_SCOPE_SIZE:
+            raise ValueError(f"exam_scope.n 必须在 1-{MAX_EXAM_SCOPE_SIZE} 之间")
+        normalized["n"] = n
+
     if scope_type == "date_range":
         date_from_raw = exam_scope.get("date_from")
         date_to_raw = exam_scope.get("date_to")
@@ -127,18 +221,31 @@ def _normalize_exam_scope(exam_scope):
     return normalized
 
 
-def build_exam_scope(grade_level, exam_scope):
+def load_cohort_exams(grade_level):
+    """该届别全部考试（按日期升序），复合规则各条件的考试范围都从这一份列表中选取。"""
+    return list(Exam.objects.filter(grade_level=grade_level).order_by("date", "id"))
+
+
+def build_exam_scope(grade_level, exam_scope, cohort_exams=None):
     """Resolve target exams from scope definition and grade."""
     scope_type = exam_scope["type"]
 
-    exams = Exam.objects.filter(grade_level=grade_level).order_by("date", "id")
+    if cohort_exams is None:
+        cohort_exams = load_cohort_exams(grade_level)
 
     if scope_type == "selected_exam_ids":
-        exams = exams.filter(id__in=exam_scope["exam_ids"])
+        exam_ids = set(exam_scope["exam_ids"])
+        exam_list = [exam for exam in cohort_exams if exam.id in exam_ids]
     elif scope_type == "date_range":
-        exams = exams.filter(date__gte=exam_scope["date_from"], date__lte=exam_scope["date_to"])
+        exam_list = [
+            exam for exam in cohort_exams
+            if exam_scope["date_from"] <= exam.date <= exam_scope["date_to"]
+        ]
+    elif scope_type == "latest_n":
+        exam_list = cohort_exams[-exam_scope["n"]:]
+    else:
+        exam_list = list(cohort_exams)
 
-    exam_list = list(exams)
     if not exam_list:
         raise ValueError("该范围内无考试数据")
 
@@ -161,50 +268,42 @@ def build_candidate_students(grade_level, only_active=True):
     return list(students.order_by("student_id", "id"))
 
 
-def compute_student_hits(students, exams, threshold):
-    """Compute hit/participation/missing stats for each student across exams."""
+def compute_student_hits(students, exams, rule):
+    """
+    Compute hit/participation/missing stats for each student across exams.
+
+    学生×考试 矩阵按 (届别, 指标, 考试版本) 缓存，这里只逐列比较一次阈值；
+    矩阵中没有的学生（全部缺考）按 0 参考处理。
+    """
     if not students:
         return []
 
-    student_ids = [student.id for student in students]
-    exam_ids = [exam.id for exam in exams]
+    matrix = TargetMatrixService.get(rule["grade_level"], rule["metric"], rule["subject"], exams)
+    return _matrix_student_stats(students, matrix, rule)
 
-    # Total rank is duplicated on every subject row; Min() gives a stable single value per (student, exam).
-    raw_rank_rows = (
-        Score.objects.filter(student_id__in=student_ids, exam_id__in=exam_ids)
-        .values("student_id", "exam_id")
-        .annotate(total_rank=Min("total_score_rank_in_grade"))
-    )
 
-    rank_map = {}
-    for row in raw_rank_rows:
-        rank_map[(row["student_id"], row["exam_id"])] = row["total_rank"]
+def _matrix_student_stats(students, matrix, rule):
+    """按候选学生顺序取出矩阵上的命中/参考/缺考统计；matrix 的考试列即该条件的考试范围。"""
+    hit_counts = matrix.hit_counts(rule["operator"], rule["threshold"])
+    averages = matrix.averages()
+    positions = matrix.positions
+    exam_count = matrix.exam_count
+    is_rank = METRIC_SOURCES[rule["metric"]][2] == "rank"
 
-    exam_count = len(exams)
     stats = []
     for student in students:
-        hit_count = 0
-        participated_count = 0
-        rank_sum = 0
-
-        for exam in exams:
-            rank = rank_map.get((student.id, exam.id))
-            if rank is None:
-                continue
-
-            participated_count += 1
-            rank_sum += rank
-            if rank <= threshold:
-                hit_count += 1
-
+        position = positions.get(student.id)
+        participated_count = matrix.participated[position] if position is not None else 0
+        average = averages[position] if position is not None else None
         stats.append(
             {
                 "student": student,
-                "hit_count": hit_count,
+                "hit_count": hit_counts[position] if position is not None else 0,
                 "participated_count": participated_count,
                 "missed_exam_count": exam_count - participated_count,
                 "exam_count": exam_count,
-                "avg_rank": round(rank_sum / participated_count, 1) if participated_count > 0 else None,
+                "avg_rank": average if is_rank else None,
+                "avg_value": average,
             }
         )
 
@@ -229,38 +328,54 @@ def apply_quantifier(student_stat, quantifier, absent_policy, k=None):
 
 
 def execute_target_student_rule(payload):
-    """Execute first-phase target-student filtering rule and return normalized result."""
-    rule = validate_rule_payload(payload)
+    """Execute target-student filtering rule (single or compound) and return normalized result."""
+    rule, exams = prepare_target_student_rule(payload)
+    return evaluate_target_student_rule(rule, exams)
+
+
+def _student_row(student):
+    return {
+        "student_pk": student.id,
+        "student_id": student.student_id,
+        "name": student.name,
+        "cohort": student.cohort,
+        "grade_level": student.grade_level,
+        "grade_level_display": student.get_grade_level_display() if student.grade_level else None,
+        "class_name": student.current_class.class_name if student.current_class else None,
+    }
+
+
+def _required_count(stat, absent_policy):
+    return stat["exam_count"] if absent_policy == "strict_fail" else stat["participated_count"]
+
+
+def evaluate_target_student_rule(rule, exams):
+    """对已校验的规则与已解析的考试范围求值（结果集缓存未命中时调用）。"""
+    if "conditions" in rule:
+        return evaluate_compound_rule(rule, exams)
 
-    exams = build_exam_scope(rule["grade_level"], rule["exam_scope"])
     exam_count = len(exams)
 
     if rule["quantifier"] == "at_least" and rule["absent_policy"] == "strict_fail" and rule["k"] > exam_count:
         raise ValueError("strict_fail 场景下，k 不能大于目标考试场次")
 
     students = build_candidate_students(rule["grade_level"], only_active=True)
-    student_stats = compute_student_hits(students, exams, rule["threshold"])
+    student_stats = compute_student_hits(students, exams, rule)
 
     matched_students = []
     for stat in student_stats:
         if not apply_quantifier(stat, rule["quantifier"], rule["absent_policy"], rule["k"]):
             continue
 
-        student = stat["student"]
         matched_students.append(
             {
-                "student_pk": student.id,
-                "student_id": student.student_id,
-                "name": student.name,
-                "cohort": student.cohort,
-                "grade_level": student.grade_level,
-                "grade_level_display": student.get_grade_level_display() if student.grade_level else None,
-                "class_name": student.current_class.class_name if student.current_class else None,
+                **_student_row(stat["student"]),
                 "hit_count": stat["hit_count"],
-                "required_count": stat["exam_count"] if rule["absent_policy"] == "strict_fail" else stat["participated_count"],
+                "required_count": _required_count(stat, rule["absent_policy"]),
                 "participated_count": stat["participated_count"],
                 "missed_exam_count": stat["missed_exam_count"],
                 "avg_rank": stat["avg_rank"],
+                "avg_value": stat["avg_value"],
             }
         )
 
@@ -270,6 +385,7 @@ def execute_target_student_rule(payload):
         "rule_summary": {
             "grade_level": rule["grade_level"],
             "metric": rule["metric"],
+            "subject": rule["subject"],
             "operator": rule["operator"],
             "threshold": rule["threshold"],
             "quantifier": rule["quantifier"],
@@ -280,3 +396,90 @@ def execute_target_student_rule(payload):
         "matched_count": len(matched_students),
         "students": matched_students,
     }
+
+
+def evaluate_compound_rule(rule, exams):
+    """
+    复合规则求值：所有条件共用一份候选学生。
+
+    同一 (指标, 科目) 的条件共用一份覆盖全部相关考试的矩阵（一次查询且按考试版本缓存），
+    各条件只取自己考试范围的列；条件之间不再各自查询成绩。
+    """
+    grade_level = rule["grade_level"]
+    students = build_candidate_students(grade_level, only_active=True)
+
+    matrices = {}
+    condition_stats = []
+    for condition in rule["conditions"]:
+        key = (condition["metric"], condition["subject"])
+        if key not in matrices:
+            matrices[key] = TargetMatrixService.get(grade_level, condition["metric"], condition["subject"], exams)
+        view = matrices[key].view(condition["exam_ids"])
+        stats = _matrix_student_stats(students, view, condition) if students else []
+        condition_stats.append([
+            (stat, apply_quantifier(stat, condition["quantifier"], condition["absent_policy"], condition["k"]))
+            for stat in stats
+        ])
+
+    combine = all if rule["logic"] == "AND" else any
+    matched_students = []
+    for position, student in enumerate(students):
+        results = [stats[position] for stats in condition_stats]
+        if not combine(matched for _, matched in results):
+            continue
+
+        details = [
+            {
+                "condition_index": index,
+                "matched": matched,
+                "hit_count": stat["hit_count"],
+                "required_count": _required_count(stat, condition["absent_policy"]),
+                "participated_count": stat["participated_count"],
+                "missed_exam_count": stat["missed_exam_count"],
+                "avg_rank": stat["avg_rank"],
+                "avg_value": stat["avg_value"],
+            }
+            for index, (condition, (stat, matched)) in enumerate(zip(rule["conditions"], results), start=1)
+        ]
+        matched_students.append(
+            {
+                **_student_row(student),
+                "matched_condition_count": sum(1 for detail in details if detail["matched"]),
+                "hit_count": sum(detail["hit_count"] for detail in details),
+                # 各条件的考试范围可能重叠、科目也可能不同，应达标/参考/缺考次数只按条件给出
+                "required_count": None,
+                "participated_count": None,
+                "missed_exam_count": None,
+                "avg_rank": None,
+                "avg_value": None,
+                "conditions": details,
+            }
+        )
+
+    matched_students.sort(
+        key=lambda item: (-item["matched_condition_count"], -item["hit_count"], item["student_id"])
+    )
+
+    return {
+        "rule_summary": {
+            "grade_level": grade_level,
+            "logic": rule["logic"],
+            "conditions": [
+                {
+                    "condition_index": index,
+                    "metric": condition["metric"],
+                    "subject": condition["subject"],
+                    "operator": condition["operator"],
+                    "threshold": condition["threshold"],
+                    "quantifier": condition["quantifier"],
+                    "k": condition["k"],
+                    "absent_policy": condition["absent_policy"],
+                    "exam_count": len(condition["exam_ids"]),
+                }
+                for index, condition in enumerate(rule["conditions"], start=1)
+            ],
+        },
+        "exam_count": len(exams),
+        "matched_count": len(matched_students),
+        "students": matched_students,
+    }
@@ -5,12 +5,27 @@ Exam ↔ CalendarEvent 同步信号
 - Exam 新增 → 创建 CalendarEvent（visibility=school, event_type=exam）
 - Exam 更新 → 同步更新关联的 CalendarEvent（title/date/description/grade）
 - Exam 删除 → CASCADE 删除关联的 CalendarEvent（通过 FK on_delete=CASCADE）
+
+Score → ExamResult 汇总同步信号：
+- Score 保存/删除 → 刷新对应 (学生, 考试) 的汇总行（deferred() 块内合并刷新）
+- 学生/考试删除引起的级联删除不处理，ExamResult 会随之级联删除
+
+成绩读权限范围缓存失效信号（ScoreAccessService）：
+- Class 增删改、任课老师变化 → 所有用户的权限范围失效
+- Student 保存/删除（调班）→ (班级 → 考试) 映射失效
+- Class、Student 增删改 → 成绩分析结果缓存（AnalysisCacheService）的名单版本递增
 """
-from django.db.models.signals import post_save, post_delete
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.dispatch import receiver
 
 from .models.exam import Exam
 from .models.calendar import CalendarEvent
+from .models.score import Score
+from .models.student import Class, Student
+from .services.analysis_cache_service import AnalysisCacheService
+from .services.exam_result_service import ExamResultService
+from .services.score_access_service import ScoreAccessService
 
 
 @receiver(post_save, sender=Exam)
@@ -59,3 +74,45 @@ def sync_exam_to_calendar(sender, instance, created, **kwargs):
         event.grade = instance.grade_level or ''
         # 注意：creator 不变（保持创建者），exam FK 本身就是对的
         event.save(update_fields=['title', 'start', 'description', 'grade'])
+
+
+@receiver(post_save, sender=Score)
+def sync_exam_result_on_score_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ExamResultService.mark_changed([(instance.student_id, instance.exam_id)])
+
+
+@receiver(post_delete, sender=Score)
+def sync_exam_result_on_score_delete(sender, instance, origin=None, **kwargs):
+    # 只处理直接删除成绩的情况（单条或查询集）；删除学生/考试时汇总行会被级联删除
+    if isinstance(origin, QuerySet):
+        direct = origin.model is Score
+    else:
+        direct = origin is None or isinstance(origin, Score)
+    if direct:
+        ExamResultService.mark_changed([(instance.student_id, instance.exam_id)])
+
+
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+def invalidate_access_scopes_on_class_change(sender, raw=False, **kwargs):
+    if raw:
+        return
+    ScoreAccessService.invalidate_scopes()
+    AnalysisCacheService.invalidate_roster()
+
+
+@receiver(m2m_changed, sender=Class.subject_teachers.through)
+def invalidate_access_scopes_on_teacher_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        ScoreAccessService.invalidate_scopes()
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_class_exams_on_student_change(sender, raw=False, **kwargs):
+    if raw:
+        return
+    ScoreAccessService.invalidate_class_exams()
+    AnalysisCacheService.invalidate_roster()
@@ -3,16 +3,33 @@
 用于高效处理大量数据的排名计算
 """
 import time
-from django.db.models import Sum, F
-from django.db import transaction
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
 from django_rq import job
-from .models import Exam, Score
+from .models import Exam, Score, Student
+
+# 四个排名字段，增量与全量路径共用
+RANK_FIELDS = [
+    'total_score_rank_in_grade',
+    'total_score_rank_in_class',
+    'grade_rank_in_subject',
+    'class_rank_in_subject',
+]
+
+# 无法排名（如未分班）时写入的占位名次，与全量路径保持一致
+MISSING_RANK = 999
+
 
 @job('default', timeout=600)  # 增加超时时间到10分钟
-def update_all_rankings_async(exam_id, grade_level=None, *args, **kwargs):
+def update_all_rankings_async(exam_id, grade_level=None, *args, changed_pairs=None, verify=False, **kwargs):
     """
     优化版异步更新完整排名
     使用更高效的算法处理大量数据
+
+    changed_pairs: 可选，发生变动的 (student_id, subject) 列表。
+        传入时走增量模式，只重写排名实际变化的记录；不传则全量重算。
+    verify: 增量模式下是否再用全量算法校验一遍，校验不一致时回退为全量重算。
     """
     print(f"开始优化版异步更新完整排名，考试ID: {exam_id}")
     start_time = time.time()
@@ -30,9 +47,16 @@ def update_all_rankings_async(exam_id, grade_level=None, *args, **kwargs):
                 'error': 'Exam not found'
             }
         
+        changed_pairs = _normalize_changed_pairs(changed_pairs)
+
         # 获取需要更新排名的年级
         if grade_level:
             grade_levels = [grade_level]
+        elif changed_pairs:
+            # 增量模式只需处理变动学生所在的届别
+            grade_levels = list(set(Student.objects.filter(
+                id__in={student_id for student_id, _ in changed_pairs}
+            ).values_list('cohort', flat=True)))
         else:
             # grade_level 参数实际是 cohort 格式（如"初中2023级"）
             grade_levels = list(set(Score.objects.filter(exam=exam).values_list(
@@ -47,10 +71,19 @@ def update_all_rankings_async(exam_id, grade_level=None, *args, **kwargs):
             
             # 使用事务确保数据一致性
             with transaction.atomic():
-                result = update_grade_rankings_optimized(exam, current_grade)
+                if changed_pairs:
+                    result = update_grade_rankings_incremental(exam, current_grade, changed_pairs)
+                    if verify and result and result.get('success'):
+                        mismatched_ids = verify_grade_rankings(exam, current_grade)
+                        if mismatched_ids:
+                            print(f"年级 {current_grade} 增量排名校验发现 {len(mismatched_ids)} 条不一致，回退全量重算")
+                            result = update_grade_rankings_optimized(exam, current_grade)
+                else:
+                    result = update_grade_rankings_optimized(exam, current_grade)
                 if result and result.get('success'):
                     updated_count = result.get('updated_count', 0) or 0
                     total_updated += updated_count
+                    _refresh_exam_results(exam.id, current_grade)
                 else:
                     print(f"年级 {current_grade} 排名更新失败: {result.get('message', '未知错误') if result else '返回值为空'}")
                     updated_count = 0
@@ -58,6 +91,8 @@ def update_all_rankings_async(exam_id, grade_level=None, *args, **kwargs):
             grade_time = time.time() - grade_start_time
             print(f"年级 {current_grade} 处理完成，耗时 {grade_time:.2f} 秒，更新 {updated_count} 条记录")
         
+        _warm_rank_index(exam.id)
+
         execution_time = time.time() - start_time
         success_message = f"优化版排名更新完成！共更新 {total_updated} 条记录，耗时 {execution_time:.2f} 秒"
         print(success_message)
@@ -81,235 +116,406 @@ def update_all_rankings_async(exam_id, grade_level=None, *args, **kwargs):
         }
 
 
-def update_grade_rankings_optimized(exam, grade_level):
+def update_grade_rankings_optimized(exam, grade_level, backend=None):
+    """
+    优化版年级排名更新（全量）
+
+    backend: 'sql' 使用数据库窗口函数一次算出四个排名并以一条 UPDATE ... JOIN 写回；
+        'python' 在内存中计算后 bulk_update 写回（用于不支持窗口函数的旧数据库）。
+        不传时按 settings.RANKING_BACKEND（默认 'auto'）自动选择。
+    """
+    backend = _select_ranking_backend(backend)
+    if backend == 'sql':
+        return _update_grade_rankings_sql(exam, grade_level)
+    return _update_grade_rankings_python(exam, grade_level)
+
+
+def _select_ranking_backend(backend=None):
+    """根据配置与数据库能力选择排名后端：MySQL 8+/MariaDB 10.2+/SQLite 3.25+ 走 SQL 窗口函数。"""
+    backend = backend or getattr(settings, 'RANKING_BACKEND', 'auto')
+    if backend == 'python':
+        return 'python'
+    if not connection.features.supports_over_clause:
+        if backend == 'sql':
+            print("  当前数据库不支持窗口函数，排名计算回退到 Python 实现")
+        return 'python'
+    return 'sql'
+
+
+def _supports_update_join():
+    """数据库是否支持 UPDATE ... JOIN / UPDATE ... FROM 一次性写回。"""
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 33, 0)
+    return connection.vendor in ('mysql', 'postgresql')
+
+
+def _build_ranking_sql():
+    """
+    生成一届学生一场考试的排名查询，每条成绩一行：
+    score_id, 总分年级排名, 总分班级排名, 科目年级排名, 科目班级排名。
+
+    RANK() 与 _competition_ranks 口径一致（并列同名次，后续名次跳过）；
+    未分班学生的班级排名写 MISSING_RANK。总分先 ROUND 到两位小数，
+    避免 SQLite 浮点求和把本应并列的总分拆开。
+    总分排名先在按学生聚合的派生表中算好，再按学生关联回成绩行计算科目排名，
+    让数据库沿 student_id 索引查找成绩行，而不是让两个派生表互相扫描。
+    参数顺序：exam_id, cohort, exam_id。
+    """
+    qn = connection.ops.quote_name
+    score_table = qn(Score._meta.db_table)
+    student_table = qn(Student._meta.db_table)
+
+    return f"""
+        SELECT sc.id AS score_id,
+               tr.grade_total_rank,
+               tr.class_total_rank,
+               RANK() OVER (PARTITION BY sc.subject ORDER BY sc.score_value DESC) AS grade_subject_rank,
+               CASE WHEN st.current_class_id IS NULL THEN {MISSING_RANK}
+                    ELSE RANK() OVER (PARTITION BY sc.subject, st.current_class_id ORDER BY sc.score_value DESC)
+               END AS class_subject_rank
+        FROM (
+            SELECT t.student_id,
+                   RANK() OVER (ORDER BY t.total_score DESC) AS grade_total_rank,
+                   CASE WHEN t.class_id IS NULL THEN {MISSING_RANK}
+                        ELSE RANK() OVER (PARTITION BY t.class_id ORDER BY t.total_score DESC)
+                   END AS class_total_rank
+            FROM (
+                SELECT sc.student_id AS student_id,
+                       st.current_class_id AS class_id,
+                       ROUND(SUM(sc.score_value), 2) AS total_score
+                FROM {score_table} sc
+                INNER JOIN {student_table} st ON sc.student_id = st.id
+                WHERE sc.exam_id = %s AND st.cohort = %s
+                GROUP BY sc.student_id, st.current_class_id
+            ) t
+        ) tr
+        INNER JOIN {score_table} sc ON sc.student_id = tr.student_id
+        INNER JOIN {student_table} st ON sc.student_id = st.id
+        WHERE sc.exam_id = %s
+    """
+
+
+def _update_grade_rankings_sql(exam, grade_level):
     """
-    优化版年级排名更新
-    使用更高效的算法和批量操作
+    SQL 窗口函数后端：一条查询算出全部排名，一条 UPDATE 写回整届。
+
+    MySQL 使用 UPDATE ... JOIN，SQLite 3.33+/PostgreSQL 使用 UPDATE ... FROM；
+    更老的 SQLite 只取回排名结果再 bulk_update。
     """
-    import time
     start_time = time.time()
-    
-    # 获取该年级所有学生的总分
-    # grade_level 参数实际是 cohort 格式（如"初中2023级"）
-    students_total_scores = list(Score.objects.filter(
-        exam=exam,
-        student__cohort=grade_level
-    ).values('student_id', 'student__current_class_id').annotate(
-        total_score=Sum('score_value')
-    ).order_by('-total_score', 'student_id'))  # 添加student_id确保排序稳定
-    
-    print(f"  获取到 {len(students_total_scores)} 个学生的总分数据")
-    
-    # 创建学生ID到总分排名的映射
-    grade_rank_map = {}
-    class_rank_maps = {}
-    
-    # 1. 计算年级总分排名
-    current_rank = 1
-    previous_score = None
-    
-    for i, student_data in enumerate(students_total_scores):
-        student_id = student_data['student_id']
-        total_score = student_data['total_score'] or 0
-        
-        if previous_score is not None and total_score != previous_score:
-            current_rank = i + 1
-        
-        grade_rank_map[student_id] = current_rank
-        previous_score = total_score
-    
-    # 2. 按班级分组计算班级总分排名
-    class_students = {}
-    for student_data in students_total_scores:
-        class_id = student_data['student__current_class_id']
-        if class_id not in class_students:
-            class_students[class_id] = []
-        class_students[class_id].append(student_data)
-    
-    for class_id, class_student_list in class_students.items():
-        if not class_id:
-            continue
-            
-        # 对班级内学生按总分排序
-        class_student_list.sort(key=lambda x: (-x['total_score'] or 0, x['student_id']))
-        
-        class_rank_map = {}
-        current_rank = 1
-        previous_score = None
-        
-        for i, student_data in enumerate(class_student_list):
-            student_id = student_data['student_id']
-            total_score = student_data['total_score'] or 0
-            
-            if previous_score is not None and total_score != previous_score:
-                current_rank = i + 1
-            
-            class_rank_map[student_id] = current_rank
-            previous_score = total_score
-        
-        class_rank_maps[class_id] = class_rank_map
-    
-    print(f"  总分排名计算完成")
-    
-    # 3. 获取所有科目 - 修复重复问题
-    # 修复subjects查询 - 使用set直接去重避免Django ORM的distinct问题
-    from django.db import connection
-    
-    # 使用原生SQL确保真正的去重
-    with connection.cursor() as cursor:
-        cursor.execute("""
-            SELECT DISTINCT subject
-            FROM students_grades_score s
-            INNER JOIN students_grades_student st ON s.student_id = st.id
-            WHERE s.exam_id = %s AND st.cohort = %s
-        """, [exam.id, grade_level])
-        subjects_list = [row[0] for row in cursor.fetchall()]
-    
-    print(f"Found {len(subjects_list)} subjects to process: {subjects_list}")
-    
-    print(f"  需要处理 {len(subjects_list)} 个科目的排名: {subjects_list}")
-    
-    # 第4步：计算各科目的班级排名  
-    print("  正在计算班级排名...")
-    
-    # 4. 为每个科目计算排名
-    subject_grade_rank_maps = {}
-    subject_class_rank_maps = {}
-    
-    for subject in subjects_list:
-        # 年级科目排名
-        subject_scores = list(Score.objects.filter(
-            exam=exam,
-            subject=subject,
-            student__cohort=grade_level
-        ).values('student_id', 'student__current_class_id', 'score_value').order_by(
-            '-score_value', 'student_id'
-        ))
-        
-        # 年级科目排名
-        grade_subject_rank_map = {}
-        current_rank = 1
-        previous_score = None
-        
-        for i, score_data in enumerate(subject_scores):
-            student_id = score_data['student_id']
-            score_value = score_data['score_value'] or 0
-            
-            if previous_score is not None and score_value != previous_score:
-                current_rank = i + 1
-            
-            grade_subject_rank_map[student_id] = current_rank
-            previous_score = score_value
-        
-        subject_grade_rank_maps[subject] = grade_subject_rank_map
-        
-        # 班级科目排名
-        class_subject_students = {}
-        for score_data in subject_scores:
-            class_id = score_data['student__current_class_id']
-            if class_id not in class_subject_students:
-                class_subject_students[class_id] = []
-            class_subject_students[class_id].append(score_data)
-        
-        class_subject_rank_maps = {}
-        for class_id, class_scores in class_subject_students.items():
-            if not class_id:
-                continue
-                
-            # 对班级内学生按科目成绩排序
-            class_scores.sort(key=lambda x: (-x['score_value'] or 0, x['student_id']))
-            
-            class_subject_rank_map = {}
-            current_rank = 1
-            previous_score = None
-            
-            for i, score_data in enumerate(class_scores):
-                student_id = score_data['student_id']
-                score_value = score_data['score_value'] or 0
-                
-                if previous_score is not None and score_value != previous_score:
-                    current_rank = i + 1
-                
-                class_subject_rank_map[student_id] = current_rank
-                previous_score = score_value
-            
-            class_subject_rank_maps[class_id] = class_subject_rank_map
-        
-        subject_class_rank_maps[subject] = class_subject_rank_maps
-    
-    print(f"  科目排名计算完成")
-    
-    # 5. 批量更新所有排名
-    print(f"  开始批量更新排名...")
-    scores_to_update = Score.objects.filter(
-        exam=exam,
-        student__cohort=grade_level
-    )
-    
+
+    qn = connection.ops.quote_name
+    score_table = qn(Score._meta.db_table)
+    ranking_sql = _build_ranking_sql()
+    params = [exam.id, grade_level, exam.id]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f"""
+                UPDATE {score_table} s
+                INNER JOIN ({ranking_sql}) r ON r.score_id = s.id
+                SET s.total_score_rank_in_grade = r.grade_total_rank,
+                    s.total_score_rank_in_class = r.class_total_rank,
+                    s.grade_rank_in_subject = r.grade_subject_rank,
+                    s.class_rank_in_subject = r.class_subject_rank
+            """, params)
+            processed_count = cursor.rowcount
+        elif _supports_update_join():
+            cursor.execute(f"""
+                UPDATE {score_table}
+                SET total_score_rank_in_grade = r.grade_total_rank,
+                    total_score_rank_in_class = r.class_total_rank,
+                    grade_rank_in_subject = r.grade_subject_rank,
+                    class_rank_in_subject = r.class_subject_rank
+                FROM ({ranking_sql}) r
+                WHERE {score_table}.id = r.score_id
+            """, params)
+            processed_count = cursor.rowcount
+        else:
+            cursor.execute(ranking_sql, params)
+            update_list = []
+            for score_id, *ranks in cursor.fetchall():
+                score = Score(pk=score_id)
+                for field, rank in zip(RANK_FIELDS, ranks):
+                    setattr(score, field, rank)
+                update_list.append(score)
+            Score.objects.bulk_update(update_list, RANK_FIELDS, batch_size=500)
+            processed_count = len(update_list)
+
+    execution_time = time.time() - start_time
+    success_message = f"排名更新完成！年级: {grade_level}, 共更新 {processed_count} 条记录，耗时 {execution_time:.2f} 秒（SQL窗口函数）"
+    print(success_message)
+
+    return {
+        'success': True,
+        'message': success_message,
+        'updated_count': processed_count,
+        'execution_time': execution_time,
+        'grade_level': grade_level,
+        'backend': 'sql',
+    }
+
+
+def _update_grade_rankings_python(exam, grade_level):
+    """
+    Python 后端：一次查询取出整届成绩行（含班级），内存中计算排名后分批 bulk_update。
+    """
+    start_time = time.time()
+
+    rows = _load_rank_rows(exam, grade_level)
+    print(f"  获取到 {len(rows)} 条成绩数据")
+    expected = _compute_expected_ranks(rows)
+
     update_list = []
     processed_count = 0
-    
-    for score in scores_to_update:
-        student_id = score.student_id
-        subject = score.subject
-        class_id = score.student.current_class_id
-        
-        # 更新总分排名
-        score.total_score_rank_in_grade = grade_rank_map.get(student_id, 999)
-        if class_id and class_id in class_rank_maps:
-            score.total_score_rank_in_class = class_rank_maps[class_id].get(student_id, 999)
-        else:
-            score.total_score_rank_in_class = 999
-        
-        # 更新科目排名
-        if subject in subject_grade_rank_maps:
-            score.grade_rank_in_subject = subject_grade_rank_maps[subject].get(student_id, 999)
-        else:
-            score.grade_rank_in_subject = 999
-            
-        if (subject in subject_class_rank_maps and 
-            class_id and class_id in subject_class_rank_maps[subject]):
-            score.class_rank_in_subject = subject_class_rank_maps[subject][class_id].get(student_id, 999)
-        else:
-            score.class_rank_in_subject = 999
-        
+    for row in rows:
+        score = Score(pk=row['id'])
+        for field in RANK_FIELDS:
+            setattr(score, field, expected[row['id']].get(field, MISSING_RANK))
         update_list.append(score)
         processed_count += 1
-        
+
         # 分批处理，避免内存问题和长时间锁定
         if len(update_list) >= 500:
-            print(f"    批量更新第 {processed_count-499}-{processed_count} 条记录...")
-            Score.objects.bulk_update(
-                update_list,
-                ['total_score_rank_in_grade', 'total_score_rank_in_class', 
-                 'grade_rank_in_subject', 'class_rank_in_subject'],
-                batch_size=500
-            )
-            update_list = []  # 清空列表释放内存
-    
-    # 更新剩余记录
+            Score.objects.bulk_update(update_list, RANK_FIELDS, batch_size=500)
+            update_list = []
+
     if update_list:
-        print(f"    批量更新最后 {len(update_list)} 条记录...")
-        Score.objects.bulk_update(
-            update_list,
-            ['total_score_rank_in_grade', 'total_score_rank_in_class', 
-             'grade_rank_in_subject', 'class_rank_in_subject'],
-            batch_size=500
-        )
-    
+        Score.objects.bulk_update(update_list, RANK_FIELDS, batch_size=500)
+
     execution_time = time.time() - start_time
     success_message = f"排名更新完成！年级: {grade_level}, 共更新 {processed_count} 条记录，耗时 {execution_time:.2f} 秒"
     print(success_message)
-    
+
     return {
         'success': True,
         'message': success_message,
         'updated_count': processed_count,
         'execution_time': execution_time,
-        'grade_level': grade_level
+        'grade_level': grade_level,
+        'backend': 'python',
+    }
+
+
+def _normalize_changed_pairs(changed_pairs):
+    """把 (student_id, subject) 列表规范化为去重后的元组集合。"""
+    if not changed_pairs:
+        return set()
+    return {(int(student_id), subject) for student_id, subject in changed_pairs}
+
+
+def _competition_ranks(entries):
+    """
+    计算竞争排名（并列同名次，下一名跳过并列人数）。
+
+    entries: 已按分数降序排好的 (key, value) 列表。
+    """
+    rank_map = {}
+    current_rank = 1
+    previous_value = None
+
+    for index, (key, value) in enumerate(entries):
+        if previous_value is not None and value != previous_value:
+            current_rank = index + 1
+        rank_map[key] = current_rank
+        previous_value = value
+
+    return rank_map
+
+
+def _load_rank_rows(exam, grade_level):
+    """一次查询取出某届别本场考试的全部成绩行（含当前排名），不实例化模型对象。"""
+    return list(Score.objects.filter(
+        exam=exam,
+        student__cohort=grade_level
+    ).values(
+        'id', 'student_id', 'student__current_class_id', 'subject', 'score_value', *RANK_FIELDS
+    ))
+
+
+def _compute_expected_ranks(rows, subjects=None):
+    """
+    根据成绩行在内存中计算期望排名，口径与 update_grade_rankings_optimized 一致。
+
+    subjects 为 None 时计算全部科目；否则只计算给定科目的科目排名
+    （其余科目行的科目排名不会受影响，保持数据库现值）。
+    返回 {score_id: {field: rank}}，总分排名对每一行都会给出。
+    """
+    student_totals = defaultdict(lambda: 0)
+    student_class = {}
+    subject_entries = defaultdict(list)
+
+    for row in rows:
+        student_id = row['student_id']
+        score_value = row['score_value'] or 0
+        student_totals[student_id] += score_value
+        student_class[student_id] = row['student__current_class_id']
+        if subjects is None or row['subject'] in subjects:
+            subject_entries[row['subject']].append((student_id, score_value))
+
+    # 总分排名（年级 + 班级）
+    ordered_totals = sorted(student_totals.items(), key=lambda item: (-item[1], item[0]))
+    grade_total_ranks = _competition_ranks(ordered_totals)
+
+    class_totals = defaultdict(list)
+    for student_id, total_score in ordered_totals:
+        class_id = student_class[student_id]
+        if class_id:
+            class_totals[class_id].append((student_id, total_score))
+    class_total_ranks = {}
+    for class_entries in class_totals.values():
+        class_total_ranks.update(_competition_ranks(class_entries))
+
+    # 科目排名（年级 + 班级）
+    subject_grade_ranks = {}
+    subject_class_ranks = {}
+    for subject, entries in subject_entries.items():
+        entries.sort(key=lambda item: (-item[1], item[0]))
+        subject_grade_ranks[subject] = _competition_ranks(entries)
+
+        class_entries = defaultdict(list)
+        for student_id, score_value in entries:
+            class_id = student_class[student_id]
+            if class_id:
+                class_entries[class_id].append((student_id, score_value))
+        class_rank_map = {}
+        for entries_in_class in class_entries.values():
+            class_rank_map.update(_competition_ranks(entries_in_class))
+        subject_class_ranks[subject] = class_rank_map
+
+    expected = {}
+    for row in rows:
+        student_id = row['student_id']
+        subject = row['subject']
+        ranks = {
+            'total_score_rank_in_grade': grade_total_ranks.get(student_id, MISSING_RANK),
+            'total_score_rank_in_class': class_total_ranks.get(student_id, MISSING_RANK),
+        }
+        if subject in subject_grade_ranks:
+            ranks['grade_rank_in_subject'] = subject_grade_ranks[subject].get(student_id, MISSING_RANK)
+            ranks['class_rank_in_subject'] = subject_class_ranks[subject].get(student_id, MISSING_RANK)
+        expected[row['id']] = ranks
+
+    return expected
+
+
+def _diff_rank_rows(rows, expected):
+    """找出排名与数据库现值不一致的行，返回待写回的 Score 实例列表（只带 id 与排名字段）。"""
+    changed_scores = []
+    for row in rows:
+        target = expected.get(row['id'], {})
+        if all(row[field] == value for field, value in target.items()):
+            continue
+
+        score = Score(pk=row['id'])
+        for field in RANK_FIELDS:
+            setattr(score, field, target.get(field, row[field]))
+        changed_scores.append(score)
+    return changed_scores
+
+
+def update_grade_rankings_incremental(exam, grade_level, changed_pairs):
+    """
+    增量年级排名更新：整届在内存中重算，只写回名次变化的行。
+
+    - 仍一次读取整届本场考试的成绩行，总分排名按全部学生重新排序；
+    - 科目排名只重算变动的科目，其余科目行保持数据库现值；
+    - 重算结果与数据库现值逐行比对，只对排名真正变化的记录执行 bulk_update。
+    读取与排序的开销与全量相同，省下的是写入：名次实际移动的通常只是新旧分数之间的那部分学生。
+    """
+    start_time = time.time()
+
+    changed_pairs = _normalize_changed_pairs(changed_pairs)
+    if not changed_pairs:
+        return update_grade_rankings_optimized(exam, grade_level)
+
+    affected_subjects = {subject for _, subject in changed_pairs}
+    rows = _load_rank_rows(exam, grade_level)
+    expected = _compute_expected_ranks(rows, subjects=affected_subjects)
+    changed_scores = _diff_rank_rows(rows, expected)
+
+    if changed_scores:
+        Score.objects.bulk_update(changed_scores, RANK_FIELDS, batch_size=500)
+
+    execution_time = time.time() - start_time
+    success_message = (
+        f"增量排名更新完成！年级: {grade_level}, 变动 {len(changed_pairs)} 项，"
+        f"扫描 {len(rows)} 条，实际更新 {len(changed_scores)} 条记录，耗时 {execution_time:.2f} 秒"
+    )
+    print(success_message)
+
+    return {
+        'success': True,
+        'message': success_message,
+        'updated_count': len(changed_scores),
+        'scanned_count': len(rows),
+        'execution_time': execution_time,
+        'grade_level': grade_level,
+        'mode': 'incremental',
     }
 
 
+def verify_grade_rankings(exam, grade_level):
+    """
+    用全量算法校验数据库中的排名，不做任何写入。
+
+    返回排名与期望值不一致的成绩记录 id 列表（空列表表示排名完全正确）。
+    """
+    rows = _load_rank_rows(exam, grade_level)
+    expected = _compute_expected_ranks(rows)
+    return [score.pk for score in _diff_rank_rows(rows, expected)]
+
+
+def _refresh_exam_results(exam_id, grade_level):
+    """排名写回后同步 (学生, 考试) 汇总表中的总分排名。"""
+    from .services.exam_result_service import ExamResultService
+
+    stats = ExamResultService.refresh_exam(exam_id, grade_level)
+    print(f"同步成绩汇总，考试ID: {exam_id}, 届别: {grade_level}: {stats}")
+
+
+def _warm_rank_index(exam_id):
+    """排名全部写回后预先构建高级筛选的名次索引，失败不影响排名结果。"""
+    from .services.rank_index_service import RankIndexService
+
+    try:
+        RankIndexService.warm(exam_id)
+    except Exception as exc:
+        print(f"构建名次索引失败，考试ID: {exam_id}: {exc}")
+
+
+def run_pending_rankings(exam_id, cohort_key):
+    """
+    排名调度器延迟投递的任务入口：执行某 (考试, 届别) 合并后的排名请求。
+    详见 services/ranking_scheduler.py。
+    """
+    from .services.ranking_scheduler import RankingScheduler
+
+    return RankingScheduler.run_pending(exam_id, cohort_key)
+
+
+@job('default', timeout=3600)
+def run_import_job(job_id):
+    """后台执行 Excel 导入任务（成绩/学生），进度写回 ImportJob，详见 services/import_job_service.py。"""
+    from .services.import_job_service import ImportJobService
+
+    print(f"开始执行导入任务，任务ID: {job_id}")
+    result = ImportJobService.run(job_id)
+    print(f"导入任务结束，任务ID: {job_id}, 状态: {result['status']}")
+    return result
+
+
+@job('default', timeout=3600)
+def run_export_job(job_id):
+    """后台生成导出文件（成绩导出/个人分析报告），结果写回 ExportJob，详见 services/export_job_service.py。"""
+    from .services.export_job_service import ExportJobService
+
+    print(f"开始执行导出任务，任务ID: {job_id}")
+    result = ExportJobService.run(job_id)
+    print(f"导出任务结束，任务ID: {job_id}, 状态: {result['status']}")
+    return result
+
+
 # 向后兼容函数，重定向到完整排名更新
 @job('default', timeout=3600)
 def update_grade_rankings_async(exam_id, grade_level=None, *args, **kwargs):
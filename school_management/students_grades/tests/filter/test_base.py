@@ -0,0 +1,32 @@
+"""Shared helpers for the advanced filter tests.
+
+db_condition_student_ids evaluates one rank condition directly on the Score table and serves as
+the reference result for the rank-index evaluator.
+"""
+from django.db.models import Min
+
+from school_management.students_grades.models import Score
+from school_management.students_grades.services.advanced_filter import AdvancedFilterService
+
+
+def db_condition_student_ids(exam, condition):
+    """单个名次条件的数据库口径：总分名次取各科目行上的最小值，bottom_n 以有名次的人数为基数。"""
+    scores = Score.objects.filter(exam=exam)
+    if condition['subject'] == 'total':
+        rank_field = 'total_score_rank_in_grade' if condition['dimension'] == 'grade' else 'total_score_rank_in_class'
+    else:
+        rank_field = 'grade_rank_in_subject' if condition['dimension'] == 'grade' else 'class_rank_in_subject'
+        scores = scores.filter(subject=AdvancedFilterService.SUBJECT_MAP[condition['subject']])
+    ranked = scores.values('student_id').annotate(rank_value=Min(rank_field)).filter(rank_value__isnull=False)
+
+    operator, value = condition['operator'], condition['value']
+    if operator == 'top_n':
+        ranked = ranked.filter(rank_value__lte=value)
+    elif operator == 'bottom_n':
+        total_count = ranked.count()
+        if total_count <= 0:
+            return []
+        ranked = ranked.filter(rank_value__gte=max(total_count - value + 1, 1))
+    else:
+        ranked = ranked.filter(rank_value__gte=value[0], rank_value__lte=value[1])
+    return list(ranked.values_list('student_id', flat=True))
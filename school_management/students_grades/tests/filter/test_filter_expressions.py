@@ -0,0 +1,131 @@
+"""Tests for nested AND/OR/NOT filter expressions and their cost-ordered evaluation."""
+import json
+import random
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+
+from school_management.students_grades.models import Class, Exam, Score, Student
+from school_management.students_grades.serializers import SavedFilterRuleSerializer
+from school_management.students_grades.services.advanced_filter import AdvancedFilterService
+from school_management.students_grades.services.rank_index_service import RankIndex
+from school_management.students_grades.tests.filter.test_base import db_condition_student_ids
+
+LEAVES = [
+    {'subject': 'total', 'dimension': 'grade', 'operator': 'top_n', 'value': 10},
+    {'subject': 'chinese', 'dimension': 'grade', 'operator': 'range', 'value': [5, 20]},
+    {'subject': 'math', 'dimension': 'class', 'operator': 'bottom_n', 'value': 4},
+    {'subject': 'math', 'dimension': 'grade', 'operator': 'top_n', 'value': 2},
+]
+
+
+class FilterExpressionTests(TestCase):
+    def setUp(self):
+        rng = random.Random(11)
+        self.classes = [Class.objects.create(grade_level='初二', cohort='初中EX级', class_name=f'{i}班') for i in (1, 2)]
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中EX级', date=date(2026, 4, 1))
+        students = [
+            Student.objects.create(
+                student_id=f'EX{i:03d}', name=f'学生{i}', grade_level='初二', cohort='初中EX级',
+                current_class=self.classes[i % 2],
+            )
+            for i in range(24)
+        ]
+        total_ranks = rng.sample(range(1, 25), 24)
+        for subject in ('语文', '数学'):
+            ranks = rng.sample(range(1, 25), 24)
+            for student, total_rank, rank in zip(students, total_ranks, ranks):
+                Score.objects.create(
+                    student=student, exam=self.exam, subject=subject, score_value=rank,
+                    grade_rank_in_subject=rank, class_rank_in_subject=(rank + 1) // 2,
+                    total_score_rank_in_grade=total_rank, total_score_rank_in_class=(total_rank + 1) // 2,
+                )
+        self.universe = {student.pk for student in students}
+
+    def _brute_force(self, node):
+        if 'op' not in node:
+            return set(db_condition_student_ids(self.exam, node))
+        results = [self._brute_force(child) for child in node['children']]
+        if node['op'] == 'AND':
+            return set.intersection(*results)
+        if node['op'] == 'OR':
+            return set.union(*results)
+        return self.universe - results[0]
+
+    def test_nested_expressions_match_set_semantics(self):
+        expressions = [
+            {'op': 'AND', 'children': [LEAVES[0], {'op': 'OR', 'children': [LEAVES[1], LEAVES[2]]}]},
+            {'op': 'OR', 'children': [LEAVES[3], {'op': 'AND', 'children': [LEAVES[1], {'op': 'NOT', 'children': [LEAVES[0]]}]}]},
+            {'op': 'NOT', 'children': [{'op': 'OR', 'children': LEAVES}]},
+            LEAVES[2],
+        ]
+        for expression in expressions:
+            normalized = AdvancedFilterService.normalize_expression({'expression': expression})
+            self.assertEqual(
+                AdvancedFilterService.apply_expression(self.exam.pk, normalized),
+                sorted(self._brute_force(normalized)),
+                msg=expression,
+            )
+
+    def test_flat_payloads_normalize_to_single_group(self):
+        self.assertEqual(
+            AdvancedFilterService.normalize_expression({'logic': 'or', 'conditions': LEAVES[:2]}),
+            {'op': 'OR', 'children': LEAVES[:2]},
+        )
+        for bad in (
+            {'expression': {'op': 'NOT', 'children': LEAVES[:2]}},
+            {'expression': {'op': 'XOR', 'children': LEAVES[:2]}},
+            {'expression': {'op': 'AND', 'children': [{'subject': 'total'}]}},
+            {'logic': 'AND', 'conditions': []},
+        ):
+            with self.assertRaises(ValueError):
+                AdvancedFilterService.normalize_expression(bad)
+
+    def test_and_evaluates_most_selective_leaf_first_and_pushes_candidates_down(self):
+        calls = []
+        original = RankIndex.match
+
+        def recording_match(index, subject, dimension, operator, value, candidates=None):
+            result = original(index, subject, dimension, operator, value, candidates=candidates)
+            calls.append(((subject, operator, value), candidates))
+            return result
+
+        expression = {'op': 'AND', 'children': [LEAVES[1], LEAVES[0], LEAVES[3]]}
+        with mock.patch.object(RankIndex, 'match', recording_match):
+            result = AdvancedFilterService.apply_expression(self.exam.pk, expression)
+
+        self.assertEqual(calls[0], (('数学', 'top_n', 2), None))
+        for _, candidates in calls[1:]:
+            self.assertIsNotNone(candidates)
+            self.assertLessEqual(bin(candidates).count('1'), 2)
+        self.assertEqual(result, sorted(self._brute_force(expression)))
+
+    def test_saved_rule_and_api_accept_expressions(self):
+        expression = {'op': 'and', 'children': [LEAVES[0], {'op': 'not', 'children': [LEAVES[3]]}]}
+        serializer = SavedFilterRuleSerializer(
+            data={'name': '嵌套规则', 'rule_type': 'advanced', 'rule_config': {'expression': expression}}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['rule_config']['expression']['children'][1]['op'], 'NOT')
+
+        client = Client()
+        client.force_login(get_user_model().objects.create_user(username='ex_staff', password='x', role='staff'))
+        resp = client.post(
+            '/api/students/advanced-filter/',
+            data=json.dumps({'exam_id': self.exam.pk, 'expression': expression}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(len(body['condition_columns']), 2)
+        normalized = AdvancedFilterService.normalize_expression({'expression': expression})
+        self.assertEqual({row['student_id'] for row in body['students']}, self._brute_force(normalized))
+
+        resp = client.post(
+            '/api/students/advanced-filter/',
+            data=json.dumps({'exam_id': self.exam.pk, 'expression': {'op': 'NOT', 'children': []}}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,116 @@
+"""Tests for the per-exam rank index behind the advanced filter (RankIndexService)."""
+import itertools
+import json
+import pickle
+import random
+from datetime import date
+
+from django.test import TestCase
+
+from school_management.students_grades.models import Class, Exam, Score, Student
+from school_management.students_grades.services.advanced_filter import AdvancedFilterService
+from school_management.students_grades.services.rank_index_service import RankIndexService
+from school_management.students_grades.tests.filter.test_base import db_condition_student_ids
+from school_management.students_grades.tests.score.test_base import LocmemCacheMixin, staff_client
+
+
+class RankIndexTests(LocmemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(7)
+        self.classes = [
+            Class.objects.create(grade_level='初二', cohort='初中RI级', class_name=f'{i}班') for i in (1, 2)
+        ]
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中RI级', date=date(2026, 4, 1))
+        self.students = [
+            Student.objects.create(
+                student_id=f'RI{i:03d}', name=f'学生{i}', grade_level='初二', cohort='初中RI级',
+                current_class=self.classes[i % 2],
+            )
+            for i in range(30)
+        ]
+        total_ranks = list(range(1, 31))
+        rng.shuffle(total_ranks)
+        for subject in ('语文', '数学'):
+            subject_ranks = list(range(1, 31))
+            rng.shuffle(subject_ranks)
+            for student, total_rank, subject_rank in zip(self.students, total_ranks, subject_ranks):
+                # 部分学生缺考数学
+                if subject == '数学' and student.pk % 7 == 0:
+                    continue
+                Score.objects.create(
+                    student=student, exam=self.exam, subject=subject, score_value=60 + subject_rank % 40,
+                    grade_rank_in_subject=subject_rank, class_rank_in_subject=(subject_rank + 1) // 2,
+                    total_score_rank_in_grade=total_rank, total_score_rank_in_class=(total_rank + 1) // 2,
+                )
+
+    def test_conditions_match_database_evaluation(self):
+        conditions = [
+            {'subject': subject, 'dimension': dimension, 'operator': operator, 'value': value}
+            for subject, dimension, (operator, value) in itertools.product(
+                ('total', 'chinese', 'math', 'physics'),
+                ('grade', 'class'),
+                (('top_n', 5), ('bottom_n', 4), ('range', [3, 12])),
+            )
+        ]
+        for condition in conditions:
+            expected = sorted(db_condition_student_ids(self.exam, condition))
+            self.assertEqual(
+                AdvancedFilterService.apply_filter(self.exam.pk, 'AND', [condition]), expected, msg=condition
+            )
+
+        pair = conditions[0:7:6]
+        first, second = (set(db_condition_student_ids(self.exam, c)) for c in pair)
+        self.assertEqual(AdvancedFilterService.apply_filter(self.exam.pk, 'AND', pair), sorted(first & second))
+        self.assertEqual(AdvancedFilterService.apply_filter(self.exam.pk, 'OR', pair), sorted(first | second))
+        self.assertEqual(
+            AdvancedFilterService.apply_filter(self.exam.pk, 'OR', pair, class_id=self.classes[0].pk),
+            sorted(sid for sid in first | second if Student.objects.get(pk=sid).current_class_id == self.classes[0].pk),
+        )
+
+    def test_index_is_cached_until_data_version_changes(self):
+        condition = {'subject': 'math', 'dimension': 'grade', 'operator': 'top_n', 'value': 3}
+        AdvancedFilterService.apply_filter(self.exam.pk, 'AND', [condition])
+        with self.assertNumQueries(1):
+            # 只剩考试数据版本查询
+            AdvancedFilterService.apply_filter(self.exam.pk, 'AND', [condition, condition])
+
+        top = Score.objects.get(exam=self.exam, subject='数学', grade_rank_in_subject=1)
+        top.grade_rank_in_subject = 99
+        top.save()
+        self.assertNotIn(top.student_id, AdvancedFilterService.apply_filter(self.exam.pk, 'AND', [condition]))
+
+    def test_index_survives_pickling(self):
+        index = RankIndexService.get(self.exam.pk)
+        restored = pickle.loads(pickle.dumps(index))
+        student = self.students[3]
+        self.assertEqual(restored.rank('语文', 'grade', student.pk), index.rank('语文', 'grade', student.pk))
+        self.assertEqual(
+            restored.score('total', student.pk),
+            float(sum(Score.objects.filter(exam=self.exam, student=student).values_list('score_value', flat=True))),
+        )
+
+    def test_advanced_filter_view_reads_details_from_index(self):
+        client = staff_client('ri_staff')
+        payload = {
+            'exam_id': self.exam.pk,
+            'logic': 'OR',
+            'conditions': [
+                {'subject': 'total', 'dimension': 'grade', 'operator': 'top_n', 'value': 3},
+                {'subject': 'math', 'dimension': 'class', 'operator': 'range', 'value': [1, 2]},
+            ],
+        }
+        client.post('/api/students/advanced-filter/', data=json.dumps(payload), content_type='application/json')
+        with self.assertNumQueries(4):
+            # 会话 + 用户 + 考试数据版本 + 学生
+            resp = client.post('/api/students/advanced-filter/', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        for row in resp.json()['students']:
+            score = Score.objects.filter(exam=self.exam, student_id=row['student_id'], subject='数学').first()
+            detail = row['condition_details'][1]
+            self.assertEqual(detail['rank'], score.class_rank_in_subject if score else None)
+            self.assertEqual(detail['score'], float(score.score_value) if score else None)
+            self.assertEqual(
+                row['total_rank'],
+                Score.objects.filter(exam=self.exam, student_id=row['student_id']).first().total_score_rank_in_grade,
+            )
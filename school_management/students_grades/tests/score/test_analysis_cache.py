@@ -0,0 +1,141 @@
+"""Tests for the versioned analysis result cache (AnalysisCacheService)."""
+from datetime import date
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from .test_base import BaseTestCase, LocmemCacheMixin
+from school_management.students_grades.models import Class, Exam, ExamSubject, Score, Student
+from school_management.students_grades.services import AnalysisCacheService
+from school_management.students_grades.services.analysis_cache_service import cache_get_or_build
+
+
+class AnalysisCacheTests(LocmemCacheMixin, BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cls = Class.objects.create(grade_level='初一', cohort='初中AC级', class_name='1班')
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中AC级', date=date(2025, 11, 1))
+        ExamSubject.objects.create(exam=self.exam, subject_code='语文', subject_name='语文', max_score=100)
+        self.student = Student.objects.create(
+            student_id='AC001', name='王五', grade_level='初一', cohort='初中AC级', current_class=self.cls
+        )
+        self.score = Score.objects.create(student=self.student, exam=self.exam, subject='语文', score_value=80)
+
+    def _grade_url(self):
+        return f'/api/scores/class-analysis-grade?exam={self.exam.pk}&grade_level=初中AC级'
+
+    def test_repeat_request_hits_cache_until_scores_change(self):
+        first = self.client.get(self._grade_url()).json()
+        with self.assertNumQueries(3):
+            # 会话 + 用户 + 考试数据版本，不再重新计算
+            second = self.client.get(self._grade_url()).json()
+        self.assertEqual(first, second)
+
+        self.score.score_value = 60
+        self.score.save()
+
+        third = self.client.get(self._grade_url()).json()
+        self.assertEqual(third['data']['grade_avg_score'], 60.0)
+
+        metrics = AnalysisCacheService.metrics()
+        self.assertEqual((metrics['class_grade']['hits'], metrics['class_grade']['misses']), (1, 2))
+        self.assertEqual(metrics['total']['hit_rate'], round(1 / 3, 4))
+
+    def test_roster_changes_invalidate_cached_analysis(self):
+        other = Class.objects.create(grade_level='初一', cohort='初中AC级', class_name='2班')
+        self.assertEqual(self.client.get(self._grade_url()).json()['data']['class_statistics'][0]['class_name'], '1班')
+
+        # 调班、改班名、批量改状态都不经过成绩写入，考试数据版本不变
+        self.student.current_class = other
+        self.student.save()
+        data = self.client.get(self._grade_url()).json()['data']
+        self.assertEqual([item['class_name'] for item in data['class_statistics']], ['2班'])
+
+        other.class_name = '3班'
+        other.save()
+        data = self.client.get(self._grade_url()).json()['data']
+        self.assertEqual([item['class_name'] for item in data['class_statistics']], ['3班'])
+
+        resp = self.client.post(
+            '/api/students/batch-update-status',
+            {'student_ids': [self.student.pk], 'status': '毕业'},
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.client.get(self._grade_url()).json()['data']['total_students'], 0)
+        self.assertEqual(AnalysisCacheService.metrics()['class_grade']['hits'], 0)
+
+    def test_student_analysis_invalidated_by_new_exam(self):
+        url = f'/api/scores/student-analysis-data?student_id={self.student.pk}'
+        self.assertEqual(self.client.get(url).json()['data']['summary']['total_exams'], 1)
+
+        exam = Exam.objects.create(name='期末', academic_year='2025-2026', grade_level='初中AC级', date=date(2026, 1, 10))
+        Score.objects.create(student=self.student, exam=exam, subject='语文', score_value=90)
+
+        self.assertEqual(self.client.get(url).json()['data']['summary']['total_exams'], 2)
+        self.assertEqual(AnalysisCacheService.metrics()['student']['hits'], 0)
+
+    def test_errors_are_not_cached(self):
+        resp = self.client.get('/api/scores/class-analysis-grade?exam=999999&grade_level=初中AC级')
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get('/api/scores/class-analysis-single?exam=999999&class_name=1')
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(AnalysisCacheService.metrics()['total']['hits'], 0)
+
+    def test_exam_edit_bumps_data_version(self):
+        self.client.get(self._grade_url())
+        resp = self.client.patch(
+            f'/api/exams/{self.exam.pk}',
+            {'subjects': [{'subject_code': '语文', 'max_score': 120}]},
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 200)
+
+        data = self.client.get(self._grade_url()).json()['data']
+        self.assertEqual(data['total_max_score'], 120.0)
+        self.assertEqual(AnalysisCacheService.metrics()['class_grade']['hits'], 0)
+
+    def test_metrics_endpoint(self):
+        self.client.get(self._grade_url())
+        self.client.get(self._grade_url())
+        data = self.client.get('/api/scores/analysis-cache-metrics').json()['data']
+        self.assertEqual(data['class_grade'], {'hits': 1, 'misses': 1, 'errors': 0, 'hit_rate': 0.5})
+
+
+class CacheGetOrBuildTests(SimpleTestCase):
+    """cache_get_or_build 是名次索引、目标生矩阵与结果集共用的读取流程。"""
+
+    def test_builds_once_then_hits(self):
+        cache = caches['default']
+        cache.delete('cgob:hit')
+        outcomes = []
+        builder = mock.Mock(return_value={'value': 1})
+
+        for _ in range(2):
+            value = cache_get_or_build(cache, 'cgob:hit', builder, 60, record=outcomes.append)
+
+        self.assertEqual(value, {'value': 1})
+        builder.assert_called_once()
+        self.assertEqual(outcomes, ['misses', 'hits'])
+
+    def test_backend_failures_fall_back_to_builder(self):
+        broken = mock.Mock()
+        broken.get.side_effect = ConnectionError('down')
+        outcomes = []
+        self.assertEqual(cache_get_or_build(broken, 'k', lambda: 2, 60, record=outcomes.append), 2)
+        broken.set.assert_not_called()
+
+        broken.get.side_effect = None
+        broken.get.return_value = None
+        broken.set.side_effect = ConnectionError('down')
+        self.assertEqual(cache_get_or_build(broken, 'k', lambda: 3, 60, record=outcomes.append), 3)
+        self.assertEqual(outcomes, ['errors', 'misses', 'errors'])
+
+    def test_custom_store_replaces_set(self):
+        cache = mock.Mock()
+        cache.get.return_value = None
+        stored = []
+        cache_get_or_build(cache, 'k', lambda: 4, 60, store=stored.append)
+        self.assertEqual(stored, [4])
+        cache.set.assert_not_called()
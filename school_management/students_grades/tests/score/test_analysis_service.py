@@ -1,6 +1,9 @@
 from datetime import date
+from decimal import Decimal
 import json
 
+from django.db.models import Avg
+
 from .test_base import BaseTestCase
 from school_management.students_grades.models import Class, Student, Exam, ExamSubject, Score
 from school_management.students_grades.services.analysis_service import (
@@ -71,3 +74,85 @@ class AnalysisServiceTests(BaseTestCase):
 
         result = analyze_grade(exam, "初三")
         self.assertEqual(result.get("total_max_score"), 240)
+
+
+class AnalysisQueryCountTests(BaseTestCase):
+    def setUp(self):
+        self.classes = [Class.objects.create(grade_level="初三", cohort="初中QC级", class_name=f"{index}班") for index in (1, 2, 3)]
+        self.exam = Exam.objects.create(name="E_query_count", academic_year="2025-2026", grade_level="初中QC级", date=date(2024, 5, 1))
+        ExamSubject.objects.create(exam=self.exam, subject_code="语文", subject_name="语文", max_score=100)
+        ExamSubject.objects.create(exam=self.exam, subject_code="数学", subject_name="数学", max_score=100)
+        for class_index, cls in enumerate(self.classes):
+            for index in range(4):
+                student = Student.objects.create(
+                    student_id=f"QC{class_index}{index}", name=f"QC{class_index}{index}",
+                    grade_level="初三", cohort="初中QC级", current_class=cls,
+                )
+                Score.objects.create(student=student, exam=self.exam, subject="语文", score_value=60 + index * 10, total_score_rank_in_grade=index + 1)
+                Score.objects.create(student=student, exam=self.exam, subject="数学", score_value=50 + index * 10, total_score_rank_in_grade=index + 1)
+
+    def test_single_class_loads_scores_once(self):
+        scores = Score.objects.filter(exam=self.exam, student__current_class=self.classes[0])
+        # 成绩 + 考试科目 + 科目平均分
+        with self.assertNumQueries(3):
+            result = analyze_single_class(scores, self.classes[0], self.exam)
+
+        self.assertEqual(result["total_students"], 4)
+        self.assertEqual(result["subject_stats"]["语文"]["avg_score"], 75.0)
+        self.assertEqual(result["score_distribution"]["数学"]["不及格(<60%)"], 1)
+        self.assertEqual([item["total_score"] for item in result["student_rankings"]], [170.0, 150.0, 130.0, 110.0])
+        self.assertEqual(result["student_rankings"][0]["grade_rank"], 4)
+        self.assertEqual(json.loads(result["chart_data_json"])["total_max_score"], 200)
+
+    def test_multiple_classes_query_count_does_not_grow_with_classes(self):
+        # 成绩 + 考试科目
+        with self.assertNumQueries(2):
+            result = analyze_multiple_classes(self.classes, self.exam)
+
+        self.assertEqual(result["total_students"], 12)
+        self.assertEqual(result["class_statistics"][0]["subject_averages"], [75.0, 65.0])
+        self.assertEqual(result["class_statistics"][0]["avg_total"], 140.0)
+
+    def test_grade_query_count_does_not_grow_with_classes(self):
+        # 班级 + 成绩 + 年级/班级科目平均分 + 考试科目
+        with self.assertNumQueries(5):
+            result = analyze_grade(self.exam, "初中QC级")
+
+        self.assertEqual(result["total_students"], 12)
+        self.assertEqual(result["total_max_score"], 200)
+        self.assertEqual([item["class_name"] for item in result["class_statistics"]], ["1班", "2班", "3班"])
+        self.assertEqual(result["class_statistics"][0]["subject_averages"], [75.0, 65.0])
+        chart_data = json.loads(result["chart_data_json"])
+        self.assertEqual(chart_data["difficulty_coefficients"], [0.75, 0.65])
+
+    def test_fallback_full_marks_are_counted_once_per_subject(self):
+        # 英语不在考试科目中，按默认满分 100 补齐一次，与参加的人数无关
+        for cls in self.classes:
+            for student in Student.objects.filter(current_class=cls):
+                Score.objects.create(student=student, exam=self.exam, subject="英语", score_value=80)
+
+        scores = Score.objects.filter(exam=self.exam, student__current_class=self.classes[0])
+        single = analyze_single_class(scores, self.classes[0], self.exam)
+        self.assertEqual(json.loads(single["chart_data_json"])["total_max_score"], 300)
+        self.assertEqual(analyze_grade(self.exam, "初中QC级")["total_max_score"], 300)
+        # 总分 190~250 按 300 分档（按成绩行重复补齐时 1班满分为 600，全部落在不及格档）
+        multi = analyze_multiple_classes(self.classes, self.exam)
+        self.assertEqual(json.loads(multi["chart_data_json"])["score_distributions"]["1班"], [0, 0, 3, 1, 0])
+
+
+class AnalysisAverageParityTests(BaseTestCase):
+    def test_subject_averages_are_the_database_avg(self):
+        cls = Class.objects.create(grade_level="初三", cohort="初中AP级", class_name="1班")
+        exam = Exam.objects.create(name="E_parity", academic_year="2025-2026", grade_level="初中AP级", date=date(2024, 6, 1))
+        ExamSubject.objects.create(exam=exam, subject_code="语文", subject_name="语文", max_score=150)
+        # 精确均值为 88.96666666666667，数据库 AVG 的精度因后端而异（MySQL 为 88.966667）
+        for index, value in enumerate(["131.44", "125.13", "10.33"]):
+            student = Student.objects.create(
+                student_id=f"AP{index}", name=f"AP{index}", grade_level="初三", cohort="初中AP级", current_class=cls,
+            )
+            Score.objects.create(student=student, exam=exam, subject="语文", score_value=Decimal(value))
+
+        expected = float(Score.objects.filter(exam=exam).aggregate(avg=Avg("score_value"))["avg"])
+        result = analyze_grade(exam, "初中AP级")
+        self.assertEqual(json.loads(result["chart_data_json"])["subject_averages"], [expected])
+        self.assertEqual(result["class_statistics"][0]["subject_averages"], [expected])
@@ -2,9 +2,22 @@
 
 Provides a minimal BaseTestCase with a client initializer and small helpers.
 Other test modules may still define their own setUp when they need different fixtures.
+
+Also shared by the cache-backed tests (analysis cache, access scopes, rank index, target students):
+LocmemCacheMixin swaps the named cache aliases for per-process caches, create_cohort builds a
+cohort of classes/exams/students, and target_rule builds a single-condition target-student rule.
 """
-from django.test import TestCase, Client
+from datetime import date
+
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+
+from school_management.students_grades.models import Class, Exam, Student
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+DUMMY_BACKEND = 'django.core.cache.backends.dummy.DummyCache'
+TARGET_COHORT = '初中2023级'
 
 
 class BaseTestCase(TestCase):
@@ -29,3 +42,81 @@ class BaseTestCase(TestCase):
         if isinstance(value, (list, tuple)):
             return list(value)
         return [value]
+
+
+def locmem_caches(*aliases):
+    """CACHES 设置：default 与 aliases 为进程内缓存，其余分析类缓存别名为 DummyCache。"""
+    settings = {'default': {'BACKEND': LOCMEM_BACKEND}}
+    for alias in ('analysis', 'access_scope'):
+        if alias in aliases:
+            settings[alias] = {'BACKEND': LOCMEM_BACKEND, 'LOCATION': f'{alias}-tests'}
+        else:
+            settings[alias] = {'BACKEND': DUMMY_BACKEND}
+    return settings
+
+
+class LocmemCacheMixin:
+    """把 cache_aliases 中的缓存换成进程内缓存（其余为 DummyCache），每个测试前清空。"""
+
+    cache_aliases = ('analysis',)
+
+    @classmethod
+    def setUpClass(cls):
+        override = override_settings(CACHES=locmem_caches(*cls.cache_aliases))
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        for alias in self.cache_aliases:
+            caches[alias].clear()
+
+
+def create_cohort(prefix, student_count, exam_count, class_count=1, first_month=9, cohort=TARGET_COHORT):
+    """
+    建一届测试数据，返回 (班级, 考试, 学生) 三个列表。
+
+    班级为初二 1班、2班……；考试为 2025 年 first_month 起逐月一场；学生学号为 prefix + 三位序号，
+    按序号轮流分到各班，状态为在读。
+    """
+    classes = [
+        Class.objects.create(grade_level='初二', cohort=cohort, class_name=f'{i}班') for i in range(1, class_count + 1)
+    ]
+    exams = [
+        Exam.objects.create(
+            name=f'考试{i}', academic_year='2025-2026', grade_level=cohort, date=date(2025, first_month + i, 1)
+        )
+        for i in range(exam_count)
+    ]
+    students = [
+        Student.objects.create(
+            student_id=f'{prefix}{i:03d}', name=f'学生{i}', grade_level='初二', cohort=cohort,
+            current_class=classes[i % class_count], status='在读',
+        )
+        for i in range(student_count)
+    ]
+    return classes, exams, students
+
+
+def staff_client(username):
+    """以新建的 staff 用户登录的测试客户端。"""
+    client = Client()
+    client.force_login(get_user_model().objects.create_user(username=username, password='x', role='staff'))
+    return client
+
+
+def target_rule(**overrides):
+    """单条件目标生规则，默认：届别内全部考试的总分年级名次都在前 8 名，缺考即不满足。"""
+    rule = {
+        'grade_level': TARGET_COHORT,
+        'exam_scope': {'type': 'all_in_grade'},
+        'metric': 'total_score_rank_in_grade',
+        'operator': 'lte',
+        'threshold': 8,
+        'quantifier': 'all',
+        'k': None,
+        'absent_policy': 'strict_fail',
+    }
+    rule.update(overrides)
+    return rule
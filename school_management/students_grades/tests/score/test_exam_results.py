@@ -0,0 +1,106 @@
+"""Tests for the per-(student, exam) ExamResult summary table."""
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from school_management.students_grades.models import Class, Exam, ExamResult, ExamSubject, Score, Student
+from school_management.students_grades.services import ScoreImportService
+from school_management.students_grades.services.exam_result_service import ExamResultService
+from school_management.students_grades.tasks import update_all_rankings_async
+from school_management.students_grades.tests.score.test_score_imports import make_excel_bytes
+
+
+class ExamResultSyncTests(TestCase):
+    def setUp(self):
+        self.cls1 = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='1班')
+        self.cls2 = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='2班')
+        self.s1 = Student.objects.create(student_id='ER001', name='学生甲', grade_level='初一', cohort='初中2025级', current_class=self.cls1)
+        self.s2 = Student.objects.create(student_id='ER002', name='学生乙', grade_level='初一', cohort='初中2025级', current_class=self.cls2)
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 11, 1))
+        for subject in ('语文', '数学'):
+            ExamSubject.objects.create(exam=self.exam, subject_code=subject, subject_name=subject, max_score=150)
+
+    def test_single_score_writes_keep_summary_in_sync(self):
+        Score.objects.create(student=self.s1, exam=self.exam, subject='语文', score_value=Decimal('90.5'))
+        math = Score.objects.create(student=self.s1, exam=self.exam, subject='数学', score_value=80)
+
+        result = ExamResult.objects.get(student=self.s1, exam=self.exam)
+        self.assertEqual(result.total_score, Decimal('170.50'))
+        self.assertEqual(result.subject_count, 2)
+        self.assertEqual(result.subject_scores, {'语文': 90.5, '数学': 80.0})
+        self.assertEqual(result.class_at_exam, self.cls1)
+
+        math.score_value = 100
+        math.save()
+        Score.objects.filter(student=self.s1, exam=self.exam, subject='语文').delete()
+
+        result.refresh_from_db()
+        self.assertEqual(result.total_score, Decimal('100.00'))
+        self.assertEqual(result.subject_scores, {'数学': 100.0})
+
+        math.delete()
+        self.assertFalse(ExamResult.objects.filter(student=self.s1, exam=self.exam).exists())
+
+    def test_class_at_exam_is_kept_after_student_changes_class(self):
+        Score.objects.create(student=self.s1, exam=self.exam, subject='语文', score_value=90)
+        self.s1.current_class = self.cls2
+        self.s1.save()
+
+        Score.objects.create(student=self.s1, exam=self.exam, subject='数学', score_value=90)
+
+        self.assertEqual(ExamResult.objects.get(student=self.s1, exam=self.exam).class_at_exam, self.cls1)
+
+    def test_deferred_block_refreshes_on_exit(self):
+        with ExamResultService.deferred():
+            Score.objects.create(student=self.s1, exam=self.exam, subject='语文', score_value=90)
+            Score.objects.create(student=self.s1, exam=self.exam, subject='数学', score_value=80)
+            self.assertFalse(ExamResult.objects.exists())
+
+        self.assertEqual(ExamResult.objects.get(student=self.s1, exam=self.exam).subject_count, 2)
+
+        with self.assertRaises(RuntimeError):
+            with ExamResultService.deferred():
+                ExamResultService.mark_changed([(self.s2.id, self.exam.id)])
+                raise RuntimeError('boom')
+        # 异常后状态已复位，之后的写入立即同步
+        Score.objects.create(student=self.s2, exam=self.exam, subject='语文', score_value=60)
+        self.assertTrue(ExamResult.objects.filter(student=self.s2, exam=self.exam).exists())
+
+    def test_bulk_import_and_ranking_job_update_summary(self):
+        upload = make_excel_bytes(['学号', '学生姓名', '语文', '数学'], [('ER001', '学生甲', 120, 100), ('ER002', '学生乙', 110, 130)])
+        ScoreImportService.batch_import(upload, self.exam.pk)
+
+        results = {result.student_id: result for result in ExamResult.objects.filter(exam=self.exam)}
+        self.assertEqual(results[self.s1.id].total_score, Decimal('220.00'))
+        self.assertEqual(results[self.s2.id].total_score, Decimal('240.00'))
+        self.assertIsNone(results[self.s1.id].total_score_rank_in_grade)
+
+        update_all_rankings_async(self.exam.id, '初中2025级')
+
+        ranks = dict(ExamResult.objects.filter(exam=self.exam).values_list('student_id', 'total_score_rank_in_grade'))
+        self.assertEqual(ranks, {self.s2.id: 1, self.s1.id: 2})
+        self.assertEqual(
+            ExamResult.objects.get(student=self.s1, exam=self.exam).total_score_rank_in_class,
+            Score.objects.filter(student=self.s1, exam=self.exam).first().total_score_rank_in_class,
+        )
+
+    def test_backfill_command_repairs_drift(self):
+        Score.objects.bulk_create([
+            Score(student=self.s1, exam=self.exam, subject='语文', score_value=70, total_score_rank_in_grade=2),
+            Score(student=self.s1, exam=self.exam, subject='数学', score_value=75, total_score_rank_in_grade=2),
+            Score(student=self.s2, exam=self.exam, subject='语文', score_value=95, total_score_rank_in_grade=1),
+        ])
+        stale_exam = Exam.objects.create(name='旧考试', academic_year='2024-2025', grade_level='初中2025级', date=date(2025, 6, 1))
+        ExamResult.objects.create(student=self.s1, exam=stale_exam, total_score=10, subject_count=1)
+
+        out = StringIO()
+        call_command('backfill_exam_results', stdout=out)
+
+        self.assertIn('新增 2', out.getvalue())
+        self.assertFalse(ExamResult.objects.filter(exam=stale_exam).exists())
+        result = ExamResult.objects.get(student=self.s1, exam=self.exam)
+        self.assertEqual(result.total_score, Decimal('145.00'))
+        self.assertEqual(result.total_score_rank_in_grade, 2)
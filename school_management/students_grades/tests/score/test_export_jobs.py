@@ -0,0 +1,118 @@
+"""Tests for background export jobs (/api/export-jobs)."""
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+import openpyxl
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+
+from school_management.students_grades.models import Class, Exam, ExamSubject, ExportJob, Score, Student
+from school_management.students_grades.services import ExportJobService
+
+DELAY = 'school_management.students_grades.tasks.run_export_job.delay'
+
+
+class ExportJobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+        self.client = Client()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='export_job_staff', password='test-pass-123', role='staff')
+        self.other = User.objects.create_user(username='export_job_admin', password='test-pass-123', role='admin')
+        self.client.force_login(self.user)
+
+        cls = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='1班')
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 11, 1))
+        ExamSubject.objects.create(exam=self.exam, subject_code='语文', subject_name='语文', max_score=150)
+        self.student = Student.objects.create(student_id='EJ001', name='张三', grade_level='初一', cohort='初中2025级', current_class=cls)
+        self.score = Score.objects.create(student=self.student, exam=self.exam, subject='语文', score_value=120)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _request_export(self, query='async=true'):
+        with patch(DELAY, side_effect=ExportJobService.run) as mocked_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.get(f'/api/scores/batch-export?{query}')
+        self.assertEqual(resp.status_code, 202)
+        return resp.json()['job_id'], mocked_delay
+
+    def test_async_export_builds_downloadable_artifact(self):
+        job_id, mocked_delay = self._request_export()
+        mocked_delay.assert_called_once_with(job_id)
+
+        data = self.client.get(f'/api/export-jobs/{job_id}').json()
+        self.assertEqual(data['status'], 'success')
+        self.assertFalse(data['cached'])
+        self.assertEqual(data['download_url'], f'/api/export-jobs/{job_id}/download')
+
+        resp = self.client.get(data['download_url'])
+        self.assertEqual(resp.status_code, 200)
+        sheet = openpyxl.load_workbook(BytesIO(b''.join(resp.streaming_content))).active
+        self.assertEqual(sheet.title, '成绩导出')
+        self.assertEqual(sheet.cell(row=2, column=1).value, 'EJ001')
+
+    def test_repeat_request_reuses_artifact_until_scores_change(self):
+        first_id, _ = self._request_export('async=true&grade_filter=初中2025级')
+        first = ExportJob.objects.get(pk=first_id)
+
+        # 参数顺序不同、多了无关参数，仍是同一缓存键；其他用户（同为全校范围）直接拿到已生成的文件
+        self.client.force_login(self.other)
+        second_id, mocked_delay = self._request_export('grade_filter=初中2025级&async=1&page=3')
+        mocked_delay.assert_not_called()
+        second = ExportJob.objects.get(pk=second_id)
+        self.assertEqual((second.status, second.cached, second.file.name), ('success', True, first.file.name))
+
+        self.score.score_value = 130
+        self.score.save()
+
+        third_id, mocked_delay = self._request_export('async=true&grade_filter=初中2025级')
+        mocked_delay.assert_called_once()
+        third = ExportJob.objects.get(pk=third_id)
+        self.assertFalse(third.cached)
+        self.assertNotEqual(third.cache_key, first.cache_key)
+
+    def test_cache_key_depends_on_user_scope(self):
+        teacher = get_user_model().objects.create_user(username='export_job_teacher', password='test-pass-123', role='subject_teacher')
+        params = ExportJobService.normalize_params(QueryDict('grade_filter=初中2025级'))
+
+        self.assertEqual(
+            ExportJobService.build_cache_key('score_batch', params, self.user),
+            ExportJobService.build_cache_key('score_batch', params, self.other),
+        )
+        self.assertNotEqual(
+            ExportJobService.build_cache_key('score_batch', params, self.user),
+            ExportJobService.build_cache_key('score_batch', params, teacher),
+        )
+
+    def test_expired_artifacts_are_evicted(self):
+        job_id, _ = self._request_export()
+        job = ExportJob.objects.get(pk=job_id)
+        self.assertTrue(default_storage.exists(job.file.name))
+
+        ExportJob.objects.filter(pk=job_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.client.get(f'/api/export-jobs/{job_id}/download').status_code, 410)
+
+        call_command('evict_export_artifacts', stdout=StringIO())
+
+        self.assertFalse(ExportJob.objects.filter(pk=job_id).exists())
+        self.assertFalse(default_storage.exists(job.file.name))
+
+    def test_jobs_are_scoped_to_their_creator(self):
+        job_id, _ = self._request_export()
+        teacher = get_user_model().objects.create_user(username='export_job_other', password='test-pass-123', role='staff')
+        self.client.force_login(teacher)
+
+        self.assertEqual(self.client.get(f'/api/export-jobs/{job_id}').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/export-jobs/{job_id}/download').status_code, 404)
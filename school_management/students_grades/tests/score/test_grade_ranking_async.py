@@ -1,10 +1,19 @@
 """Unit tests for ranking algorithm in tasks.update_grade_rankings_optimized."""
 from datetime import date
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from school_management.students_grades.models import Class, Student, Exam, ExamSubject, Score
-from school_management.students_grades.tasks import update_grade_rankings_optimized
+from school_management.students_grades.tasks import (
+    MISSING_RANK,
+    RANK_FIELDS,
+    update_all_rankings_async,
+    update_grade_rankings_incremental,
+    update_grade_rankings_optimized,
+    verify_grade_rankings,
+)
 
 
 class RankingAlgorithmTests(TestCase):
@@ -14,10 +23,10 @@ class RankingAlgorithmTests(TestCase):
         self.class2 = Class.objects.create(grade_level='Grade8', class_name='2班')
 
         # 创建学生并分班
-        self.s1 = Student.objects.create(student_id='A001', name='学生A', grade_level='Grade8', current_class=self.class1)
-        self.s2 = Student.objects.create(student_id='A002', name='学生B', grade_level='Grade8', current_class=self.class1)
-        self.s3 = Student.objects.create(student_id='A003', name='学生C', grade_level='Grade8', current_class=self.class2)
-        self.s4 = Student.objects.create(student_id='A004', name='学生D', grade_level='Grade8', current_class=self.class2)
+        self.s1 = Student.objects.create(student_id='A001', name='学生A', grade_level='Grade8', cohort='Grade8', current_class=self.class1)
+        self.s2 = Student.objects.create(student_id='A002', name='学生B', grade_level='Grade8', cohort='Grade8', current_class=self.class1)
+        self.s3 = Student.objects.create(student_id='A003', name='学生C', grade_level='Grade8', cohort='Grade8', current_class=self.class2)
+        self.s4 = Student.objects.create(student_id='A004', name='学生D', grade_level='Grade8', cohort='Grade8', current_class=self.class2)
 
         # 创建考试与科目
         self.exam = Exam.objects.create(name='期中', academic_year='2024-2025', grade_level='Grade8', date=date(2025,6,1))
@@ -102,7 +111,7 @@ class RankingAlgorithmTests(TestCase):
         期望：语文年级排名 s2 和 s5 并列为 1，s1 的语文排名应为 3（并列后跳过 2）。
         """
         # 新建一个与 s2 在语文并列但总分较低的学生
-        s5 = Student.objects.create(student_id='A005', name='学生E', grade_level='Grade8', current_class=self.class1)
+        s5 = Student.objects.create(student_id='A005', name='学生E', grade_level='Grade8', cohort='Grade8', current_class=self.class1)
         # s5: 语文95 (并列), 数学 50 (使总分落后)
         Score.objects.create(student=s5, exam=self.exam, subject='语文', score_value=95)
         Score.objects.create(student=s5, exam=self.exam, subject='数学', score_value=50)
@@ -126,7 +135,7 @@ class RankingAlgorithmTests(TestCase):
         测试要点：创建一个只考一科的学生，断言其 total_score_rank_in_grade 排在预期位置（比有完整科目的学生低）。
         """
         # 新建一个只考语文但不考数学的学生 s6
-        s6 = Student.objects.create(student_id='A006', name='学生F', grade_level='Grade8', current_class=self.class2)
+        s6 = Student.objects.create(student_id='A006', name='学生F', grade_level='Grade8', cohort='Grade8', current_class=self.class2)
         # 仅添加语文成绩 85
         Score.objects.create(student=s6, exam=self.exam, subject='语文', score_value=85)
 
@@ -148,8 +157,8 @@ class RankingAlgorithmTests(TestCase):
         要点：向每个班级再添加一个学生，确保在班级内和年级内总分排序都按照 total_score 排序并处理并列。
         """
         # 添加两名学生，分别放到 class1 和 class2
-        s7 = Student.objects.create(student_id='A007', name='学生G', grade_level='Grade8', current_class=self.class1)
-        s8 = Student.objects.create(student_id='A008', name='学生H', grade_level='Grade8', current_class=self.class2)
+        s7 = Student.objects.create(student_id='A007', name='学生G', grade_level='Grade8', cohort='Grade8', current_class=self.class1)
+        s8 = Student.objects.create(student_id='A008', name='学生H', grade_level='Grade8', cohort='Grade8', current_class=self.class2)
 
         # s7 在 class1 给出总分 150 (例如 语文75 数学75)
         Score.objects.create(student=s7, exam=self.exam, subject='语文', score_value=75)
@@ -176,3 +185,122 @@ class RankingAlgorithmTests(TestCase):
         self.assertGreater(rec_s7.total_score_rank_in_grade, rec_s8.total_score_rank_in_grade)
         # 在 class1 内，s7 的班级排名应比 s1/s2 更靠后（通常为 3）
         self.assertGreaterEqual(rec_s7.total_score_rank_in_class, 3)
+
+
+class IncrementalRankingTests(TestCase):
+    """增量排名：只重写排名实际变化的记录，结果与全量重算一致。"""
+
+    def setUp(self):
+        # 复用 RankingAlgorithmTests 的班级/学生/成绩夹具，先跑一次全量排名作为基线
+        RankingAlgorithmTests.setUp(self)
+        update_grade_rankings_optimized(self.exam, 'Grade8')
+
+    def test_incremental_update_only_rewrites_shifted_rows(self):
+        # s3 语文 80 -> 100，总分 160 -> 180：s3 与 s4 的年级总分名次互换，语文年级名次整体后移
+        Score.objects.filter(student=self.s3, exam=self.exam, subject='语文').update(score_value=100)
+
+        res = update_grade_rankings_incremental(self.exam, 'Grade8', [(self.s3.id, '语文')])
+
+        self.assertTrue(res.get('success'))
+        self.assertEqual(res.get('mode'), 'incremental')
+        # s3/s4 的两条总分记录 + s1/s2 的语文记录；s1/s2 的数学记录不变
+        self.assertEqual(res.get('updated_count'), 6)
+        self.assertEqual(verify_grade_rankings(self.exam, 'Grade8'), [])
+
+        rec_s3 = Score.objects.get(student=self.s3, exam=self.exam, subject='语文')
+        self.assertEqual(rec_s3.grade_rank_in_subject, 1)
+        self.assertEqual(rec_s3.total_score_rank_in_grade, 3)
+        self.assertEqual(rec_s3.total_score_rank_in_class, 1)
+
+    def test_incremental_update_is_noop_when_ranks_unchanged(self):
+        # 分数变化但不跨越任何人：名次全部不变，不应写库
+        Score.objects.filter(student=self.s3, exam=self.exam, subject='数学').update(score_value=81)
+
+        res = update_grade_rankings_incremental(self.exam, 'Grade8', [(self.s3.id, '数学')])
+
+        self.assertEqual(res.get('updated_count'), 0)
+        self.assertEqual(verify_grade_rankings(self.exam, 'Grade8'), [])
+
+    def test_incremental_update_handles_deleted_subject(self):
+        Score.objects.filter(student=self.s1, exam=self.exam, subject='数学').delete()
+
+        update_grade_rankings_incremental(self.exam, 'Grade8', [(self.s1.id, '数学')])
+
+        self.assertEqual(verify_grade_rankings(self.exam, 'Grade8'), [])
+        rec_s1 = Score.objects.get(student=self.s1, exam=self.exam, subject='语文')
+        # s1 只剩语文 90，总分年级最低
+        self.assertEqual(rec_s1.total_score_rank_in_grade, 4)
+
+    def test_async_entry_resolves_cohort_from_changed_pairs(self):
+        Score.objects.filter(student=self.s4, exam=self.exam, subject='语文').update(score_value=100)
+
+        res = update_all_rankings_async(self.exam.id, changed_pairs=[[self.s4.id, '语文']])
+
+        self.assertTrue(res.get('success'))
+        self.assertEqual(verify_grade_rankings(self.exam, 'Grade8'), [])
+
+    def test_verify_falls_back_to_full_recompute_on_drift(self):
+        # 人为制造与本次变动无关的排名漂移，增量路径不会修复它，校验后应回退全量重算
+        Score.objects.filter(student=self.s1, exam=self.exam, subject='数学').update(grade_rank_in_subject=42)
+        Score.objects.filter(student=self.s3, exam=self.exam, subject='语文').update(score_value=100)
+
+        update_all_rankings_async(
+            self.exam.id,
+            'Grade8',
+            changed_pairs=[[self.s3.id, '语文']],
+            verify=True,
+        )
+
+        self.assertEqual(verify_grade_rankings(self.exam, 'Grade8'), [])
+
+
+class RankingBackendTests(TestCase):
+    """SQL 窗口函数后端与 Python 后端的排名结果必须逐行一致。"""
+
+    def setUp(self):
+        RankingAlgorithmTests.setUp(self)
+        # 未分班学生：班级排名应写占位名次
+        self.s9 = Student.objects.create(student_id='A009', name='学生I', grade_level='Grade8', cohort='Grade8')
+        Score.objects.create(student=self.s9, exam=self.exam, subject='语文', score_value=80.1)
+        Score.objects.create(student=self.s9, exam=self.exam, subject='数学', score_value=90.2)
+        # 小数总分并列：80.1 + 90.2 == 90.1 + 80.2
+        self.s10 = Student.objects.create(student_id='A010', name='学生J', grade_level='Grade8', cohort='Grade8', current_class=self.class2)
+        Score.objects.create(student=self.s10, exam=self.exam, subject='语文', score_value=90.1)
+        Score.objects.create(student=self.s10, exam=self.exam, subject='数学', score_value=80.2)
+
+    def _snapshot(self):
+        return {
+            row['id']: row
+            for row in Score.objects.filter(exam=self.exam).values('id', *RANK_FIELDS)
+        }
+
+    def test_sql_and_python_backends_write_identical_ranks(self):
+        res_python = update_grade_rankings_optimized(self.exam, 'Grade8', backend='python')
+        python_ranks = self._snapshot()
+        Score.objects.filter(exam=self.exam).update(**{field: None for field in RANK_FIELDS})
+
+        res_sql = update_grade_rankings_optimized(self.exam, 'Grade8', backend='sql')
+
+        self.assertEqual(res_python['backend'], 'python')
+        self.assertEqual(res_sql['backend'], 'sql')
+        self.assertEqual(res_sql['updated_count'], 12)
+        self.assertEqual(self._snapshot(), python_ranks)
+        self.assertEqual(verify_grade_rankings(self.exam, 'Grade8'), [])
+
+        rec_s9 = Score.objects.get(student=self.s9, exam=self.exam, subject='语文')
+        rec_s10 = Score.objects.get(student=self.s10, exam=self.exam, subject='语文')
+        self.assertEqual(rec_s9.total_score_rank_in_grade, rec_s10.total_score_rank_in_grade)
+        self.assertEqual(rec_s9.total_score_rank_in_class, MISSING_RANK)
+        self.assertEqual(rec_s9.class_rank_in_subject, MISSING_RANK)
+
+    def test_python_backend_query_count_does_not_grow_with_rows(self):
+        # 一次读取 + 一次批量写回，不再逐行访问 score.student
+        with CaptureQueriesContext(connection) as ctx:
+            update_grade_rankings_optimized(self.exam, 'Grade8', backend='python')
+        self.assertLessEqual(len(ctx.captured_queries), 2)
+
+    def test_sql_backend_writes_back_in_a_single_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            update_grade_rankings_optimized(self.exam, 'Grade8', backend='sql')
+        statements = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('UPDATE')]
+        self.assertEqual(len(statements), 1)
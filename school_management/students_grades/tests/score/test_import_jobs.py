@@ -0,0 +1,166 @@
+"""Tests for background Excel import jobs (/api/import-jobs)."""
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+
+from school_management.students_grades.models import Exam, ExamSubject, ImportJob, Score, Student
+from school_management.students_grades.services import ImportJobService
+from school_management.students_grades.tests.score.test_score_imports import make_excel_bytes
+
+DELAY = 'school_management.students_grades.tasks.run_import_job.delay'
+
+
+class ImportJobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+        self.client = Client()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='import_job_staff', password='test-pass-123', role='staff')
+        self.client.force_login(self.user)
+
+        self.exam = Exam.objects.create(name='期末', academic_year='2024-2025', grade_level='Grade8', date=date(2025, 6, 20))
+        ExamSubject.objects.create(exam=self.exam, subject_code='语文', subject_name='语文', max_score=150)
+        self.stu1 = Student.objects.create(student_id='J001', name='张三')
+        self.stu2 = Student.objects.create(student_id='J002', name='李四')
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _score_file(self):
+        return make_excel_bytes(
+            ['学号', '学生姓名', '语文'],
+            [('J001', '张三', 120), ('J002', '李四', 999), ('J404', '王五', 100)],
+        )
+
+    def test_async_score_import_returns_job_and_status_reports_result(self):
+        with patch(DELAY, side_effect=ImportJobService.run) as mocked_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(
+                    '/api/scores/batch-import',
+                    {'exam': self.exam.pk, 'excel_file': self._score_file(), 'async': 'true'},
+                )
+
+        self.assertEqual(resp.status_code, 202)
+        job_id = resp.json()['job_id']
+        mocked_delay.assert_called_once_with(job_id)
+
+        status_resp = self.client.get(f'/api/import-jobs/{job_id}')
+        self.assertEqual(status_resp.status_code, 200)
+        data = status_resp.json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['total_rows'], 3)
+        self.assertEqual(data['imported_rows'], 1)
+        self.assertEqual(data['failed_rows'], 2)
+        self.assertEqual(data['progress'], 100.0)
+        self.assertEqual([item['row'] for item in data['error_details']], [3, 4])
+        self.assertEqual(data['result']['imported_count'], 1)
+        self.assertTrue(Score.objects.filter(student=self.stu1, exam=self.exam).exists())
+
+    def test_async_score_import_resumes_from_start_row(self):
+        with patch(DELAY):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(
+                    '/api/scores/batch-import',
+                    {'exam': self.exam.pk, 'excel_file': self._score_file(), 'async': 'true', 'start_row': 3},
+                )
+        job_id = resp.json()['job_id']
+
+        data = ImportJobService.run(job_id)
+
+        self.assertEqual(data['start_row'], 3)
+        self.assertEqual(data['total_rows'], 2)
+        self.assertEqual(data['processed_rows'], 2)
+        self.assertEqual([item['row'] for item in data['error_details']], [3, 4])
+        self.assertFalse(Score.objects.filter(student=self.stu1, exam=self.exam).exists())
+
+    def test_finished_job_deletes_uploaded_source_file(self):
+        with patch(DELAY):
+            job = ImportJobService.create_job('score', self._score_file(), self.user, exam_id=self.exam.pk)
+        path = job.file.path
+        self.assertTrue(os.path.exists(path))
+
+        ImportJobService.run(job.pk)
+
+        job.refresh_from_db()
+        self.assertFalse(job.file)
+        self.assertFalse(os.path.exists(path))
+
+    def test_invalid_start_row_is_rejected(self):
+        with patch(DELAY):
+            resp = self.client.post(
+                '/api/scores/batch-import',
+                {'exam': self.exam.pk, 'excel_file': self._score_file(), 'async': 'true', 'start_row': 'abc'},
+            )
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_small_file_keeps_synchronous_result_format(self):
+        resp = self.client.post('/api/scores/batch-import', {'exam': self.exam.pk, 'excel_file': self._score_file()})
+
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertNotIn('job_id', body)
+        self.assertEqual(body['imported_count'], 1)
+        self.assertEqual(len(body['error_details']), 2)
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_queue_unavailable_runs_job_inline(self):
+        with patch(DELAY, side_effect=ConnectionError('redis down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                job = ImportJobService.create_job('score', self._score_file(), self.user, exam_id=self.exam.pk)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'success')
+
+    def test_student_import_job_reports_failed_rows_as_error_details(self):
+        upload = make_excel_bytes(
+            ['学号 (必填)', '姓名 (必填)'],
+            [('J100', '新同学'), ('', '缺学号')],
+        )
+        with patch(DELAY):
+            job = ImportJobService.create_job('student', upload, self.user)
+
+        data = ImportJobService.run(job.pk)
+
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['imported_rows'], 1)
+        self.assertEqual(data['error_details'][0]['row'], 3)
+        self.assertTrue(Student.objects.filter(student_id='J100').exists())
+
+    def test_running_job_reports_eta(self):
+        with patch(DELAY):
+            job = ImportJobService.create_job('score', self._score_file(), self.user, exam_id=self.exam.pk)
+        ImportJob.objects.filter(pk=job.pk).update(
+            status='running',
+            total_rows=100,
+            processed_rows=25,
+            started_at=timezone.now() - timedelta(seconds=10),
+        )
+        job.refresh_from_db()
+
+        data = ImportJobService.serialize(job)
+
+        self.assertEqual(data['progress'], 25.0)
+        self.assertAlmostEqual(data['eta_seconds'], 30, delta=2)
+        self.assertNotIn('result', data)
+
+    def test_jobs_are_scoped_to_their_creator(self):
+        with patch(DELAY):
+            job = ImportJobService.create_job('score', self._score_file(), self.user, exam_id=self.exam.pk)
+
+        other = get_user_model().objects.create_user(username='import_job_other', password='test-pass-123', role='staff')
+        self.client.force_login(other)
+
+        self.assertEqual(self.client.get(f'/api/import-jobs/{job.pk}').status_code, 404)
+        self.assertEqual(self.client.get('/api/import-jobs').json()['results'], [])
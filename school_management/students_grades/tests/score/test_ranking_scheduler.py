@@ -0,0 +1,204 @@
+"""Tests for the coalescing ranking scheduler (inline backend)."""
+import time
+from datetime import date
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+
+from school_management.students_grades.models import Class, Student, Exam, ExamSubject, Score
+from school_management.students_grades.services.ranking_scheduler import (
+    ALL_COHORTS,
+    InMemoryRankingStore,
+    RankingScheduler,
+    RedisRankingStore,
+)
+from school_management.students_grades.services.score_mutation_service import ScoreMutationService
+from school_management.students_grades.tasks import verify_grade_rankings
+from school_management.students_grades.tests.score.test_base import BaseTestCase
+
+RUN_TASK = 'school_management.students_grades.services.ranking_scheduler.update_all_rankings_async'
+
+
+class RankingSchedulerTests(TestCase):
+    def setUp(self):
+        InMemoryRankingStore.clear()
+        self.cls = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='1班')
+        self.s1 = Student.objects.create(student_id='RS001', name='学生甲', grade_level='初一', cohort='初中2025级', current_class=self.cls)
+        self.s2 = Student.objects.create(student_id='RS002', name='学生乙', grade_level='初一', cohort='初中2025级', current_class=self.cls)
+        self.exam = Exam.objects.create(name='月考', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 10, 1))
+        ExamSubject.objects.create(exam=self.exam, subject_code='语文', subject_name='语文', max_score=120)
+        ExamSubject.objects.create(exam=self.exam, subject_code='数学', subject_name='数学', max_score=120)
+
+    def tearDown(self):
+        InMemoryRankingStore.clear()
+
+    def test_repeated_requests_collapse_into_one_job(self):
+        for _ in range(3):
+            RankingScheduler.request(self.exam.id, changed_pairs=[(self.s1.id, '语文')])
+        RankingScheduler.request(self.exam.id, changed_pairs=[(self.s2.id, '数学')])
+
+        status = RankingScheduler.pending(self.exam.id)
+        self.assertTrue(status['pending'])
+        self.assertEqual(len(status['cohorts']), 1)
+        self.assertEqual(status['cohorts'][0]['grade_level'], '初中2025级')
+        self.assertEqual(status['cohorts'][0]['request_count'], 4)
+        self.assertFalse(status['cohorts'][0]['full'])
+
+        with patch(RUN_TASK) as mocked_task:
+            RankingScheduler.flush(self.exam.id)
+
+        mocked_task.assert_called_once_with(
+            self.exam.id,
+            '初中2025级',
+            changed_pairs=[[self.s1.id, '语文'], [self.s2.id, '数学']],
+        )
+        self.assertFalse(RankingScheduler.pending(self.exam.id)['pending'])
+
+    def test_full_request_absorbs_incremental_pairs(self):
+        RankingScheduler.request(self.exam.id, changed_pairs=[(self.s1.id, '语文')])
+        RankingScheduler.request(self.exam.id, '初中2025级')
+
+        with patch(RUN_TASK) as mocked_task:
+            RankingScheduler.flush()
+
+        mocked_task.assert_called_once_with(self.exam.id, '初中2025级', changed_pairs=None)
+
+    @override_settings(RANKING_SCHEDULER={'BACKEND': 'inline', 'MAX_CHANGED_PAIRS': 1})
+    def test_too_many_pairs_collapse_to_full_recompute(self):
+        RankingScheduler.request(self.exam.id, changed_pairs=[(self.s1.id, '语文'), (self.s2.id, '语文')])
+
+        self.assertTrue(RankingScheduler.pending(self.exam.id)['cohorts'][0]['full'])
+
+    def test_unknown_cohort_falls_back_to_whole_exam(self):
+        RankingScheduler.request(self.exam.id)
+
+        status = RankingScheduler.pending(self.exam.id)
+        self.assertEqual(status['cohorts'][0]['grade_level'], None)
+        with patch(RUN_TASK) as mocked_task:
+            RankingScheduler.flush(self.exam.id)
+        mocked_task.assert_called_once_with(self.exam.id, None, changed_pairs=None)
+
+    @override_settings(RANKING_SCHEDULER={'BACKEND': 'inline', 'QUIET_SECONDS': 30, 'MAX_DELAY_SECONDS': 60})
+    def test_run_pending_waits_for_quiet_window(self):
+        RankingScheduler.request(self.exam.id, '初中2025级')
+
+        with patch(RUN_TASK) as mocked_task:
+            self.assertIsNone(RankingScheduler.run_pending(self.exam.id, '初中2025级'))
+            mocked_task.assert_not_called()
+            self.assertTrue(RankingScheduler.pending(self.exam.id)['pending'])
+
+            RankingScheduler.run_pending(self.exam.id, '初中2025级', force=True)
+            mocked_task.assert_called_once()
+
+    @override_settings(RANKING_SCHEDULER={'BACKEND': 'inline', 'QUIET_SECONDS': 30, 'MAX_DELAY_SECONDS': 10})
+    def test_quiet_window_is_capped_by_max_delay(self):
+        RankingScheduler.request(self.exam.id, '初中2025级')
+        first = RankingScheduler.pending(self.exam.id)['cohorts'][0]
+
+        self.assertLessEqual(first['due_at'], first['first_requested_at'] + 10)
+        self.assertLessEqual(first['due_at'], time.time() + 10)
+
+    def test_failed_schedule_is_cleared_so_next_request_retries(self):
+        with patch.object(InMemoryRankingStore, 'schedule', side_effect=ConnectionError('redis down')):
+            self.assertFalse(RankingScheduler.request(self.exam.id, '初中2025级'))
+
+        self.assertIsNone(InMemoryRankingStore().get(self.exam.id, '初中2025级')['scheduled_for'])
+        with patch.object(InMemoryRankingStore, 'schedule', return_value=None) as mocked_schedule:
+            self.assertTrue(RankingScheduler.request(self.exam.id, '初中2025级'))
+        mocked_schedule.assert_called_once()
+
+    @override_settings(RANKING_SCHEDULER={'BACKEND': 'inline', 'QUIET_SECONDS': 5, 'RESCHEDULE_GRACE_SECONDS': 60})
+    def test_overdue_job_is_rescheduled_after_grace_period(self):
+        with patch.object(InMemoryRankingStore, 'schedule', return_value=None) as mocked_schedule:
+            RankingScheduler.request(self.exam.id, '初中2025级')
+            RankingScheduler.request(self.exam.id, '初中2025级')
+            self.assertEqual(mocked_schedule.call_count, 1)
+
+            # 任务应在 5 秒后执行，但过了宽限时间仍未执行（如 worker 未带 --with-scheduler）
+            with patch('school_management.students_grades.services.ranking_scheduler.time.time',
+                       return_value=time.time() + 120):
+                RankingScheduler.request(self.exam.id, '初中2025级')
+            self.assertEqual(mocked_schedule.call_count, 2)
+
+        state = InMemoryRankingStore().get(self.exam.id, '初中2025级')
+        self.assertEqual(state['request_count'], 3)
+        self.assertGreater(state['scheduled_for'], time.time() + 100)
+
+    def test_mutation_service_registers_pending_rankings_and_flush_applies_them(self):
+        ScoreMutationService.manual_add(self.s1.id, self.exam.id, {'语文': 100, '数学': 90})
+        ScoreMutationService.manual_add(self.s2.id, self.exam.id, {'语文': 80, '数学': 110})
+
+        status = RankingScheduler.pending(self.exam.id)
+        self.assertEqual(status['cohorts'][0]['request_count'], 2)
+
+        results = RankingScheduler.flush(self.exam.id)
+
+        self.assertEqual(len(results), 1)
+        self.assertTrue(results[0]['success'])
+        self.assertEqual(verify_grade_rankings(self.exam, '初中2025级'), [])
+        self.assertEqual(Score.objects.get(student=self.s2, exam=self.exam, subject='数学').grade_rank_in_subject, 1)
+
+
+class RankingStatusApiTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        InMemoryRankingStore.clear()
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 11, 1))
+
+    def tearDown(self):
+        InMemoryRankingStore.clear()
+
+    def test_ranking_status_reports_pending_cohorts(self):
+        resp = self.client.get('/api/scores/ranking-status', {'exam': self.exam.id})
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(resp.json()['pending'])
+
+        RankingScheduler.request(self.exam.id, '初中2025级')
+
+        data = self.client.get('/api/scores/ranking-status', {'exam': self.exam.id}).json()
+        self.assertTrue(data['success'])
+        self.assertTrue(data['pending'])
+        self.assertEqual(data['cohorts'][0]['grade_level'], '初中2025级')
+        self.assertNotEqual(data['cohorts'][0]['grade_level'], ALL_COHORTS)
+
+    def test_ranking_status_requires_exam(self):
+        resp = self.client.get('/api/scores/ranking-status')
+        self.assertEqual(resp.status_code, 400)
+
+
+def _redis_available():
+    try:
+        import django_rq
+
+        django_rq.get_connection('default').ping()
+    except Exception:
+        return False
+    return True
+
+
+@skipUnless(_redis_available(), 'Redis 未启动')
+class RedisRankingStoreTests(TestCase):
+    def setUp(self):
+        self.store = RedisRankingStore()
+        self.exam_id = 900000 + int(time.time()) % 1000
+        self.addCleanup(self.store.pop, self.exam_id, '初中2025级')
+
+    def test_add_is_atomic_and_expires_state(self):
+        now = time.time()
+        self.assertTrue(self.store.add(self.exam_id, '初中2025级', {(1, '语文')}, False, now, 5, 60, 10, 60, 300))
+        self.assertFalse(self.store.add(self.exam_id, '初中2025级', {(2, '数学')}, False, now + 1, 5, 60, 10, 60, 300))
+
+        state = self.store.get(self.exam_id, '初中2025级')
+        self.assertEqual(state['first_requested_at'], now)
+        self.assertEqual(state['request_count'], 2)
+        state_key = self.store._state_key(self.exam_id, '初中2025级')
+        self.assertTrue(0 < self.store.redis.ttl(state_key) <= 300)
+        self.assertTrue(0 < self.store.redis.ttl(self.store._pairs_key(self.exam_id, '初中2025级')) <= 300)
+
+    def test_missing_job_is_rescheduled(self):
+        now = time.time()
+        self.store.add(self.exam_id, '初中2025级', set(), True, now, 5, 60, 10, 60, 300)
+        self.store.mark_scheduled(self.exam_id, '初中2025级', now + 5, 'missing-job-id')
+
+        self.assertTrue(self.store.add(self.exam_id, '初中2025级', set(), True, now + 1, 5, 60, 10, 60, 300))
@@ -0,0 +1,105 @@
+"""Tests for memoised score access scopes (ScoreAccessService.get_scope)."""
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+
+from school_management.students_grades.models import Class, Exam, Score, Student
+from school_management.students_grades.services.score_access_service import ScoreAccessService
+from school_management.students_grades.tests.score.test_base import LocmemCacheMixin
+
+
+class ScoreAccessScopeTests(LocmemCacheMixin, TestCase):
+    cache_aliases = ('access_scope',)
+
+    def setUp(self):
+        super().setUp()
+        User = get_user_model()
+        self.teacher = User.objects.create_user(username='scope_teacher', password='test-pass-123', role='subject_teacher')
+        self.class_1 = Class.objects.create(grade_level='初一', cohort='初中SC级', class_name='1班')
+        self.class_2 = Class.objects.create(grade_level='初一', cohort='初中SC级', class_name='2班')
+        self.class_1.subject_teachers.add(self.teacher)
+
+        self.exam_1 = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中SC级', date=date(2025, 11, 1))
+        self.exam_2 = Exam.objects.create(name='期末', academic_year='2025-2026', grade_level='初中SC级', date=date(2026, 1, 10))
+        self.student_1 = Student.objects.create(student_id='SC001', name='甲', grade_level='初一', cohort='初中SC级', current_class=self.class_1)
+        self.student_2 = Student.objects.create(student_id='SC002', name='乙', grade_level='初一', cohort='初中SC级', current_class=self.class_2)
+        Score.objects.create(student=self.student_1, exam=self.exam_1, subject='语文', score_value=90)
+        Score.objects.create(student=self.student_2, exam=self.exam_2, subject='语文', score_value=80)
+
+    def _fresh_teacher(self):
+        # 模拟新请求：每个请求的 request.user 都是新加载的对象
+        return get_user_model().objects.get(pk=self.teacher.pk)
+
+    def test_scope_is_resolved_once_per_request_and_cached_across_requests(self):
+        teacher = self._fresh_teacher()
+        with CaptureQueriesContext(connection) as ctx:
+            ScoreAccessService.scope_scores(teacher, Score.objects.all())
+            ScoreAccessService.scope_students(teacher, Student.objects.all())
+            ScoreAccessService.scope_classes(teacher, Class.objects.all())
+            ScoreAccessService.scope_exams_for_entry(teacher, Exam.objects.all())
+        # 任课班级 + 班级届别，只查一次
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+        teacher = self._fresh_teacher()
+        with self.assertNumQueries(0):
+            scope = ScoreAccessService.get_scope(teacher)
+        self.assertEqual((scope.class_ids, scope.cohorts), ((self.class_1.pk,), ('初中SC级',)))
+
+    def test_exam_scope_uses_class_exam_map_instead_of_scores(self):
+        teacher = self._fresh_teacher()
+        with CaptureQueriesContext(connection) as ctx:
+            exams = list(ScoreAccessService.scope_exams_from_scores(teacher, Exam.objects.all()))
+        self.assertEqual(exams, [self.exam_1])
+        self.assertFalse(any('"students_grades_score"' in query['sql'] for query in ctx.captured_queries))
+
+        teacher = self._fresh_teacher()
+        with self.assertNumQueries(1):
+            # 只剩考试本身的查询
+            list(ScoreAccessService.scope_exams_from_scores(teacher, Exam.objects.all()))
+
+    def test_teaching_class_change_invalidates_scope(self):
+        self.assertEqual(ScoreAccessService.scoped_class_ids(self._fresh_teacher()), [self.class_1.pk])
+
+        self.class_2.subject_teachers.add(self.teacher)
+        teacher = self._fresh_teacher()
+        self.assertEqual(sorted(ScoreAccessService.scoped_class_ids(teacher)), [self.class_1.pk, self.class_2.pk])
+        self.assertEqual(
+            set(ScoreAccessService.scope_exams_from_scores(teacher, Exam.objects.all())),
+            {self.exam_1, self.exam_2},
+        )
+
+    def test_role_change_and_transfers_are_reflected(self):
+        teacher = self._fresh_teacher()
+        self.assertEqual(list(ScoreAccessService.scope_exams_from_scores(teacher, Exam.objects.all())), [self.exam_1])
+
+        # 调班后 (班级 → 考试) 映射失效
+        self.student_2.current_class = self.class_1
+        self.student_2.save()
+        teacher = self._fresh_teacher()
+        self.assertEqual(
+            set(ScoreAccessService.scope_exams_from_scores(teacher, Exam.objects.all())),
+            {self.exam_1, self.exam_2},
+        )
+
+        teacher.role = 'grade_manager'
+        teacher.managed_grade = '初一'
+        teacher.save()
+        self.assertEqual(
+            sorted(ScoreAccessService.scoped_class_ids(self._fresh_teacher())),
+            [self.class_1.pk, self.class_2.pk],
+        )
+
+    def test_options_endpoint_resolves_scope_once(self):
+        client = Client()
+        client.force_login(self.teacher)
+        client.get('/api/scores/options')
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = client.get('/api/scores/options')
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(
+            any('"students_grades_class_subject_teachers"' in query['sql'] for query in ctx.captured_queries)
+        )
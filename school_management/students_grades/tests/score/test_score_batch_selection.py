@@ -0,0 +1,87 @@
+"""Tests for set-based selected-record operations (batch-delete-selected / batch-export-selected)."""
+from datetime import date
+from unittest import mock
+
+from .test_base import BaseTestCase
+from school_management.students_grades.models import Class, Exam, ExamResult, Score, Student
+from school_management.students_grades.services import ScoreMutationService, ScoreQueryService
+
+SCHEDULER_REQUEST = 'school_management.students_grades.services.ranking_scheduler.RankingScheduler.request'
+
+
+class ScoreBatchSelectionTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.classes = [
+            Class.objects.create(grade_level='初一', cohort='初中BS级', class_name='1班'),
+            Class.objects.create(grade_level='初二', cohort='初中BT级', class_name='1班'),
+        ]
+        self.exams = [
+            Exam.objects.create(name='月考一', academic_year='2025-2026', grade_level='初中BS级', date=date(2025, 10, 1)),
+            Exam.objects.create(name='月考二', academic_year='2025-2026', grade_level='初中BS级', date=date(2025, 11, 1)),
+        ]
+        self.students = []
+        for index in range(6):
+            cls = self.classes[index % 2]
+            student = Student.objects.create(
+                student_id=f'BS{index:03d}', name=f'学生{index}', grade_level=cls.grade_level,
+                cohort=cls.cohort, current_class=cls,
+            )
+            self.students.append(student)
+            for exam in self.exams:
+                for subject in ('语文', '数学'):
+                    Score.objects.create(student=student, exam=exam, subject=subject, score_value=60 + index)
+
+    def _keys(self, students, exam):
+        return [f'{student.pk}_{exam.pk}' for student in students]
+
+    def test_selection_condition_groups_pairs_by_exam(self):
+        pairs = ScoreQueryService.parse_record_keys(
+            self._keys(self.students, self.exams[0]) + ['bad', f'{self.students[0].pk}_{self.exams[0].pk}']
+        )
+        self.assertEqual(len(pairs), 6)
+        self.assertEqual(Score.objects.filter(ScoreQueryService.selection_condition(pairs)).count(), 12)
+        chunks = list(ScoreQueryService.iter_selection_chunks(pairs, chunk_size=4))
+        self.assertEqual([len(batch) for batch, _ in chunks], [4, 2])
+
+    def test_delete_selected_returns_per_exam_counts_and_reranks_affected_cohorts(self):
+        selected = self._keys(self.students[:4], self.exams[0]) + self._keys(self.students[:1], self.exams[1])
+        with mock.patch(SCHEDULER_REQUEST) as request:
+            resp = self.client.post(
+                '/api/scores/batch-delete-selected',
+                {'selected_records': selected},
+                content_type='application/json',
+            )
+
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body['deleted_count'], 10)
+        self.assertEqual(
+            body['affected_exams'],
+            [{'exam_id': self.exams[0].pk, 'deleted_count': 8}, {'exam_id': self.exams[1].pk, 'deleted_count': 2}],
+        )
+        self.assertEqual(
+            sorted((call.args[0], call.args[1]) for call in request.call_args_list),
+            sorted([
+                (self.exams[0].pk, '初中BS级'),
+                (self.exams[0].pk, '初中BT级'),
+                (self.exams[1].pk, '初中BS级'),
+            ]),
+        )
+        self.assertEqual(ExamResult.objects.filter(exam=self.exams[0]).count(), 2)
+
+    def test_delete_selected_query_count_does_not_grow_with_selection(self):
+        with mock.patch(SCHEDULER_REQUEST):
+            with self.assertNumQueries(9):
+                ScoreMutationService.delete_selected(Score.objects.all(), self._keys(self.students[:1], self.exams[0]))
+            with self.assertNumQueries(9):
+                ScoreMutationService.delete_selected(Score.objects.all(), self._keys(self.students[1:], self.exams[0]))
+        self.assertFalse(Score.objects.filter(exam=self.exams[0]).exists())
+
+    def test_export_selected_spans_exams_in_one_chunk(self):
+        selected = self._keys(self.students[:2], self.exams[1]) + self._keys(self.students[:2], self.exams[0])
+        rows = list(ScoreQueryService.iter_selected_export_rows(Score.objects.all(), selected))
+        self.assertEqual(
+            [(row['student_id'], row['exam_id']) for row in rows],
+            [(s.pk, self.exams[1].pk) for s in self.students[:2]] + [(s.pk, self.exams[0].pk) for s in self.students[:2]],
+        )
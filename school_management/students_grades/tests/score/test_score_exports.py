@@ -0,0 +1,106 @@
+"""Tests for the chunked XLSX score exports (low-memory, returned via StreamingHttpResponse)."""
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+
+import openpyxl
+from django.contrib.auth import get_user_model
+from django.http import QueryDict
+from django.test import TestCase, Client
+
+from school_management.students_grades.models import Class, Exam, ExamSubject, Score, Student
+from school_management.students_grades.services import ScoreQueryService, ScoreWorkbookService
+
+
+def sheet_values(content):
+    workbook = openpyxl.load_workbook(BytesIO(content), read_only=True)
+    sheet = workbook.active
+    return sheet.title, [list(row) for row in sheet.iter_rows(values_only=True)]
+
+
+class ScoreStreamingExportTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='score_export_admin', password='test-pass-123', role='admin')
+        self.client.force_login(self.user)
+
+        self.cls = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='1班')
+        self.exams = [
+            Exam.objects.create(name='月考一', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 10, 1)),
+            Exam.objects.create(name='月考二', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 11, 1)),
+        ]
+        for exam in self.exams:
+            for subject in ('语文', '数学', '英语'):
+                ExamSubject.objects.create(exam=exam, subject_code=subject, subject_name=subject, max_score=150)
+
+        values = [(90, 80, 70), (80, 90, 70), (100, 60, None), (70.5, 88, 95), (60, 60, 60)]
+        self.students = []
+        for index, triple in enumerate(values):
+            student = Student.objects.create(
+                student_id=f'X{index:03d}', name=f'学生{index}', grade_level='初一',
+                cohort='初中2025级', current_class=self.cls,
+            )
+            self.students.append(student)
+            for exam_index, exam in enumerate(self.exams):
+                for subject, value in zip(('语文', '数学', '英语'), triple):
+                    if value is not None:
+                        Score.objects.create(
+                            student=student, exam=exam, subject=subject,
+                            score_value=Decimal(str(value)) + exam_index,
+                            total_score_rank_in_grade=index + 1,
+                        )
+
+    def _request(self, query=''):
+        return SimpleNamespace(query_params=QueryDict(query), user=self.user)
+
+    def _download(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return sheet_values(b''.join(response.streaming_content))
+
+    def test_iter_export_rows_matches_aggregate_rows_across_chunks(self):
+        scores = ScoreQueryService.filter_scores(self._request())
+        expected = ScoreQueryService.aggregate_rows(scores)
+
+        self.assertEqual(list(ScoreQueryService.iter_export_rows(scores, chunk_size=3)), expected)
+
+    def test_batch_export_keeps_column_layout(self):
+        scores = ScoreQueryService.filter_scores(self._request())
+        legacy = ScoreWorkbookService.build_export_workbook(ScoreQueryService.aggregate_rows(scores))
+        legacy_buffer = BytesIO()
+        legacy.save(legacy_buffer)
+
+        title, rows = self._download(self.client.get('/api/scores/batch-export'))
+
+        self.assertEqual((title, rows), sheet_values(legacy_buffer.getvalue()))
+        self.assertEqual(len(rows), 11)
+
+    def test_query_export_streams_rows_in_requested_order(self):
+        query = 'subject_sort=total_score&sort_order=desc&dynamic_subjects=1'
+        request = self._request(query)
+        rows = ScoreQueryService.sort_rows(ScoreQueryService.aggregate_rows(ScoreQueryService.filter_scores(request)), request)
+        legacy = ScoreWorkbookService.build_query_export_workbook(rows, ['语文', '数学', '英语'])
+        legacy_buffer = BytesIO()
+        legacy.save(legacy_buffer)
+
+        title, sheet_rows = self._download(self.client.get(f'/api/scores/query-export?{query}'))
+
+        self.assertEqual((title, sheet_rows), sheet_values(legacy_buffer.getvalue()))
+        self.assertEqual(sheet_rows[0][-5:], ['语文', '数学', '英语', '总分', '年级排名'])
+
+    def test_batch_export_selected_follows_selection_order(self):
+        selected = [
+            f'{self.students[3].pk}_{self.exams[1].pk}',
+            'bad-key',
+            f'{self.students[0].pk}_{self.exams[0].pk}',
+        ]
+
+        _, rows = self._download(self.client.post(
+            '/api/scores/batch-export-selected',
+            {'selected_records': selected},
+            content_type='application/json',
+        ))
+
+        self.assertEqual([(row[0], row[5]) for row in rows[1:]], [('X003', '月考二'), ('X000', '月考一')])
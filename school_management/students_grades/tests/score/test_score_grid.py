@@ -0,0 +1,107 @@
+"""Tests for spreadsheet-style class score entry (ScoreGridService / score-grid endpoints)."""
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client
+
+from .test_base import BaseTestCase
+from school_management.students_grades.models import Class, Exam, ExamResult, ExamSubject, Score, Student
+
+SCHEDULER_REQUEST = 'school_management.students_grades.services.ranking_scheduler.RankingScheduler.request'
+
+
+class ScoreGridTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cls = Class.objects.create(grade_level='初一', cohort='初中GR级', class_name='1班')
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中GR级', date=date(2025, 11, 1))
+        ExamSubject.objects.create(exam=self.exam, subject_code='语文', subject_name='语文', max_score=120)
+        ExamSubject.objects.create(exam=self.exam, subject_code='数学', subject_name='数学', max_score=120)
+        self.students = [
+            Student.objects.create(
+                student_id=f'GR{i:03d}', name=f'学生{i}', grade_level='初一', cohort='初中GR级', current_class=self.cls
+            )
+            for i in range(1, 4)
+        ]
+        Score.objects.create(student=self.students[0], exam=self.exam, subject='语文', score_value=90)
+
+    def _grid(self):
+        resp = self.client.get(f'/api/scores/score-grid?class_id={self.cls.pk}&exam_id={self.exam.pk}&subjects=语文,数学')
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def _save(self, rows):
+        return self.client.post(
+            '/api/scores/score-grid-save',
+            {'class_id': self.cls.pk, 'exam_id': self.exam.pk, 'rows': rows},
+            content_type='application/json',
+        )
+
+    def test_grid_lists_class_rows_with_versions(self):
+        data = self._grid()
+        self.assertEqual([subject['value'] for subject in data['subjects']], ['语文', '数学'])
+        self.assertEqual([row['student_number'] for row in data['rows']], ['GR001', 'GR002', 'GR003'])
+        self.assertEqual(data['rows'][0]['scores'], {'语文': 90.0, '数学': None})
+        self.assertIsNotNone(data['rows'][0]['version'])
+        self.assertIsNone(data['rows'][1]['version'])
+
+    def test_save_applies_whole_grid_with_one_ranking_refresh(self):
+        rows = [
+            {'student_id': row['student_id'], 'version': row['version'], 'scores': {'数学': str(100 + index)}}
+            for index, row in enumerate(self._grid()['rows'])
+        ]
+        rows[0]['scores']['语文'] = ''
+
+        with mock.patch(SCHEDULER_REQUEST) as request:
+            resp = self._save(rows)
+
+        self.assertEqual(resp.status_code, 200, resp.content)
+        body = resp.json()
+        self.assertEqual((body['created_count'], body['updated_count'], body['deleted_count']), (3, 0, 1))
+        self.assertFalse(Score.objects.filter(student=self.students[0], subject='语文').exists())
+        self.assertEqual(ExamResult.objects.filter(exam=self.exam).count(), 3)
+        request.assert_called_once()
+        self.assertEqual(len(request.call_args.kwargs['changed_pairs']), 4)
+        self.assertTrue(all(row['version'] for row in body['rows']))
+
+    def test_invalid_cells_are_reported_and_nothing_is_written(self):
+        grid = self._grid()['rows']
+        resp = self._save([
+            {'student_id': grid[0]['student_id'], 'version': grid[0]['version'], 'scores': {'数学': '121'}},
+            {'student_id': grid[1]['student_id'], 'version': grid[1]['version'], 'scores': {'数学': '88', '语文': 'x'}},
+        ])
+        self.assertEqual(resp.status_code, 400)
+        errors = resp.json()['errors']
+        self.assertEqual(
+            sorted((error['student_id'], error['subject'], error['message']) for error in errors),
+            sorted([
+                (grid[0]['student_id'], '数学', '数学 的分数必须在0-120分之间'),
+                (grid[1]['student_id'], '语文', '语文 的分数格式不正确'),
+            ]),
+        )
+        self.assertEqual(Score.objects.filter(exam=self.exam).count(), 1)
+
+    def test_stale_row_version_is_rejected(self):
+        grid = self._grid()['rows']
+        score = Score.objects.get(student=self.students[0], subject='语文')
+        score.score_value = 95
+        score.save()
+
+        with mock.patch(SCHEDULER_REQUEST) as request:
+            resp = self._save([
+                {'student_id': grid[0]['student_id'], 'version': grid[0]['version'], 'scores': {'语文': '70'}},
+                {'student_id': grid[1]['student_id'], 'version': grid[1]['version'], 'scores': {'语文': '80'}},
+            ])
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual([conflict['student_id'] for conflict in resp.json()['conflicts']], [grid[0]['student_id']])
+        self.assertEqual(float(Score.objects.get(student=self.students[0], subject='语文').score_value), 95.0)
+        self.assertFalse(Score.objects.filter(student=self.students[1]).exists())
+        request.assert_not_called()
+
+    def test_grid_is_limited_to_visible_classes(self):
+        teacher = get_user_model().objects.create_user(username='grid_teacher', password='x', role='subject_teacher')
+        client = Client()
+        client.force_login(teacher)
+        resp = client.get(f'/api/scores/score-grid?class_id={self.cls.pk}&exam_id={self.exam.pk}')
+        self.assertEqual(resp.status_code, 404)
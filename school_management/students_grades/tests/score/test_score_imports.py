@@ -1,6 +1,7 @@
 """Integration tests for /api/scores/batch-import after migration."""
 from io import BytesIO
 from datetime import date
+from unittest.mock import patch
 
 import openpyxl
 
@@ -9,6 +10,7 @@ from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 from school_management.students_grades.models import Student, Exam, Score, ExamSubject
+from school_management.students_grades.services import ScoreImportService, ScoreImportServiceError
 
 
 def make_excel_bytes(headers, rows):
@@ -93,3 +95,87 @@ class ScoreImportApiTests(TestCase):
         resp = self.client.post(self.url, {'exam': self.exam.pk, 'excel_file': file_obj}, format='multipart')
         self.assertEqual(resp.status_code, 200)
         self.assertTrue(resp.json().get('success'))
+
+
+class ScoreImportStreamingTests(TestCase):
+    """Chunked, resumable behaviour of ScoreImportService.batch_import."""
+
+    def setUp(self):
+        self.exam = Exam.objects.create(name='月考', academic_year='2024-2025', grade_level='Grade8', date=date(2025, 3, 1))
+        ExamSubject.objects.create(exam=self.exam, subject_code='语文', subject_name='语文', max_score=150)
+        ExamSubject.objects.create(exam=self.exam, subject_code='数学', subject_name='数学', max_score=150)
+        self.students = [
+            Student.objects.create(student_id=f'T{i:03d}', name=f'学生{i}')
+            for i in range(1, 6)
+        ]
+        self.headers = ['学号', '学生姓名', '语文', '数学']
+        self.rows = [
+            ('T001', '学生1', 100, 110),
+            ('T002', '学生2', 90, 200),  # 数学超过满分
+            (None, None, None, None),     # 空行跳过
+            ('T003', '学生3', 80, 70),
+            ('T404', '不存在', 60, 60),
+            ('T004', '学生4', 120, 130),
+        ]
+
+    def test_chunked_import_reports_progress_and_keeps_error_format(self):
+        progress = []
+
+        result = ScoreImportService.batch_import(
+            make_excel_bytes(self.headers, self.rows),
+            self.exam.pk,
+            progress_callback=progress.append,
+            chunk_size=2,
+        )
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['imported_count'], 3)
+        self.assertEqual(result['failed_count'], 2)
+        self.assertEqual(result['last_committed_row'], 7)
+        self.assertEqual([item['row'] for item in result['error_details']], [3, 6])
+        self.assertEqual(set(result['error_details'][0]), {'row', 'student_id', 'student_name', 'errors'})
+        self.assertEqual([item['last_committed_row'] for item in progress], [3, 6, 7])
+        # 出错行中合法的科目仍会写入（T002 的语文），与整表导入时一致
+        self.assertEqual(Score.objects.filter(exam=self.exam).count(), 7)
+
+    def test_failed_chunk_keeps_committed_chunks_and_can_resume(self):
+        original = ScoreImportService._import_chunk
+        calls = []
+
+        def flaky_import_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('数据库连接中断')
+            return original(*args, **kwargs)
+
+        with patch.object(ScoreImportService, '_import_chunk', side_effect=flaky_import_chunk):
+            with self.assertRaises(ScoreImportServiceError) as ctx:
+                ScoreImportService.batch_import(make_excel_bytes(self.headers, self.rows), self.exam.pk, chunk_size=2)
+
+        payload = ctx.exception.payload
+        self.assertEqual(payload['last_committed_row'], 3)
+        self.assertEqual(payload['resume_from_row'], 5)
+        self.assertEqual(Score.objects.filter(exam=self.exam).count(), 3)
+
+        result = ScoreImportService.batch_import(
+            make_excel_bytes(self.headers, self.rows),
+            self.exam.pk,
+            start_row=payload['resume_from_row'],
+            chunk_size=2,
+        )
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['imported_count'], 2)
+        self.assertEqual(Score.objects.filter(exam=self.exam).count(), 7)
+
+    def test_duplicate_student_rows_across_chunks_keep_last_value(self):
+        rows = [
+            ('T001', '学生1', 100, 110),
+            ('T002', '学生2', 90, 95),
+            ('T001', '学生1', 105, 110),
+        ]
+
+        ScoreImportService.batch_import(make_excel_bytes(self.headers, rows), self.exam.pk, chunk_size=2)
+
+        score = Score.objects.get(student=self.students[0], exam=self.exam, subject='语文')
+        self.assertEqual(float(score.score_value), 105)
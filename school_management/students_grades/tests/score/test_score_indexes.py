@@ -0,0 +1,74 @@
+"""Query-plan regression tests for the composite Score indexes."""
+from datetime import date
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from school_management.students_grades.models import Class, Exam, Score, Student
+from school_management.students_grades.services.exam_result_service import ExamResultService
+from school_management.students_grades.services.target_matrix_service import TargetMatrixService
+
+
+class ScoreIndexPlanTests(TestCase):
+    """
+    仍按考试读取成绩行的查询应命中复合索引（EXPLAIN 文本中出现索引名；MySQL 另按 key/possible_keys 列核对）：
+
+    - 目标生科目名次矩阵：exam IN + subject 定位，只读名次列，由 score_exam_subject_rank_idx 覆盖；
+    - (学生, 考试) 汇总按批刷新：exam + student IN 定位，由 score_exam_student_rank_idx 定位。
+    """
+
+    def setUp(self):
+        cls = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='1班')
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 11, 1))
+        self.students = []
+        for index in range(5):
+            student = Student.objects.create(
+                student_id=f'IX{index:03d}', name=f'学生{index}', grade_level='初一',
+                cohort='初中2025级', current_class=cls,
+            )
+            self.students.append(student)
+            for subject in ('语文', '数学'):
+                Score.objects.create(
+                    student=student, exam=self.exam, subject=subject, score_value=80 + index,
+                    grade_rank_in_subject=index + 1, class_rank_in_subject=index + 1,
+                    total_score_rank_in_grade=index + 1, total_score_rank_in_class=index + 1,
+                )
+
+    def test_subject_rank_matrix_uses_subject_rank_index(self):
+        for metric in ('subject_rank_in_grade', 'subject_rank_in_class'):
+            plan = TargetMatrixService.source_rows('初中2025级', metric, '语文', [self.exam.pk]).explain()
+            self.assertIn('score_exam_subject_rank_idx', plan, msg=f'{connection.vendor}: {plan}')
+
+    def test_exam_result_refresh_uses_student_rank_index(self):
+        batch = [student.pk for student in self.students[:2]]
+        queryset = ExamResultService._score_rows(Score.objects.filter(exam_id=self.exam.pk, student_id__in=batch))
+        plan = queryset.explain()
+        self.assertIn('score_exam_student_rank_idx', plan, msg=f'{connection.vendor}: {plan}')
+
+    def _mysql_score_plan(self, queryset):
+        """MySQL 传统 EXPLAIN 中成绩表那一行（含 key / possible_keys 列）。"""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return next(row for row in rows if row['table'] == Score._meta.db_table)
+
+    @skipUnless(connection.vendor == 'mysql', 'MySQL EXPLAIN 的 key/possible_keys 列')
+    def test_mysql_explain_reports_composite_index_keys(self):
+        batch = [student.pk for student in self.students[:2]]
+        cases = [
+            (
+                TargetMatrixService.source_rows('初中2025级', 'subject_rank_in_grade', '语文', [self.exam.pk]),
+                'score_exam_subject_rank_idx',
+            ),
+            (
+                ExamResultService._score_rows(Score.objects.filter(exam_id=self.exam.pk, student_id__in=batch)),
+                'score_exam_student_rank_idx',
+            ),
+        ]
+        for queryset, index_name in cases:
+            row = self._mysql_score_plan(queryset)
+            self.assertIn(index_name, (row['possible_keys'] or '').split(','), msg=row)
+            self.assertEqual(row['key'], index_name, msg=row)
@@ -0,0 +1,120 @@
+"""Tests for the DB-side pivot and keyset pagination behind GET /api/scores."""
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.http import QueryDict
+from django.test import TestCase, Client
+
+from school_management.students_grades.models import Class, Exam, ExamSubject, Score, Student
+from school_management.students_grades.services import ScoreQueryService
+
+
+class ScoreListQueryTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='score_list_admin', password='test-pass-123', role='admin')
+        self.client.force_login(self.user)
+
+        self.cls = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='1班')
+        self.exams = [
+            Exam.objects.create(name='月考一', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 10, 1)),
+            Exam.objects.create(name='月考二', academic_year='2025-2026', grade_level='初中2025级', date=date(2025, 11, 1)),
+        ]
+        for exam in self.exams:
+            for subject in ('语文', '数学', '英语'):
+                ExamSubject.objects.create(exam=exam, subject_code=subject, subject_name=subject, max_score=150)
+
+        # 分数刻意制造总分并列与缺科，检验并列兜底顺序与缺失值处理
+        values = [(90, 80, 70), (80, 90, 70), (100, 60, None), (70.5, 88, 95), (60, 60, 60), (90, None, 70)]
+        for index, triple in enumerate(values):
+            student = Student.objects.create(
+                student_id=f'L{index:03d}', name=f'学生{5 - index}', grade_level='初一',
+                cohort='初中2025级', current_class=self.cls,
+            )
+            for exam_index, exam in enumerate(self.exams):
+                for subject, value in zip(('语文', '数学', '英语'), triple):
+                    if value is None:
+                        continue
+                    Score.objects.create(
+                        student=student, exam=exam, subject=subject,
+                        score_value=Decimal(str(value)) + exam_index,
+                        total_score_rank_in_grade=index + 1 if exam_index == 0 else None,
+                    )
+
+    def _python_rows(self, params):
+        request = SimpleNamespace(query_params=params, user=self.user)
+        rows = ScoreQueryService.aggregate_rows(ScoreQueryService.filter_scores(request))
+        return [row['record_key'] for row in ScoreQueryService.sort_rows(rows, request)]
+
+    def _sql_rows(self, params):
+        request = SimpleNamespace(query_params=params, user=self.user)
+        data = ScoreQueryService.paginate(ScoreQueryService.filter_scores(request), request, page_size=100)
+        return [row['record_key'] for row in data['results']]
+
+    def test_sql_order_matches_python_sort_for_every_sort_mode(self):
+        cases = [
+            '',
+            'sort_by=total_score_desc', 'sort_by=total_score_asc', 'sort_by=student_name',
+            'sort_by=exam_date', 'sort_by=grade_rank',
+            'subject_sort=total_score&sort_order=desc', 'subject_sort=total_score&sort_order=asc',
+            'subject_sort=grade_rank&sort_order=desc', 'subject_sort=grade_rank&sort_order=asc',
+            'subject_sort=英语&sort_order=desc', 'subject_sort=数学&sort_order=asc',
+            'subject_sort=物理&sort_order=desc',
+        ]
+        for query in cases:
+            with self.subTest(query=query):
+                params = QueryDict(query)
+                self.assertEqual(self._sql_rows(params), self._python_rows(params))
+
+    def test_rows_keep_existing_shape(self):
+        resp = self.client.get('/api/scores', {'sort_by': 'total_score_desc', 'dynamic_subjects': '1'})
+
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual(data['count'], 12)
+        self.assertEqual(data['all_subjects'], ['语文', '数学', '英语'])
+        top = data['results'][0]
+        self.assertEqual(top['student']['student_id'], 'L003')
+        self.assertEqual(top['exam']['date'], '2025-11-01')
+        self.assertEqual(top['scores'], {'语文': 71.5, '数学': 89.0, '英语': 96.0})
+        self.assertEqual(top['total_score'], 256.5)
+        self.assertEqual(top['class']['class_name'], '1班')
+        missing = next(row for row in data['results'] if row['record_key'].startswith(f"{Student.objects.get(student_id='L005').pk}_"))
+        self.assertNotIn('数学', missing['scores'])
+
+    def test_keyset_pages_walk_forward_and_back(self):
+        params = {'subject_sort': 'total_score', 'sort_order': 'desc', 'page_size': 10}
+        expected = self._python_rows(QueryDict('subject_sort=total_score&sort_order=desc'))
+
+        first = self.client.get('/api/scores', params).json()
+        self.assertEqual(first['num_pages'], 2)
+        self.assertIsNone(first['previous_cursor'])
+
+        second = self.client.get('/api/scores', {**params, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(second['current_page'], 2)
+        self.assertFalse(second['has_next'])
+        self.assertEqual(second['start_index'], 11)
+        self.assertEqual(
+            [row['record_key'] for row in first['results'] + second['results']],
+            expected,
+        )
+
+        back = self.client.get('/api/scores', {**params, 'cursor': second['previous_cursor']}).json()
+        self.assertEqual(back['current_page'], 1)
+        self.assertEqual(back['results'], first['results'])
+
+    def test_page_cost_does_not_grow_with_result_size(self):
+        params = {'page_size': 10, 'sort_by': 'student_name'}
+        first = self.client.get('/api/scores', params).json()
+
+        # 子科目列表 + COUNT + 分页分组查询 + 学生 + 考试（另含会话/用户查询）
+        with self.assertNumQueries(7):
+            self.client.get('/api/scores', {**params, 'cursor': first['next_cursor']})
+
+    def test_invalid_cursor_is_rejected(self):
+        resp = self.client.get('/api/scores', {'cursor': 'not-a-cursor'})
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json()['success'])
@@ -0,0 +1,94 @@
+"""Tests for the bulk write path of ScoreMutationService (manual add / batch edit save)."""
+from datetime import date
+from unittest import mock
+
+from .test_base import BaseTestCase
+from school_management.students_grades.models import Class, Exam, ExamResult, ExamSubject, Score, Student
+from school_management.students_grades.services.score_mutation_service import (
+    ScoreMutationService,
+    ScoreMutationServiceError,
+)
+
+SCHEDULER_REQUEST = 'school_management.students_grades.services.ranking_scheduler.RankingScheduler.request'
+
+
+class ScoreMutationBulkTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cls = Class.objects.create(grade_level='初一', cohort='初中MU级', class_name='1班')
+        self.exam = Exam.objects.create(name='期中', academic_year='2025-2026', grade_level='初中MU级', date=date(2025, 11, 1))
+        for code in ('语文', '数学', '英语'):
+            ExamSubject.objects.create(exam=self.exam, subject_code=code, subject_name=code, max_score=120)
+        self.student = Student.objects.create(
+            student_id='MU001', name='赵六', grade_level='初一', cohort='初中MU级', current_class=self.cls
+        )
+
+    def test_manual_add_writes_all_subjects_with_one_ranking_trigger(self):
+        with mock.patch(SCHEDULER_REQUEST) as request:
+            result = ScoreMutationService.manual_add(
+                self.student.pk, self.exam.pk, {'语文': '100', '数学': '95.5', '英语': '88'}
+            )
+
+        self.assertEqual(result['created_count'], 3)
+        self.assertEqual(Score.objects.filter(student=self.student, exam=self.exam).count(), 3)
+        self.assertEqual(
+            Score.objects.get(student=self.student, exam=self.exam, subject='数学').exam_subject.max_score, 120
+        )
+        self.assertEqual(float(ExamResult.objects.get(student=self.student, exam=self.exam).total_score), 283.5)
+        request.assert_called_once()
+        self.assertEqual(
+            sorted(request.call_args.kwargs['changed_pairs']),
+            sorted([(self.student.pk, '语文'), (self.student.pk, '数学'), (self.student.pk, '英语')]),
+        )
+
+    def test_manual_add_keeps_validation_messages_and_writes_nothing(self):
+        with self.assertRaisesMessage(Exception, '分数 130.0 超过了 数学 的满分 120'):
+            ScoreMutationService.manual_add(self.student.pk, self.exam.pk, {'语文': '90', '数学': '130'})
+        self.assertFalse(Score.objects.filter(student=self.student).exists())
+
+        Score.objects.create(student=self.student, exam=self.exam, subject='语文', score_value=90)
+        with self.assertRaises(ScoreMutationServiceError) as ctx:
+            ScoreMutationService.manual_add(self.student.pk, self.exam.pk, {'语文': '90', '数学': '80'})
+        self.assertEqual(ctx.exception.payload['duplicate_subjects'], ['语文'])
+
+    def test_batch_edit_save_upserts_and_deletes_in_bulk(self):
+        Score.objects.create(student=self.student, exam=self.exam, subject='语文', score_value=90)
+        Score.objects.create(student=self.student, exam=self.exam, subject='数学', score_value=80)
+
+        with mock.patch(SCHEDULER_REQUEST) as request:
+            result = ScoreMutationService.batch_edit_save(
+                self.student.pk, self.exam.pk, {'语文': '', '数学': '85', '英语': '70'}
+            )
+
+        self.assertEqual(
+            (result['created_count'], result['updated_count'], result['deleted_count']), (1, 1, 1)
+        )
+        scores = dict(Score.objects.filter(student=self.student, exam=self.exam).values_list('subject', 'score_value'))
+        self.assertEqual({code: float(value) for code, value in scores.items()}, {'数学': 85.0, '英语': 70.0})
+        self.assertEqual(float(ExamResult.objects.get(student=self.student, exam=self.exam).total_score), 155.0)
+        request.assert_called_once()
+        self.assertEqual(
+            sorted(request.call_args.kwargs['changed_pairs']),
+            sorted([(self.student.pk, '语文'), (self.student.pk, '数学'), (self.student.pk, '英语')]),
+        )
+
+    def test_batch_edit_save_query_count_does_not_grow_with_subjects(self):
+        payload = {code: '60' for code in ('语文', '数学', '英语', '物理', '化学', '生物')}
+        with self.assertNumQueries(13):
+            ScoreMutationService.batch_edit_save(self.student.pk, self.exam.pk, payload)
+        self.assertEqual(Score.objects.filter(student=self.student, exam=self.exam).count(), 6)
+
+    def test_batch_edit_save_validates_whole_sheet_before_writing(self):
+        Score.objects.create(student=self.student, exam=self.exam, subject='语文', score_value=90)
+        with self.assertRaisesMessage(ScoreMutationServiceError, '英语 的分数必须在0-120分之间'):
+            ScoreMutationService.batch_edit_save(self.student.pk, self.exam.pk, {'语文': '', '英语': '121'})
+        with self.assertRaisesMessage(ScoreMutationServiceError, '数学 的分数格式不正确'):
+            ScoreMutationService.batch_edit_save(self.student.pk, self.exam.pk, {'数学': 'abc'})
+        self.assertTrue(Score.objects.filter(student=self.student, exam=self.exam, subject='语文').exists())
+
+    def test_unchanged_sheet_does_not_trigger_ranking(self):
+        Score.objects.create(student=self.student, exam=self.exam, subject='语文', score_value=90)
+        with mock.patch(SCHEDULER_REQUEST) as request:
+            result = ScoreMutationService.batch_edit_save(self.student.pk, self.exam.pk, {'语文': '90'})
+        self.assertEqual(result['updated_count'], 1)
+        request.assert_not_called()
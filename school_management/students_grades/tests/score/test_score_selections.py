@@ -0,0 +1,139 @@
+"""Tests for server-side score selection tokens (ScoreSelectionService / /api/scores/selections)."""
+import datetime
+from datetime import date
+from io import BytesIO
+from unittest import mock
+
+import openpyxl
+from django.contrib.auth import get_user_model
+from django.test import Client
+from django.utils import timezone
+
+from .test_base import BaseTestCase
+from school_management.students_grades.models import Class, Exam, Score, ScoreSelection, Student
+from school_management.students_grades.services import ScoreSelectionService
+
+SCHEDULER_REQUEST = 'school_management.students_grades.services.ranking_scheduler.RankingScheduler.request'
+
+
+class ScoreSelectionTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.classes = [
+            Class.objects.create(grade_level='初一', cohort='初中SL级', class_name='1班'),
+            Class.objects.create(grade_level='初一', cohort='初中SL级', class_name='2班'),
+        ]
+        self.exams = [
+            Exam.objects.create(name='月考一', academic_year='2025-2026', grade_level='初中SL级', date=date(2025, 10, 1)),
+            Exam.objects.create(name='月考二', academic_year='2025-2026', grade_level='初中SL级', date=date(2025, 11, 1)),
+        ]
+        self.students = []
+        for index in range(4):
+            cls = self.classes[index % 2]
+            student = Student.objects.create(
+                student_id=f'SL{index:03d}', name=f'学生{index}', grade_level='初一', cohort='初中SL级', current_class=cls
+            )
+            self.students.append(student)
+            for exam in self.exams:
+                Score.objects.create(student=student, exam=exam, subject='语文', score_value=70 + index)
+
+    def _create(self, query='', body=None, client=None):
+        return (client or self.client).post(
+            f'/api/scores/selections{query}', body or {}, content_type='application/json'
+        )
+
+    def test_create_and_update_selection_with_deltas(self):
+        resp = self._create(f'?exam_filter={self.exams[0].pk}')
+        self.assertEqual(resp.status_code, 201)
+        token = resp.json()['token']
+        self.assertEqual(resp.json()['count'], 4)
+
+        resp = self.client.patch(
+            f'/api/scores/selections/{token}',
+            {
+                'exclude': [f'{self.students[0].pk}_{self.exams[0].pk}'],
+                'include': [f'{self.students[1].pk}_{self.exams[1].pk}', 'bad'],
+            },
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.json()['count'], resp.json()['include_count'], resp.json()['exclude_count']), (4, 1, 1))
+
+        # 重新勾选被取消的记录
+        resp = self.client.patch(
+            f'/api/scores/selections/{token}',
+            {'include': [f'{self.students[0].pk}_{self.exams[0].pk}']},
+            content_type='application/json',
+        )
+        self.assertEqual((resp.json()['count'], resp.json()['exclude_count']), (5, 0))
+
+    def test_batch_operations_accept_selection_token(self):
+        token = self._create(
+            f'?exam_filter={self.exams[0].pk}',
+            {'exclude': [f'{self.students[3].pk}_{self.exams[0].pk}']},
+        ).json()['token']
+
+        resp = self.client.post(
+            '/api/scores/batch-export-selected', {'selection_token': token}, content_type='application/json'
+        )
+        self.assertEqual(resp.status_code, 200)
+        sheet = openpyxl.load_workbook(BytesIO(b''.join(resp.streaming_content)), read_only=True).active
+        self.assertEqual(len(list(sheet.iter_rows(values_only=True))) - 1, 3)
+
+        with mock.patch(SCHEDULER_REQUEST):
+            resp = self.client.post(
+                '/api/scores/batch-delete-selected', {'selection_token': token}, content_type='application/json'
+            )
+        self.assertEqual(resp.json()['deleted_count'], 3)
+        self.assertEqual(
+            list(Score.objects.filter(exam=self.exams[0]).values_list('student_id', flat=True)), [self.students[3].pk]
+        )
+
+    def test_delta_keys_at_the_cap_stay_within_sqlite_parameter_limit(self):
+        # 最坏情况：每条记录属于不同考试，集合条件无法合并
+        cap = ScoreSelectionService.MAX_DELTA_KEYS
+        keys = [f'{self.students[0].pk}_{exam_id}' for exam_id in range(10000, 10000 + cap)]
+        resp = self._create(
+            f'?exam_filter={self.exams[0].pk}', {'include': keys[:cap // 2], 'exclude': keys[cap // 2:]}
+        )
+        self.assertEqual(resp.status_code, 201)
+
+        selection = ScoreSelection.objects.get(token=resp.json()['token'])
+        _, params = ScoreSelectionService.scores(selection, selection.created_by).query.sql_with_params()
+        self.assertLessEqual(len(params), 999)
+
+        resp = self.client.patch(
+            f'/api/scores/selections/{selection.token}',
+            {'include': [f'{self.students[1].pk}_{self.exams[1].pk}']},
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 400)
+
+    def test_selection_is_scoped_to_owner_and_access_scope(self):
+        teacher = get_user_model().objects.create_user(username='sel_teacher', password='x', role='subject_teacher')
+        self.classes[0].subject_teachers.add(teacher)
+        client = Client()
+        client.force_login(teacher)
+
+        resp = self._create(
+            '', {'include': [f'{self.students[1].pk}_{self.exams[0].pk}']}, client=client
+        )
+        # 2班学生不在任课范围内，即使手动勾选也不计入
+        self.assertEqual(resp.json()['count'], 4)
+        token = resp.json()['token']
+
+        resp = self.client.get(f'/api/scores/selections/{token}')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_expired_selection_is_rejected_and_evicted(self):
+        token = self._create().json()['token']
+        ScoreSelection.objects.filter(token=token).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+
+        resp = self.client.post(
+            '/api/scores/batch-delete-selected', {'selection_token': token}, content_type='application/json'
+        )
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(Score.objects.count(), 8)
+
+        self._create()
+        self.assertFalse(ScoreSelection.objects.filter(token=token).exists())
@@ -0,0 +1,168 @@
+"""Tests for the class-wide student analysis report export (zip)."""
+import shutil
+import tempfile
+import zipfile
+from datetime import date
+from io import BytesIO
+from unittest.mock import patch
+
+import openpyxl
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from school_management.students_grades.models import Class, Exam, ExamSubject, ExportJob, Score, Student
+from school_management.students_grades.services import (
+    ExportJobService,
+    ScoreAnalysisService,
+    StudentAnalysisBatchService,
+)
+from school_management.students_grades.services import student_analysis_batch_service as batch_module
+
+DELAY = 'school_management.students_grades.tasks.run_export_job.delay'
+
+
+class StudentAnalysisBatchTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root)
+        self.override.enable()
+
+        self.client = Client()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='batch_report_staff', password='test-pass-123', role='staff')
+        self.client.force_login(self.user)
+
+        self.class_1 = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='1班')
+        self.class_2 = Class.objects.create(grade_level='初一', cohort='初中2025级', class_name='2班')
+        self.exams = []
+        for index, exam_date in enumerate([date(2025, 11, 1), date(2026, 1, 10)]):
+            exam = Exam.objects.create(
+                name=f'考试{index + 1}', academic_year='2025-2026', grade_level='初中2025级', date=exam_date
+            )
+            ExamSubject.objects.create(exam=exam, subject_code='语文', subject_name='语文', max_score=150)
+            ExamSubject.objects.create(exam=exam, subject_code='数学', subject_name='数学', max_score=150)
+            self.exams.append(exam)
+
+        self.students = []
+        for index in range(6):
+            student = Student.objects.create(
+                student_id=f'BR{index:03d}',
+                name=f'学生{index}',
+                grade_level='初一',
+                cohort='初中2025级',
+                current_class=self.class_1 if index < 4 else self.class_2,
+            )
+            self.students.append(student)
+            for exam in self.exams:
+                Score.objects.create(student=student, exam=exam, subject='语文', score_value=100 + index)
+                Score.objects.create(student=student, exam=exam, subject='数学', score_value=90 + index)
+
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_bulk_loader_matches_single_student_analysis(self):
+        students = Student.objects.select_related('current_class').filter(current_class=self.class_1)
+        with CaptureQueriesContext(connection) as ctx:
+            bulk = ScoreAnalysisService.load_students_analysis_data(students)
+        # 学生 + 成绩 + 考试 + 考试科目，与人数无关
+        self.assertEqual(len(ctx.captured_queries), 4)
+
+        for student in self.students[:4]:
+            self.assertEqual(bulk[student.pk], ScoreAnalysisService.build_student_analysis_data(student.pk, '', None))
+
+    def test_bulk_loader_respects_exam_range(self):
+        students = Student.objects.select_related('current_class').filter(pk=self.students[0].pk)
+        exam_ids = [self.exams[1].pk]
+        bulk = ScoreAnalysisService.load_students_analysis_data(students, exam_ids)
+        single = ScoreAnalysisService.build_student_analysis_data(self.students[0].pk, str(self.exams[1].pk), None)
+        self.assertEqual(bulk[self.students[0].pk], single)
+        self.assertEqual(bulk[self.students[0].pk]['summary']['total_exams'], 1)
+
+    def test_class_export_streams_zip_of_workbooks(self):
+        resp = self.client.get(f'/api/scores/student-analysis-batch-export?class_id={self.class_1.pk}')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/zip')
+
+        archive = zipfile.ZipFile(BytesIO(b''.join(resp.streaming_content)))
+        names = sorted(archive.namelist())
+        self.assertEqual(names, [f'BR{index:03d}_初中2025级1班学生{index}个人成绩分析报告.xlsx' for index in range(4)])
+        workbook = openpyxl.load_workbook(BytesIO(archive.read(names[0])))
+        self.assertTrue(workbook.sheetnames)
+
+    def test_stream_zip_emits_each_report_as_it_is_written(self):
+        students = StudentAnalysisBatchService.resolve_students(self.user, class_id=self.class_1.pk)
+        rendered = []
+        render = batch_module._render_report
+
+        def counting_render(item):
+            rendered.append(item)
+            return render(item)
+
+        with patch.object(batch_module, '_render_report', counting_render):
+            chunks = StudentAnalysisBatchService.stream_zip(students)
+            first = next(chunks)
+            # 第一个文件写完即产出，其余学生尚未生成
+            self.assertEqual(len(rendered), 1)
+            self.assertTrue(first.startswith(b'PK'))
+            content = first + b''.join(chunks)
+
+        self.assertEqual(len(rendered), 4)
+        self.assertEqual(len(zipfile.ZipFile(BytesIO(content)).namelist()), 4)
+
+    def test_large_sync_export_is_turned_into_job(self):
+        with patch.object(StudentAnalysisBatchService, 'SYNC_MAX_STUDENTS', 5), patch(DELAY) as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.get('/api/scores/student-analysis-batch-export?cohort=初中2025级')
+        self.assertEqual(resp.status_code, 202)
+        delay.assert_called_once()
+
+    def test_missing_scope_returns_400(self):
+        resp = self.client.get('/api/scores/student-analysis-batch-export')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_async_cohort_export_reports_progress(self):
+        with patch(DELAY, side_effect=ExportJobService.run):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.get('/api/scores/student-analysis-batch-export?cohort=初中2025级&async=true')
+        self.assertEqual(resp.status_code, 202)
+
+        job = ExportJob.objects.get(pk=resp.json()['job_id'])
+        self.assertEqual(job.status, 'success')
+        self.assertTrue(job.file.name.endswith('.zip'))
+        self.assertEqual((job.total_items, job.processed_items), (6, 6))
+
+        data = self.client.get(f'/api/export-jobs/{job.pk}').json()
+        self.assertEqual((data['total_items'], data['processed_items']), (6, 6))
+        download = self.client.get(data['download_url'])
+        archive = zipfile.ZipFile(BytesIO(b''.join(download.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 6)
+
+    def test_progress_counts_students_without_reports(self):
+        Student.objects.create(
+            student_id='BR999', name='无成绩', grade_level='初一', cohort='初中2025级', current_class=self.class_2
+        )
+        with patch(DELAY, side_effect=ExportJobService.run):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.get('/api/scores/student-analysis-batch-export?cohort=初中2025级&async=true')
+
+        job = ExportJob.objects.get(pk=resp.json()['job_id'])
+        self.assertEqual(job.status, 'success')
+        # 没有成绩的学生不生成报告，但计入进度，任务结束时进度为 7/7
+        self.assertEqual((job.total_items, job.processed_items), (7, 7))
+        with job.file.open('rb') as handle:
+            self.assertEqual(len(zipfile.ZipFile(handle).namelist()), 6)
+
+    def test_process_pool_output_matches_sequential(self):
+        students = StudentAnalysisBatchService.resolve_students(self.user, cohort='初中2025级')
+
+        def archive_names(max_workers):
+            buffer = BytesIO()
+            with patch.object(StudentAnalysisBatchService, 'POOL_THRESHOLD', 1):
+                written = StudentAnalysisBatchService.write_zip(buffer, students, max_workers=max_workers)
+            self.assertEqual(written, 6)
+            return zipfile.ZipFile(buffer).namelist()
+
+        self.assertEqual(archive_names(2), archive_names(1))
@@ -0,0 +1,64 @@
+"""Tests for ScoreAnalysisService.build_student_analysis_data (student-analysis-data)."""
+from datetime import date
+
+from .test_base import BaseTestCase
+from school_management.students_grades.models import Class, Exam, ExamSubject, Score, Student
+from school_management.students_grades.services import ScoreAnalysisService, ScoreAnalysisServiceError
+
+
+class StudentAnalysisDataTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cls = Class.objects.create(grade_level='初二', cohort='初中SA级', class_name='3班')
+        self.student = Student.objects.create(
+            student_id='SA001', name='李四', grade_level='初二', cohort='初中SA级', current_class=cls
+        )
+        self.exams = []
+
+    def _add_exams(self, count):
+        for _ in range(count):
+            index = len(self.exams)
+            exam = Exam.objects.create(
+                name=f'月考{index}', academic_year='2025-2026', grade_level='初中SA级', date=date(2025, 9, index + 1)
+            )
+            ExamSubject.objects.create(exam=exam, subject_code='语文', subject_name='语文', max_score=120)
+            # 数学、英语、体育不在考试科目中，满分走 Score.get_max_score 兜底
+            for subject, value in (('体育', 40), ('英语', 90), ('语文', 100 + index), ('数学', 80)):
+                Score.objects.create(
+                    student=self.student, exam=exam, subject=subject, score_value=value,
+                    total_score_rank_in_grade=index + 1, total_score_rank_in_class=index + 2,
+                )
+            self.exams.append(exam)
+
+    def test_query_count_does_not_grow_with_exams(self):
+        self._add_exams(3)
+        # 学生 + 成绩 + 考试 + 考试科目
+        with self.assertNumQueries(4):
+            ScoreAnalysisService.build_student_analysis_data(self.student.pk, '', None)
+
+        self._add_exams(12)
+        with self.assertNumQueries(4):
+            data = ScoreAnalysisService.build_student_analysis_data(self.student.pk, '', None)
+        self.assertEqual(data['summary']['total_exams'], 15)
+
+        exam_ids = ','.join(str(exam.pk) for exam in self.exams[:5])
+        with self.assertNumQueries(4):
+            data = ScoreAnalysisService.build_student_analysis_data(self.student.pk, exam_ids, None)
+        self.assertEqual(data['summary']['total_exams'], 5)
+
+    def test_scores_follow_subject_order_and_full_score_fallbacks(self):
+        self._add_exams(2)
+        data = ScoreAnalysisService.build_student_analysis_data(self.student.pk, '', None)
+
+        self.assertEqual(data['subjects'], ['语文', '数学', '英语', '体育'])
+        first_exam = data['exams'][0]
+        self.assertEqual([item['subject_name'] for item in first_exam['scores']], ['语文', '数学', '英语', '体育'])
+        self.assertEqual([item['full_score'] for item in first_exam['scores'][:2]], [120.0, 100.0])
+        self.assertEqual((first_exam['grade_total_rank'], first_exam['class_total_rank']), (1, 2))
+        self.assertEqual(data['trend_data']['语文']['scores'], [100.0, 101.0])
+        self.assertEqual(data['trend_data']['total']['exam_ids'], [exam.pk for exam in self.exams])
+
+    def test_missing_exams_return_404(self):
+        with self.assertRaises(ScoreAnalysisServiceError) as ctx:
+            ScoreAnalysisService.build_student_analysis_data(self.student.pk, '', None)
+        self.assertEqual(ctx.exception.status_code, 404)
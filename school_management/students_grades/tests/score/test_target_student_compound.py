@@ -0,0 +1,123 @@
+"""Tests for compound (multi-condition) target-student rules."""
+import json
+import random
+
+from django.core.cache import caches
+from django.test import TestCase
+
+from school_management.students_grades.models import Score
+from school_management.students_grades.services.score_workbook_service import (
+    TARGET_STUDENT_HEADERS,
+    ScoreWorkbookService,
+)
+from school_management.students_grades.services.target_student_service import execute_target_student_rule
+from school_management.students_grades.tests.score.test_base import (
+    TARGET_COHORT as COHORT,
+    LocmemCacheMixin,
+    create_cohort,
+    staff_client,
+)
+
+TOTAL_TOP = {
+    'exam_scope': {'type': 'latest_n', 'n': 5},
+    'metric': 'total_score_rank_in_grade', 'operator': 'lte', 'threshold': 8,
+    'quantifier': 'at_least', 'k': 3, 'absent_policy': 'ignore_absent',
+}
+MATH_LATEST = {
+    'exam_scope': {'type': 'latest_n', 'n': 1},
+    'metric': 'subject_rank_in_grade', 'subject': '数学', 'operator': 'lte', 'threshold': 6,
+    'quantifier': 'all', 'absent_policy': 'strict_fail',
+}
+
+
+class TargetStudentCompoundRuleTests(LocmemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(25)
+        _, self.exams, students = create_cohort('TC', student_count=16, exam_count=7, first_month=3)
+        for exam in self.exams:
+            total_ranks = rng.sample(range(1, 17), 16)
+            math_ranks = rng.sample(range(1, 17), 16)
+            for student, total_rank, math_rank in zip(students, total_ranks, math_ranks):
+                if rng.random() < 0.1:
+                    continue
+                Score.objects.create(
+                    student=student, exam=exam, subject='数学', score_value=100,
+                    grade_rank_in_subject=math_rank, total_score_rank_in_grade=total_rank,
+                )
+
+    def _ids(self, payload):
+        return {item['student_id'] for item in execute_target_student_rule(payload)['students']}
+
+    def _compound(self, logic, *conditions):
+        return {'grade_level': COHORT, 'logic': logic, 'conditions': list(conditions)}
+
+    def test_compound_rules_match_intersection_and_union_of_single_rules(self):
+        total_ids = self._ids({'grade_level': COHORT, **TOTAL_TOP})
+        math_ids = self._ids({'grade_level': COHORT, **MATH_LATEST})
+        self.assertTrue(total_ids and math_ids)
+
+        self.assertEqual(self._ids(self._compound('AND', TOTAL_TOP, MATH_LATEST)), total_ids & math_ids)
+        self.assertEqual(self._ids(self._compound('or', TOTAL_TOP, MATH_LATEST)), total_ids | math_ids)
+
+        result = execute_target_student_rule(self._compound('OR', TOTAL_TOP, MATH_LATEST))
+        self.assertEqual([item['exam_count'] for item in result['rule_summary']['conditions']], [5, 1])
+        self.assertEqual(result['exam_count'], 5)
+        for item in result['students']:
+            self.assertEqual(item['matched_condition_count'], sum(detail['matched'] for detail in item['conditions']))
+            self.assertEqual(item['conditions'][0]['matched'], item['student_id'] in total_ids)
+
+    def test_exam_counts_are_reported_per_condition_only(self):
+        # 两个条件的考试范围相同：缺考次数不能在行上相加
+        result = execute_target_student_rule(self._compound('OR', TOTAL_TOP, {**TOTAL_TOP, 'threshold': 4}))
+        self.assertTrue(result['students'])
+        for item in result['students']:
+            self.assertEqual(
+                (item['required_count'], item['participated_count'], item['missed_exam_count']), (None, None, None)
+            )
+            first, second = item['conditions']
+            self.assertEqual(first['missed_exam_count'], second['missed_exam_count'])
+            self.assertEqual(first['missed_exam_count'], 5 - first['participated_count'])
+
+        rows = list(ScoreWorkbookService._target_student_sheet_rows(result['students']))
+        missed_column = TARGET_STUDENT_HEADERS.index('缺考次数')
+        self.assertEqual({row[missed_column] for row in rows[1:]}, {'-'})
+
+    def test_conditions_share_exam_list_and_metric_matrices(self):
+        total_all = {**TOTAL_TOP, 'exam_scope': {'type': 'all_in_grade'}, 'quantifier': 'all'}
+        # 届别考试 + 候选学生 + 每个 (指标, 科目) 一份矩阵
+        with self.assertNumQueries(4):
+            execute_target_student_rule(self._compound('AND', TOTAL_TOP, MATH_LATEST))
+        caches['analysis'].clear()
+        with self.assertNumQueries(3):
+            execute_target_student_rule(self._compound('OR', TOTAL_TOP, total_all))
+
+    def test_invalid_compound_rules_are_rejected(self):
+        with self.assertRaisesMessage(ValueError, 'conditions'):
+            execute_target_student_rule(self._compound('AND'))
+        with self.assertRaisesMessage(ValueError, 'logic'):
+            execute_target_student_rule(self._compound('XOR', TOTAL_TOP))
+        with self.assertRaisesMessage(ValueError, '第 2 个条件'):
+            execute_target_student_rule(self._compound('AND', TOTAL_TOP, {**MATH_LATEST, 'subject': None}))
+        with self.assertRaisesMessage(ValueError, '第 1 个条件：strict_fail'):
+            execute_target_student_rule(self._compound(
+                'AND', {**TOTAL_TOP, 'absent_policy': 'strict_fail', 'k': 6}, MATH_LATEST,
+            ))
+
+    def test_api_caches_compound_results(self):
+        client = staff_client('tc_staff')
+        url = '/api/scores/target-students-query'
+        resp = client.post(
+            url, data=json.dumps({**self._compound('OR', TOTAL_TOP, MATH_LATEST), 'page_size': 2}),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['data']
+        self.assertEqual(data['rule_summary']['logic'], 'OR')
+
+        page = client.post(
+            url, data=json.dumps({'result_id': data['result_id'], 'page': 2, 'page_size': 2}),
+            content_type='application/json',
+        ).json()['data']
+        self.assertEqual(page['pagination']['total'], data['pagination']['total'])
+        self.assertEqual(len(page['students'][0]['conditions']), 2)
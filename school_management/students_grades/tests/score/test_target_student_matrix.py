@@ -0,0 +1,124 @@
+"""Tests for the cached student×exam matrix behind target-student rules."""
+import json
+import random
+
+from django.test import TestCase
+
+from school_management.students_grades.models import ExamResult, Score, Student
+from school_management.students_grades.services.exam_result_service import ExamResultService
+from school_management.students_grades.services.target_student_service import execute_target_student_rule
+from school_management.students_grades.tests.score.test_base import (
+    LocmemCacheMixin,
+    create_cohort,
+    staff_client,
+    target_rule,
+)
+
+
+class TargetStudentMatrixTests(LocmemCacheMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(23)
+        _, self.exams, self.students = create_cohort('TM', student_count=20, exam_count=4, class_count=2)
+        # 休学学生不参与筛选
+        Student.objects.filter(pk=self.students[0].pk).update(status='休学')
+        self.values = {}
+        for exam in self.exams:
+            grade_ranks = rng.sample(range(1, 21), 20)
+            for student, rank in zip(self.students, grade_ranks):
+                if rng.random() < 0.15:
+                    continue  # 缺考
+                for subject, score_value in (('语文', 40 + rank), ('数学', 130 - rank)):
+                    Score.objects.create(
+                        student=student, exam=exam, subject=subject, score_value=score_value,
+                        grade_rank_in_subject=rank, class_rank_in_subject=(rank + 1) // 2,
+                        total_score_rank_in_grade=rank, total_score_rank_in_class=(rank + 1) // 2,
+                    )
+                self.values[(student.pk, exam.pk)] = {
+                    'total_score_rank_in_grade': rank,
+                    'total_score_rank_in_class': (rank + 1) // 2,
+                    'total_score': 170,
+                    'subject_rank_in_grade': rank,
+                    'subject_score': 40 + rank,
+                }
+
+    def _expected(self, payload):
+        """逐学生、逐考试的朴素求值，作为对照。"""
+        matched = set()
+        for student in self.students[1:]:
+            values = [self.values.get((student.pk, exam.pk), {}).get(payload['metric']) for exam in self.exams]
+            present = [value for value in values if value is not None]
+            if payload['operator'] == 'lte':
+                hits = sum(value <= payload['threshold'] for value in present)
+            else:
+                hits = sum(value >= payload['threshold'] for value in present)
+            if payload['quantifier'] == 'at_least':
+                ok = hits >= payload['k']
+            elif payload['absent_policy'] == 'strict_fail':
+                ok = hits == len(self.exams)
+            else:
+                ok = bool(present) and hits == len(present)
+            if ok:
+                matched.add(student.student_id)
+        return matched
+
+    def test_metrics_and_quantifiers_match_per_student_evaluation(self):
+        cases = [
+            target_rule(),
+            target_rule(absent_policy='ignore_absent'),
+            target_rule(quantifier='at_least', k=2, threshold=10),
+            target_rule(metric='total_score_rank_in_class', threshold=3, absent_policy='ignore_absent'),
+            target_rule(metric='total_score', operator='gte', threshold=170, quantifier='at_least', k=3),
+            target_rule(metric='subject_rank_in_grade', subject='语文', quantifier='at_least', k=1, threshold=4),
+            target_rule(metric='subject_score', subject='语文', operator='gte', threshold=52.5, absent_policy='ignore_absent'),
+        ]
+        for payload in cases:
+            result = execute_target_student_rule(payload)
+            self.assertEqual({item['student_id'] for item in result['students']}, self._expected(payload), msg=payload)
+            self.assertNotIn('TM000', {item['student_id'] for item in result['students']})
+
+        student = self.students[3]
+        row = next(
+            item for item in execute_target_student_rule(target_rule(threshold=20, absent_policy='ignore_absent'))['students']
+            if item['student_id'] == student.student_id
+        )
+        ranks = [self.values[(student.pk, exam.pk)]['total_score_rank_in_grade'] for exam in self.exams if (student.pk, exam.pk) in self.values]
+        self.assertEqual(row['participated_count'], len(ranks))
+        self.assertEqual(row['avg_rank'], round(sum(ranks) / len(ranks), 1))
+
+    def test_matrix_is_reused_across_runs_and_rebuilt_after_score_changes(self):
+        execute_target_student_rule(target_rule())
+        # 考试范围 + 候选学生，矩阵来自缓存
+        with self.assertNumQueries(2):
+            execute_target_student_rule(target_rule(threshold=15, quantifier='at_least', k=2))
+
+        student, exam = self.students[1], self.exams[0]
+        Score.objects.filter(student=student, exam=exam).delete()
+        ExamResultService.refresh_pairs([(student.pk, exam.pk)])
+        self.assertFalse(ExamResult.objects.filter(student=student, exam=exam).exists())
+        self.values.pop((student.pk, exam.pk), None)
+
+        payload = target_rule(threshold=20)
+        with self.assertNumQueries(3):
+            result = execute_target_student_rule(payload)
+        self.assertEqual({item['student_id'] for item in result['students']}, self._expected(payload))
+        self.assertNotIn(student.student_id, {item['student_id'] for item in result['students']})
+
+    def test_validation_of_new_metrics(self):
+        with self.assertRaisesMessage(ValueError, 'subject'):
+            execute_target_student_rule(target_rule(metric='subject_score', operator='gte', threshold=60))
+        with self.assertRaisesMessage(ValueError, 'threshold'):
+            execute_target_student_rule(target_rule(metric='total_score', operator='gte', threshold=-1))
+        with self.assertRaisesMessage(ValueError, 'operator'):
+            execute_target_student_rule(target_rule(operator='eq'))
+
+    def test_api_returns_new_metric_fields(self):
+        client = staff_client('tm_staff')
+        payload = target_rule(metric='subject_score', subject='数学', operator='gte', threshold=120, absent_policy='ignore_absent')
+        resp = client.post('/api/scores/target-students-query', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()['data']
+        self.assertEqual(data['rule_summary']['subject'], '数学')
+        for item in data['students']:
+            self.assertIsNone(item['avg_rank'])
+            self.assertGreaterEqual(item['avg_value'], 120)
@@ -0,0 +1,105 @@
+"""Tests for cached target-student result sets (result_id paging, sorting and export)."""
+import io
+import json
+from unittest import mock
+
+import openpyxl
+from django.test import TestCase
+
+from school_management.students_grades.models import Exam, Score
+from school_management.students_grades.services import target_result_service
+from school_management.students_grades.services.target_result_service import TargetResultService
+from school_management.students_grades.tests.score.test_base import (
+    LocmemCacheMixin,
+    create_cohort,
+    staff_client,
+    target_rule,
+)
+
+# 三场考试中至少一场进入前 threshold 名
+AT_LEAST_ONCE = {'quantifier': 'at_least', 'k': 1, 'absent_policy': 'ignore_absent'}
+
+
+class TargetStudentResultTests(LocmemCacheMixin, TestCase):
+    url = '/api/scores/target-students-query'
+
+    def setUp(self):
+        super().setUp()
+        _, self.exams, self.students = create_cohort('TR', student_count=12, exam_count=3)
+        for exam_index, exam in enumerate(self.exams):
+            for i, student in enumerate(self.students):
+                Score.objects.create(
+                    student=student, exam=exam, subject='语文', score_value=100,
+                    total_score_rank_in_grade=(i + exam_index) % 12 + 1,
+                )
+        self.client = staff_client('tr_staff')
+
+    def _post(self, payload, url=None):
+        return self.client.post(url or self.url, data=json.dumps(payload), content_type='application/json')
+
+    def test_later_pages_and_sorting_are_served_from_the_cached_result(self):
+        first = self._post({**target_rule(**AT_LEAST_ONCE), 'page_size': 5}).json()['data']
+        result_id = first['result_id']
+        # 三场都在 8 名之后的只有 TR008、TR009
+        self.assertEqual(first['pagination']['total'], 10)
+
+        with mock.patch.object(
+            target_result_service, 'evaluate_target_student_rule',
+            side_effect=AssertionError('不应重新求值'),
+        ):
+            second = self._post({'result_id': result_id, 'page': 2, 'page_size': 5}).json()['data']
+            self.assertEqual(second['result_id'], result_id)
+            self.assertEqual(second['pagination']['page'], 2)
+            self.assertEqual(len(second['students']), 5)
+
+            # 相同规则再次提交同样命中缓存
+            again = self._post(target_rule(**AT_LEAST_ONCE)).json()['data']
+            self.assertEqual(again['result_id'], result_id)
+
+            ordered = self._post({'result_id': result_id, 'sort_by': 'avg_rank', 'sort_order': 'asc'}).json()['data']
+            avg_ranks = [item['avg_rank'] for item in ordered['students']]
+            self.assertEqual(avg_ranks, sorted(avg_ranks))
+
+        self.assertEqual(self._post({'result_id': result_id, 'sort_by': 'name'}).status_code, 400)
+
+    def test_result_expires_when_exam_data_changes(self):
+        result_id = self._post(target_rule(**AT_LEAST_ONCE)).json()['data']['result_id']
+        Score.objects.filter(student=self.students[0], exam=self.exams[0]).update(total_score_rank_in_grade=12)
+        Exam.objects.filter(pk=self.exams[0].pk).update(data_version=self.exams[0].data_version + 5)
+
+        resp = self._post({'result_id': result_id, 'page': 2})
+        self.assertEqual(resp.status_code, 404)
+        self.assertIn('过期', resp.json()['error'])
+
+        # 带规则时直接重新求值，得到新的 result_id
+        data = self._post({**target_rule(**AT_LEAST_ONCE), 'result_id': result_id}).json()['data']
+        self.assertNotEqual(data['result_id'], result_id)
+
+    def test_memory_budget_evicts_oldest_result_sets(self):
+        first = self._post(target_rule(**AT_LEAST_ONCE)).json()['data']['result_id']
+        with mock.patch.object(TargetResultService, 'MEMORY_BUDGET_BYTES', 1):
+            second = self._post(target_rule(**AT_LEAST_ONCE, threshold=3)).json()['data']['result_id']
+        # 单个结果集已超出预算：既不缓存自身，也会淘汰更早的结果集
+        self.assertEqual(self._post({'result_id': first}).status_code, 404)
+        self.assertEqual(self._post({'result_id': second}).status_code, 404)
+
+        third = self._post(target_rule(**AT_LEAST_ONCE, threshold=4)).json()['data']['result_id']
+        with mock.patch.object(TargetResultService, 'MAX_ENTRY_BYTES', 1):
+            oversized = self._post(target_rule(**AT_LEAST_ONCE, threshold=5)).json()['data']['result_id']
+        self.assertEqual(self._post({'result_id': third}).status_code, 200)
+        self.assertEqual(self._post({'result_id': oversized}).status_code, 404)
+
+    def test_export_uses_cached_result_in_requested_order(self):
+        data = self._post(target_rule(**AT_LEAST_ONCE, threshold=4)).json()['data']
+        result_id = data['result_id']
+        resp = self._post(
+            {'result_id': result_id, 'sort_by': 'student_id', 'sort_order': 'asc'},
+            url='/api/scores/target-students-export',
+        )
+        self.assertEqual(resp.status_code, 200)
+        workbook = openpyxl.load_workbook(io.BytesIO(b''.join(resp.streaming_content)))
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], '学号')
+        numbers = [row[0] for row in rows[1:]]
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(len(numbers), data['pagination']['total'])
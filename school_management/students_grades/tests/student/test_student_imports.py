@@ -25,6 +25,7 @@ import datetime
 import openpyxl
 
 from school_management.students_grades.models import Student, Class
+from school_management.students_grades.services import StudentImportService
 
 
 class StudentImportViewTests(TestCase):
@@ -226,3 +227,83 @@ class StudentImportViewTests(TestCase):
         self.assertTrue(data2.get('success'))
         self.assertTrue(isinstance(data2.get('warning_messages'), list))
         self.assertGreaterEqual(len(data2.get('warning_messages')), 1)
+
+
+class StudentImportServiceBulkTests(TestCase):
+    """Service-level tests for the chunked, set-based student import engine."""
+
+    HEADERS = [
+        "学号 (必填)", "姓名 (必填)", "出生日期 (YYYY-MM-DD)", "年级 (初一/初二/初三/高一/高二/高三)",
+        "学段 (初中/高中)", "届别年份 (纯数字，如2026)", "班级名称 (1班-20班)", "学籍号",
+    ]
+
+    def make_upload(self, rows):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(self.HEADERS)
+        for row in rows:
+            ws.append(row)
+        buf = BytesIO()
+        wb.save(buf)
+        return SimpleUploadedFile('students.xlsx', buf.getvalue())
+
+    def test_classes_are_resolved_in_bulk_with_bounded_queries(self):
+        rows = [
+            [f'B{i:03d}', f'学生{i}', '2012-9-1', '初一', '初中', 2025, f'{i % 5 + 1}班', None]
+            for i in range(60)
+        ]
+        # 查询数与行数无关：班级查询 + 建班 + 学生查询 + 批量写入
+        with self.assertNumQueries(8):
+            result = StudentImportService.batch_import(self.make_upload(rows), chunk_size=100)
+
+        self.assertEqual(result['imported_count'], 60)
+        self.assertEqual(Class.objects.filter(cohort='初中2025级').count(), 5)
+        self.assertEqual(sum('自动创建班级' in msg for msg in result['success_messages']), 5)
+        student = Student.objects.get(student_id='B007')
+        self.assertEqual(student.current_class.class_name, '3班')
+        self.assertEqual(student.date_of_birth, datetime.date(2012, 9, 1))
+
+    def test_duplicates_and_existing_students_update_in_place(self):
+        Student.objects.create(student_id='U001', name='旧名')
+        rows = [
+            ['U001', '新名', '2012/09/01', '初一', '初中', 2025, '1班', None],
+            ['U002', '第一次', '2012.09.02', '初一', '初中', 2025, '1班', None],
+            ['U002', '第二次', 'bad-date', '初一', '初中', 2025, '1班', None],
+        ]
+        result = StudentImportService.batch_import(self.make_upload(rows), chunk_size=2)
+
+        self.assertEqual(result['imported_count'], 3)
+        self.assertIn('U002', result['warning_messages'][0])
+        self.assertTrue(any("第 4 行的 'date_of_birth' 日期格式不正确" in msg for msg in result['warning_messages']))
+        self.assertEqual(Student.objects.get(student_id='U001').name, '新名')
+        latest = Student.objects.get(student_id='U002')
+        self.assertEqual(latest.name, '第二次')
+        self.assertIsNone(latest.date_of_birth)
+
+    def test_failing_row_is_isolated_when_chunk_falls_back(self):
+        Student.objects.create(student_id='E000', name='已有', student_enrollment_number='EN-TAKEN')
+        rows = [
+            ['E001', '正常一', None, '初一', '初中', 2025, '1班', None],
+            ['E002', '冲突', None, '初一', '初中', 2025, '1班', 'EN-TAKEN'],
+            ['E003', '正常二', None, '初一', '初中', 2025, '1班', None],
+            [None, '缺学号', None, '初一', '初中', 2025, '1班', None],
+        ]
+        result = StudentImportService.batch_import(self.make_upload(rows))
+
+        self.assertEqual(result['imported_count'], 2)
+        self.assertEqual([item['row'] for item in result['failed_rows']], [3, 5])
+        self.assertTrue(Student.objects.filter(student_id__in=['E001', 'E003']).count() == 2)
+        self.assertFalse(Student.objects.filter(student_id='E002').exists())
+
+    def test_existing_class_cohort_is_filled_with_warning(self):
+        cls_obj = Class.objects.create(grade_level='初二', class_name='6班')
+        rows = [
+            ['C001', '补全一', None, '初二', '初中', 2024, '6班', None],
+            ['C002', '补全二', None, '初二', '初中', 2024, '6班', None],
+        ]
+        result = StudentImportService.batch_import(self.make_upload(rows))
+
+        cls_obj.refresh_from_db()
+        self.assertEqual(cls_obj.cohort, '初中2024级')
+        self.assertEqual(sum('cohort 已自动补全' in msg for msg in result['warning_messages']), 1)
+        self.assertEqual(Student.objects.filter(current_class=cls_obj).count(), 2)
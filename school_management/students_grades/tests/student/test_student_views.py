@@ -146,10 +146,10 @@ class StudentApiContractSmokeTests(TestCase):
         )
         Score.objects.create(student=student, exam=exam, exam_subject=exam_subject, subject='语文', score_value=95)
 
-        with patch('school_management.students_grades.tasks.update_all_rankings_async.delay') as mocked_delay:
+        with patch('school_management.students_grades.services.ranking_scheduler.RankingScheduler.request') as mocked_request:
             resp = self.client.delete(f'/api/students/{student.pk}/')
             self.assertEqual(resp.status_code, 204)
-            mocked_delay.assert_called()
+            mocked_request.assert_called_once_with(exam.pk, student.cohort)
 
 
 class StudentWritePermissionMatrixTests(TestCase):
@@ -10,6 +10,8 @@ from .score import ScoreViewSet
 from .student import StudentViewSet
 from .classroom import ClassViewSet
 from .exam import ExamViewSet
+from .import_job import ImportJobViewSet
+from .export_job import ExportJobViewSet
 
 __all__ = [
     'advanced_filter',
@@ -22,4 +24,6 @@ __all__ = [
     'StudentViewSet',
     'ClassViewSet',
     'ExamViewSet',
+    'ImportJobViewSet',
+    'ExportJobViewSet',
 ]
@@ -0,0 +1,39 @@
+from django.http import FileResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from ..services import ExportJobService
+
+
+class ExportJobViewSet(viewsets.ViewSet):
+    """
+    导出任务状态与下载
+    - 列表：当前用户最近的导出任务
+    - 详情：任务状态，完成后返回 download_url
+    - 下载：有效期内可重复下载
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        jobs = ExportJobService.scope_jobs(request.user)[:20]
+        return Response({'results': [ExportJobService.serialize(job) for job in jobs]})
+
+    def retrieve(self, request, pk=None):
+        job = get_object_or_404(ExportJobService.scope_jobs(request.user), pk=pk)
+        return Response(ExportJobService.serialize(job))
+
+    @action(detail=True, methods=['get'], url_path='download')
+    def download(self, request, pk=None):
+        job = get_object_or_404(ExportJobService.scope_jobs(request.user), pk=pk)
+        if job.status != 'success' or not job.file:
+            return Response({'success': False, 'message': '导出文件尚未生成'}, status=status.HTTP_409_CONFLICT)
+        if job.expires_at and job.expires_at <= timezone.now():
+            return Response({'success': False, 'message': '导出文件已过期，请重新导出'}, status=status.HTTP_410_GONE)
+        try:
+            file_handle = job.file.open('rb')
+        except FileNotFoundError:
+            return Response({'success': False, 'message': '导出文件已过期，请重新导出'}, status=status.HTTP_410_GONE)
+        return FileResponse(file_handle, as_attachment=True, filename=job.filename)
@@ -1,11 +1,11 @@
-from django.db import models
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 
-from ..models import Exam, FilterResultSnapshot, SavedFilterRule, Score, Student
+from ..models import Exam, FilterResultSnapshot, SavedFilterRule, Student
 from ..serializers import FilterResultSnapshotSerializer, SavedFilterRuleSerializer
 from ..services import AdvancedFilterService, FilterComparisonService
+from ..services.rank_index_service import RankIndexService
 from school_management.users.permissions import IsAdminOrGradeManagerOrStaff
 
 
@@ -23,61 +23,6 @@ SUBJECT_LABEL_MAP = {
 }
 
 
-def _get_condition_rank_map(exam_id: int, condition: dict, student_ids: list[int]) -> dict[int, int]:
-    subject = condition.get('subject')
-    dimension = condition.get('dimension')
-
-    if subject == 'total':
-        rank_field = 'total_score_rank_in_grade' if dimension == 'grade' else 'total_score_rank_in_class'
-        rows = (
-            Score.objects.filter(exam_id=exam_id, student_id__in=student_ids)
-            .values('student_id')
-            .annotate(rank_value=models.Min(rank_field))
-        )
-    else:
-        subject_name = AdvancedFilterService.SUBJECT_MAP.get(subject)
-        if not subject_name:
-            return {}
-        rank_field = 'grade_rank_in_subject' if dimension == 'grade' else 'class_rank_in_subject'
-        rows = (
-            Score.objects.filter(exam_id=exam_id, student_id__in=student_ids, subject=subject_name)
-            .values('student_id')
-            .annotate(rank_value=models.Min(rank_field))
-        )
-
-    return {
-        row['student_id']: row['rank_value']
-        for row in rows
-        if row.get('rank_value') is not None
-    }
-
-
-def _get_condition_score_map(exam_id: int, condition: dict, student_ids: list[int]) -> dict[int, float]:
-    subject = condition.get('subject')
-
-    if subject == 'total':
-        rows = (
-            Score.objects.filter(exam_id=exam_id, student_id__in=student_ids)
-            .values('student_id')
-            .annotate(score_value=models.Sum('score_value'))
-        )
-    else:
-        subject_name = AdvancedFilterService.SUBJECT_MAP.get(subject)
-        if not subject_name:
-            return {}
-        rows = (
-            Score.objects.filter(exam_id=exam_id, student_id__in=student_ids, subject=subject_name)
-            .values('student_id')
-            .annotate(score_value=models.Max('score_value'))
-        )
-
-    return {
-        row['student_id']: float(row['score_value'])
-        for row in rows
-        if row.get('score_value') is not None
-    }
-
-
 class _FilterWritePermissionMixin:
     """筛选相关视图权限：读操作登录可用，写操作仅 admin/grade_manager/staff。"""
 
@@ -90,7 +35,11 @@ class _FilterWritePermissionMixin:
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated, IsAdminOrGradeManagerOrStaff])
 def advanced_filter(request):
-    """高级筛选 API：按多条件组合返回学生列表。"""
+    """
+    高级筛选 API：按多条件组合返回学生列表。
+
+    条件可以是平铺的 logic + conditions，也可以是嵌套的 expression（AND/OR/NOT 分组）。
+    """
     try:
         exam_id = request.data.get('exam_id')
         logic = request.data.get('logic')
@@ -100,39 +49,48 @@ def advanced_filter(request):
         if not exam_id:
             return Response({'message': 'exam_id 为必填项'}, status=status.HTTP_400_BAD_REQUEST)
 
-        student_ids = AdvancedFilterService.apply_filter(
-            exam_id=int(exam_id),
-            logic=logic,
-            conditions=conditions,
-            class_id=int(class_id) if class_id else None,
-        )
+        index = RankIndexService.get(int(exam_id))
+        expression = request.data.get('expression')
+        if expression is not None:
+            # 嵌套表达式：AND/OR/NOT 分组 + 条件叶子；明细列按叶子出现顺序
+            expression = AdvancedFilterService.normalize_expression({'expression': expression})
+            conditions = AdvancedFilterService.expression_leaves(expression)
+            logic = expression.get('op', 'AND')
+            student_ids = AdvancedFilterService.apply_expression(
+                int(exam_id),
+                expression,
+                class_id=int(class_id) if class_id else None,
+                index=index,
+            )
+        else:
+            student_ids = AdvancedFilterService.apply_filter(
+                exam_id=int(exam_id),
+                logic=logic,
+                conditions=conditions,
+                class_id=int(class_id) if class_id else None,
+                index=index,
+            )
 
         students = {
             student.id: student
             for student in Student.objects.select_related('current_class').filter(id__in=student_ids)
         }
-        rank_rows = (
-            Score.objects.filter(exam_id=exam_id, student_id__in=student_ids)
-            .values('student_id')
-            .annotate(total_rank=models.Min('total_score_rank_in_grade'))
-        )
-        rank_map = {row['student_id']: row['total_rank'] for row in rank_rows}
 
+        # 明细列（各条件的成绩、名次）与总分年级名次都从同一名次索引读取，不再按条件查询
         condition_columns = []
-        condition_rank_maps = []
-        condition_score_maps = []
-        for index, condition in enumerate(conditions, start=1):
+        for index_no, condition in enumerate(conditions, start=1):
             subject = condition.get('subject', '')
             condition_columns.append(
                 {
-                    'index': index,
+                    'index': index_no,
                     'subject': subject,
                     'subject_label': SUBJECT_LABEL_MAP.get(subject, subject),
                     'dimension': condition.get('dimension'),
                 }
             )
-            condition_rank_maps.append(_get_condition_rank_map(int(exam_id), condition, student_ids))
-            condition_score_maps.append(_get_condition_score_map(int(exam_id), condition, student_ids))
+        condition_keys = [
+            (AdvancedFilterService.subject_code(column['subject']), column['dimension']) for column in condition_columns
+        ]
 
         result_students = []
         for student_id in student_ids:
@@ -141,14 +99,14 @@ def advanced_filter(request):
                 continue
             class_name = student.current_class.class_name if student.current_class else '未分班'
             condition_details = []
-            for idx, column in enumerate(condition_columns):
+            for column, (subject_code, dimension) in zip(condition_columns, condition_keys):
                 condition_details.append(
                     {
                         'condition_index': column['index'],
                         'subject': column['subject'],
                         'subject_label': column['subject_label'],
-                        'score': condition_score_maps[idx].get(student_id),
-                        'rank': condition_rank_maps[idx].get(student_id),
+                        'score': index.score(subject_code, student_id),
+                        'rank': index.rank(subject_code, dimension, student_id),
                     }
                 )
             result_students.append(
@@ -158,7 +116,7 @@ def advanced_filter(request):
                     'name': student.name,
                     'cohort': student.cohort,
                     'class_name': class_name,
-                    'total_rank': rank_map.get(student.id),
+                    'total_rank': index.rank('total', 'grade', student.id),
                     'condition_details': condition_details,
                 }
             )
@@ -170,14 +128,15 @@ def advanced_filter(request):
             )
         )
 
-        return Response(
-            {
-                'count': len(result_students),
-                'logic': (logic or '').upper(),
-                'condition_columns': condition_columns,
-                'students': result_students,
-            }
-        )
+        data = {
+            'count': len(result_students),
+            'logic': (logic or '').upper(),
+            'condition_columns': condition_columns,
+            'students': result_students,
+        }
+        if expression is not None:
+            data['expression'] = expression
+        return Response(data)
     except Exam.DoesNotExist:
         return Response({'message': '考试不存在'}, status=status.HTTP_404_NOT_FOUND)
     except ValueError as exc:
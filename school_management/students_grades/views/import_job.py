@@ -0,0 +1,22 @@
+from django.shortcuts import get_object_or_404
+from rest_framework import permissions, viewsets
+from rest_framework.response import Response
+
+from ..services import ImportJobService
+
+
+class ImportJobViewSet(viewsets.ViewSet):
+    """
+    Excel 导入任务进度查询
+    - 列表：当前用户最近的导入任务
+    - 详情：进度、预计剩余时间，结束后返回完整导入结果（含 error_details）
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        jobs = ImportJobService.scope_jobs(request.user)[:20]
+        return Response({'results': [ImportJobService.serialize(job) for job in jobs]})
+
+    def retrieve(self, request, pk=None):
+        job = get_object_or_404(ImportJobService.scope_jobs(request.user), pk=pk)
+        return Response(ImportJobService.serialize(job))
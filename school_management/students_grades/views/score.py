@@ -1,15 +1,14 @@
 import datetime
 
 import openpyxl
-from django.core.paginator import Paginator
 from django.db import models
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
 
-from school_management.users.permissions import IsAdminOrGradeManagerOrStaff
+from school_management.users.permissions import IsAdminOrGradeManagerOrStaff, IsAdminOrStaff
 
 from ..models.exam import Exam
 from ..models.score import Score, SUBJECT_CHOICES as SCORE_SUBJECT_CHOICES
@@ -22,19 +21,32 @@ from ..models.student import (
 )
 from ..serializers import ScoreSerializer
 from ..services import (
-    execute_target_student_rule,
+    TargetResultService,
+    TargetResultServiceError,
     ScoreQueryService,
     ScoreWorkbookService,
     ScoreAnalysisService,
     ScoreAnalysisServiceError,
+    AnalysisCacheService,
     ScoreMutationService,
     ScoreMutationServiceError,
+    ScoreGridService,
+    ScoreGridServiceError,
+    ScoreSelectionService,
+    ScoreSelectionServiceError,
     ScoreImportService,
     ScoreImportServiceError,
+    ImportJobService,
+    ImportJobServiceError,
+    ExportJobService,
+    ExportJobServiceError,
+    StudentAnalysisBatchService,
+    StudentAnalysisBatchServiceError,
 )
 from ..services.score_access_service import ScoreAccessService
 from ..services.student_analysis_export import StudentAnalysisExportService
-from ..tasks import update_all_rankings_async
+from ..services.exam_result_service import ExamResultService
+from ..services.ranking_scheduler import RankingScheduler
 
 class ScoreViewSet(viewsets.ModelViewSet):
     """
@@ -49,22 +61,45 @@ class ScoreViewSet(viewsets.ModelViewSet):
     parser_classes = [JSONParser, MultiPartParser, FormParser]
 
     def get_permissions(self):
-        if self.action == 'target_students_query':
+        if self.action in ['target_students_query', 'target_students_export']:
             return [permissions.IsAuthenticated()]
 
+        if self.action == 'analysis_cache_metrics':
+            return [permissions.IsAuthenticated(), IsAdminOrStaff()]
+
         if self.action in [
             'create', 'update', 'partial_update', 'destroy',
-            'manual_add', 'batch_edit_save',
+            'manual_add', 'batch_edit_save', 'score_grid_save',
             'batch_delete_selected', 'batch_delete_filtered', 'batch_import'
         ]:
             return [permissions.IsAuthenticated(), IsAdminOrGradeManagerOrStaff()]
         return [permissions.IsAuthenticated()]
 
+    @staticmethod
+    def _target_student_result(request):
+        """
+        传 result_id（且未带规则）时读取缓存的结果集，否则执行规则；返回 (result_id, 结果, 排序后的学生)。
+
+        result_id 失效时若请求同时带了规则则重新执行，否则返回 404 由前端重新查询。
+        """
+        result_id = request.query_params.get('result_id') or request.data.get('result_id')
+        if result_id and not request.data.get('grade_level'):
+            result = TargetResultService.load(result_id)
+        else:
+            result_id, result = TargetResultService.run(request.data)
+
+        students = TargetResultService.sort_students(
+            result.get('students', []),
+            request.query_params.get('sort_by', request.data.get('sort_by')),
+            request.query_params.get('sort_order', request.data.get('sort_order', 'desc')),
+        )
+        return result_id, result, students
+
     @action(detail=False, methods=['post'], url_path='target-students-query')
     def target_students_query(self, request):
-        """按规则筛选目标生（第一期：单条件 + 时序量词）。"""
+        """按规则筛选目标生（第一期：单条件 + 时序量词）；结果集按 result_id 缓存，翻页与排序不重新求值。"""
         try:
-            result = execute_target_student_rule(request.data)
+            result_id, result, students = self._target_student_result(request)
 
             page = self._parse_pagination_value(
                 request.query_params.get('page', request.data.get('page', 1)),
@@ -81,7 +116,6 @@ class ScoreViewSet(viewsets.ModelViewSet):
                 max_value=1000,
             )
 
-            students = result.get('students', [])
             total = len(students)
             num_pages = ((total - 1) // page_size + 1) if total else 1
 
@@ -92,7 +126,7 @@ class ScoreViewSet(viewsets.ModelViewSet):
             end = start + page_size
             paged_students = students[start:end]
 
-            result['students'] = paged_students
+            result = {**result, 'result_id': result_id, 'students': paged_students}
             result['pagination'] = {
                 'page': page,
                 'page_size': page_size,
@@ -103,11 +137,29 @@ class ScoreViewSet(viewsets.ModelViewSet):
             }
 
             return Response({'success': True, 'data': result})
+        except TargetResultServiceError as e:
+            return Response({'success': False, 'error': e.message}, status=e.status_code)
         except ValueError as e:
             return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'success': False, 'error': f'服务器错误: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='target-students-export')
+    def target_students_export(self, request):
+        """导出目标生筛选结果（按 result_id 读取缓存结果集，排序与列表一致）。"""
+        try:
+            _, result, students = self._target_student_result(request)
+        except TargetResultServiceError as e:
+            return Response({'success': False, 'error': e.message}, status=e.status_code)
+        except ValueError as e:
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        return self._streaming_xlsx_response(
+            ScoreWorkbookService.target_students_workbook_chunks(students),
+            f'目标生筛选结果_{timestamp}.xlsx',
+        )
+
     @staticmethod
     def _parse_pagination_value(raw_value, default_value, field_name, min_value, max_value):
         if raw_value in [None, '']:
@@ -126,18 +178,6 @@ class ScoreViewSet(viewsets.ModelViewSet):
     def _filter_scores(self, request):
         return ScoreQueryService.filter_scores(request)
 
-    def _aggregate_rows(self, scores):
-        return ScoreQueryService.aggregate_rows(scores)
-
-    def _sort_rows(self, rows, request):
-        return ScoreQueryService.sort_rows(rows, request)
-
-    def _build_export_workbook(self, rows):
-        return ScoreWorkbookService.build_export_workbook(rows)
-
-    def _build_query_export_workbook(self, rows, all_subjects):
-        return ScoreWorkbookService.build_query_export_workbook(rows, all_subjects)
-
     def _build_student_analysis_export_payload(self, request):
         """组装个人分析导出 payload，复用 student_analysis_data 同口径数据。"""
         analysis_response = self.student_analysis_data(request)
@@ -166,17 +206,19 @@ class ScoreViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='student-analysis-report-export')
     def student_analysis_report_export(self, request):
-        """导出个人成绩分析报告（Excel）。"""
+        """导出个人成绩分析报告（Excel）；传 async=true 时转为后台导出任务。"""
+        if ExportJobService.should_run_async(request.query_params.get('async')):
+            denied = self._student_access_denied(request, request.query_params.get('student_id'))
+            if denied is not None:
+                return denied
+            return self._export_job_response('student_analysis', request)
+
         payload, error_response = self._build_student_analysis_export_payload(request)
         if error_response is not None:
             return error_response
 
         try:
-            workbook = openpyxl.Workbook()
-            StudentAnalysisExportService.build_overview_sheet(workbook, payload)
-            StudentAnalysisExportService.build_total_trend_sheet(workbook, payload)
-            StudentAnalysisExportService.build_subject_detail_sheet(workbook, payload)
-            StudentAnalysisExportService.build_subject_trend_sheet(workbook, payload)
+            workbook = StudentAnalysisExportService.build_workbook(payload)
 
             student_info = payload.get('student_info') or {}
             timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M')
@@ -189,6 +231,41 @@ class ScoreViewSet(viewsets.ModelViewSet):
         except Exception:
             return Response({'success': False, 'error': '服务异常，请稍后重试'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'], url_path='student-analysis-batch-export')
+    def student_analysis_batch_export(self, request):
+        """
+        按班级（class_id）或届别（cohort）批量导出个人成绩分析报告（zip，每个学生一个 Excel）。
+
+        exam_ids 可选，逗号分隔；传 async=true 或人数超过 SYNC_MAX_STUDENTS 时转为后台导出任务，
+        可在任务详情中查看进度。同步导出在当前进程逐个生成，边生成边发送。
+        """
+        try:
+            students = StudentAnalysisBatchService.resolve_students(
+                request.user,
+                request.query_params.get('class_id'),
+                request.query_params.get('cohort'),
+            )
+            exam_ids = StudentAnalysisBatchService.parse_exam_ids(request.query_params.get('exam_ids'))
+        except StudentAnalysisBatchServiceError as exc:
+            return Response({'success': False, 'error': exc.message}, status=exc.status_code)
+
+        if not students.exists():
+            return Response({'success': False, 'error': '没有可导出的学生'}, status=status.HTTP_404_NOT_FOUND)
+
+        if (
+            ExportJobService.should_run_async(request.query_params.get('async'))
+            or students.count() > StudentAnalysisBatchService.SYNC_MAX_STUDENTS
+        ):
+            return self._export_job_response('student_analysis_batch', request)
+
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M')
+        response = StreamingHttpResponse(
+            StudentAnalysisBatchService.stream_zip(students, exam_ids),
+            content_type='application/zip',
+        )
+        response['Content-Disposition'] = f'attachment; filename="个人成绩分析报告_{timestamp}.zip"'
+        return response
+
     @action(detail=False, methods=['get'], url_path='options')
     def options(self, request):
         grade_level_filter = request.query_params.get('grade_level')
@@ -297,14 +374,9 @@ class ScoreViewSet(viewsets.ModelViewSet):
             ]
         })
 
-    @action(detail=False, methods=['get'], url_path='student-analysis-data')
-    def student_analysis_data(self, request):
-        """获取学生个人成绩分析数据（前后端分离 API 版本）"""
-        student_id = request.query_params.get('student_id')
-        exam_ids = request.query_params.get('exam_ids', '')
-        exam_id = request.query_params.get('exam_id')
-
-        # Subject teacher: verify student belongs to their teaching classes
+    @staticmethod
+    def _student_access_denied(request, student_id):
+        """科任老师只能访问所教班级学生的分析数据；无权限时返回 403 响应。"""
         user = request.user
         if getattr(user, 'role', None) == 'subject_teacher':
             accessible_students = ScoreAccessService.scope_students(user, Student.objects.all())
@@ -313,9 +385,33 @@ class ScoreViewSet(viewsets.ModelViewSet):
                     {'success': False, 'error': '无权限访问该学生的分析数据'},
                     status=status.HTTP_403_FORBIDDEN,
                 )
+        return None
+
+    @action(detail=False, methods=['get'], url_path='student-analysis-data')
+    def student_analysis_data(self, request):
+        """获取学生个人成绩分析数据（前后端分离 API 版本）"""
+        student_id = request.query_params.get('student_id')
+        exam_ids = request.query_params.get('exam_ids', '')
+        exam_id = request.query_params.get('exam_id')
+
+        denied = self._student_access_denied(request, student_id)
+        if denied is not None:
+            return denied
 
         try:
-            analysis_data = ScoreAnalysisService.build_student_analysis_data(student_id, exam_ids, exam_id)
+            if exam_ids:
+                cache_exam_ids = [item.strip() for item in exam_ids.split(',') if item.strip()]
+            elif exam_id:
+                cache_exam_ids = [exam_id]
+            else:
+                cache_exam_ids = Score.objects.filter(student_id=student_id).values('exam_id')
+            analysis_data = AnalysisCacheService.get_or_build(
+                'student',
+                {'student_id': student_id, 'exam_ids': exam_ids, 'exam_id': exam_id},
+                request.user,
+                cache_exam_ids,
+                lambda: ScoreAnalysisService.build_student_analysis_data(student_id, exam_ids, exam_id),
+            )
             return Response({'success': True, 'data': analysis_data})
         except ScoreAnalysisServiceError as exc:
             return Response({'success': False, 'error': exc.message}, status=exc.status_code)
@@ -331,12 +427,24 @@ class ScoreViewSet(viewsets.ModelViewSet):
         class_name_param = request.query_params.get('class_name')
         selected_classes = request.query_params.getlist('selected_classes')
         try:
-            data = ScoreAnalysisService.build_class_analysis_single(
-                exam_id,
-                grade_level,
-                academic_year,
-                class_name_param,
-                selected_classes,
+            data = AnalysisCacheService.get_or_build(
+                'class_single',
+                {
+                    'exam': exam_id,
+                    'grade_level': grade_level,
+                    'academic_year': academic_year,
+                    'class_name': class_name_param,
+                    'selected_classes': selected_classes,
+                },
+                request.user,
+                [exam_id],
+                lambda: ScoreAnalysisService.build_class_analysis_single(
+                    exam_id,
+                    grade_level,
+                    academic_year,
+                    class_name_param,
+                    selected_classes,
+                ),
             )
             return Response({'success': True, 'data': data})
         except ScoreAnalysisServiceError as exc:
@@ -353,12 +461,24 @@ class ScoreViewSet(viewsets.ModelViewSet):
         class_name_param = request.query_params.get('class_name', '')
         selected_classes_param = request.query_params.getlist('selected_classes')
         try:
-            data = ScoreAnalysisService.build_class_analysis_multi(
-                exam_id,
-                grade_level,
-                academic_year,
-                class_name_param,
-                selected_classes_param,
+            data = AnalysisCacheService.get_or_build(
+                'class_multi',
+                {
+                    'exam': exam_id,
+                    'grade_level': grade_level,
+                    'academic_year': academic_year,
+                    'class_name': class_name_param,
+                    'selected_classes': selected_classes_param,
+                },
+                request.user,
+                [exam_id],
+                lambda: ScoreAnalysisService.build_class_analysis_multi(
+                    exam_id,
+                    grade_level,
+                    academic_year,
+                    class_name_param,
+                    selected_classes_param,
+                ),
             )
             return Response({'success': True, 'data': data})
         except ScoreAnalysisServiceError as exc:
@@ -373,13 +493,24 @@ class ScoreViewSet(viewsets.ModelViewSet):
         grade_level = request.query_params.get('grade_level')
         academic_year = request.query_params.get('academic_year', '')
         try:
-            data = ScoreAnalysisService.build_class_analysis_grade(exam_id, grade_level, academic_year)
+            data = AnalysisCacheService.get_or_build(
+                'class_grade',
+                {'exam': exam_id, 'grade_level': grade_level, 'academic_year': academic_year},
+                request.user,
+                [exam_id],
+                lambda: ScoreAnalysisService.build_class_analysis_grade(exam_id, grade_level, academic_year),
+            )
             return Response({'success': True, 'data': data})
         except ScoreAnalysisServiceError as exc:
             return Response({'success': False, 'error': exc.message}, status=exc.status_code)
         except Exception as exc:
             return Response({'success': False, 'error': f'服务器错误: {str(exc)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'], url_path='analysis-cache-metrics')
+    def analysis_cache_metrics(self, request):
+        """成绩分析缓存的命中/未命中统计（按接口汇总）。"""
+        return Response({'success': True, 'data': AnalysisCacheService.metrics()})
+
     @action(detail=False, methods=['post'], url_path='manual-add')
     def manual_add(self, request):
         student_id = request.data.get('student_id')
@@ -421,12 +552,52 @@ class ScoreViewSet(viewsets.ModelViewSet):
         except Exception as exc:
             return Response({'success': False, 'message': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-    def list(self, request, *args, **kwargs):
-        rows = self._aggregate_rows(self._filter_scores(request))
-        rows = self._sort_rows(rows, request)
-        all_subjects = ScoreQueryService.resolve_subjects(rows, request.query_params.get('dynamic_subjects'))
+    @action(detail=False, methods=['get'], url_path='score-grid')
+    def score_grid(self, request):
+        """班级成绩录入表格：?class_id=&exam_id=&subjects=语文,数学，每行附带版本号。"""
+        try:
+            data = ScoreGridService.load(
+                request.user,
+                request.query_params.get('class_id'),
+                request.query_params.get('exam_id'),
+                request.query_params.get('subjects'),
+            )
+            return Response(data)
+        except ScoreGridServiceError as exc:
+            return Response(exc.payload or {'success': False, 'message': exc.message}, status=exc.status_code)
 
-        page = request.query_params.get('page', '1')
+    @action(detail=False, methods=['post'], url_path='score-grid-save')
+    def score_grid_save(self, request):
+        """保存成绩表格：rows=[{student_id, version, scores: {科目: 分数}}]，逐格校验后整体写入。"""
+        try:
+            result = ScoreGridService.save(
+                request.user,
+                request.data.get('class_id'),
+                request.data.get('exam_id'),
+                request.data.get('rows'),
+            )
+            return Response(result)
+        except ScoreGridServiceError as exc:
+            return Response(exc.payload or {'success': False, 'message': exc.message}, status=exc.status_code)
+        except Exception as exc:
+            return Response({'success': False, 'message': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'], url_path='ranking-status')
+    def ranking_status(self, request):
+        """查询某场考试是否有尚未执行的排名更新，前端据此提示排名可能不是最新。"""
+        exam_id = request.query_params.get('exam') or request.query_params.get('exam_id')
+        try:
+            exam_id = int(exam_id)
+        except (TypeError, ValueError):
+            return Response({'success': False, 'message': '请提供有效的考试ID'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            data = RankingScheduler.pending(exam_id)
+        except Exception as exc:
+            return Response({'success': False, 'message': f'排名状态查询失败: {str(exc)}'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'success': True, **data})
+
+    def list(self, request, *args, **kwargs):
         page_size = request.query_params.get('page_size', '100')
         try:
             page_size = int(page_size)
@@ -434,23 +605,11 @@ class ScoreViewSet(viewsets.ModelViewSet):
             page_size = 100
         page_size = max(10, min(100, page_size))
 
-        paginator = Paginator(rows, page_size)
-        page_obj = paginator.get_page(page)
-
-        return Response({
-            'count': paginator.count,
-            'num_pages': paginator.num_pages,
-            'current_page': page_obj.number,
-            'has_previous': page_obj.has_previous(),
-            'has_next': page_obj.has_next(),
-            'previous_page': page_obj.previous_page_number() if page_obj.has_previous() else None,
-            'next_page': page_obj.next_page_number() if page_obj.has_next() else None,
-            'start_index': page_obj.start_index() if paginator.count else 0,
-            'end_index': page_obj.end_index() if paginator.count else 0,
-            'page_size': page_size,
-            'results': list(page_obj),
-            'all_subjects': all_subjects,
-        })
+        try:
+            data = ScoreQueryService.paginate(self._filter_scores(request), request, page_size)
+        except ValueError as exc:
+            return Response({'success': False, 'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
 
     @action(detail=False, methods=['get'], url_path='download-template')
     def download_template(self, request):
@@ -482,36 +641,29 @@ class ScoreViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='batch-delete-selected')
     def batch_delete_selected(self, request):
+        selection_token = request.data.get('selection_token')
         selected_records = request.data.get('selected_records', [])
-        if not selected_records:
+        if not selection_token and not selected_records:
             return Response({'success': False, 'message': '没有选择任何记录'}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_deleted = 0
-        affected_exam_ids = set()
-        scoped_scores = ScoreAccessService.scope_scores(
-            request.user,
-            Score.objects.all(),
-        )
-
-        for record in selected_records:
-            try:
-                student_id, exam_id = str(record).split('_')
-            except ValueError:
-                continue
-            deleted_count = scoped_scores.filter(student_id=student_id, exam_id=exam_id).delete()[0]
-            total_deleted += deleted_count
-            if deleted_count > 0:
-                affected_exam_ids.add(int(exam_id))
-
-        for exam_id in affected_exam_ids:
+        if selection_token:
             try:
-                update_all_rankings_async.delay(exam_id)
-            except Exception:
-                pass
+                selection_scores = ScoreSelectionService.resolve(request.user, selection_token)
+            except ScoreSelectionServiceError as exc:
+                return Response({'success': False, 'message': exc.message}, status=exc.status_code)
+            result = ScoreMutationService.delete_scores(selection_scores)
+        else:
+            scoped_scores = ScoreAccessService.scope_scores(
+                request.user,
+                Score.objects.all(),
+            )
+            result = ScoreMutationService.delete_selected(scoped_scores, selected_records)
+        total_deleted = result['deleted_count']
 
         return Response({
             'success': True,
             'deleted_count': total_deleted,
+            'affected_exams': result['affected_exams'],
             'message': f'成功删除 {total_deleted} 条成绩记录' if total_deleted else '没有找到对应的成绩记录'
         })
 
@@ -528,14 +680,12 @@ class ScoreViewSet(viewsets.ModelViewSet):
                 'message': '没有符合筛选条件的成绩记录'
             })
 
-        affected_exam_ids = list(filtered_scores.values_list('exam_id', flat=True).distinct())
-        filtered_scores.delete()
+        affected_cohorts = list(filtered_scores.values_list('exam_id', 'student__cohort').distinct())
+        with ExamResultService.deferred():
+            filtered_scores.delete()
 
-        for exam_id in affected_exam_ids:
-            try:
-                update_all_rankings_async.delay(exam_id)
-            except Exception:
-                pass
+        for exam_id, cohort in affected_cohorts:
+            RankingScheduler.request(exam_id, cohort)
 
         return Response({
             'success': True,
@@ -554,67 +704,150 @@ class ScoreViewSet(viewsets.ModelViewSet):
             'record_keys': record_keys,
         })
 
+    @action(detail=False, methods=['post'], url_path='selections')
+    def create_selection(self, request):
+        """
+        以当前筛选条件（query string，同列表接口）创建服务端选择集，返回 token。
+
+        请求体可带 include/exclude 记录键作为初始的勾选/取消；批量删除、导出传 selection_token 即可。
+        """
+        try:
+            selection = ScoreSelectionService.create(
+                request.user,
+                request.query_params,
+                include=request.data.get('include'),
+                exclude=request.data.get('exclude'),
+            )
+            data = ScoreSelectionService.serialize(selection, request.user)
+        except ScoreSelectionServiceError as exc:
+            return Response({'success': False, 'message': exc.message}, status=exc.status_code)
+        except ValueError as exc:
+            return Response({'success': False, 'message': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'success': True, **data}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get', 'patch', 'delete'], url_path=r'selections/(?P<token>[^/.]+)')
+    def selection_detail(self, request, token=None):
+        """查看（GET）、追加勾选/取消（PATCH，include/exclude）或丢弃（DELETE）选择集。"""
+        try:
+            if request.method == 'DELETE':
+                ScoreSelectionService.discard(request.user, token)
+                return Response({'success': True})
+            if request.method == 'PATCH':
+                selection = ScoreSelectionService.update(
+                    request.user,
+                    token,
+                    include=request.data.get('include'),
+                    exclude=request.data.get('exclude'),
+                )
+            else:
+                selection = ScoreSelectionService.get(request.user, token)
+            data = ScoreSelectionService.serialize(selection, request.user)
+        except ScoreSelectionServiceError as exc:
+            return Response({'success': False, 'message': exc.message}, status=exc.status_code)
+        return Response({'success': True, **data})
+
+    @staticmethod
+    def _streaming_xlsx_response(chunks, filename):
+        response = StreamingHttpResponse(
+            chunks,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @staticmethod
+    def _export_job_response(kind, request):
+        try:
+            job = ExportJobService.request_job(kind, request.query_params, request.user)
+        except ExportJobServiceError as exc:
+            return Response({'success': False, 'message': exc.message}, status=exc.status_code)
+        return Response({
+            'success': True,
+            'async': True,
+            'job_id': job.pk,
+            'job': ExportJobService.serialize(job),
+        }, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=False, methods=['post'], url_path='batch-export-selected')
     def batch_export_selected(self, request):
+        selection_token = request.data.get('selection_token')
         selected_records = request.data.get('selected_records', [])
-        if not selected_records:
+        if not selection_token and not selected_records:
             return Response({'success': False, 'message': '没有选择任何记录'}, status=status.HTTP_400_BAD_REQUEST)
 
-        selected_rows = []
-        scoped_scores = ScoreAccessService.scope_scores(
-            request.user,
-            Score.objects.all(),
-        )
-        for record in selected_records:
+        if selection_token:
             try:
-                student_id, exam_id = str(record).split('_')
-            except ValueError:
-                continue
-            scores = scoped_scores.filter(student_id=student_id, exam_id=exam_id).select_related(
-                'student', 'student__current_class', 'exam'
+                selection_scores = ScoreSelectionService.resolve(request.user, selection_token)
+            except ScoreSelectionServiceError as exc:
+                return Response({'success': False, 'message': exc.message}, status=exc.status_code)
+            rows = ScoreQueryService.iter_export_rows(selection_scores)
+        else:
+            scoped_scores = ScoreAccessService.scope_scores(
+                request.user,
+                Score.objects.all(),
             )
-            selected_rows.extend(self._aggregate_rows(scores))
-
-        workbook = self._build_export_workbook(selected_rows)
+            rows = ScoreQueryService.iter_selected_export_rows(scoped_scores, selected_records)
         timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="聚合成绩导出_{timestamp}.xlsx"'
-        workbook.save(response)
-        return response
+        return self._streaming_xlsx_response(
+            ScoreWorkbookService.export_workbook_chunks(rows),
+            f'聚合成绩导出_{timestamp}.xlsx',
+        )
 
     @action(detail=False, methods=['get'], url_path='batch-export')
     def batch_export(self, request):
-        rows = self._aggregate_rows(self._filter_scores(request))
-        workbook = self._build_export_workbook(rows)
+        if ExportJobService.should_run_async(request.query_params.get('async')):
+            return self._export_job_response('score_batch', request)
+
+        rows = ScoreQueryService.iter_export_rows(self._filter_scores(request))
         timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="筛选成绩导出_{timestamp}.xlsx"'
-        workbook.save(response)
-        return response
+        return self._streaming_xlsx_response(
+            ScoreWorkbookService.export_workbook_chunks(rows),
+            f'筛选成绩导出_{timestamp}.xlsx',
+        )
 
     @action(detail=False, methods=['get'], url_path='query-export')
     def query_export(self, request):
-        rows = self._aggregate_rows(self._filter_scores(request))
-        rows = self._sort_rows(rows, request)
-        all_subjects = ScoreQueryService.resolve_subjects(rows, request.query_params.get('dynamic_subjects'))
+        if ExportJobService.should_run_async(request.query_params.get('async')):
+            return self._export_job_response('score_query', request)
 
-        workbook = self._build_query_export_workbook(rows, all_subjects)
+        scores = self._filter_scores(request)
+        all_subjects = ScoreQueryService.display_subjects(
+            ScoreQueryService.present_subjects(scores),
+            request.query_params.get('dynamic_subjects'),
+        )
+        rows = ScoreQueryService.iter_export_rows(scores, request)
         timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-        response['Content-Disposition'] = f'attachment; filename="成绩查询导出_{timestamp}.xlsx"'
-        workbook.save(response)
-        return response
+        return self._streaming_xlsx_response(
+            ScoreWorkbookService.query_export_workbook_chunks(rows, all_subjects),
+            f'成绩查询导出_{timestamp}.xlsx',
+        )
 
     @action(detail=False, methods=['post'], url_path='batch-import', parser_classes=[MultiPartParser, FormParser])
     def batch_import(self, request):
         excel_file = request.FILES.get('excel_file')
         exam_id = request.data.get('exam')
+        start_row = request.data.get('start_row') or 2
+
+        if excel_file and ImportJobService.should_run_async(excel_file, request.data.get('async')):
+            try:
+                job = ImportJobService.create_job(
+                    'score', excel_file, request.user, exam_id=exam_id, start_row=start_row
+                )
+            except ImportJobServiceError as exc:
+                return Response({'success': False, 'message': exc.message}, status=exc.status_code)
+            return Response({
+                'success': True,
+                'async': True,
+                'job_id': job.pk,
+                'status': job.status,
+                'message': '文件已上传，正在后台导入',
+            }, status=status.HTTP_202_ACCEPTED)
 
         try:
-            result = ScoreImportService.batch_import(excel_file, exam_id)
+            result = ScoreImportService.batch_import(excel_file, exam_id, start_row=start_row)
             return Response(result)
         except ScoreImportServiceError as exc:
-            return Response({'success': False, 'message': exc.message}, status=exc.status_code)
+            return Response(exc.payload or {'success': False, 'message': exc.message}, status=exc.status_code)
         except Exception as exc:
             return Response(
                 {'success': False, 'message': f'文件处理失败：{str(exc)}'},
@@ -1,5 +1,3 @@
-import datetime
-
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from django.db import transaction
@@ -23,7 +21,14 @@ from ..models.student import (
     COHORT_CHOICES,
 )
 from ..serializers import StudentSerializer
-from ..tasks import update_all_rankings_async
+from ..services import (
+    AnalysisCacheService,
+    ImportJobService,
+    ImportJobServiceError,
+    StudentImportService,
+    StudentImportServiceError,
+)
+from ..services.ranking_scheduler import RankingScheduler
 
 class StudentViewSet(viewsets.ModelViewSet):
     """
@@ -68,15 +73,12 @@ class StudentViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         # 获取该学生参与的所有考试ID，用于后续排名更新
         affected_exam_ids = list(Score.objects.filter(student=instance).values_list('exam_id', flat=True).distinct())
+        cohort = instance.cohort
         instance.delete()
         
-        # 异步更新受影响考试的排名
-        if affected_exam_ids:
-            for exam_id in affected_exam_ids:
-                try:
-                    update_all_rankings_async.delay(exam_id)
-                except Exception:
-                    pass  # 静默处理任务提交错误
+        # 登记受影响考试的排名更新（由调度器合并去抖）
+        for exam_id in affected_exam_ids:
+            RankingScheduler.request(exam_id, cohort)
 
     def perform_update(self, serializer):
         # 检查是否变更为毕业状态，如果是则补充毕业日期
@@ -95,16 +97,14 @@ class StudentViewSet(viewsets.ModelViewSet):
         try:
             with transaction.atomic():
                 students_to_delete = Student.objects.filter(pk__in=student_ids)
-                affected_exam_ids = list(Score.objects.filter(student__in=students_to_delete).values_list('exam_id', flat=True).distinct())
+                affected_cohorts = list(
+                    Score.objects.filter(student__in=students_to_delete).values_list('exam_id', 'student__cohort').distinct()
+                )
                 
                 deleted_count, _ = students_to_delete.delete()
                 
-                if affected_exam_ids:
-                    for exam_id in affected_exam_ids:
-                        try:
-                            update_all_rankings_async.delay(exam_id)
-                        except Exception:
-                            pass
+                for exam_id, cohort in affected_cohorts:
+                    RankingScheduler.request(exam_id, cohort)
                             
                 return Response({
                     'success': True,
@@ -136,7 +136,9 @@ class StudentViewSet(viewsets.ModelViewSet):
                     students_to_update.filter(status='毕业').update(status=new_status)
                 else:
                     updated_count = students_to_update.update(status=new_status)
-                    
+                # 批量 update 不触发信号：毕业/休学等状态会改变分析口径
+                AnalysisCacheService.invalidate_roster()
+
                 return Response({
                     'success': True, 
                     'message': f'成功更新 {updated_count} 名学生的状态为 "{new_status}"。'
@@ -328,196 +330,22 @@ class StudentViewSet(viewsets.ModelViewSet):
         if not excel_file.name.endswith(('.xlsx', '.xls')):
             return Response({'success': False, 'message': "文件格式不正确，请上传 .xlsx 或 .xls 文件。"}, status=400)
 
-        try:
-            workbook = openpyxl.load_workbook(excel_file)
-            sheet = workbook.active
-            
-            header = [cell.value for cell in sheet[1]]
-            
-            header_mapping = {
-                "学号 (必填)": "student_id",
-                "姓名 (必填)": "name",
-                "性别 (男/女)": "gender",
-                "出生日期 (YYYY-MM-DD)": "date_of_birth",
-                "年级 (初一/初二/初三/高一/高二/高三)": "grade_level",
-                "学段 (初中/高中)": "_section",
-                "届别年份 (纯数字，如2026)": "_cohort_year",
-                "班级名称 (1班-20班)": "class_name",
-                "在校状态 (在读/转学/休学/复学/毕业)": "status",
-                "身份证号码": "id_card_number",
-                "学籍号": "student_enrollment_number",
-                "家庭地址": "home_address",
-                "监护人姓名": "guardian_name",
-                "监护人联系电话": "guardian_contact_phone",
-                "入学日期 (YYYY-MM-DD)": "entry_date",
-                "毕业日期 (YYYY-MM-DD)": "graduation_date",
-            }
-
-            imported_count = 0
-            failed_rows = []
-            success_messages = []
-            error_messages = []
-            warning_messages = []
-
-            # 检测Excel中是否有重复学号
-            excel_student_ids = []
-            duplicate_rows = []
-
-            for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-                if not any(row):
-                    continue
-                row_data = dict(zip(header, row))
-                sid = row_data.get('学号 (必填)') or row_data.get('学号')
-                if sid:
-                    sid = str(sid).strip()
-                    if sid in excel_student_ids:
-                        duplicate_rows.append({'row': row_idx, 'student_id': sid})
-                    excel_student_ids.append(sid)
-
-            if duplicate_rows:
-                warning_messages.append(f"检测到Excel中有重复学号：{', '.join([r['student_id'] for r in duplicate_rows])}")
-
-            from django.db import transaction
-
-            for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-                if not any(row):
-                    continue
-
-                try:
-                    with transaction.atomic():
-                        row_data = dict(zip(header, row))
-                        student_data = {}
-                        for excel_header, model_field in header_mapping.items():
-                            if excel_header in row_data:
-                                student_data[model_field] = row_data[excel_header]
-
-                        if not student_data.get('student_id') or not student_data.get('name'):
-                            raise ValueError("学号和姓名为必填字段")
-
-                        if student_data.get('student_id'):
-                            student_data['student_id'] = str(student_data['student_id']).strip()
-
-                        if student_data.get('id_card_number'):
-                            student_data['id_card_number'] = str(student_data['id_card_number']).strip()
-                        # 学籍号：空字符串也设为None，避免唯一约束冲突
-                        enrollment = student_data.get('student_enrollment_number')
-                        if enrollment and str(enrollment).strip():
-                            student_data['student_enrollment_number'] = str(enrollment).strip()
-                        else:
-                            student_data['student_enrollment_number'] = None
-
-                        for date_field in ['date_of_birth', 'entry_date', 'graduation_date']:
-                            if date_field in student_data:
-                                date_value = student_data[date_field]
-                                if date_value is None or date_value == '' or str(date_value).strip() == '':
-                                    student_data[date_field] = None
-                                    continue
-                                
-                                try:
-                                    if isinstance(date_value, datetime.datetime):
-                                        student_data[date_field] = date_value.date()
-                                    elif isinstance(date_value, datetime.date):
-                                        pass
-                                    else:
-                                        date_str = str(date_value).strip()
-                                        if date_str:
-                                            for date_format in ['%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d']:
-                                                try:
-                                                    student_data[date_field] = datetime.datetime.strptime(date_str, date_format).date()
-                                                    break
-                                                except ValueError:
-                                                    continue
-                                            else:
-                                                student_data[date_field] = None
-                                                warning_messages.append(f"第 {row_idx} 行的 '{date_field}' 日期格式不正确 (值: '{date_value}')")
-                                        else:
-                                            student_data[date_field] = None
-                                except Exception as e:
-                                    student_data[date_field] = None
-                                    warning_messages.append(f"第 {row_idx} 行的 '{date_field}' 日期处理出错: {e}")
-                            else:
-                                student_data[date_field] = None
-
-                        if 'gender' in student_data and student_data['gender']:
-                            gender_value = str(student_data['gender']).strip()
-                            gender_mapping = {
-                                '男': '男', 'M': '男', 'Male': '男', 'male': '男', '1': '男',
-                                '女': '女', 'F': '女', 'Female': '女', 'female': '女', '0': '女'
-                            }
-                            student_data['gender'] = gender_mapping.get(gender_value, gender_value)
-                            if student_data['gender'] not in ['男', '女']:
-                                warning_messages.append(f"第 {row_idx} 行的性别值 '{gender_value}' 无效，已设置为空")
-                                student_data['gender'] = None
-
-                        # 处理学段 + 届别年份 → cohort
-                        section = student_data.pop('_section', None)
-                        cohort_year = student_data.pop('_cohort_year', None)
-                        class_name = student_data.pop('class_name', None)
-                        current_class_obj = None
-
-                        # grade_level 直接从 Excel 读取（传统格式如"初一"）
-                        # cohort = section + cohort_year + "级"（如"初中2024级"）
-                        if section and cohort_year:
-                            cohort_year_str = str(cohort_year).strip()
-                            cohort_value = f"{section}{cohort_year_str}级"
-                            student_data['cohort'] = cohort_value
-
-                        if class_name:
-                            # 使用 grade_level + class_name 作为查找键，确保正确匹配
-                            try:
-                                current_class_obj, created = Class.objects.get_or_create(
-                                    grade_level=student_data.get('grade_level', ''),
-                                    class_name=class_name,
-                                    defaults={
-                                        'grade_level': student_data.get('grade_level', ''),
-                                        'cohort': student_data.get('cohort', '')
-                                    }
-                                )
-                                # 如果已存在但 cohort 为空，自动补全 cohort
-                                if not created and not current_class_obj.cohort and student_data.get('cohort'):
-                                    current_class_obj.cohort = student_data.get('cohort')
-                                    current_class_obj.save(update_fields=['cohort'])
-                                    warning_messages.append(
-                                        f"第 {row_idx} 行：班级 {student_data.get('grade_level', '')}{class_name} 的 cohort 已自动补全为 {student_data.get('cohort')}"
-                                    )
-                                if created:
-                                    success_messages.append(f"自动创建班级：{student_data.get('grade_level', '')}{class_name}")
-                            except Exception as e:
-                                raise ValueError(f"班级创建/查找失败: {e}")
-
-                        student_data['current_class'] = current_class_obj
-
-                        student_id = student_data.get('student_id')
-                        student_obj, created = Student.objects.update_or_create(
-                            student_id=student_id,
-                            defaults=student_data
-                        )
-
-                        if created:
-                            success_messages.append(f"成功新增学生：{student_obj.name} ({student_obj.student_id})")
-                        else:
-                            success_messages.append(f"成功更新学生：{student_obj.name} ({student_obj.student_id})")
-                        imported_count += 1
-                        
-                except Exception as e:
-                    failed_rows.append({'row': row_idx, 'error': str(e)})
-                    error_messages.append(f"第 {row_idx} 行学生导入失败: {e}")
-                    continue
-
+        if ImportJobService.should_run_async(excel_file, request.data.get('async')):
+            try:
+                job = ImportJobService.create_job('student', excel_file, request.user)
+            except ImportJobServiceError as exc:
+                return Response({'success': False, 'message': exc.message}, status=exc.status_code)
             return Response({
                 'success': True,
-                'imported_count': imported_count,
-                'failed_count': len(failed_rows),
-                'success_messages': success_messages,
-                'error_messages': error_messages,
-                'warning_messages': warning_messages,
-                'failed_rows': failed_rows
-            })
+                'async': True,
+                'job_id': job.pk,
+                'status': job.status,
+                'message': '文件已上传，正在后台导入',
+            }, status=status.HTTP_202_ACCEPTED)
 
-        except Exception as e:
-            return Response({
-                'success': False,
-                'message': f"解析文件时出现严重错误: {str(e)}"
-            }, status=500)
+        try:
+            return Response(StudentImportService.batch_import(excel_file))
+        except StudentImportServiceError as exc:
+            return Response({'success': False, 'message': exc.message}, status=exc.status_code)
 
 
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""排名后端基准测试：对比 SQL 窗口函数后端与 Python 后端的全量排名耗时。
+
+在独立的测试数据库中生成一场合成考试（默认 2000 名学生 × 9 科），
+分别用两个后端各跑若干轮，输出耗时并校验两者写回的排名逐行一致。
+不会读写业务数据库。
+
+Usage:
+    cd /path/to/SMS
+    python scripts/benchmark_ranking.py
+    python scripts/benchmark_ranking.py --students 2000 --classes 20 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "school_management.settings")
+django.setup()
+
+from django.db import connection
+
+from school_management.students_grades.models import Class, Exam, ExamSubject, Score, Student
+from school_management.students_grades.tasks import RANK_FIELDS, update_grade_rankings_optimized
+
+COHORT = '初中2025级'
+SUBJECTS = ['语文', '数学', '英语', '政治', '历史', '物理', '化学', '生物', '地理']
+
+
+def build_exam(student_count, class_count, seed):
+    """生成一届学生与一场考试的合成成绩，分数保留一位小数以制造并列。"""
+    rng = random.Random(seed)
+
+    classes = Class.objects.bulk_create([
+        Class(grade_level='初一', cohort=COHORT, class_name=f'{i}班')
+        for i in range(1, class_count + 1)
+    ])
+    students = Student.objects.bulk_create([
+        Student(
+            student_id=f'BM{index:05d}',
+            name=f'学生{index}',
+            grade_level='初一',
+            cohort=COHORT,
+            current_class=classes[index % class_count],
+        )
+        for index in range(student_count)
+    ])
+
+    exam = Exam.objects.create(name='排名基准测试', academic_year='2025-2026', grade_level=COHORT, date=date(2025, 11, 1))
+    exam_subjects = ExamSubject.objects.bulk_create([
+        ExamSubject(exam=exam, subject_code=subject, subject_name=subject, max_score=150)
+        for subject in SUBJECTS
+    ])
+
+    scores = [
+        Score(
+            student=student,
+            exam=exam,
+            exam_subject=exam_subject,
+            subject=exam_subject.subject_code,
+            score_value=Decimal(rng.randint(300, 1500)) / 10,
+        )
+        for student in students
+        for exam_subject in exam_subjects
+    ]
+    Score.objects.bulk_create(scores, batch_size=2000)
+    return exam, len(scores)
+
+
+def snapshot(exam):
+    return {
+        row['id']: tuple(row[field] for field in RANK_FIELDS)
+        for row in Score.objects.filter(exam=exam).values('id', *RANK_FIELDS)
+    }
+
+
+def run_backend(exam, backend, repeat):
+    timings = []
+    for _ in range(repeat):
+        Score.objects.filter(exam=exam).update(**{field: None for field in RANK_FIELDS})
+        started = time.perf_counter()
+        update_grade_rankings_optimized(exam, COHORT, backend=backend)
+        timings.append(time.perf_counter() - started)
+    return timings, snapshot(exam)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比排名后端的耗时')
+    parser.add_argument('--students', type=int, default=2000, help='学生人数（默认 2000）')
+    parser.add_argument('--classes', type=int, default=20, help='班级数（默认 20）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个后端运行轮数（默认 3）')
+    parser.add_argument('--seed', type=int, default=20250901, help='随机种子')
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        print(f"数据库: {connection.vendor}，窗口函数支持: {connection.features.supports_over_clause}")
+        exam, score_count = build_exam(args.students, args.classes, args.seed)
+        print(f"合成数据: {args.students} 名学生 × {len(SUBJECTS)} 科 = {score_count} 条成绩\n")
+
+        results = {}
+        for backend in ('python', 'sql'):
+            timings, ranks = run_backend(exam, backend, args.repeat)
+            results[backend] = ranks
+            print(
+                f"{backend:>6}: 最快 {min(timings):.3f}s，"
+                f"中位数 {statistics.median(timings):.3f}s（{args.repeat} 轮）"
+            )
+
+        identical = results['python'] == results['sql']
+        print(f"\n两个后端排名结果一致: {'是' if identical else '否'}")
+        return 0 if identical else 1
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""学生导入基准测试：对比批量写入与逐行写入导入学生名册的耗时和查询数。
+
+在独立的测试数据库中生成一份与导入模板格式一致的名册（默认 3000 行），
+依次执行首次导入（全部新增、自动建班）、原样重复导入、修改后再导入（全部更新），
+分别记录批量模式与逐行模式（StudentImportService.BULK_WRITE=False）的结果。
+不会读写业务数据库。
+
+Usage:
+    cd /path/to/SMS
+    python scripts/benchmark_student_import.py
+    python scripts/benchmark_student_import.py --rows 3000 --classes 20
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from io import BytesIO
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "school_management.settings")
+django.setup()
+
+import openpyxl
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+
+from school_management.students_grades.models import Class, Student
+from school_management.students_grades.services import StudentImportService
+
+HEADERS = [
+    "学号 (必填)", "姓名 (必填)", "性别 (男/女)", "出生日期 (YYYY-MM-DD)",
+    "年级 (初一/初二/初三/高一/高二/高三)", "学段 (初中/高中)", "届别年份 (纯数字，如2026)",
+    "班级名称 (1班-20班)", "在校状态 (在读/转学/休学/复学/毕业)", "身份证号码", "学籍号",
+    "家庭地址", "监护人姓名", "监护人联系电话", "入学日期 (YYYY-MM-DD)", "毕业日期 (YYYY-MM-DD)",
+]
+
+
+def build_sheet(row_count, class_count, seed):
+    """生成名册 Excel 字节，日期以字符串形式写入以覆盖日期解析。"""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    for index in range(row_count):
+        birthday = date(2012, 1, 1) + timedelta(days=rng.randint(0, 364))
+        ws.append([
+            f'SI{index:05d}', f'学生{index}', rng.choice(['男', '女']), birthday.strftime('%Y-%m-%d'),
+            '初一', '初中', 2025, f'{index % class_count + 1}班', '在读',
+            '', f'EN{index:06d}', '地址', '监护人', '13800000000', '2025-09-01', '',
+        ])
+    buf = BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def run_import(content):
+    upload = SimpleUploadedFile('students.xlsx', content)
+    query_count = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal query_count
+        query_count += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        started = time.perf_counter()
+        result = StudentImportService.batch_import(upload)
+        elapsed = time.perf_counter() - started
+    return elapsed, query_count, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比学生导入批量写入与逐行写入的耗时')
+    parser.add_argument('--rows', type=int, default=3000, help='名册行数（默认 3000）')
+    parser.add_argument('--classes', type=int, default=20, help='班级数（默认 20）')
+    parser.add_argument('--seed', type=int, default=20250901, help='随机种子')
+    args = parser.parse_args()
+
+    content = build_sheet(args.rows, args.classes, args.seed)
+    # 换一个随机种子生成第二份名册（性别、出生日期不同），使更新阶段产生真实的写入
+    changed_content = build_sheet(args.rows, args.classes, args.seed + 1)
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        print(f"数据库: {connection.vendor}，名册: {args.rows} 行 / {args.classes} 个班级\n")
+        for bulk in (False, True):
+            StudentImportService.BULK_WRITE = bulk
+            Student.objects.all().delete()
+            Class.objects.all().delete()
+
+            label = '批量' if bulk else '逐行'
+            for phase, sheet in (('新增', content), ('重复导入', content), ('更新', changed_content)):
+                elapsed, query_count, result = run_import(sheet)
+                print(
+                    f"{label}{phase}: {elapsed:.3f}s，{query_count} 条 SQL，"
+                    f"成功 {result['imported_count']} 行，失败 {result['failed_count']} 行"
+                )
+        return 0
+    finally:
+        StudentImportService.BULK_WRITE = True
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())